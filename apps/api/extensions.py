@@ -0,0 +1,26 @@
+"""Strawberry schema extensions."""
+
+from asgiref.sync import sync_to_async
+from strawberry.extensions import SchemaExtension
+
+
+class SyncResolversOffEventLoop(SchemaExtension):
+    """
+    Run synchronous root resolvers in a worker thread under the async view.
+
+    Mutations and the remaining sync queries use the Django ORM directly,
+    which Django refuses to do on a running event loop. Wrapping just the
+    top-level Query/Mutation fields keeps nested attribute resolution on the
+    loop and leaves async resolvers untouched.
+    """
+
+    _root_types = ('Query', 'Mutation')
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if info.parent_type.name not in self._root_types:
+            return _next(root, info, *args, **kwargs)
+
+        field = info.parent_type.fields[info.field_name].extensions.get('strawberry-definition')
+        if field is None or field.is_async:
+            return _next(root, info, *args, **kwargs)
+        return sync_to_async(_next)(root, info, *args, **kwargs)
@@ -0,0 +1,84 @@
+"""Management command to compare DRF serializers with the fast read path."""
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.utils import timezone
+from apps.devices.models import (
+    SolarPanel, Generator, Battery, ElectricVehicle,
+    AirConditioner, Heater
+)
+from apps.api.serializers import (
+    BatterySerializer, ElectricVehicleSerializer, SolarPanelSerializer,
+    GeneratorSerializer, AirConditionerSerializer, HeaterSerializer,
+    FastReadSerializer
+)
+
+
+def build_rows(model, count, user, **values):
+    """Build unsaved model instances so the benchmark measures serialization only."""
+    now = timezone.now()
+    rows = []
+    for i in range(count):
+        row = model(id=i + 1, user=user, name=f'{model.__name__} {i}', **values)
+        row.created_at = now - timedelta(minutes=i)
+        row.updated_at = now
+        rows.append(row)
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Benchmark DRF ModelSerializer list rendering against FastReadSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per list')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (best is reported)')
+        parser.add_argument('--fields', default='', help='Optional comma-separated sparse fieldset')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        fields = tuple(f for f in options['fields'].split(',') if f) or None
+        user = User(id=1, username='benchmark')
+
+        cases = [
+            (BatterySerializer, build_rows(
+                Battery, rows, user, capacity_kwh=13.5, current_charge_kwh=6.75,
+                max_charge_rate_kw=5.0, max_discharge_rate_kw=5.0)),
+            (ElectricVehicleSerializer, build_rows(
+                ElectricVehicle, rows, user, capacity_kwh=75.0, current_charge_kwh=40.0,
+                max_charge_rate_kw=11.0, max_discharge_rate_kw=7.0, mode='charging',
+                last_seen_at=timezone.now())),
+            (SolarPanelSerializer, build_rows(
+                SolarPanel, rows, user, panel_area_m2=20.0, efficiency=0.2, max_capacity_w=4000.0)),
+            (GeneratorSerializer, build_rows(Generator, rows, user, rated_output_w=3000.0)),
+            (AirConditionerSerializer, build_rows(
+                AirConditioner, rows, user, rated_power_w=3500.0, min_power_w=1500.0, max_power_w=4500.0)),
+            (HeaterSerializer, build_rows(
+                Heater, rows, user, rated_power_w=2000.0, min_power_w=800.0, max_power_w=2500.0)),
+        ]
+
+        self.stdout.write(f'Serializing {rows} rows x {repeat} runs'
+                          + (f' with fields={",".join(fields)}' if fields else ''))
+        self.stdout.write(f'{"serializer":<28}{"drf ms":>10}{"fast ms":>10}{"speedup":>10}')
+
+        for serializer_class, instances in cases:
+            fast = FastReadSerializer.for_serializer(serializer_class, fields)
+            expected = serializer_class(instances, many=True, fields=fields).data
+            if fast.serialize_many(instances) != expected:
+                self.stdout.write(self.style.ERROR(f'{serializer_class.__name__}: output mismatch'))
+                continue
+
+            drf_ms = self._best(lambda: serializer_class(instances, many=True, fields=fields).data, repeat)
+            fast_ms = self._best(lambda: fast.serialize_many(instances), repeat)
+            self.stdout.write(
+                f'{serializer_class.__name__:<28}{drf_ms:>10.1f}{fast_ms:>10.1f}{drf_ms / fast_ms:>9.1f}x'
+            )
+
+    @staticmethod
+    def _best(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
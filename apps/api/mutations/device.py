@@ -15,6 +15,7 @@ from apps.api.types.device_types import (
 )
 from apps.api.permissions import IsAuthenticated
 from apps.simulation.redis_client import RedisClient
+from apps.simulation.simulators.registry import STORAGE_DEVICE_TYPES
 
 
 @strawberry.enum
@@ -72,18 +73,27 @@ class UpdateDeviceInput:
 def convert_device_to_graphql(device):
     """Convert Django model to GraphQL type."""
     device_type = device.get_device_type()
-    specific_device = device.get_specific_device()
-    
+
     # Get current status from Redis (simulation state)
     redis_client = RedisClient()
-    current_status = device.status  # Default to DB status
-    
-    # Check Redis for real-time simulation status
-    if device_type in ['battery', 'electric_vehicle']:
+    if device_type in STORAGE_DEVICE_TYPES:
         redis_data = redis_client.get_device_storage(device.id)
     else:
         redis_data = redis_client.get_device_data(device.id)
-    
+
+    return build_device_type(device, redis_data)
+
+
+def build_device_type(device, redis_data):
+    """
+    Build the GraphQL type for `device` from its DB row and the latest
+    simulation payload already fetched from Redis (or None).
+    """
+    device_type = device.get_device_type()
+    specific_device = device.get_specific_device()
+    current_status = device.status  # Default to DB status
+
+    # Check Redis for real-time simulation status
     if redis_data and 'status' in redis_data:
         current_status = redis_data['status']
     
@@ -148,7 +158,7 @@ def convert_device_to_graphql(device):
             created_at=device.created_at,
             updated_at=device.updated_at,
             capacity_kwh=specific_device.capacity_kwh,
-            current_charge_kwh=specific_device.current_charge_kwh,
+            current_charge_kwh=specific_device.settled_charge_kwh,
             max_charge_rate_kw=specific_device.max_charge_rate_kw,
             max_discharge_rate_kw=specific_device.max_discharge_rate_kw,
             mode=EVModeEnum[mode_value.upper()],
@@ -167,6 +177,9 @@ def convert_device_to_graphql(device):
             rated_power_w=specific_device.rated_power_w,
             min_power_w=specific_device.min_power_w,
             max_power_w=specific_device.max_power_w,
+            climate_region=specific_device.climate_region,
+            setpoint_c=specific_device.setpoint_c,
+            thermal_time_constant_hours=specific_device.thermal_time_constant_hours,
         )
     elif device_type == 'heater':
         return HeaterType(
@@ -179,6 +192,9 @@ def convert_device_to_graphql(device):
             rated_power_w=specific_device.rated_power_w,
             min_power_w=specific_device.min_power_w,
             max_power_w=specific_device.max_power_w,
+            climate_region=specific_device.climate_region,
+            setpoint_c=specific_device.setpoint_c,
+            thermal_time_constant_hours=specific_device.thermal_time_constant_hours,
         )
 
 
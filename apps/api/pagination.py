@@ -0,0 +1,205 @@
+"""
+Keyset (cursor) pagination shared by the REST and GraphQL APIs.
+
+Pages are addressed by the position of the last row seen rather than by an
+OFFSET, so the database walks the `(created_at, id)` index straight to the
+next page and no COUNT(*) is issued. Deep pages cost the same as the first.
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+DEVICE_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a cursor we did not issue."""
+
+
+def encode_cursor(position: Sequence[Any], reverse: bool = False) -> str:
+    """Encode an ordering position into an opaque URL-safe cursor."""
+    payload = {
+        'p': [value.isoformat() if hasattr(value, 'isoformat') else value for value in position],
+        'r': int(reverse),
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, queryset, ordering: Sequence[str]) -> Tuple[list, bool]:
+    """Decode a cursor back into typed ordering values and a direction flag."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        raw_position = payload['p']
+        reverse = bool(payload.get('r', 0))
+    except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(raw_position, list) or len(raw_position) != len(ordering):
+        raise InvalidCursor(cursor)
+
+    opts = queryset.model._meta
+    try:
+        position = [
+            opts.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, raw_position)
+        ]
+    except Exception:
+        raise InvalidCursor(cursor)
+    return position, reverse
+
+
+def _invert(ordering: Sequence[str]) -> List[str]:
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def _keyset_q(ordering: Sequence[str], position: Sequence[Any]) -> Q:
+    """
+    Build the row-value comparison "strictly after `position`" for `ordering`.
+
+    For ('-created_at', '-id') this is:
+        created_at < c OR (created_at = c AND id < i)
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        branch = Q(**{f'{name}__{lookup}': position[index]})
+        for prior_field, prior_value in zip(ordering[:index], position[:index]):
+            branch &= Q(**{prior_field.lstrip('-'): prior_value})
+        condition |= branch
+    return condition
+
+
+def position_of(instance, ordering: Sequence[str]) -> list:
+    """Return the ordering values of `instance`."""
+    return [getattr(instance, field.lstrip('-')) for field in ordering]
+
+
+def keyset_slice(queryset, ordering: Sequence[str], page_size: int,
+                 position: Optional[Sequence[Any]] = None, reverse: bool = False):
+    """The unevaluated query behind `keyset_page`: up to `page_size + 1` rows in travel order."""
+    effective = _invert(ordering) if reverse else list(ordering)
+    queryset = queryset.order_by(*effective)
+    if position is not None:
+        queryset = queryset.filter(_keyset_q(effective, position))
+    return queryset[:page_size + 1]
+
+
+def keyset_page(queryset, ordering: Sequence[str], page_size: int,
+                position: Optional[Sequence[Any]] = None, reverse: bool = False):
+    """
+    Fetch one page of `queryset` after (or, when `reverse`, before) `position`.
+
+    Returns `(items, has_more)` where `has_more` says whether further rows
+    exist in the direction of travel. Items are always in `ordering` order.
+    """
+    items = list(keyset_slice(queryset, ordering, page_size, position, reverse))
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+    return items, has_more
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination class backed by `keyset_page`.
+
+    Responses keep the `next`/`previous`/`results` envelope of the previous
+    page-number pagination but omit `count`.
+    """
+
+    ordering = DEVICE_ORDERING
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = None, False
+        if encoded:
+            try:
+                position, reverse = decode_cursor(encoded, queryset, self.ordering)
+            except InvalidCursor:
+                raise NotFound(self.invalid_cursor_message)
+
+        items, has_more = keyset_page(queryset, self.ordering, page_size, position, reverse)
+
+        if reverse:
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+
+        self.first_position = position_of(items[0], self.ordering) if items else None
+        self.last_position = position_of(items[-1], self.ordering) if items else None
+        if not items and position is not None:
+            # Empty page past either end: let the client walk back from here.
+            self.first_position = self.last_position = position
+        return items
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encode_cursor(self.last_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encode_cursor(self.first_position, reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class UserKeysetPagination(KeysetPagination):
+    """Keyset pagination for users, matching `UserViewSet`'s date_joined ordering."""
+
+    ordering = ('-date_joined', '-id')
@@ -1,6 +1,7 @@
 """GraphQL permission classes."""
 import jwt
 from typing import Any
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
 from django.conf import settings
 from strawberry.permission import BasePermission
@@ -68,3 +69,15 @@ class IsAuthenticated(BasePermission):
             
         except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist):
             return False
+
+
+class AsyncIsAuthenticated(IsAuthenticated):
+    """
+    IsAuthenticated for async resolvers.
+
+    They run on the event loop, where the session and user lookups can't
+    touch the ORM, so the same check is run in a thread and awaited.
+    """
+
+    async def has_permission(self, source: Any, info: Info, **kwargs) -> bool:
+        return await sync_to_async(super().has_permission)(source, info, **kwargs)
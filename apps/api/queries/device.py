@@ -1,23 +1,88 @@
 """Device queries."""
 
 import strawberry
-from typing import List
+from typing import List, Optional
 from strawberry.types import Info
 from apps.devices.models import Device
-from apps.api.types.device_types import DeviceUnion
-from apps.api.mutations.device import convert_device_to_graphql
-from apps.api.permissions import IsAuthenticated
+from apps.api.types.device_types import DeviceUnion, DeviceConnection, DeviceEdge, PageInfo
+from apps.api.mutations.device import build_device_type, convert_device_to_graphql
+from apps.api.pagination import (
+    DEVICE_ORDERING, InvalidCursor, decode_cursor, encode_cursor, keyset_page, keyset_slice,
+    position_of,
+)
+from apps.api.permissions import AsyncIsAuthenticated, IsAuthenticated
+from apps.simulation.redis_client import AsyncRedisClient
+from apps.simulation.simulators.registry import SIMULATION_RELATIONS, STORAGE_DEVICE_TYPES
+
+# Upper bound on `first` so a single page can't turn into an unbounded list.
+MAX_PAGE_SIZE = 100
 
 
 @strawberry.type
 class DeviceQuery:
-    @strawberry.field(permission_classes=[IsAuthenticated])
-    def all_devices(self, info: Info) -> List[DeviceUnion]:
-        """Get all devices for the authenticated user."""
+    @strawberry.field(permission_classes=[AsyncIsAuthenticated])
+    async def all_devices(self, info: Info, first: int = MAX_PAGE_SIZE) -> List[DeviceUnion]:
+        """
+        Get the newest `first` of the authenticated user's devices, with live state.
+
+        This is the dashboard's view and has no cursor; page through every
+        device with the `devices` connection.
+        """
         user = info.context.user
-        devices = Device.objects.filter(user=user).select_related(
-            'solarpanel', 'generator', 'battery', 'electricvehicle',
-            'airconditioner', 'heater'
+        page_size = max(1, min(first, MAX_PAGE_SIZE))
+        devices = [
+            device async for device in keyset_slice(
+                Device.objects.filter(user=user).select_related(*SIMULATION_RELATIONS),
+                DEVICE_ORDERING, page_size,
+            )
+        ][:page_size]
+
+        # One MGET for every device's live state instead of a GET per device
+        redis_data = await AsyncRedisClient().get_devices_live_data(
+            (device.id, device.get_device_type() in STORAGE_DEVICE_TYPES)
+            for device in devices
         )
+        return [build_device_type(device, redis_data[device.id]) for device in devices]
 
-        return [convert_device_to_graphql(device) for device in devices]
+    @strawberry.field(permission_classes=[IsAuthenticated])
+    def devices(
+        self,
+        info: Info,
+        first: int = 50,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+    ) -> DeviceConnection:
+        """Get a page of the authenticated user's devices, newest first."""
+        user = info.context.user
+        queryset = Device.objects.filter(user=user).select_related(*SIMULATION_RELATIONS)
+
+        reverse = last is not None
+        page_size = max(1, min(last if reverse else first, MAX_PAGE_SIZE))
+        cursor = before if reverse else after
+
+        position = None
+        if cursor:
+            try:
+                position, _ = decode_cursor(cursor, queryset, DEVICE_ORDERING)
+            except InvalidCursor:
+                raise Exception("Invalid cursor")
+
+        devices, has_more = keyset_page(queryset, DEVICE_ORDERING, page_size, position, reverse)
+
+        edges = [
+            DeviceEdge(
+                cursor=encode_cursor(position_of(device, DEVICE_ORDERING)),
+                node=convert_device_to_graphql(device),
+            )
+            for device in devices
+        ]
+        return DeviceConnection(
+            edges=edges,
+            page_info=PageInfo(
+                has_next_page=has_more if not reverse else position is not None,
+                has_previous_page=has_more if reverse else position is not None,
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+            ),
+        )
@@ -3,20 +3,19 @@
 import strawberry
 from strawberry.types import Info
 from apps.api.types.energy_stats import EnergyStatsType, CurrentStorageType
-from apps.api.permissions import IsAuthenticated
-from apps.simulation.redis_client import RedisClient
+from apps.api.permissions import AsyncIsAuthenticated
+from apps.simulation.redis_client import AsyncRedisClient
 
 
 @strawberry.type
 class EnergyQuery:
-    @strawberry.field(permission_classes=[IsAuthenticated])
-    def energy_stats(self, info: Info) -> EnergyStatsType:
+    @strawberry.field(permission_classes=[AsyncIsAuthenticated])
+    async def energy_stats(self, info: Info) -> EnergyStatsType:
         """Get current energy statistics for the authenticated user."""
         user = info.context.user
-        redis_client = RedisClient()
 
         # Get aggregated stats from Redis
-        stats = redis_client.get_user_stats(user.id)
+        stats = await AsyncRedisClient().get_user_stats(user.id)
 
         if not stats:
             # Return zero stats if no data available yet
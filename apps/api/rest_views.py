@@ -1,8 +1,10 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.contrib.auth.models import User
+from django.db.models import Count
 from apps.devices.models.base import Device
 from apps.devices.models.storage import Battery, ElectricVehicle
 from apps.devices.models.production import SolarPanel, Generator
@@ -10,18 +12,83 @@ from apps.devices.models.consumption import AirConditioner, Heater
 from .serializers import (
     UserSerializer, DeviceSerializer, BatterySerializer,
     ElectricVehicleSerializer, SolarPanelSerializer, GeneratorSerializer,
-    AirConditionerSerializer, HeaterSerializer
+    AirConditionerSerializer, HeaterSerializer, FastReadSerializer
 )
+from .pagination import UserKeysetPagination
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class SparseFieldsetMixin:
+    """
+    Adds `?fields=a,b,c` to a viewset.
+
+    Reads (list/retrieve) render only the requested fields and narrow the ORM
+    query with `.only()`, dropping joins such as `user` when `user_username`
+    isn't asked for. List actions render through `FastReadSerializer`.
+    """
+    fields_query_param = 'fields'
+
+    def get_requested_fields(self):
+        """Return the requested field names as a tuple, or None for all fields."""
+        if not hasattr(self, '_requested_fields'):
+            raw = self.request.query_params.get(self.fields_query_param) if self.request else None
+            requested = None
+            if raw:
+                names = {name.strip() for name in raw.split(',') if name.strip()}
+                available = self.get_serializer_class().readable_field_names()
+                unknown = sorted(names.difference(available))
+                if unknown:
+                    raise ValidationError({self.fields_query_param: f"Unknown field(s): {', '.join(unknown)}"})
+                # Declaration order, so every ordering of a subset shares one cache entry
+                requested = tuple(name for name in available if name in names)
+            self._requested_fields = requested
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+
+        serializer_class = self.get_serializer_class()
+        fields = self.get_requested_fields() or serializer_class.readable_field_names()
+        paths = serializer_class.orm_paths_for(fields)
+        if paths is None:
+            return queryset
+
+        relations = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*sorted(relations))
+
+        # Keep the pagination keys loaded so cursors don't cost a query per page.
+        ordering = getattr(self.paginator, 'ordering', ())
+        keys = [field.lstrip('-') for field in ordering]
+        return queryset.only('id', *keys, *paths)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = FastReadSerializer.for_serializer(
+            self.get_serializer_class(), self.get_requested_fields()
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(renderer.serialize_many(page))
+        return Response(renderer.serialize_many(queryset))
+
+
+class UserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for User model.
     Allows CRUD operations on users (admin only).
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    queryset = User.objects.annotate(device_count=Count('devices')).order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = UserKeysetPagination
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -30,7 +97,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class DeviceViewSet(viewsets.ModelViewSet):
+class DeviceViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for base Device model.
     Lists all devices with their types.
@@ -62,37 +129,37 @@ class DeviceViewSet(viewsets.ModelViewSet):
         })
 
 
-class BatteryViewSet(viewsets.ModelViewSet):
+class BatteryViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Battery devices."""
-    queryset = Battery.objects.all().select_related('user')
+    queryset = Battery.objects.all().select_related('user', 'state')
     serializer_class = BatterySerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Battery.objects.all().select_related('user')
-        return Battery.objects.filter(user=self.request.user)
+            return Battery.objects.all().select_related('user', 'state')
+        return Battery.objects.filter(user=self.request.user).select_related('state')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class ElectricVehicleViewSet(viewsets.ModelViewSet):
+class ElectricVehicleViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Electric Vehicle devices."""
-    queryset = ElectricVehicle.objects.all().select_related('user')
+    queryset = ElectricVehicle.objects.all().select_related('user', 'state')
     serializer_class = ElectricVehicleSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         if self.request.user.is_staff:
-            return ElectricVehicle.objects.all().select_related('user')
-        return ElectricVehicle.objects.filter(user=self.request.user)
+            return ElectricVehicle.objects.all().select_related('user', 'state')
+        return ElectricVehicle.objects.filter(user=self.request.user).select_related('state')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class SolarPanelViewSet(viewsets.ModelViewSet):
+class SolarPanelViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Solar Panel devices."""
     queryset = SolarPanel.objects.all().select_related('user')
     serializer_class = SolarPanelSerializer
@@ -107,7 +174,7 @@ class SolarPanelViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class GeneratorViewSet(viewsets.ModelViewSet):
+class GeneratorViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Generator devices."""
     queryset = Generator.objects.all().select_related('user')
     serializer_class = GeneratorSerializer
@@ -122,7 +189,7 @@ class GeneratorViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class AirConditionerViewSet(viewsets.ModelViewSet):
+class AirConditionerViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Air Conditioner devices."""
     queryset = AirConditioner.objects.all().select_related('user')
     serializer_class = AirConditionerSerializer
@@ -137,7 +204,7 @@ class AirConditionerViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class HeaterViewSet(viewsets.ModelViewSet):
+class HeaterViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Heater devices."""
     queryset = Heater.objects.all().select_related('user')
     serializer_class = HeaterSerializer
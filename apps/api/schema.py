@@ -1,6 +1,7 @@
 """Root GraphQL schema."""
 
 import strawberry
+from apps.api.extensions import SyncResolversOffEventLoop
 from apps.api.mutations.auth import AuthMutation
 from apps.api.mutations.device import DeviceMutation
 from apps.api.queries.device import DeviceQuery
@@ -19,4 +20,8 @@ class Mutation(AuthMutation, DeviceMutation):
     pass
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    extensions=[SyncResolversOffEventLoop],
+)
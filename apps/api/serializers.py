@@ -1,12 +1,168 @@
-from rest_framework import serializers
+from functools import lru_cache
+from operator import attrgetter
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from apps.devices.models.base import Device
-from apps.devices.models.storage import Battery, ElectricVehicle
+from apps.devices.models.storage import Battery, ElectricVehicle, EVMode
 from apps.devices.models.production import SolarPanel, Generator
 from apps.devices.models.consumption import AirConditioner, Heater
 
 
-class UserSerializer(serializers.ModelSerializer):
+DEVICE_CHILD_RELATIONS = (
+    'solarpanel', 'generator', 'battery', 'electricvehicle',
+    'airconditioner', 'heater',
+)
+
+
+class SparseFieldsMixin:
+    """
+    Lets a serializer be narrowed to a subset of its declared fields.
+
+    Pass `fields=[...]` when instantiating; anything not listed is dropped.
+    `Meta.field_dependencies` maps computed fields (properties, methods) to
+    the ORM paths they read, so views can build a matching `.only()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    @lru_cache(maxsize=64)
+    def readable_field_names(cls):
+        """Names of every non-write-only field, in declaration order."""
+        return tuple(name for name, field in cls().fields.items() if not field.write_only)
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def orm_paths_for(cls, field_names):
+        """
+        Return the ORM paths needed to render the `field_names` tuple, or None
+        when a field's dependencies are unknown and the query must not be narrowed.
+
+        Callers pass field names in declaration order (see
+        `SparseFieldsetMixin.get_requested_fields`) so each subset is cached once.
+        """
+        serializer = cls(fields=field_names)
+        model = serializer.Meta.model
+        dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+        concrete = {f.name for f in model._meta.concrete_fields}
+        paths = []
+        for name, field in serializer.fields.items():
+            if name in dependencies:
+                paths.extend(dependencies[name])
+            elif field.source == '*':
+                return None
+            elif field.source.split('.')[0] in concrete:
+                paths.append('__'.join(field.source.split('.')))
+            else:
+                return None
+        return tuple(paths)
+
+
+class FastReadSerializer:
+    """
+    Read-only serialization path for list endpoints.
+
+    The DRF serializer is bound once per (serializer class, field subset) and
+    compiled into plain (name, getter, converter) triples; rendering a row is
+    then a tight loop with no per-field `get_attribute` / `to_representation`
+    dispatch, SkipField handling or ReturnDict wrapping.
+    Output is identical to `serializer_class(rows, many=True).data`.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer = serializer_class(fields=fields)
+        self.columns = [
+            self._compile(field) for field in self.serializer.fields.values()
+            if not field.write_only
+        ]
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def for_serializer(cls, serializer_class, fields=None):
+        """The compiled renderer for a serializer and a field tuple in declaration order."""
+        return cls(serializer_class, fields)
+
+    def _compile(self, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(self.serializer, field.method_name)
+            return field.field_name, method, None, False
+
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.source_attrs == [field.source]:
+            model_field = self.serializer.Meta.model._meta.get_field(field.source)
+            return field.field_name, attrgetter(model_field.attname), None, False
+
+        getter = attrgetter('.'.join(field.source_attrs))
+        needs_timezone = False
+        if isinstance(field, serializers.FloatField):
+            convert = float
+        elif isinstance(field, serializers.IntegerField):
+            convert = int
+        elif isinstance(field, serializers.CharField):
+            convert = str
+        elif self._is_iso_datetime(field):
+            convert, needs_timezone = self._datetime_converter(field), True
+        else:
+            convert = field.to_representation
+
+        def read(instance, getter=getter):
+            value = getter(instance)
+            return value() if callable(value) else value
+
+        return field.field_name, read, convert, needs_timezone
+
+    @staticmethod
+    def _is_iso_datetime(field):
+        if not isinstance(field, serializers.DateTimeField):
+            return False
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        return output_format is not None and output_format.lower() == ISO_8601
+
+    @staticmethod
+    def _datetime_converter(field):
+        """Same output as DateTimeField.to_representation, minus the per-row timezone lookup."""
+        def convert(value, current_timezone):
+            field_timezone = field.timezone if hasattr(field, 'timezone') else current_timezone
+            if field_timezone is None or isinstance(value, str) or timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def _render(self, instance, current_timezone):
+        row = {}
+        for name, read, convert, needs_timezone in self.columns:
+            value = read(instance)
+            if convert is None or value is None:
+                row[name] = value
+            elif needs_timezone:
+                row[name] = convert(value, current_timezone)
+            else:
+                row[name] = convert(value)
+        return row
+
+    @staticmethod
+    def _current_timezone():
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(self, instance):
+        return self._render(instance, self._current_timezone())
+
+    def serialize_many(self, instances):
+        current_timezone = self._current_timezone()
+        return [self._render(instance, current_timezone) for instance in instances]
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_count = serializers.SerializerMethodField()
     password = serializers.CharField(write_only=True, required=False, min_length=8)
     
@@ -15,9 +171,12 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 
                   'is_active', 'is_staff', 'date_joined', 'device_count', 'password']
         read_only_fields = ['id', 'date_joined', 'device_count']
+        field_dependencies = {'device_count': ['id']}
     
     def get_device_count(self, obj):
-        return obj.devices.count()
+        # Annotated by UserViewSet's queryset; users saved or fetched elsewhere count here
+        count = getattr(obj, 'device_count', None)
+        return count if count is not None else obj.devices.count()
 
     def validate(self, attrs):
         password = attrs.get('password')
@@ -42,7 +201,7 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class DeviceSerializer(serializers.ModelSerializer):
+class DeviceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     
@@ -51,13 +210,18 @@ class DeviceSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_username', 'name', 'status', 
                   'device_type', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at', 'device_type']
+        field_dependencies = {
+            'device_type': [f'{relation}__device_ptr' for relation in DEVICE_CHILD_RELATIONS],
+        }
 
 
-class BatterySerializer(serializers.ModelSerializer):
+class BatterySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     charge_percentage = serializers.FloatField(read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
+    # Stored on DeviceState rather than the battery table
+    current_charge_kwh = serializers.FloatField(min_value=0.0, required=False)
     
     class Meta:
         model = Battery
@@ -66,12 +230,22 @@ class BatterySerializer(serializers.ModelSerializer):
                   'max_charge_rate_kw', 'max_discharge_rate_kw',
                   'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type', 'charge_percentage']
+        field_dependencies = {
+            'device_type': [],
+            'current_charge_kwh': ['state__current_charge_kwh'],
+            'charge_percentage': ['capacity_kwh', 'state__current_charge_kwh'],
+        }
 
 
-class ElectricVehicleSerializer(serializers.ModelSerializer):
+class ElectricVehicleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     charge_percentage = serializers.FloatField(read_only=True)
+    # Stored on DeviceState rather than the electric vehicle table; reads
+    # include driving since the car was last seen
+    current_charge_kwh = serializers.FloatField(source='settled_charge_kwh', min_value=0.0, required=False)
+    mode = serializers.ChoiceField(choices=EVMode.choices, required=False)
+    last_seen_at = serializers.DateTimeField(required=False, allow_null=True)
     
     class Meta:
         model = ElectricVehicle
@@ -79,11 +253,26 @@ class ElectricVehicleSerializer(serializers.ModelSerializer):
                   'capacity_kwh', 'current_charge_kwh', 'charge_percentage',
                   'max_charge_rate_kw', 'max_discharge_rate_kw', 'mode',
                   'last_seen_at', 'driving_efficiency_kwh_per_hour',
+                  'schedule_timezone', 'away_windows',
                   'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type', 'charge_percentage']
+        field_dependencies = {
+            'device_type': [],
+            'current_charge_kwh': [
+                'state__current_charge_kwh', 'state__mode', 'state__last_seen_at',
+                'driving_efficiency_kwh_per_hour', 'schedule_timezone', 'away_windows',
+            ],
+            'charge_percentage': [
+                'capacity_kwh', 'state__current_charge_kwh', 'state__mode',
+                'state__last_seen_at', 'driving_efficiency_kwh_per_hour',
+                'schedule_timezone', 'away_windows',
+            ],
+            'mode': ['state__mode'],
+            'last_seen_at': ['state__last_seen_at'],
+        }
 
 
-class SolarPanelSerializer(serializers.ModelSerializer):
+class SolarPanelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -94,9 +283,10 @@ class SolarPanelSerializer(serializers.ModelSerializer):
                   'panel_area_m2', 'efficiency', 'max_capacity_w',
                   'latitude', 'longitude', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type']
+        field_dependencies = {'device_type': []}
 
 
-class GeneratorSerializer(serializers.ModelSerializer):
+class GeneratorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -106,9 +296,10 @@ class GeneratorSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_username', 'name', 'status', 'device_type',
                   'rated_output_w', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type']
+        field_dependencies = {'device_type': []}
 
 
-class AirConditionerSerializer(serializers.ModelSerializer):
+class AirConditionerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -117,11 +308,13 @@ class AirConditionerSerializer(serializers.ModelSerializer):
         model = AirConditioner
         fields = ['id', 'user', 'user_username', 'name', 'status', 'device_type',
                   'rated_power_w', 'min_power_w', 'max_power_w',
+                  'climate_region', 'setpoint_c', 'thermal_time_constant_hours',
                   'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type']
+        field_dependencies = {'device_type': []}
 
 
-class HeaterSerializer(serializers.ModelSerializer):
+class HeaterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     device_type = serializers.CharField(source='get_device_type', read_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -130,5 +323,7 @@ class HeaterSerializer(serializers.ModelSerializer):
         model = Heater
         fields = ['id', 'user', 'user_username', 'name', 'status', 'device_type',
                   'rated_power_w', 'min_power_w', 'max_power_w',
+                  'climate_region', 'setpoint_c', 'thermal_time_constant_hours',
                   'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'device_type']
+        field_dependencies = {'device_type': []}
@@ -1,7 +1,7 @@
 """GraphQL types for devices."""
 
 import strawberry
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -76,6 +76,9 @@ class AirConditionerType(DeviceInterface):
     rated_power_w: float
     min_power_w: float
     max_power_w: float
+    climate_region: str
+    setpoint_c: float
+    thermal_time_constant_hours: float
 
 
 @strawberry.type
@@ -84,6 +87,9 @@ class HeaterType(DeviceInterface):
     rated_power_w: float
     min_power_w: float
     max_power_w: float
+    climate_region: str
+    setpoint_c: float
+    thermal_time_constant_hours: float
 
 
 # Union type for polymorphic device queries
@@ -91,3 +97,26 @@ DeviceUnion = strawberry.union(
     "DeviceUnion",
     (SolarPanelType, GeneratorType, BatteryType, ElectricVehicleType, AirConditionerType, HeaterType)
 )
+
+
+@strawberry.type
+class PageInfo:
+    """Relay-style pagination info."""
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: Optional[str]
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class DeviceEdge:
+    """A device together with the cursor that points at it."""
+    cursor: str
+    node: DeviceUnion
+
+
+@strawberry.type
+class DeviceConnection:
+    """Relay-style connection over a user's devices, keyset-paginated on (created_at, id)."""
+    edges: List[DeviceEdge]
+    page_info: PageInfo
@@ -1,24 +1,41 @@
 """Custom GraphQL view with proper CSRF handling."""
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from strawberry.django.views import GraphQLView as BaseGraphQLView
+from strawberry.django.views import AsyncGraphQLView
+from strawberry.http.exceptions import HTTPException
+from apps.simulation import codec
+
+_django_default = DjangoJSONEncoder().default
 
 
 @method_decorator(csrf_exempt, name='dispatch')
-class GraphQLView(BaseGraphQLView):
+class GraphQLView(AsyncGraphQLView):
     """
     Custom GraphQL view that:
+    - Runs asynchronously, so requests waiting on Redis/Postgres don't pin a worker
+      (served natively under ASGI; Django adapts it when running under WSGI)
     - Exempts CSRF (uses JWT authentication with Authorization header)
     - Properly sets up context with user for permission checks
+    - Encodes and decodes JSON through the shared fast codec
     """
 
-    def get_context(self, request, response=None):
+    def encode_json(self, response_data):
+        return codec.dumps(response_data, default=_django_default)
+
+    def parse_json(self, data):
+        try:
+            return codec.loads(data)
+        except ValueError as e:
+            raise HTTPException(400, "Unable to parse request body as JSON") from e
+
+    async def get_context(self, request, response=None):
         """
         Override get_context to ensure user is available in the context.
         This is critical for the IsAuthenticated permission class to work
         with both session and JWT authentication.
         """
-        context = super().get_context(request, response)
+        context = await super().get_context(request, response)
         # Ensure user is set in context from the request
         if hasattr(request, 'user'):
             context.user = request.user
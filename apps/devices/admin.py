@@ -1,3 +1,4 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
@@ -5,7 +6,7 @@ from django.db.models import Count
 from django.utils.html import format_html
 from .models import (
     Device, SolarPanel, Generator, Battery,
-    ElectricVehicle, AirConditioner, Heater
+    ElectricVehicle, EVMode, AirConditioner, Heater, Household
 )
 
 
@@ -113,7 +114,49 @@ class GeneratorAdmin(DeviceAdmin):
     )
 
 
+class DeviceStateForm(forms.ModelForm):
+    """Model form that also edits the fields stored on the device's DeviceState."""
+
+    state_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.state_fields:
+            if name in self.fields:
+                self.initial.setdefault(name, getattr(self.instance, name))
+
+    def save(self, commit=True):
+        for name in self.state_fields:
+            if name in self.cleaned_data:
+                setattr(self.instance, name, self.cleaned_data[name])
+        return super().save(commit)
+
+
+class BatteryAdminForm(DeviceStateForm):
+    current_charge_kwh = forms.FloatField(min_value=0.0, initial=0.0, help_text="Current charge level in kWh")
+
+    state_fields = ('current_charge_kwh',)
+
+    class Meta:
+        model = Battery
+        fields = '__all__'
+
+
+class ElectricVehicleAdminForm(DeviceStateForm):
+    current_charge_kwh = forms.FloatField(min_value=0.0, initial=0.0, help_text="Current charge level in kWh")
+    mode = forms.ChoiceField(choices=EVMode.choices, initial=EVMode.CHARGING, help_text="Current operating mode")
+    last_seen_at = forms.DateTimeField(required=False, help_text="Last time the EV was connected")
+
+    state_fields = ('current_charge_kwh', 'mode', 'last_seen_at')
+
+    class Meta:
+        model = ElectricVehicle
+        fields = '__all__'
+
+
 class BatteryAdmin(DeviceAdmin):
+    form = BatteryAdminForm
+    list_select_related = ['state']
     fieldsets = (
         ('Basic Information', {
             'fields': ('id', 'user', 'name', 'status'),
@@ -148,6 +191,8 @@ class BatteryAdmin(DeviceAdmin):
 
 
 class ElectricVehicleAdmin(DeviceAdmin):
+    form = ElectricVehicleAdminForm
+    list_select_related = ['state']
     fieldsets = (
         ('Basic Information', {
             'fields': ('id', 'user', 'name', 'status'),
@@ -158,8 +203,9 @@ class ElectricVehicleAdmin(DeviceAdmin):
             'description': 'Configure battery capacity and charge/discharge rates'
         }),
         ('EV State & Schedule', {
-            'fields': ('mode', 'last_seen_at', 'driving_efficiency_kwh_per_hour'),
-            'description': 'Vehicle mode and driving efficiency settings'
+            'fields': ('mode', 'last_seen_at', 'driving_efficiency_kwh_per_hour',
+                       'schedule_timezone', 'away_windows'),
+            'description': 'Vehicle mode, driving efficiency and weekly away schedule'
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -167,7 +213,7 @@ class ElectricVehicleAdmin(DeviceAdmin):
         }),
     )
     list_display = DeviceAdmin.list_display + ['mode_badge', 'charge_bar']
-    list_filter = DeviceAdmin.list_filter + ['mode']
+    list_filter = DeviceAdmin.list_filter + ['state__mode']
 
     def mode_badge(self, obj):
         """Display mode with badge."""
@@ -210,6 +256,10 @@ class AirConditionerAdmin(DeviceAdmin):
             'fields': ('rated_power_w', 'min_power_w', 'max_power_w'),
             'description': 'Configure power consumption range (rated, minimum, and maximum)'
         }),
+        ('Thermal Model', {
+            'fields': ('climate_region', 'setpoint_c', 'thermal_time_constant_hours'),
+            'description': 'Load follows the gap between the home temperature and the setpoint'
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -227,6 +277,10 @@ class HeaterAdmin(DeviceAdmin):
             'fields': ('rated_power_w', 'min_power_w', 'max_power_w'),
             'description': 'Configure power consumption range (rated, minimum, and maximum)'
         }),
+        ('Thermal Model', {
+            'fields': ('climate_region', 'setpoint_c', 'thermal_time_constant_hours'),
+            'description': 'Load follows the gap between the home temperature and the setpoint'
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -234,6 +288,12 @@ class HeaterAdmin(DeviceAdmin):
     )
 
 
+class HouseholdAdmin(admin.ModelAdmin):
+    list_display = ['user', 'load_profile', 'baseline_w', 'timezone']
+    list_filter = ['load_profile']
+    search_fields = ['user__username', 'user__email']
+
+
 class CustomUserAdmin(UserAdmin):
     """Custom User admin with simplified action dropdown for debugging."""
     
@@ -258,6 +318,7 @@ admin_site.register(ElectricVehicle, ElectricVehicleAdmin)
 admin_site.register(AirConditioner, AirConditionerAdmin)
 admin_site.register(Heater, HeaterAdmin)
 admin_site.register(Device, DeviceAdmin)
+admin_site.register(Household, HouseholdAdmin)
 
 # Register Django built-in models with custom admins
 admin_site.register(User, CustomUserAdmin)
@@ -0,0 +1,217 @@
+"""
+Fleet change feed.
+
+Every device mutation adds a `DeviceChange` row in its own transaction, so
+consumers holding a copy of the fleet (the simulation daemon, caches,
+search indexes) can apply what changed since they last looked instead of
+rescanning every device:
+
+    feed = ChangeFeed()          # watermark taken before the initial load
+    load_everything()
+    ...
+    batch = feed.poll()          # devices upserted and deleted since
+    apply(batch.upserted, batch.deleted)
+
+Ids are allocated when a row is inserted, not when it commits, so a
+transaction can commit an id below one already read, however long it has
+been open. The ids a read skips are kept as open gaps with the position and
+looked up again on every read until they turn up or are older than
+DEVICE_CHANGE_RETENTION_HOURS (a rolled-back transaction leaves a gap that
+never fills). Entries older than that are pruned (`prune_changes`); a
+consumer that fell further behind gets `ChangeFeedExpired` and must reload
+in full.
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import reduce
+from operator import or_
+from typing import List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from apps.devices.models import ChangeOperation, DeviceChange
+
+DEFAULT_PAGE_SIZE = 10000
+
+# (first id, last id, epoch seconds first seen) of ids skipped below a watermark
+Gap = Tuple[int, int, float]
+
+
+class ChangeFeedExpired(Exception):
+    """Entries after the watermark were pruned; the consumer must reload."""
+
+
+def _retention_seconds() -> float:
+    return float(getattr(settings, 'DEVICE_CHANGE_RETENTION_HOURS', 24)) * 3600
+
+
+def current_watermark() -> int:
+    """The id of the newest entry, or 0 if the feed is empty."""
+    return DeviceChange.objects.aggregate(watermark=Max('id'))['watermark'] or 0
+
+
+def _missing(ids: List[int], start: int, end: int, seen_at: float) -> List[Gap]:
+    """The gaps `ids` (sorted) leave in `start`..`end`."""
+    gaps = []
+    for change_id in ids:
+        if change_id > start:
+            gaps.append((start, change_id - 1, seen_at))
+        start = change_id + 1
+    if start <= end:
+        gaps.append((start, end, seen_at))
+    return gaps
+
+
+@dataclass
+class ChangeBatch:
+    """
+    Changes after a watermark, collapsed per device.
+
+    A device is in at most one of `upserted` and `deleted`, whichever its
+    last entry was. `gaps` are the ids below the watermark still to look for.
+    """
+
+    watermark: int
+    upserted: Set[int] = field(default_factory=set)
+    deleted: Set[int] = field(default_factory=set)
+    user_ids: Set[int] = field(default_factory=set)
+    count: int = 0
+    gaps: List[Gap] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.upserted or self.deleted)
+
+    def apply(self, change_id: int, device_id: int, user_id: int, operation: str):
+        if operation == ChangeOperation.DELETE:
+            self.upserted.discard(device_id)
+            self.deleted.add(device_id)
+        else:
+            self.deleted.discard(device_id)
+            self.upserted.add(device_id)
+        self.user_ids.add(user_id)
+        # A filled gap is below the watermark
+        self.watermark = max(self.watermark, change_id)
+        self.count += 1
+
+    def merge(self, later: 'ChangeBatch'):
+        """Fold in the batch read after this one."""
+        self.upserted = (self.upserted - later.deleted) | later.upserted
+        self.deleted = (self.deleted - later.upserted) | later.deleted
+        self.user_ids |= later.user_ids
+        self.watermark = later.watermark
+        self.count += later.count
+        self.gaps = later.gaps
+
+
+def _fill_gaps(batch: ChangeBatch, gaps: List[Gap]):
+    """Apply the entries committed into `gaps` since they were seen; keep the rest open."""
+    forget_before = time.time() - _retention_seconds()
+    gaps = [gap for gap in gaps if gap[2] > forget_before]
+    if not gaps:
+        return
+    rows = list(
+        DeviceChange.objects.filter(reduce(or_, (Q(id__range=(start, end)) for start, end, _ in gaps)))
+        .order_by('id').values_list('id', 'device_id', 'user_id', 'operation')
+    )
+    for row in rows:
+        batch.apply(*row)
+    filled = [row[0] for row in rows]
+    for start, end, seen_at in gaps:
+        batch.gaps.extend(_missing([i for i in filled if start <= i <= end], start, end, seen_at))
+
+
+def read_changes(since: int, limit: int = DEFAULT_PAGE_SIZE, gaps: List[Gap] = ()) -> ChangeBatch:
+    """
+    Read up to `limit` entries after the `since` watermark, and any that
+    have since committed into the open `gaps` below it.
+
+    The returned batch's watermark and gaps are where the next read should
+    start. Raises `ChangeFeedExpired` if entries after `since` were pruned.
+    """
+    batch = ChangeBatch(since)
+    _fill_gaps(batch, gaps)
+    rows = list(
+        DeviceChange.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'device_id', 'user_id', 'operation')[:limit]
+    )
+    if not rows:
+        return batch
+
+    if rows[0][0] > since + 1 and not DeviceChange.objects.filter(id__lte=since).exists():
+        # Pruning removes the oldest entries first: with nothing left at or
+        # below the watermark, the missing ids may have been pruned
+        raise ChangeFeedExpired(f'Changes after {since} are no longer retained')
+
+    seen_at = time.time()
+    batch.gaps.extend(_missing([row[0] for row in rows], since + 1, rows[-1][0], seen_at))
+    for row in rows:
+        batch.apply(*row)
+    return batch
+
+
+class ChangeFeed:
+    """A consumer's position in the change feed: a watermark and the open gaps below it."""
+
+    def __init__(self, watermark: Optional[int] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                 gaps: Optional[List[Gap]] = None):
+        self.page_size = page_size
+        if watermark is None:
+            # Take the watermark before loading the data it covers: changes
+            # made during the load are then read again, and upserts are
+            # idempotent. Transactions still open below it leave gaps in the
+            # last page of ids; older ones than that are missed
+            watermark = current_watermark()
+            recent = list(
+                DeviceChange.objects.filter(id__gt=watermark - page_size, id__lte=watermark)
+                .order_by('id').values_list('id', flat=True)
+            )
+            gaps = _missing(recent, max(1, watermark - page_size + 1), watermark, time.time())
+        self.watermark = watermark
+        self.gaps = list(gaps or [])
+
+    @property
+    def position(self) -> str:
+        """The watermark and open gaps, for `ChangeFeed.resume` in another process."""
+        return json.dumps({'watermark': self.watermark, 'gaps': self.gaps})
+
+    @classmethod
+    def resume(cls, position, page_size: int = DEFAULT_PAGE_SIZE) -> 'ChangeFeed':
+        """The feed at a saved `position` (or a bare watermark)."""
+        position = json.loads(position)
+        if isinstance(position, int):
+            return cls(position, page_size, gaps=[])
+        return cls(position['watermark'], page_size, gaps=[tuple(gap) for gap in position['gaps']])
+
+    def poll(self) -> ChangeBatch:
+        """Every change committed since the last poll, collapsed per device."""
+        batch = ChangeBatch(self.watermark, gaps=self.gaps)
+        while True:
+            page = read_changes(batch.watermark, self.page_size, batch.gaps)
+            batch.merge(page)
+            if page.count < self.page_size:
+                break
+        self.watermark = batch.watermark
+        self.gaps = batch.gaps
+        return batch
+
+
+def prune_changes(older_than: Optional[datetime] = None) -> int:
+    """
+    Delete entries older than the retention window; returns how many.
+
+    The newest entry is always kept, so the current watermark survives an
+    idle period.
+    """
+    if older_than is None:
+        older_than = timezone.now() - timedelta(seconds=_retention_seconds())
+    boundary = DeviceChange.objects.filter(created_at__lt=older_than).aggregate(boundary=Max('id'))['boundary']
+    if boundary is None:
+        return 0
+    boundary = min(boundary, current_watermark() - 1)
+    deleted, _ = DeviceChange.objects.filter(id__lte=boundary).delete()
+    return deleted
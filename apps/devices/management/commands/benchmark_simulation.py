@@ -0,0 +1,223 @@
+"""Management command to compare the simulation daemon with the Celery path."""
+import math
+import os
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from apps.devices.models import (
+    AirConditioner, Battery, Device, DeviceState, ElectricVehicle, EVMode, Generator,
+    Heater, SolarPanel,
+)
+from apps.simulation.daemon import SimulationDaemon
+from apps.simulation.profiles import baseline_loads
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.simulators.registry import SIMULATOR_POOL
+from apps.simulation.tasks import compute_user_energy_stats, simulate_devices
+from apps.simulation.ticks import Tick, tick_id_for, tick_start
+
+PATHS = ('celery', 'daemon', 'sharded')
+
+# One household's devices, repeated across the fleet
+TEMPLATES = (
+    (SolarPanel, {'panel_area_m2': 20.0, 'efficiency': 0.20, 'max_capacity_w': 4000.0}),
+    (Battery, {'capacity_kwh': 13.5, 'max_charge_rate_kw': 5.0, 'max_discharge_rate_kw': 5.0}),
+    (AirConditioner, {'rated_power_w': 3500.0, 'min_power_w': 1500.0, 'max_power_w': 4500.0}),
+    (ElectricVehicle, {'capacity_kwh': 75.0, 'max_charge_rate_kw': 11.0, 'max_discharge_rate_kw': 7.0}),
+    (Heater, {'rated_power_w': 2000.0, 'min_power_w': 800.0, 'max_power_w': 2500.0}),
+    (Generator, {'rated_output_w': 3000.0}),
+)
+INITIAL_STATE = {
+    Battery: {'current_charge_kwh': 6.75},
+    ElectricVehicle: {'current_charge_kwh': 40.0, 'mode': EVMode.CHARGING},
+}
+# Panels are spread over a grid of locations across the continental US
+LOCATIONS = [(25.0 + row * 0.5, -124.0 + column * 1.2) for row in range(40) for column in range(50)]
+CHUNK = 5000
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark's rows."""
+
+
+def _insert_children(model, device_ids, values):
+    """
+    Insert the subclass rows of multi-table devices, which `bulk_create`
+    can't do, with one executemany per chunk.
+    """
+    fields = model._meta.local_concrete_fields
+    qn = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(f.column) for f in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})'
+    )
+    variants = [model(**dict(values, **variant)) for variant in (
+        [{'latitude': lat, 'longitude': lon} for lat, lon in LOCATIONS]
+        if model is SolarPanel else [{}]
+    )]
+    prepared = [
+        [field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields]
+        for row in variants
+    ]
+    pointer = model._meta.pk
+    with connection.cursor() as cursor:
+        for start in range(0, len(device_ids), CHUNK):
+            cursor.executemany(sql, [
+                [device_id if field is pointer else value
+                 for field, value in zip(fields, prepared[(start + i) % len(prepared)])]
+                for i, device_id in enumerate(device_ids[start:start + CHUNK])
+            ])
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark one simulation tick through the Celery tasks and through the in-memory '
+        'daemon. Writes simulation keys to Redis (removed afterwards): use a non-production Redis.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,1000000',
+            help='Comma-separated device counts (default: 10000,100000,1000000)'
+        )
+        parser.add_argument(
+            '--paths',
+            default=','.join(PATHS),
+            help=f'Comma-separated paths to run (default: {",".join(PATHS)})'
+        )
+        parser.add_argument('--ticks', type=int, default=3, help='Ticks timed per path (the mean is reported)')
+        parser.add_argument('--devices-per-user', type=int, default=6, help='Devices per household')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes for the sharded daemon path (default: one per CPU)'
+        )
+        parser.add_argument(
+            '--celery-sample',
+            type=int,
+            default=0,
+            help='Time the Celery path on this many devices and scale up (default: the whole fleet)'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        paths = options['paths'].split(',')
+        unknown = set(paths) - set(PATHS)
+        if unknown:
+            raise CommandError(f'Unknown paths: {", ".join(sorted(unknown))}')
+
+        self.stdout.write(
+            'Celery is timed running its task bodies in this process, without the broker, '
+            'so its figures are a lower bound.'
+        )
+        self.stdout.write(
+            f'{"devices":>10}{"celery s/tick":>16}{"daemon s/tick":>16}{"sharded s/tick":>16}'
+            f'{"daemon load s":>16}{"speedup":>10}'
+        )
+        for size in sizes:
+            device_ids, user_ids = [], []
+            try:
+                with transaction.atomic():
+                    device_ids, user_ids = self._create_fleet(size, options['devices_per_user'])
+                    timings = {
+                        'celery': self._celery(device_ids, user_ids, options) if 'celery' in paths else None,
+                        'daemon': self._daemon(options['ticks']) if 'daemon' in paths else None,
+                        'sharded': (
+                            self._daemon(options['ticks'], options['processes'], after=2 * options['ticks'])
+                            if 'sharded' in paths else None
+                        ),
+                    }
+                    raise _Rollback
+            except _Rollback:
+                pass
+            finally:
+                self._clean_redis(device_ids, user_ids)
+            self.stdout.write(self._row(size, timings))
+
+    def _create_fleet(self, size, per_user):
+        """`size` devices in households of `per_user`; rolled back afterwards."""
+        prefix = f'benchmark-simulation-{size}'
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-{i}') for i in range(math.ceil(size / per_user))],
+            batch_size=CHUNK
+        )
+        devices = Device.objects.bulk_create(
+            [Device(user=users[i // per_user], name=f'Benchmark {i}') for i in range(size)],
+            batch_size=CHUNK
+        )
+        device_ids = [device.id for device in devices]
+        for position, (model, values) in enumerate(TEMPLATES):
+            ids = device_ids[position::len(TEMPLATES)]
+            _insert_children(model, ids, values)
+            if model in INITIAL_STATE:
+                DeviceState.objects.bulk_create(
+                    [DeviceState(device_id=device_id, **INITIAL_STATE[model]) for device_id in ids],
+                    batch_size=CHUNK
+                )
+        return device_ids, [user.id for user in users]
+
+    @staticmethod
+    def _ticks(count, after=0):
+        first = tick_id_for(time.time(), 60) + after
+        return [Tick(tick_id, tick_start(tick_id, 60), 60.0, 0, 0.0) for tick_id in range(first, first + count)]
+
+    def _celery(self, device_ids, user_ids, options):
+        """Mean seconds per tick of the orchestrator's work and its tasks' bodies."""
+        SIMULATOR_POOL.clear()
+        sample = options['celery_sample'] or len(device_ids)
+        sampled_ids = device_ids[:sample]
+        sampled_users = user_ids[:math.ceil(len(sampled_ids) / options['devices_per_user'])]
+        batch_size = settings.SIMULATION_BATCH_SIZE
+
+        total = 0.0
+        for tick in self._ticks(options['ticks']):
+            start = time.perf_counter()
+            for offset in range(0, len(sampled_ids), batch_size):
+                simulate_devices(sampled_ids[offset:offset + batch_size], tick.tick_id, tick.elapsed_seconds)
+            baselines = baseline_loads(sampled_users, tick.timestamp)
+            for user_id in sampled_users:
+                compute_user_energy_stats(user_id, tick.tick_id, baselines[user_id])
+            total += time.perf_counter() - start
+        return total / options['ticks'] * len(device_ids) / len(sampled_ids)
+
+    def _daemon(self, ticks, processes=1, after=None):
+        """(mean seconds per tick, seconds to load the fleet)."""
+        daemon = SimulationDaemon(processes=processes)
+        start = time.perf_counter()
+        daemon.load()
+        load = time.perf_counter() - start
+
+        total = 0.0
+        try:
+            # Later ticks than the previous paths', which already applied their own
+            for tick in self._ticks(ticks, after=ticks if after is None else after):
+                start = time.perf_counter()
+                daemon.run_tick(tick)
+                total += time.perf_counter() - start
+        finally:
+            daemon.close()
+        return total / ticks, load
+
+    @staticmethod
+    def _clean_redis(device_ids, user_ids):
+        redis = RedisClient().redis
+        keys = [f'user:{user_id}:energy_stats' for user_id in user_ids] + [
+            f'device:{device_id}:{kind}' for device_id in device_ids for kind in ('current', 'storage', 'state')
+        ]
+        for start in range(0, len(keys), CHUNK):
+            redis.delete(*keys[start:start + CHUNK])
+
+    @staticmethod
+    def _row(size, timings):
+        celery, daemon, sharded = timings['celery'], timings['daemon'], timings['sharded']
+        cells = [
+            f'{celery:>15.3f}s' if celery is not None else f'{"-":>16}',
+            f'{daemon[0]:>15.3f}s' if daemon is not None else f'{"-":>16}',
+            f'{sharded[0]:>15.3f}s' if sharded is not None else f'{"-":>16}',
+            f'{daemon[1]:>15.3f}s' if daemon is not None else f'{"-":>16}',
+            f'{celery / daemon[0]:>9.1f}x' if celery is not None and daemon is not None else f'{"-":>10}',
+        ]
+        return f'{size:>10}' + ''.join(cells)
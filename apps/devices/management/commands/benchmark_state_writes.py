@@ -0,0 +1,80 @@
+"""Management command to compare ways of writing one tick of device state."""
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from apps.devices.models import Device, DeviceState
+from apps.simulation.state import BatchStateWriter, CopyStateWriter
+
+METHODS = ('save', 'bulk_update', 'copy')
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark's rows."""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-row save(), bulk_update and COPY for one tick of DeviceState writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma-separated device counts (default: 1000,10000,100000)'
+        )
+        parser.add_argument(
+            '--methods',
+            default=','.join(METHODS),
+            help=f'Comma-separated methods to run (default: {",".join(METHODS)})'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        methods = options['methods'].split(',')
+        unknown = set(methods) - set(METHODS)
+        if unknown:
+            raise CommandError(f'Unknown methods: {", ".join(sorted(unknown))}')
+        if 'copy' in methods and not CopyStateWriter.copy_supported():
+            self.stdout.write(self.style.WARNING('COPY needs PostgreSQL with psycopg 3; skipping it.'))
+            methods = [method for method in methods if method != 'copy']
+
+        self.stdout.write(f'{"devices":>10}  ' + '  '.join(f'{method:>12}' for method in methods))
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    states = self._create_states(size)
+                    timings = [
+                        self._time(method, states, watermark)
+                        for watermark, method in enumerate(methods, start=1)
+                    ]
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(f'{size:>10}  ' + '  '.join(f'{seconds:>11.3f}s' for seconds in timings))
+
+    def _create_states(self, size):
+        """Create `size` bare devices with state rows; rolled back afterwards."""
+        user, _ = User.objects.get_or_create(username='benchmark-state-writes')
+        devices = Device.objects.bulk_create(
+            [Device(user=user, name=f'Benchmark {i}') for i in range(size)],
+            batch_size=5000
+        )
+        return DeviceState.objects.bulk_create(
+            [DeviceState(device=device, current_charge_kwh=5.0) for device in devices],
+            batch_size=5000
+        )
+
+    def _time(self, method, states, watermark):
+        for state in states:
+            state.current_charge_kwh = random.uniform(0.0, 10.0)
+
+        start = time.perf_counter()
+        if method == 'save':
+            for state in states:
+                state.last_tick_start = watermark
+                state.save(update_fields=list(DeviceState.STATE_FIELDS))
+        else:
+            writer = BatchStateWriter() if method == 'bulk_update' else CopyStateWriter(copy_threshold=0)
+            writer.write_states([(state, watermark) for state in states])
+        return time.perf_counter() - start
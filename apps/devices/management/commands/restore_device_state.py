@@ -0,0 +1,17 @@
+"""Management command to rebuild live storage state in Redis after a restart."""
+from django.core.management.base import BaseCommand
+from apps.simulation.state import RedisStateStore, write_behind_enabled
+
+
+class Command(BaseCommand):
+    help = 'Seed Redis with battery/EV state from the last DeviceState checkpoint'
+
+    def handle(self, *args, **options):
+        if not write_behind_enabled():
+            self.stdout.write('SIMULATION_STATE_BACKEND is not "redis"; nothing to restore.')
+            return
+
+        count = RedisStateStore().restore()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Restored live state for up to {count} devices from the last checkpoint'
+        ))
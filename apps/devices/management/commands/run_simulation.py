@@ -3,12 +3,12 @@ from django.core.management.base import BaseCommand
 from datetime import datetime
 from django.contrib.auth.models import User
 from apps.devices.models import Device
+from apps.simulation.profiles import baseline_loads
 from apps.simulation.redis_client import RedisClient
-from apps.simulation.simulators.solar import SolarPanelSimulator
-from apps.simulation.simulators.generator import GeneratorSimulator
-from apps.simulation.simulators.battery import BatterySimulator
-from apps.simulation.simulators.ev import EVSimulator
-from apps.simulation.simulators.consumption import ConsumptionSimulator
+from apps.simulation.simulators.registry import (
+    CONSUMPTION_DEVICE_TYPES, PRODUCTION_DEVICE_TYPES, SIMULATION_RELATIONS, STORAGE_DEVICE_TYPES,
+    create_simulator,
+)
 
 
 class Command(BaseCommand):
@@ -16,10 +16,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         timestamp = datetime.utcnow()
-        devices = Device.objects.select_related(
-            'solarpanel', 'generator', 'battery', 'electricvehicle',
-            'airconditioner', 'heater', 'user'
-        ).all()
+        devices = Device.objects.select_related(*SIMULATION_RELATIONS, 'user').all()
         
         redis_client = RedisClient()
         
@@ -28,38 +25,17 @@ class Command(BaseCommand):
         success_count = 0
         for device in devices:
             try:
-                specific_device = device.get_specific_device()
-                device_type = device.get_device_type()
-                
                 # Instantiate appropriate simulator
-                if device_type == 'solar_panel':
-                    simulator = SolarPanelSimulator(specific_device)
-                elif device_type == 'generator':
-                    simulator = GeneratorSimulator(specific_device)
-                elif device_type == 'battery':
-                    simulator = BatterySimulator(specific_device)
-                elif device_type == 'electric_vehicle':
-                    simulator = EVSimulator(specific_device)
-                elif device_type in ['air_conditioner', 'heater']:
-                    simulator = ConsumptionSimulator(specific_device)
-                else:
+                device_type, simulator = create_simulator(device)
+                if simulator is None:
                     continue
                 
                 # Run simulation
                 result = simulator.simulate(timestamp)
                 
                 # Store result in Redis
-                if device_type in ['battery', 'electric_vehicle']:
-                    storage_data = {
-                        'capacity_wh': result['capacity_wh'],
-                        'current_level_wh': result['current_level_wh'],
-                        'flow_w': result['flow_w'],
-                        'timestamp': result['timestamp'],
-                        'status': result['status'],
-                    }
-                    if device_type == 'electric_vehicle' and 'mode' in result:
-                        storage_data['mode'] = result['mode']
-                    redis_client.store_device_storage(device.id, storage_data)
+                if device_type in STORAGE_DEVICE_TYPES:
+                    redis_client.store_device_storage(device.id, result)
                 else:
                     redis_client.store_device_data(device.id, result)
                 
@@ -75,7 +51,8 @@ class Command(BaseCommand):
         
         # Compute user stats
         self.stdout.write('\nComputing user energy stats...')
-        user_ids = devices.values_list('user_id', flat=True).distinct()
+        user_ids = list(devices.values_list('user_id', flat=True).distinct())
+        baselines = baseline_loads(user_ids, timestamp)
         
         for user_id in user_ids:
             try:
@@ -83,7 +60,7 @@ class Command(BaseCommand):
                 user_devices = Device.objects.filter(user=user)
                 
                 total_production = 0.0
-                total_consumption = 0.0
+                total_consumption = baselines[user_id]
                 total_storage_capacity_wh = 0.0
                 total_storage_level_wh = 0.0
                 storage_flow = 0.0
@@ -91,7 +68,7 @@ class Command(BaseCommand):
                 for device in user_devices:
                     device_type = device.get_device_type()
                     
-                    if device_type in ['battery', 'electric_vehicle']:
+                    if device_type in STORAGE_DEVICE_TYPES:
                         storage_data = redis_client.get_device_storage(device.id)
                         if storage_data:
                             total_storage_capacity_wh += storage_data.get('capacity_wh', 0)
@@ -101,9 +78,9 @@ class Command(BaseCommand):
                         device_data = redis_client.get_device_data(device.id)
                         if device_data:
                             power_w = device_data.get('power_w', 0)
-                            if device_type in ['solar_panel', 'generator']:
+                            if device_type in PRODUCTION_DEVICE_TYPES:
                                 total_production += power_w
-                            elif device_type in ['air_conditioner', 'heater']:
+                            elif device_type in CONSUMPTION_DEVICE_TYPES:
                                 total_consumption += power_w
                 
                 storage_percentage = (total_storage_level_wh / total_storage_capacity_wh * 100) if total_storage_capacity_wh > 0 else 0
@@ -0,0 +1,79 @@
+"""Management command to backfill simulated history over a time range."""
+import time
+from datetime import datetime, time as dt_time, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+from apps.devices.models import Device, DeviceReading
+from apps.simulation.replay import FleetReplay, ReadingWriter
+from apps.simulation.simulators.registry import SIMULATION_RELATIONS
+
+
+def _parse(value):
+    """Parse an ISO date or datetime into naive UTC, as the simulators expect."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date or datetime: {value}')
+        parsed = datetime.combine(day, dt_time())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Replay the simulation over a historical range and store the results as DeviceReadings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help='Start of the range (ISO date or datetime, UTC)')
+        parser.add_argument('--end', required=True, help='End of the range, exclusive')
+        parser.add_argument(
+            '--step',
+            type=int,
+            default=getattr(settings, 'SIMULATION_TICK_SECONDS', 60),
+            help='Seconds between readings (default: SIMULATION_TICK_SECONDS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=50000, help='Readings per bulk write')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed (default: SIMULATION_SEED)')
+
+    def handle(self, *args, **options):
+        start, end = _parse(options['start']), _parse(options['end'])
+        if end <= start:
+            raise CommandError('--end must be after --start')
+        if options['step'] <= 0:
+            raise CommandError('--step must be positive')
+
+        try:
+            replay = FleetReplay(
+                Device.objects.select_related(*SIMULATION_RELATIONS).order_by('id').iterator(chunk_size=2000),
+                seed=options['seed'],
+            )
+        except ImportError as exc:
+            raise CommandError(str(exc))
+
+        # Re-running a range replaces it
+        deleted, _ = DeviceReading.objects.filter(
+            timestamp__gte=start.replace(tzinfo=timezone.utc),
+            timestamp__lt=end.replace(tzinfo=timezone.utc),
+        ).delete()
+        if deleted:
+            self.stdout.write(f'Removed {deleted} existing readings in range')
+
+        self.stdout.write(
+            f'Replaying {len(replay)} devices from {start.isoformat()} to {end.isoformat()} '
+            f'every {options["step"]}s...'
+        )
+        writer = ReadingWriter(batch_size=options['batch_size'])
+        started = time.perf_counter()
+        steps = 0
+        for timestamp, readings in replay.run(start, end, options['step']):
+            writer.add(timestamp, readings)
+            steps += 1
+        writer.flush()
+        duration = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {steps} steps, {writer.written} readings in {duration:.1f}s '
+            f'({writer.written / max(duration, 1e-9):,.0f} readings/s)'
+        ))
@@ -0,0 +1,53 @@
+"""Management command to run the simulation as a standalone in-memory daemon."""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.simulation.daemon import SimulationDaemon
+
+
+class Command(BaseCommand):
+    help = 'Hold the fleet in memory and simulate every tick without Celery'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticks',
+            type=int,
+            default=None,
+            help='Stop after this many ticks (default: run until interrupted)'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed (default: SIMULATION_SEED)')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=None,
+            help='Worker processes to shard the fleet across (default: SIMULATION_DAEMON_PROCESSES)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            daemon = SimulationDaemon(seed=options['seed'], processes=options['processes'])
+        except ImportError as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        daemon.load()
+        self.stdout.write(
+            f'Loaded {len(daemon.fleet)} devices in {time.perf_counter() - started:.1f}s; '
+            f'disable the run_energy_simulation beat schedule while the daemon runs.'
+        )
+
+        try:
+            daemon.run(options['ticks'], on_tick=self._report, on_error=self._error)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+        finally:
+            daemon.close()
+
+    def _report(self, tick, counts, seconds):
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Tick {tick.tick_id} ({tick.timestamp.isoformat()}): {counts["devices"]} devices, '
+            f'{counts["users"]} users, {counts["states"]} state rows, '
+            f'{counts["changed"]} device changes, {counts["skipped"]} unchanged results in {seconds:.3f}s'
+        ))
+
+    def _error(self, exc):
+        self.stdout.write(self.style.ERROR(f'❌ Tick failed, reloading the fleet: {exc}'))
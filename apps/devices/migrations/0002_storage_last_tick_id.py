@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battery',
+            name='last_tick_id',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Last simulation tick applied to the charge level', null=True),
+        ),
+        migrations.AddField(
+            model_name='electricvehicle',
+            name='last_tick_id',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Last simulation tick applied to the charge level', null=True),
+        ),
+    ]
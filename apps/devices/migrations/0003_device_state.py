@@ -0,0 +1,117 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:09
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Leave a third of each heap page free so state updates stay on-page (HOT)
+STATE_FILLFACTOR = 70
+
+
+def copy_state(apps, schema_editor):
+    """Move hot fields from the battery and EV tables into DeviceState."""
+    DeviceState = apps.get_model('devices', 'DeviceState')
+    Battery = apps.get_model('devices', 'Battery')
+    ElectricVehicle = apps.get_model('devices', 'ElectricVehicle')
+    db = schema_editor.connection.alias
+
+    states = [
+        DeviceState(
+            device_id=device_id,
+            current_charge_kwh=current_charge_kwh,
+            last_tick_id=last_tick_id,
+        )
+        for device_id, current_charge_kwh, last_tick_id in Battery.objects.using(db).values_list(
+            'device_ptr_id', 'current_charge_kwh', 'last_tick_id'
+        ).iterator()
+    ]
+    states += [
+        DeviceState(
+            device_id=device_id,
+            current_charge_kwh=current_charge_kwh,
+            mode=mode,
+            last_seen_at=last_seen_at,
+            last_tick_id=last_tick_id,
+        )
+        for device_id, current_charge_kwh, mode, last_seen_at, last_tick_id
+        in ElectricVehicle.objects.using(db).values_list(
+            'device_ptr_id', 'current_charge_kwh', 'mode', 'last_seen_at', 'last_tick_id'
+        ).iterator()
+    ]
+    DeviceState.objects.using(db).bulk_create(states, batch_size=1000)
+
+
+def restore_state(apps, schema_editor):
+    DeviceState = apps.get_model('devices', 'DeviceState')
+    Battery = apps.get_model('devices', 'Battery')
+    ElectricVehicle = apps.get_model('devices', 'ElectricVehicle')
+    db = schema_editor.connection.alias
+
+    for state in DeviceState.objects.using(db).iterator():
+        Battery.objects.using(db).filter(device_ptr_id=state.device_id).update(
+            current_charge_kwh=state.current_charge_kwh,
+            last_tick_id=state.last_tick_id,
+        )
+        ElectricVehicle.objects.using(db).filter(device_ptr_id=state.device_id).update(
+            current_charge_kwh=state.current_charge_kwh,
+            mode=state.mode or 'charging',
+            last_seen_at=state.last_seen_at,
+            last_tick_id=state.last_tick_id,
+        )
+
+
+def set_fillfactor(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        table = schema_editor.quote_name(apps.get_model('devices', 'DeviceState')._meta.db_table)
+        schema_editor.execute(f'ALTER TABLE {table} SET (fillfactor = {STATE_FILLFACTOR})')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0002_storage_last_tick_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceState',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='devices.device')),
+                ('current_charge_kwh', models.FloatField(default=0.0, help_text='Current charge level in kWh', validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('mode', models.CharField(blank=True, default='', help_text='Current operating mode (EVs only)', max_length=20)),
+                ('last_seen_at', models.DateTimeField(blank=True, help_text='Last time the EV was connected', null=True)),
+                ('last_tick_id', models.BigIntegerField(blank=True, help_text='Last simulation tick applied to the charge level', null=True)),
+            ],
+            options={
+                'verbose_name': 'Device State',
+                'verbose_name_plural': 'Device States',
+            },
+        ),
+        migrations.RunPython(set_fillfactor, migrations.RunPython.noop),
+        migrations.RunPython(copy_state, restore_state),
+        migrations.RemoveField(
+            model_name='battery',
+            name='current_charge_kwh',
+        ),
+        migrations.RemoveField(
+            model_name='battery',
+            name='last_tick_id',
+        ),
+        migrations.RemoveField(
+            model_name='electricvehicle',
+            name='current_charge_kwh',
+        ),
+        migrations.RemoveField(
+            model_name='electricvehicle',
+            name='last_seen_at',
+        ),
+        migrations.RemoveField(
+            model_name='electricvehicle',
+            name='last_tick_id',
+        ),
+        migrations.RemoveField(
+            model_name='electricvehicle',
+            name='mode',
+        ),
+    ]
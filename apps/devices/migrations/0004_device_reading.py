@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0003_device_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('power_w', models.FloatField(help_text='Power at this time in watts')),
+                ('flow_w', models.FloatField(blank=True, help_text='Charge (+) or discharge (-) power of storage devices in watts', null=True)),
+                ('level_wh', models.FloatField(blank=True, help_text='Stored energy of storage devices in Wh', null=True)),
+                ('mode', models.CharField(blank=True, default='', help_text='Operating mode (EVs only)', max_length=20)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='devices.device')),
+            ],
+            options={
+                'verbose_name': 'Device Reading',
+                'verbose_name_plural': 'Device Readings',
+                'constraints': [models.UniqueConstraint(fields=('device', 'timestamp'), name='unique_device_reading')],
+            },
+        ),
+    ]
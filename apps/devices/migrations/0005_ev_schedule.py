@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:46
+
+import apps.devices.schedule
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0004_device_reading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='electricvehicle',
+            name='away_windows',
+            field=models.JSONField(blank=True, default=apps.devices.schedule.default_away_windows, help_text='Weekly away windows, e.g. [{"days": [0, 1, 2, 3, 4], "start": "07:00", "end": "18:00"}]', validators=[apps.devices.schedule.validate_away_windows]),
+        ),
+        migrations.AddField(
+            model_name='electricvehicle',
+            name='schedule_timezone',
+            field=models.CharField(default='America/New_York', help_text='IANA time zone the away windows are in', max_length=64, validators=[apps.devices.schedule.validate_timezone]),
+        ),
+    ]
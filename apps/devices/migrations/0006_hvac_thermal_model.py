@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-19 01:58
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_ev_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airconditioner',
+            name='climate_region',
+            field=models.CharField(choices=[('hot_humid', 'Hot-humid (Houston)'), ('hot_dry', 'Hot-dry (Phoenix)'), ('mixed', 'Mixed (New York)'), ('marine', 'Marine (San Francisco)'), ('cold', 'Cold (Minneapolis)')], default='mixed', help_text='Climate the home is in; sets its outdoor temperature curves', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='airconditioner',
+            name='setpoint_c',
+            field=models.FloatField(default=24.0, help_text='Thermostat setpoint in °C'),
+        ),
+        migrations.AddField(
+            model_name='airconditioner',
+            name='thermal_time_constant_hours',
+            field=models.FloatField(default=4.0, help_text='How slowly the home follows the outdoor temperature, in hours', validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AddField(
+            model_name='heater',
+            name='climate_region',
+            field=models.CharField(choices=[('hot_humid', 'Hot-humid (Houston)'), ('hot_dry', 'Hot-dry (Phoenix)'), ('mixed', 'Mixed (New York)'), ('marine', 'Marine (San Francisco)'), ('cold', 'Cold (Minneapolis)')], default='mixed', help_text='Climate the home is in; sets its outdoor temperature curves', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='heater',
+            name='setpoint_c',
+            field=models.FloatField(default=20.0, help_text='Thermostat setpoint in °C'),
+        ),
+        migrations.AddField(
+            model_name='heater',
+            name='thermal_time_constant_hours',
+            field=models.FloatField(default=4.0, help_text='How slowly the home follows the outdoor temperature, in hours', validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+    ]
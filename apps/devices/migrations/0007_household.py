@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:02
+
+import apps.devices.schedule
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('devices', '0006_hvac_thermal_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Household',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='household', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('load_profile', models.CharField(choices=[('standard', 'Standard (out at work)'), ('home_worker', 'Works from home'), ('night_shift', 'Night shift'), ('retired', 'Retired')], default='standard', help_text='Daily shape of the baseline load', max_length=20)),
+                ('baseline_w', models.FloatField(default=600.0, help_text='Average baseline load in watts', validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('timezone', models.CharField(default='America/New_York', help_text='IANA time zone the load profile follows', max_length=64, validators=[apps.devices.schedule.validate_timezone])),
+            ],
+            options={
+                'verbose_name': 'Household',
+                'verbose_name_plural': 'Households',
+            },
+        ),
+    ]
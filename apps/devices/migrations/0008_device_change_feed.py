@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-19 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_household'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('device_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField()),
+                ('operation', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Device Change',
+                'verbose_name_plural': 'Device Changes',
+            },
+        ),
+    ]
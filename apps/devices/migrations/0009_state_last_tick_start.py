@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_device_change_feed'),
+    ]
+
+    # Stored tick ids are kept: a tick id is never larger than its tick's
+    # start in epoch seconds, so every device still accepts the next tick.
+    operations = [
+        migrations.RenameField(
+            model_name='devicestate',
+            old_name='last_tick_id',
+            new_name='last_tick_start',
+        ),
+        migrations.AlterField(
+            model_name='devicestate',
+            name='last_tick_start',
+            field=models.BigIntegerField(blank=True, help_text='Simulated start (epoch seconds) of the last tick applied to the charge level', null=True),
+        ),
+    ]
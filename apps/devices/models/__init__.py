@@ -1,11 +1,19 @@
 from .base import Device, DeviceStatus
+from .changes import ChangeOperation, DeviceChange
 from .production import SolarPanel, Generator
+from .state import DeviceState
+from .history import DeviceReading
 from .storage import Battery, ElectricVehicle, EVMode
-from .consumption import AirConditioner, Heater
+from .consumption import AirConditioner, Heater, ClimateRegion
+from .household import Household, LoadProfile
 
 __all__ = [
     'Device',
     'DeviceStatus',
+    'DeviceChange',
+    'ChangeOperation',
+    'DeviceState',
+    'DeviceReading',
     'SolarPanel',
     'Generator',
     'Battery',
@@ -13,4 +21,7 @@ __all__ = [
     'EVMode',
     'AirConditioner',
     'Heater',
+    'ClimateRegion',
+    'Household',
+    'LoadProfile',
 ]
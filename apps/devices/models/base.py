@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from .changes import ChangeOperation, DeviceChange
 
 
 class DeviceStatus(models.TextChoices):
@@ -31,6 +32,12 @@ class Device(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_device_type()})"
 
+    def save(self, *args, **kwargs):
+        # The change feed entry commits, or rolls back, with the row itself
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            DeviceChange.record(self, ChangeOperation.UPSERT)
+
     def get_device_type(self):
         """Return the specific device type name."""
         if hasattr(self, 'solarpanel'):
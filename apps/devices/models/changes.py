@@ -0,0 +1,39 @@
+from django.db import models
+
+
+class ChangeOperation(models.TextChoices):
+    UPSERT = 'upsert', 'Created or updated'
+    DELETE = 'delete', 'Deleted'
+
+
+class DeviceChange(models.Model):
+    """
+    One entry of the fleet change feed, an outbox of device mutations.
+
+    Written in the same transaction as the mutation, so every committed
+    change is in the feed and no rolled-back one is. The id is the feed's
+    watermark: a consumer reads the entries after the last id it applied
+    (`apps.devices.changes`). Device and user are plain ids rather than
+    foreign keys so that deletions outlive the device.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    device_id = models.BigIntegerField()
+    user_id = models.IntegerField()
+    operation = models.CharField(max_length=10, choices=ChangeOperation.choices)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Device Change"
+        verbose_name_plural = "Device Changes"
+
+    def __str__(self):
+        return f"{self.operation} of device {self.device_id} (#{self.id})"
+
+    @classmethod
+    def record(cls, device, operation: str) -> 'DeviceChange':
+        return cls.objects.create(
+            device_id=device.pk,
+            user_id=device.user_id,
+            operation=operation,
+        )
@@ -3,9 +3,20 @@ from django.core.validators import MinValueValidator
 from .base import Device
 
 
+class ClimateRegion(models.TextChoices):
+    HOT_HUMID = 'hot_humid', 'Hot-humid (Houston)'
+    HOT_DRY = 'hot_dry', 'Hot-dry (Phoenix)'
+    MIXED = 'mixed', 'Mixed (New York)'
+    MARINE = 'marine', 'Marine (San Francisco)'
+    COLD = 'cold', 'Cold (Minneapolis)'
+
+
 class AirConditioner(Device):
     """Air conditioning unit for cooling."""
 
+    # Load rises with the indoor temperature
+    cooling = True
+
     rated_power_w = models.FloatField(
         validators=[MinValueValidator(1.0)],
         help_text="Rated power consumption in watts"
@@ -18,11 +29,29 @@ class AirConditioner(Device):
         validators=[MinValueValidator(1.0)],
         help_text="Maximum power consumption in watts"
     )
+    climate_region = models.CharField(
+        max_length=20,
+        choices=ClimateRegion.choices,
+        default=ClimateRegion.MIXED,
+        help_text="Climate the home is in; sets its outdoor temperature curves"
+    )
+    setpoint_c = models.FloatField(
+        default=24.0,
+        help_text="Thermostat setpoint in °C"
+    )
+    thermal_time_constant_hours = models.FloatField(
+        validators=[MinValueValidator(0.0)],
+        default=4.0,
+        help_text="How slowly the home follows the outdoor temperature, in hours"
+    )
 
     class Meta:
         verbose_name = "Air Conditioner"
         verbose_name_plural = "Air Conditioners"
 
+    def get_device_type(self):
+        return 'air_conditioner'
+
     def save(self, *args, **kwargs):
         # Ensure min <= rated <= max
         if self.min_power_w > self.rated_power_w:
@@ -35,6 +64,9 @@ class AirConditioner(Device):
 class Heater(Device):
     """Heating unit for warming."""
 
+    # Load rises as the indoor temperature falls
+    cooling = False
+
     rated_power_w = models.FloatField(
         validators=[MinValueValidator(1.0)],
         help_text="Rated power consumption in watts"
@@ -47,11 +79,29 @@ class Heater(Device):
         validators=[MinValueValidator(1.0)],
         help_text="Maximum power consumption in watts"
     )
+    climate_region = models.CharField(
+        max_length=20,
+        choices=ClimateRegion.choices,
+        default=ClimateRegion.MIXED,
+        help_text="Climate the home is in; sets its outdoor temperature curves"
+    )
+    setpoint_c = models.FloatField(
+        default=20.0,
+        help_text="Thermostat setpoint in °C"
+    )
+    thermal_time_constant_hours = models.FloatField(
+        validators=[MinValueValidator(0.0)],
+        default=4.0,
+        help_text="How slowly the home follows the outdoor temperature, in hours"
+    )
 
     class Meta:
         verbose_name = "Heater"
         verbose_name_plural = "Heaters"
 
+    def get_device_type(self):
+        return 'heater'
+
     def save(self, *args, **kwargs):
         # Ensure min <= rated <= max
         if self.min_power_w > self.rated_power_w:
@@ -0,0 +1,45 @@
+from django.db import models
+from .base import Device
+
+
+class DeviceReading(models.Model):
+    """
+    One simulated reading of a device at a point in time.
+
+    Written in bulk by the offline replay engine (`simulate_range`); the
+    live simulation keeps only the latest values, in Redis.
+    """
+
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='readings'
+    )
+    timestamp = models.DateTimeField()
+    power_w = models.FloatField(help_text="Power at this time in watts")
+    flow_w = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Charge (+) or discharge (-) power of storage devices in watts"
+    )
+    level_wh = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Stored energy of storage devices in Wh"
+    )
+    mode = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        help_text="Operating mode (EVs only)"
+    )
+
+    class Meta:
+        verbose_name = "Device Reading"
+        verbose_name_plural = "Device Readings"
+        constraints = [
+            models.UniqueConstraint(fields=['device', 'timestamp'], name='unique_device_reading'),
+        ]
+
+    def __str__(self):
+        return f"Reading of device {self.device_id} at {self.timestamp}"
@@ -0,0 +1,51 @@
+from django.db import models
+from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator
+from apps.devices.schedule import DEFAULT_TIMEZONE, validate_timezone
+
+
+class LoadProfile(models.TextChoices):
+    STANDARD = 'standard', 'Standard (out at work)'
+    HOME_WORKER = 'home_worker', 'Works from home'
+    NIGHT_SHIFT = 'night_shift', 'Night shift'
+    RETIRED = 'retired', 'Retired'
+
+
+class Household(models.Model):
+    """
+    The baseline load of a user's home: lighting, appliances and everything
+    else that isn't a simulated device.
+
+    Users without a household use the defaults.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='household'
+    )
+    load_profile = models.CharField(
+        max_length=20,
+        choices=LoadProfile.choices,
+        default=LoadProfile.STANDARD,
+        help_text="Daily shape of the baseline load"
+    )
+    baseline_w = models.FloatField(
+        validators=[MinValueValidator(0.0)],
+        default=600.0,
+        help_text="Average baseline load in watts"
+    )
+    timezone = models.CharField(
+        max_length=64,
+        default=DEFAULT_TIMEZONE,
+        validators=[validate_timezone],
+        help_text="IANA time zone the load profile follows"
+    )
+
+    class Meta:
+        verbose_name = "Household"
+        verbose_name_plural = "Households"
+
+    def __str__(self):
+        return f"Household of {self.user}"
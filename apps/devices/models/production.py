@@ -33,6 +33,9 @@ class SolarPanel(Device):
         verbose_name = "Solar Panel"
         verbose_name_plural = "Solar Panels"
 
+    def get_device_type(self):
+        return 'solar_panel'
+
 
 class Generator(Device):
     """Backup generator that produces consistent power."""
@@ -45,3 +48,6 @@ class Generator(Device):
     class Meta:
         verbose_name = "Generator"
         verbose_name_plural = "Generators"
+
+    def get_device_type(self):
+        return 'generator'
@@ -0,0 +1,75 @@
+from django.db import models
+from django.core.validators import MinValueValidator
+from .base import Device
+
+
+class DeviceState(models.Model):
+    """
+    Fast-changing simulation state of a storage device.
+
+    Kept apart from the device's configuration so the per-tick writes touch
+    a narrow row with no secondary indexes. On PostgreSQL the table also has
+    a reduced fillfactor, which leaves room on each page for the new row
+    version and lets almost every update be a HOT update.
+    """
+
+    STATE_FIELDS = ('current_charge_kwh', 'mode', 'last_seen_at', 'last_tick_start')
+
+    device = models.OneToOneField(
+        Device,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='state'
+    )
+    current_charge_kwh = models.FloatField(
+        validators=[MinValueValidator(0.0)],
+        default=0.0,
+        help_text="Current charge level in kWh"
+    )
+    mode = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        help_text="Current operating mode (EVs only)"
+    )
+    last_seen_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last time the EV was connected"
+    )
+    last_tick_start = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Simulated start (epoch seconds) of the last tick applied to the charge level"
+    )
+
+    class Meta:
+        verbose_name = "Device State"
+        verbose_name_plural = "Device States"
+
+    def __str__(self):
+        return f"State of device {self.device_id}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.mark_saved()
+        return instance
+
+    def _state_values(self):
+        # Deferred fields are left out rather than loaded
+        return {name: self.__dict__[name] for name in self.STATE_FIELDS if name in self.__dict__}
+
+    def mark_saved(self):
+        """Take the current values as what the database holds."""
+        self._saved_values = self._state_values()
+
+    def changed_fields(self):
+        """State fields changed since the row was loaded or last saved; all of them if unknown."""
+        saved = getattr(self, '_saved_values', None)
+        if saved is None:
+            return set(self.STATE_FIELDS)
+        return {
+            name for name, value in self._state_values().items()
+            if name not in saved or saved[name] != value
+        }
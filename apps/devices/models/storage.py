@@ -1,20 +1,148 @@
-from django.db import models
+from datetime import datetime, timezone
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest, Least
 from django.core.validators import MinValueValidator, MaxValueValidator
+from apps.devices.schedule import (
+    DEFAULT_TIMEZONE, default_away_windows, forget_schedule, schedule_for,
+    validate_away_windows, validate_timezone,
+)
+from apps.simulation.clock import SimulationClock
 from .base import Device
+from .changes import ChangeOperation, DeviceChange
+from .state import DeviceState
+
+
+def simulated_now() -> datetime:
+    """The current time on the simulation clock (the wall clock unless accelerated)."""
+    return datetime.fromtimestamp(SimulationClock().now(), tz=timezone.utc)
+
+
+class DeviceStateMixin:
+    """
+    Presents the hot `DeviceState` columns as attributes of the device.
+
+    `current_charge_kwh`, `mode`, `last_seen_at` and `last_tick_start` read and
+    write the related `DeviceState` row, which is created alongside the
+    device. Saving the device writes only the state fields changed since the
+    row was loaded, so an edit to the device alone (a rename) can't write
+    back a stale copy of state the simulation has moved on since.
+    `save(update_fields=[...])` only touches the tables that own the named
+    fields.
+    """
+
+    state_defaults = {}
+
+    @property
+    def device_state(self):
+        try:
+            return self.state
+        except DeviceState.DoesNotExist:
+            state = DeviceState(**self.state_defaults)
+            self.state = state
+            return state
+
+    def clean_fields(self, exclude=None):
+        errors = {}
+        try:
+            super().clean_fields(exclude=exclude)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+
+        state_exclude = set(exclude or ()) | {'device'}
+        try:
+            self.device_state.clean_fields(exclude=state_exclude)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, update_fields=None, **kwargs):
+        with transaction.atomic(savepoint=False):
+            if update_fields is None:
+                super().save(*args, **kwargs)
+                self._save_state()
+                return
+
+            update_fields = set(update_fields)
+            state_fields = update_fields & set(DeviceState.STATE_FIELDS)
+            device_fields = update_fields - state_fields
+            if device_fields or not state_fields:
+                super().save(*args, update_fields=device_fields, **kwargs)
+            else:
+                # Device.save records the change; a state-only edit is one too
+                DeviceChange.record(self, ChangeOperation.UPSERT)
+            if state_fields:
+                self._save_state(state_fields)
+
+    def _save_state(self, update_fields=None):
+        state = self.device_state
+        state.device = self
+        if state._state.adding:
+            state.save(force_insert=True)
+        else:
+            if update_fields is None:
+                update_fields = state.changed_fields()
+                if not update_fields:
+                    return
+            state.save(update_fields=update_fields)
+        state.mark_saved()
+
+    def apply_charge_delta(self, delta_kwh, watermark=None, **fields):
+        """
+        Add `delta_kwh` to the stored charge, clamped to [0, capacity].
+
+        Charge changes are applied with a single conditional UPDATE keyed by
+        the simulation tick's `watermark` (its simulated start in epoch
+        seconds, see `apps.simulation.ticks.tick_watermark`): the row only
+        changes if its `last_tick_start` is older, so a retried or duplicated
+        task is a no-op. Any extra state `fields` are written in the same
+        UPDATE. Without a `watermark` the update is unconditional. Returns
+        False when the tick was already applied, in which case nothing is
+        written.
+        """
+        queryset = DeviceState.objects.filter(pk=self.pk)
+        if watermark is not None:
+            queryset = queryset.filter(Q(last_tick_start__isnull=True) | Q(last_tick_start__lt=watermark))
+            fields['last_tick_start'] = watermark
+
+        updated = queryset.update(
+            current_charge_kwh=Greatest(
+                Value(0.0),
+                Least(Value(float(self.capacity_kwh)), F('current_charge_kwh') + Value(float(delta_kwh))),
+            ),
+            **fields,
+        )
+        if not updated:
+            return False
+
+        self.current_charge_kwh = max(0.0, min(self.capacity_kwh, self.current_charge_kwh + delta_kwh))
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return True
+
+
+def _state_property(name, doc):
+    def fget(self):
+        return getattr(self.device_state, name)
+
+    def fset(self, value):
+        setattr(self.device_state, name, value)
+
+    return property(fget, fset, doc=doc)
 
 
-class Battery(Device):
+class Battery(DeviceStateMixin, Device):
     """Stationary battery for energy storage."""
 
     capacity_kwh = models.FloatField(
         validators=[MinValueValidator(0.1)],
         help_text="Total battery capacity in kWh"
     )
-    current_charge_kwh = models.FloatField(
-        validators=[MinValueValidator(0.0)],
-        default=0.0,
-        help_text="Current charge level in kWh"
-    )
+    current_charge_kwh = _state_property('current_charge_kwh', "Current charge level in kWh")
     max_charge_rate_kw = models.FloatField(
         validators=[MinValueValidator(0.1)],
         help_text="Maximum charging rate in kW"
@@ -23,11 +151,17 @@ class Battery(Device):
         validators=[MinValueValidator(0.1)],
         help_text="Maximum discharging rate in kW"
     )
+    last_tick_start = _state_property(
+        'last_tick_start', "Simulated start (epoch seconds) of the last tick applied to the charge level"
+    )
 
     class Meta:
         verbose_name = "Battery"
         verbose_name_plural = "Batteries"
 
+    def get_device_type(self):
+        return 'battery'
+
     def save(self, *args, **kwargs):
         # Ensure current charge doesn't exceed capacity
         if self.current_charge_kwh > self.capacity_kwh:
@@ -48,18 +182,14 @@ class EVMode(models.TextChoices):
     OFFLINE = 'offline', 'Offline (Driving)'
 
 
-class ElectricVehicle(Device):
+class ElectricVehicle(DeviceStateMixin, Device):
     """Electric vehicle that can charge or discharge (V2H)."""
 
     capacity_kwh = models.FloatField(
         validators=[MinValueValidator(0.1)],
         help_text="Total battery capacity in kWh"
     )
-    current_charge_kwh = models.FloatField(
-        validators=[MinValueValidator(0.0)],
-        default=0.0,
-        help_text="Current charge level in kWh"
-    )
+    current_charge_kwh = _state_property('current_charge_kwh', "Current charge level in kWh")
     max_charge_rate_kw = models.FloatField(
         validators=[MinValueValidator(0.1)],
         help_text="Maximum charging rate in kW"
@@ -68,27 +198,38 @@ class ElectricVehicle(Device):
         validators=[MinValueValidator(0.1)],
         help_text="Maximum discharging rate in kW (V2H)"
     )
-    mode = models.CharField(
-        max_length=20,
-        choices=EVMode.choices,
-        default=EVMode.CHARGING,
-        help_text="Current operating mode"
-    )
-    last_seen_at = models.DateTimeField(
-        null=True,
-        blank=True,
-        help_text="Last time the EV was connected"
-    )
+    mode = _state_property('mode', "Current operating mode")
+    last_seen_at = _state_property('last_seen_at', "Last time the EV was connected")
     driving_efficiency_kwh_per_hour = models.FloatField(
         default=3.0,
         validators=[MinValueValidator(0.1)],
         help_text="Energy consumption while driving (kWh/hour)"
     )
+    last_tick_start = _state_property(
+        'last_tick_start', "Simulated start (epoch seconds) of the last tick applied to the charge level"
+    )
+    schedule_timezone = models.CharField(
+        max_length=64,
+        default=DEFAULT_TIMEZONE,
+        validators=[validate_timezone],
+        help_text="IANA time zone the away windows are in"
+    )
+    away_windows = models.JSONField(
+        default=default_away_windows,
+        blank=True,
+        validators=[validate_away_windows],
+        help_text='Weekly away windows, e.g. [{"days": [0, 1, 2, 3, 4], "start": "07:00", "end": "18:00"}]'
+    )
+
+    state_defaults = {'mode': EVMode.CHARGING}
 
     class Meta:
         verbose_name = "Electric Vehicle"
         verbose_name_plural = "Electric Vehicles"
 
+    def get_device_type(self):
+        return 'electric_vehicle'
+
     def save(self, *args, **kwargs):
         # Ensure current charge doesn't exceed capacity
         if self.current_charge_kwh > self.capacity_kwh:
@@ -97,10 +238,47 @@ class ElectricVehicle(Device):
         if self.current_charge_kwh < 0:
             self.current_charge_kwh = 0
         super().save(*args, **kwargs)
+        forget_schedule(self.pk)
+
+    def delete(self, *args, **kwargs):
+        forget_schedule(self.pk)
+        return super().delete(*args, **kwargs)
+
+    @property
+    def schedule(self):
+        """Compiled weekly schedule of when the car is away."""
+        return schedule_for(self)
+
+    def charge_at(self, when):
+        """
+        Charge level at `when`, with driving since it was last seen settled.
+
+        While the car is away its stored charge is left as it was when it
+        left (`last_seen_at`); the energy driven since then follows in closed
+        form from the schedule, so nothing is written until it reconnects.
+        """
+        if self.mode != EVMode.OFFLINE or self.last_seen_at is None:
+            return self.current_charge_kwh
+        away_hours = self.schedule.away_seconds(self.last_seen_at, when) / 3600
+        return max(0.0, self.current_charge_kwh - self.driving_efficiency_kwh_per_hour * away_hours)
+
+    @property
+    def settled_charge_kwh(self):
+        """
+        Charge level now, on the simulation clock. Setting it sets the stored
+        charge as of then.
+        """
+        return self.charge_at(simulated_now())
+
+    @settled_charge_kwh.setter
+    def settled_charge_kwh(self, value):
+        self.current_charge_kwh = value
+        if self.mode == EVMode.OFFLINE:
+            self.last_seen_at = simulated_now()
 
     @property
     def charge_percentage(self):
         """Return current charge as percentage."""
         if self.capacity_kwh == 0:
             return 0
-        return (self.current_charge_kwh / self.capacity_kwh) * 100
+        return (self.settled_charge_kwh / self.capacity_kwh) * 100
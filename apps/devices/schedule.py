@@ -0,0 +1,240 @@
+"""
+Electric vehicle availability schedules.
+
+An EV's schedule is a list of weekly away windows in its own IANA time zone:
+
+    [{"days": [0, 1, 2, 3, 4], "start": "07:00", "end": "18:00"}]
+
+(days are 0 = Monday ... 6 = Sunday; an `end` before `start` runs past
+midnight). It is compiled once into a minute-of-week bitmap (10,080 bits)
+plus a prefix sum of away minutes, so both questions the simulation asks
+are O(1) whatever the schedule looks like:
+
+- `is_away(t)`: one bit test;
+- `away_seconds(a, b)`: `away_before(b) - away_before(a)`, from the
+  cumulative away time since the Unix epoch, which is what lets a
+  disconnected EV be settled in one step however long it has been gone.
+
+Times are evaluated on the local wall clock, so windows follow DST. Across a
+DST change the skipped or repeated hour counts as it appears on the clock.
+
+Compiled schedules are shared between vehicles with the same schedule and
+cached per vehicle (`schedule_for`); a vehicle's entry is recompiled when
+its schedule fields change and dropped when it is saved or deleted.
+`FleetSchedules` evaluates a whole fleet of heterogeneous schedules at once
+for the batch engine.
+"""
+
+import calendar
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+MINUTE = 60
+DAY = 86400
+WEEK = 7 * DAY
+MINUTES_PER_WEEK = WEEK // MINUTE
+# The Unix epoch fell on a Thursday; shifting by three days makes weeks start on Monday
+_MONDAY_SHIFT = 3 * DAY
+
+DEFAULT_TIMEZONE = 'America/New_York'
+DEFAULT_AWAY_WINDOWS = [{'days': [0, 1, 2, 3, 4], 'start': '07:00', 'end': '18:00'}]
+
+Moment = Union[datetime, float]
+WindowsKey = Tuple[Tuple[Tuple[int, ...], str, str], ...]
+
+
+def default_away_windows() -> List[Dict[str, Any]]:
+    """Away 7 AM - 6 PM on weekdays."""
+    return [dict(window, days=list(window['days'])) for window in DEFAULT_AWAY_WINDOWS]
+
+
+def to_epoch(moment: Moment) -> float:
+    """Epoch seconds of a datetime (naive means UTC) or of epoch seconds."""
+    if isinstance(moment, datetime):
+        if moment.tzinfo is None:
+            return calendar.timegm(moment.timetuple()) + moment.microsecond / 1e6
+        return moment.timestamp()
+    return float(moment)
+
+
+def _parse_minute(value: str) -> int:
+    hours, minutes = (int(part) for part in value.split(':'))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 1440:
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def validate_timezone(value: str):
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f'Unknown time zone: {value}')
+
+
+def validate_away_windows(value):
+    """Check `value` is a list of {"days", "start", "end"} windows."""
+    if not isinstance(value, list):
+        raise ValidationError('Away windows must be a list.')
+    for window in value:
+        try:
+            days = window['days']
+            start, end = _parse_minute(window['start']), _parse_minute(window['end'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValidationError(f'Invalid away window: {window!r}')
+        if not days or any(not isinstance(day, int) or not 0 <= day <= 6 for day in days):
+            raise ValidationError(f'Window days must be weekdays 0-6: {window!r}')
+        if start == end:
+            raise ValidationError(f'Window is empty: {window!r}')
+
+
+def windows_key(windows: Iterable[Dict[str, Any]]) -> WindowsKey:
+    """Hashable, order-insensitive form of a windows list."""
+    return tuple(sorted(
+        (tuple(sorted(window['days'])), window['start'], window['end']) for window in windows
+    ))
+
+
+class WeeklySchedule:
+    """A compiled weekly schedule: minute-of-week bitmap plus prefix sums."""
+
+    def __init__(self, windows: Iterable[Dict[str, Any]] = DEFAULT_AWAY_WINDOWS,
+                 tz: str = DEFAULT_TIMEZONE):
+        self.tz = ZoneInfo(tz)
+        bitmap = bytearray(MINUTES_PER_WEEK // 8)
+        for window in windows:
+            start, end = _parse_minute(window['start']), _parse_minute(window['end'])
+            length = end - start if end > start else end - start + 1440
+            for day in window['days']:
+                first = day * 1440 + start
+                for minute in range(first, first + length):
+                    minute %= MINUTES_PER_WEEK
+                    bitmap[minute >> 3] |= 1 << (minute & 7)
+        self.bitmap = bytes(bitmap)
+
+        # prefix[m] = away minutes in the week before minute m
+        prefix = array('i', [0]) * (MINUTES_PER_WEEK + 1)
+        for minute in range(MINUTES_PER_WEEK):
+            prefix[minute + 1] = prefix[minute] + self._bit(minute)
+        self.prefix = prefix
+        self.minutes_per_week = prefix[MINUTES_PER_WEEK]
+
+    def _bit(self, minute: int) -> int:
+        return (self.bitmap[minute >> 3] >> (minute & 7)) & 1
+
+    def _local_position(self, epoch: float) -> Tuple[int, int, float]:
+        """(week, minute of week, second within minute) on the local clock."""
+        offset = datetime.fromtimestamp(epoch, tz=self.tz).utcoffset()
+        local = epoch + offset.total_seconds() + _MONDAY_SHIFT
+        week, second_of_week = divmod(local, WEEK)
+        minute, second = divmod(second_of_week, MINUTE)
+        return int(week), int(minute), second
+
+    def is_away(self, moment: Moment) -> bool:
+        _, minute, _ = self._local_position(to_epoch(moment))
+        return bool(self._bit(minute))
+
+    def away_before(self, moment: Moment) -> float:
+        """Away seconds between the Unix epoch and `moment`."""
+        week, minute, second = self._local_position(to_epoch(moment))
+        minutes = week * self.minutes_per_week + self.prefix[minute]
+        return minutes * MINUTE + (second if self._bit(minute) else 0.0)
+
+    def away_seconds(self, start: Moment, end: Moment) -> float:
+        """Away seconds in [start, end]; zero if `end` is not after `start`."""
+        return max(0.0, self.away_before(end) - self.away_before(start))
+
+
+@lru_cache(maxsize=1024)
+def compile_schedule(tz: str, key: WindowsKey) -> WeeklySchedule:
+    """Compile a schedule; identical schedules share one compiled copy."""
+    return WeeklySchedule(
+        [{'days': list(days), 'start': start, 'end': end} for days, start, end in key], tz
+    )
+
+
+# vehicle id -> (schedule signature, compiled schedule)
+_vehicle_schedules: Dict[int, Tuple[Tuple[str, WindowsKey], WeeklySchedule]] = {}
+
+
+def schedule_for(vehicle) -> WeeklySchedule:
+    """The compiled schedule of an EV, cached for the vehicle."""
+    signature = (vehicle.schedule_timezone, windows_key(vehicle.away_windows))
+    cached = _vehicle_schedules.get(vehicle.pk)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    schedule = compile_schedule(*signature)
+    if vehicle.pk is not None:
+        _vehicle_schedules[vehicle.pk] = (signature, schedule)
+    return schedule
+
+
+def forget_schedule(vehicle_id: Optional[int]):
+    """Drop a vehicle's cached schedule after it is edited or deleted."""
+    _vehicle_schedules.pop(vehicle_id, None)
+
+
+DEFAULT_SCHEDULE = compile_schedule(DEFAULT_TIMEZONE, windows_key(DEFAULT_AWAY_WINDOWS))
+
+
+class FleetSchedules:
+    """
+    Evaluates the schedules of many vehicles at once.
+
+    Each distinct schedule is evaluated once per call and the results are
+    spread over the vehicles with NumPy, so the cost of a step grows with
+    the number of distinct schedules rather than the fleet size.
+    """
+
+    def __init__(self, schedules: Sequence[WeeklySchedule]):
+        self.unique: List[WeeklySchedule] = []
+        positions = {}
+        index = []
+        for schedule in schedules:
+            if id(schedule) not in positions:
+                positions[id(schedule)] = len(self.unique)
+                self.unique.append(schedule)
+            index.append(positions[id(schedule)])
+        self.index = np.array(index, dtype=np.intp)
+
+    def select(self, rows) -> 'FleetSchedules':
+        """The schedules of some of the vehicles (an index array or boolean mask)."""
+        used, index = np.unique(self.index[rows], return_inverse=True)
+        subset = FleetSchedules([])
+        subset.unique = [self.unique[position] for position in used.tolist()]
+        subset.index = index.astype(np.intp).reshape(-1)
+        return subset
+
+    def concatenate(self, other: 'FleetSchedules') -> 'FleetSchedules':
+        """The vehicles of this fleet followed by those of `other`."""
+        combined = FleetSchedules([])
+        combined.unique = list(self.unique)
+        positions = {id(schedule): i for i, schedule in enumerate(combined.unique)}
+        remap = []
+        for schedule in other.unique:
+            if id(schedule) not in positions:
+                positions[id(schedule)] = len(combined.unique)
+                combined.unique.append(schedule)
+            remap.append(positions[id(schedule)])
+        remap = np.array(remap, dtype=np.intp)
+        combined.index = np.concatenate([self.index, remap[other.index]])
+        return combined
+
+    def is_away(self, moment: Moment):
+        epoch = to_epoch(moment)
+        values = np.array([schedule.is_away(epoch) for schedule in self.unique], dtype=bool)
+        return values[self.index]
+
+    def away_before(self, moment: Moment):
+        epoch = to_epoch(moment)
+        values = np.array([schedule.away_before(epoch) for schedule in self.unique], dtype=float)
+        return values[self.index]
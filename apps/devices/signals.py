@@ -0,0 +1,17 @@
+"""Signal handlers for the devices app."""
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.devices.models import ChangeOperation, Device, DeviceChange
+
+
+@receiver(post_delete, sender=Device)
+def record_device_deletion(sender, instance, **kwargs):
+    """
+    Add deletions to the change feed.
+
+    The collector sends this inside its own transaction, once per device,
+    whether the device, its subclass row or its user was deleted.
+    """
+    DeviceChange.record(instance, ChangeOperation.DELETE)
@@ -5,3 +5,6 @@ class SimulationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.simulation'
     verbose_name = 'Energy Simulation'
+
+    def ready(self):
+        from apps.simulation import signals  # noqa: F401
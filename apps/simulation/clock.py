@@ -0,0 +1,107 @@
+"""
+The simulation clock.
+
+Simulated time runs SIMULATION_TIME_SCALE times faster than the wall clock.
+At the default scale of 1 it *is* the wall clock. At any other scale it is
+anchored in Redis the first time a process reads it, so every worker and
+beat agree on the time:
+
+    simulated = anchor_simulated + (real - anchor_real) * scale
+
+SIMULATION_CLOCK_START (an ISO datetime, UTC) sets where an accelerated
+clock starts; by default it starts at the real time of anchoring. If the
+scale is later changed, the clock re-anchors at its current simulated time
+so simulated time never jumps.
+
+Tick ids, tick timestamps and elapsed durations are all in simulated time,
+so integration is exact however fast the clock runs or however short the
+tick (SIMULATION_TICK_SECONDS) is.
+"""
+
+import time
+from datetime import timezone
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from apps.simulation.redis_client import RedisClient
+
+
+CLOCK_KEY = 'simulation:clock'
+
+
+def time_scale() -> float:
+    return float(getattr(settings, 'SIMULATION_TIME_SCALE', 1.0))
+
+
+def beat_interval_seconds() -> float:
+    """Real seconds between simulation ticks at the configured scale."""
+    return int(getattr(settings, 'SIMULATION_TICK_SECONDS', 60)) / time_scale()
+
+
+def _configured_start() -> Optional[float]:
+    value = getattr(settings, 'SIMULATION_CLOCK_START', None)
+    if not value:
+        return None
+    start = parse_datetime(value)
+    if start is None:
+        raise ValueError(f'Invalid SIMULATION_CLOCK_START: {value}')
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    return start.timestamp()
+
+
+class SimulationClock:
+    """Maps wall-clock time to simulated time."""
+
+    def __init__(self, redis_client: Optional[RedisClient] = None,
+                 scale: Optional[float] = None):
+        self.scale = time_scale() if scale is None else float(scale)
+        if self.scale <= 0:
+            raise ValueError('SIMULATION_TIME_SCALE must be positive')
+        self._redis_client = redis_client
+
+    @property
+    def redis(self):
+        if self._redis_client is None:
+            self._redis_client = RedisClient()
+        return self._redis_client.redis
+
+    @property
+    def realtime(self) -> bool:
+        return self.scale == 1.0 and _configured_start() is None
+
+    def now(self, real: Optional[float] = None) -> float:
+        """Current simulated time as epoch seconds."""
+        real = time.time() if real is None else real
+        if self.realtime:
+            return real
+        anchor_real, anchor_simulated = self._anchor(real)
+        return anchor_simulated + (real - anchor_real) * self.scale
+
+    def real_duration(self, simulated_seconds: float) -> float:
+        """Wall-clock seconds that `simulated_seconds` of simulated time take."""
+        return simulated_seconds / self.scale
+
+    def reset(self):
+        """
+        Forget the anchor; the clock restarts from SIMULATION_CLOCK_START.
+
+        A running simulation is restarted with `TickCoordinator.reset()`,
+        which also clears the tick history and storage watermarks.
+        """
+        self.redis.delete(CLOCK_KEY)
+
+    def _anchor(self, real: float) -> Tuple[float, float]:
+        start = _configured_start()
+        value = f'{real}:{start if start is not None else real}:{self.scale}'
+        # Only the first process to read the clock sets the anchor
+        self.redis.set(CLOCK_KEY, value, nx=True)
+        anchor_real, anchor_simulated, scale = (float(part) for part in self.redis.get(CLOCK_KEY).split(':'))
+
+        if scale != self.scale:
+            simulated = anchor_simulated + (real - anchor_real) * scale
+            anchor_real, anchor_simulated = real, simulated
+            self.redis.set(CLOCK_KEY, f'{real}:{simulated}:{self.scale}')
+        return anchor_real, anchor_simulated
@@ -0,0 +1,149 @@
+"""
+Spatially correlated cloud cover shared by all solar panels.
+
+Cloud cover is a field over a coarse lat/lon grid (CLOUD_GRID_DEGREES,
+0.5° by default). Each grid node gets a cover value in [0, 1) at every
+weather frame, CLOUD_PERSISTENCE_SECONDS apart, from the counter-based RNG
+keyed by the node and frame. Between frames a node's cover eases from one
+value to the next, so the field changes gradually from tick to tick. A panel
+samples the field by bilinear interpolation between the four nodes around
+it, so neighbouring homes see the same clouds and cover ramps smoothly across
+a region:
+
+    field = cloud_field(timestamp)
+    field.factor(latitude, longitude)                   # 0.85 (overcast) - 1.0 (clear)
+    field.factor_array(latitudes, longitudes)           # the same, for many panels
+
+A field is a pure function of the seed and the time, so every worker builds
+the same one without coordinating. Node values are computed once per tick
+and shared by all panels, so the cost of a tick grows with the number of
+grid cells the fleet covers rather than the number of panels.
+"""
+
+import calendar
+import math
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from apps.simulation.rng import default_seed, np, random_array, random_float
+
+# Output multiplier under full cloud and under a clear sky
+OVERCAST_FACTOR = 0.85
+CLEAR_FACTOR = 1.0
+
+# Node streams live above every device id so they never share random values
+_NODE_NAMESPACE = 1 << 62
+_NODE_BITS = 24
+_NODE_MASK = (1 << _NODE_BITS) - 1
+
+
+def grid_degrees() -> float:
+    return float(getattr(settings, 'CLOUD_GRID_DEGREES', 0.5))
+
+
+def persistence_seconds() -> int:
+    return int(getattr(settings, 'CLOUD_PERSISTENCE_SECONDS', 1800))
+
+
+def node_id(row: int, column: int) -> int:
+    """Random stream id of the grid node at (row, column); also takes int64 arrays."""
+    return _NODE_NAMESPACE | ((row & _NODE_MASK) << _NODE_BITS) | (column & _NODE_MASK)
+
+
+# The four nodes around a point, in the order `_sample` interpolates them
+_CORNERS = ((0, 0), (0, 1), (1, 0), (1, 1))
+
+
+def _smoothstep(fraction: float) -> float:
+    return fraction * fraction * (3 - 2 * fraction)
+
+
+class CloudField:
+    """The cloud cover field at one moment."""
+
+    def __init__(self, timestamp: datetime, seed: Optional[int] = None,
+                 grid: Optional[float] = None, persistence: Optional[int] = None):
+        self.timestamp = timestamp
+        self.seed = default_seed() if seed is None else seed
+        self.grid = grid_degrees() if grid is None else grid
+        self.persistence = persistence_seconds() if persistence is None else persistence
+        if self.grid <= 0 or self.persistence <= 0:
+            raise ValueError('CLOUD_GRID_DEGREES and CLOUD_PERSISTENCE_SECONDS must be positive')
+
+        frame, offset = divmod(calendar.timegm(timestamp.utctimetuple()), self.persistence)
+        self.frame = int(frame)
+        self.weight = _smoothstep(offset / self.persistence)
+        self.nodes: Dict[Tuple[int, int], float] = {}
+
+    def _blend(self, now, later):
+        """A node's cover between the frame's value and the next one's."""
+        return now + (later - now) * self.weight
+
+    def cover(self, row: int, column: int) -> float:
+        """Cloud cover in [0, 1) at a grid node."""
+        cover = self.nodes.get((row, column))
+        if cover is None:
+            stream = node_id(row, column)
+            cover = self.nodes[(row, column)] = self._blend(
+                random_float(self.seed, stream, self.frame, 0),
+                random_float(self.seed, stream, self.frame + 1, 0),
+            )
+        return cover
+
+    def _sample(self, latitude, longitude, floor, corners):
+        """
+        Bilinear interpolation of the cover around each point, as a factor.
+
+        Shared by `factor` and `factor_array`: `floor` rounds the grid
+        coordinates down and `corners(rows, columns)` gives the cover of the
+        four nodes around them (in `_CORNERS` order).
+        """
+        y, x = latitude / self.grid, longitude / self.grid
+        rows, columns = floor(y), floor(x)
+        dy, dx = y - rows, x - columns
+        south_west, south_east, north_west, north_east = corners(rows, columns)
+
+        south = south_west + (south_east - south_west) * dx
+        north = north_west + (north_east - north_west) * dx
+        return CLEAR_FACTOR - (CLEAR_FACTOR - OVERCAST_FACTOR) * (south + (north - south) * dy)
+
+    def factor(self, latitude: float, longitude: float) -> float:
+        """Output multiplier for a panel at (latitude, longitude)."""
+        return self._sample(latitude, longitude, math.floor, lambda row, column: [
+            self.cover(row + d_row, column + d_column) for d_row, d_column in _CORNERS
+        ])
+
+    def factor_array(self, latitudes, longitudes):
+        """`factor` for many panels at once; each grid node is drawn once."""
+        if np is None:
+            raise ImportError('NumPy is required for batched cloud cover')
+        return self._sample(np.asarray(latitudes), np.asarray(longitudes), np.floor, self._corner_array)
+
+    def _corner_array(self, rows, columns):
+        rows, columns = rows.astype(np.int64), columns.astype(np.int64)
+        corners = np.stack([node_id(rows + d_row, columns + d_column) for d_row, d_column in _CORNERS])
+        streams, inverse = np.unique(corners, return_inverse=True)
+        streams = streams.astype(np.uint64)
+        cover = self._blend(
+            random_array(streams, self.frame, seed=self.seed),
+            random_array(streams, self.frame + 1, seed=self.seed),
+        )
+        return cover[inverse.reshape(corners.shape)]
+
+
+_current: Optional[CloudField] = None
+
+
+def cloud_field(timestamp: datetime, seed: Optional[int] = None) -> CloudField:
+    """The field at `timestamp`, reused by every panel simulated at that time."""
+    global _current
+    seed = default_seed() if seed is None else seed
+    field = _current
+    if (
+        field is None or field.timestamp != timestamp or field.seed != seed
+        or field.grid != grid_degrees() or field.persistence != persistence_seconds()
+    ):
+        field = _current = CloudField(timestamp, seed)
+    return field
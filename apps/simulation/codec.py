@@ -0,0 +1,76 @@
+"""
+Pluggable JSON codec shared by Redis payloads, DRF and GraphQL responses.
+
+Uses orjson when it is installed and falls back to the stdlib otherwise. Pick
+a backend explicitly with the JSON_BACKEND setting ('auto', 'orjson', 'json').
+
+Both backends produce the same decoded values, not always the same bytes:
+
+- floats use the shortest round-tripping digits, so every float decodes
+  to exactly the value encoded, but orjson spells some differently from
+  the stdlib: `1e16` for `1e+16`, `1e-7` for `1e-07`, `0.00001` for
+  `1e-05`. Everything else (ints, strings, other floats, separators) is
+  byte-identical;
+- non-finite floats are written as null by orjson instead of NaN/Infinity;
+- datetimes are never encoded natively by orjson; they go through the same
+  `default` hook the stdlib encoder would use, so API timestamps keep
+  their existing format.
+
+Nothing stored or served depends on the exact spelling of a float, so the
+bytes aren't normalised: that would cost orjson its speed.
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def _select_backend() -> str:
+    requested = getattr(settings, 'JSON_BACKEND', 'auto')
+    if requested == 'json':
+        return 'json'
+    if requested == 'orjson' and orjson is None:
+        raise ImportError("JSON_BACKEND is 'orjson' but orjson is not installed")
+    return 'orjson' if orjson is not None else 'json'
+
+
+BACKEND = _select_backend()
+FAST = BACKEND == 'orjson'
+
+if FAST:
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME
+    DecodeError = orjson.JSONDecodeError
+else:
+    DecodeError = json.JSONDecodeError
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Encode `obj` as compact UTF-8 JSON bytes."""
+    if FAST:
+        try:
+            return orjson.dumps(obj, default=default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # orjson is stricter than the stdlib (e.g. ints over 64 bits);
+            # keep the previous behaviour for those rare payloads.
+            pass
+    return json.dumps(
+        obj, default=default, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def dumps_str(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Encode `obj` as a compact JSON string."""
+    return dumps(obj, default).decode('utf-8')
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON from bytes or str."""
+    if FAST:
+        return orjson.loads(data)
+    return json.loads(data)
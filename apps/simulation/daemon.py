@@ -0,0 +1,354 @@
+"""
+Standalone simulation daemon.
+
+Every tick, the Celery pipeline pays for an orchestrator enumerating the
+fleet, a broker round trip and task serialisation per batch, and a six-way
+join per device, around what is a fixed-cadence numeric loop.
+`SimulationDaemon` runs that loop in one long-lived process instead:
+
+- the fleet is loaded once into NumPy arrays (`FleetReplay`), and a tick is
+  a handful of vectorised steps over them, with the same models and random
+  draws as the per-device simulators;
+- ticks are still claimed from the `TickCoordinator`, so each runs once
+  whichever process claims it. If another process ran a tick since this
+  one's last, the arrays are behind the stored state and are reloaded;
+- with SIMULATION_DAEMON_PROCESSES above one, the step runs across that
+  many worker processes over shared memory (`FleetShards`), sharded by
+  user;
+- storage state that changed is written back in bulk (`CopyStateWriter`, or
+  Redis in write-behind mode), and device results and per-user stats go to
+  Redis in pipelines, SIMULATION_DAEMON_WRITE_SIZE at a time, skipping
+  results that haven't changed (`DeadBand`);
+- devices created or edited since the last tick are read from the device
+  change feed (`apps.devices.changes`) and reloaded individually, and
+  deleted ones dropped, in one in-place patch of the arrays
+  (`FleetReplay.patch`), so the fleet is only reloaded whole when the
+  daemon falls behind the feed's retention;
+- results are encoded for Redis straight from the reading arrays, without
+  a result record per device.
+
+Run it with `manage.py simulation_daemon`, in place of the beat schedule's
+`run_energy_simulation`.
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from django.conf import settings
+from django.db import DatabaseError
+from redis.exceptions import RedisError
+
+from apps.devices.changes import ChangeFeed, ChangeFeedExpired
+from apps.devices.models import Device, DeviceState
+from apps.simulation.deadband import DeadBand
+from apps.simulation.profiles import baseline_loads
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.replay import FleetReplay, Readings
+from apps.simulation.results import current_payloads, format_timestamp, storage_payloads
+from apps.simulation.rng import np
+from apps.simulation.shards import FleetShards
+from apps.simulation.simulators.registry import (
+    PRODUCTION, SIMULATION_RELATIONS, STORAGE, STORAGE_DEVICE_TYPES, groups,
+)
+from apps.simulation.state import (
+    CopyStateWriter, RedisStateStore, RedisStateWriter, write_behind_enabled
+)
+from apps.simulation.ticks import Tick, TickCoordinator, tick_id_for, tick_watermark
+
+STORAGE_GROUPS = groups(STORAGE)
+PRODUCTION_GROUPS = groups(PRODUCTION)
+
+
+def _datetime(epoch: float) -> Optional[datetime]:
+    return None if np.isnan(epoch) else datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def _differs(new, old):
+    """Element-wise `new != old`, with NaN equal to NaN."""
+    return (new != old) & ~(np.isnan(new) & np.isnan(old))
+
+
+class SimulationDaemon:
+    """Holds the fleet in memory and runs the simulation's ticks on it."""
+
+    def __init__(self, seed: Optional[int] = None, redis_client: Optional[RedisClient] = None,
+                 coordinator: Optional[TickCoordinator] = None, write_size: Optional[int] = None,
+                 processes: Optional[int] = None):
+        if np is None:
+            raise ImportError('NumPy is required for the simulation daemon')
+        self.seed = seed
+        self.redis_client = redis_client or RedisClient()
+        self.coordinator = coordinator or TickCoordinator(self.redis_client)
+        self.write_size = write_size or int(getattr(settings, 'SIMULATION_DAEMON_WRITE_SIZE', 10000))
+        self.store = RedisStateStore(self.redis_client) if write_behind_enabled() else None
+        processes = processes or int(getattr(settings, 'SIMULATION_DAEMON_PROCESSES', 1))
+        self.shards = FleetShards(processes) if processes > 1 else None
+        # The only writer of the fleet's results, so it remembers all of them
+        self.dead_band = DeadBand()
+
+        self.fleet: Optional[FleetReplay] = None
+        self.feed: Optional[ChangeFeed] = None
+        self.last_tick_id: Optional[int] = None
+
+    # Loading and keeping the fleet current
+
+    @staticmethod
+    def _devices():
+        return Device.objects.select_related(*SIMULATION_RELATIONS).order_by('id')
+
+    def _with_live_state(self, devices: Iterable[Device]) -> Iterator[Device]:
+        """In write-behind mode, overlay the live Redis state a chunk at a time."""
+        if self.store is None:
+            yield from devices
+            return
+        chunk = []
+        for device in devices:
+            chunk.append(device)
+            if len(chunk) == self.write_size:
+                yield from self._overlay(chunk)
+                chunk = []
+        yield from self._overlay(chunk)
+
+    def _overlay(self, devices: List[Device]) -> List[Device]:
+        self.store.load(
+            device.get_specific_device() for device in devices
+            if device.get_device_type() in STORAGE_DEVICE_TYPES
+        )
+        return devices
+
+    def load(self):
+        """Load the whole fleet with its stored state."""
+        # The stored state is as of the last completed tick
+        self.last_tick_id = self.coordinator.last_completed_tick()
+        self.feed = ChangeFeed()
+        self.fleet = FleetReplay(
+            self._with_live_state(self._devices().iterator(chunk_size=2000)), self.seed
+        )
+
+    def _load_devices(self, device_ids: List[int]) -> List[Device]:
+        """Devices by id with their stored state, SIMULATION_DAEMON_WRITE_SIZE per query."""
+        devices = []
+        for start in range(0, len(device_ids), self.write_size):
+            devices.extend(self._with_live_state(
+                self._devices().filter(id__in=device_ids[start:start + self.write_size])
+            ))
+        return devices
+
+    def sync(self) -> int:
+        """Apply device changes made since the last sync; returns how many devices changed."""
+        try:
+            changes = self.feed.poll()
+        except ChangeFeedExpired:
+            self.load()
+            return len(self.fleet)
+        if not changes:
+            return 0
+        # One patch for the whole batch of changes
+        return self.fleet.patch(sorted(changes.deleted), self._load_devices(sorted(changes.upserted)))
+
+    def _reload(self, device_ids: Set[int]):
+        """Reload devices whose stored state moved on without us."""
+        devices = self._load_devices(sorted(device_ids))
+        self.fleet.patch(device_ids - {device.id for device in devices}, devices)
+
+    # Ticks
+
+    def run_tick(self, tick: Tick) -> Dict[str, int]:
+        """Apply device changes, step the fleet and write the tick's results."""
+        changed = self.sync()
+        # Copies: shard workers advance the shared columns in place
+        before = {
+            name: {
+                key: getattr(self.fleet, name)[key].copy()
+                for key in ('current_charge_kwh', 'mode', 'last_seen')
+            }
+            for name in STORAGE_GROUPS
+        }
+        if self.shards is not None:
+            groups = self.shards.step_groups(self.fleet, tick.timestamp, tick.elapsed_seconds, tick.tick_id)
+        else:
+            groups = self.fleet.step_groups(tick.timestamp, tick.elapsed_seconds, tick.tick_id)
+
+        written, lost = self._write_state(before, tick_watermark(tick.timestamp))
+        skipped = self._store_results(groups, tick, lost)
+        users = self._store_user_stats(groups, tick.timestamp)
+        if lost:
+            self._reload(lost)
+
+        if self.store is not None and tick.tick_id % settings.SIMULATION_CHECKPOINT_TICKS == 0:
+            self.store.checkpoint()
+        self.last_tick_id = tick.tick_id
+        return {
+            'devices': len(self.fleet), 'changed': changed, 'states': written,
+            'lost': len(lost), 'users': users, 'skipped': skipped,
+        }
+
+    def _write_state(self, before, watermark: int):
+        """Write back storage state the step changed; returns (rows written, lost ids)."""
+        changes = []
+        for name in STORAGE_GROUPS:
+            group, old = getattr(self.fleet, name), before[name]
+            changed = (
+                (group['current_charge_kwh'] != old['current_charge_kwh'])
+                | (group['mode'] != old['mode'])
+                | _differs(group['last_seen'], old['last_seen'])
+            )
+            changes.extend(
+                (DeviceState(
+                    device_id=device_id, current_charge_kwh=charge,
+                    mode=mode, last_seen_at=_datetime(last_seen),
+                ), watermark)
+                for device_id, charge, mode, last_seen in zip(
+                    group['id'][changed].tolist(), group['current_charge_kwh'][changed].tolist(),
+                    group['mode'][changed].tolist(), group['last_seen'][changed].tolist(),
+                )
+            )
+
+        writer = RedisStateWriter(self.store) if self.store is not None else CopyStateWriter()
+        written = set()
+        for start in range(0, len(changes), self.write_size):
+            written |= writer.write_states(changes[start:start + self.write_size])
+        # A later tick already applied elsewhere: our copy of these is stale
+        return len(written), {state.pk for state, _ in changes} - written
+
+    def _store_results(self, groups: Dict[str, Readings], tick: Tick, lost: Set[int]) -> int:
+        """Write the tick's device results that changed; returns how many were skipped."""
+        stamp = format_timestamp(tick.timestamp)
+        skipped = 0
+        for name, readings in groups.items():
+            group = getattr(self.fleet, name)
+            if name in STORAGE_GROUPS:
+                # Lost devices are reloaded; their readings came from stale state
+                rows = ~np.isin(readings.device_ids, list(lost)) if lost else slice(None)
+                numbers = (group['capacity_kwh'][rows] * 1000, readings.level_wh[rows], readings.flow_w[rows])
+                kind = 'storage'
+            else:
+                rows = slice(None)
+                numbers = (readings.power_w,)
+                kind = 'current'
+            device_ids, statuses = readings.device_ids[rows], group['status'][rows]
+            write = self.dead_band.due(device_ids, tick.tick_id)
+            for values in numbers:
+                # Non-finite numbers are stored as null, which is never within the band
+                write |= ~np.isfinite(values)
+            modes = readings.mode[rows] if readings.mode is not None else None
+
+            for start in range(0, len(device_ids), self.write_size):
+                chunk = slice(start, start + self.write_size)
+                ids, status = device_ids[chunk].tolist(), statuses[chunk].tolist()
+                if kind == 'storage':
+                    payloads = storage_payloads(
+                        *(values[chunk].tolist() for values in numbers), stamp, status,
+                        None if modes is None else modes[chunk].tolist(),
+                    )
+                else:
+                    payloads = current_payloads(ids, numbers[0][chunk].tolist(), stamp, status)
+                keys = [f'device:{device_id}:{kind}' for device_id in ids]
+                skipped += self.dead_band.store_payloads(self.redis_client, keys, payloads, write[chunk])
+        return skipped
+
+    def _store_user_stats(self, groups: Dict[str, Readings], timestamp: datetime) -> int:
+        """Aggregate every user's devices with NumPy and store the stats; returns how many users."""
+        fleet = self.fleet
+        user_ids = np.unique(np.concatenate([getattr(fleet, name)['user_id'] for name in groups] or [[]]))
+        if not len(user_ids):
+            return 0
+        totals = {key: np.zeros(len(user_ids)) for key in ('production', 'consumption', 'capacity', 'level', 'flow')}
+
+        def add(key, group, values, offline_too=False):
+            # Only online devices count, as in compute_user_energy_stats,
+            # except for storage held at its last known level
+            rows = slice(None) if offline_too else group['online']
+            index = np.searchsorted(user_ids, group['user_id'][rows])
+            totals[key] += np.bincount(index, weights=values[rows], minlength=len(user_ids))
+
+        for name, readings in groups.items():
+            group = getattr(fleet, name)
+            if name in PRODUCTION_GROUPS:
+                add('production', group, readings.power_w)
+            elif name in STORAGE_GROUPS:
+                add('capacity', group, group['capacity_kwh'] * 1000, offline_too=True)
+                add('level', group, readings.level_wh, offline_too=True)
+                add('flow', group, readings.flow_w)
+            else:
+                add('consumption', group, readings.power_w)
+
+        baselines = baseline_loads(user_ids.tolist(), timestamp)
+        baseline = np.array([baselines[user_id] for user_id in user_ids.tolist()])
+        consumption = totals['consumption'] + baseline
+        capacity, level = totals['capacity'], totals['level']
+        percentage = np.divide(level, capacity, out=np.zeros(len(capacity)), where=capacity > 0) * 100
+        net_grid_flow = consumption + totals['flow'] - totals['production']
+
+        now = datetime.utcnow().isoformat()
+        stats = {}
+        for row in zip(
+            user_ids.tolist(), totals['production'].tolist(), consumption.tolist(), baseline.tolist(),
+            capacity.tolist(), level.tolist(), percentage.tolist(), totals['flow'].tolist(),
+            net_grid_flow.tolist(),
+        ):
+            user_id, production, user_consumption, baseline_w, capacity_wh, level_wh, pct, flow, net = row
+            stats[user_id] = {
+                'current_production': production,
+                'current_consumption': user_consumption,
+                'baseline_consumption': baseline_w,
+                'storage': {
+                    'total_capacity_wh': capacity_wh,
+                    'current_level_wh': level_wh,
+                    'percentage': pct,
+                },
+                'current_storage_flow': flow,
+                'net_grid_flow': net,
+                'timestamp': now,
+            }
+            if len(stats) >= self.write_size:
+                self.redis_client.store_users_stats(stats)
+                stats = {}
+        self.redis_client.store_users_stats(stats)
+        return len(user_ids)
+
+    def close(self):
+        """Stop the shard workers, if any."""
+        if self.shards is not None:
+            self.shards.close()
+
+    # Main loop
+
+    def seconds_to_next_tick(self) -> float:
+        """Real seconds until the next tick starts."""
+        clock, seconds = self.coordinator.clock, self.coordinator.tick_seconds
+        now = clock.now()
+        return clock.real_duration((tick_id_for(now, seconds) + 1) * seconds - now)
+
+    def run(self, ticks: Optional[int] = None,
+            on_tick: Optional[Callable[[Tick, Dict[str, int], float], None]] = None,
+            on_error: Optional[Callable[[Exception], None]] = None):
+        """
+        Run ticks as they come due, forever unless `ticks` is given.
+
+        A tick that fails on the database or Redis is left uncompleted and
+        the fleet is reloaded from the stored state before the next one.
+        """
+        ran = 0
+        while ticks is None or ran < ticks:
+            try:
+                with self.coordinator.begin() as tick:
+                    if tick is not None:
+                        if self.fleet is None or self.coordinator.last_completed_tick() != self.last_tick_id:
+                            # Another process ran a tick since ours
+                            self.load()
+                        started = time.perf_counter()
+                        counts = self.run_tick(tick)
+                        self.coordinator.record_drain(tick.tick_id)
+                        ran += 1
+                        if on_tick is not None:
+                            on_tick(tick, counts, time.perf_counter() - started)
+            except (DatabaseError, RedisError) as exc:
+                self.fleet = None
+                if on_error is None:
+                    raise
+                on_error(exc)
+            if ticks is not None and ran >= ticks:
+                break
+            time.sleep(self.seconds_to_next_tick())
@@ -0,0 +1,99 @@
+"""
+Dead-band suppression of unchanged device results.
+
+Offline devices, idle batteries, parked EVs and panels at night produce
+the same reading tick after tick, and rewriting it only refreshes its
+7-day TTL. `DeadBand` drops a device's result when it is within
+SIMULATION_WRITE_EPSILON (W, Wh) of the one in Redis and no status or mode
+changed. Each device is still rewritten, with a fresh timestamp and TTL,
+once every SIMULATION_WRITE_HEARTBEAT_SECONDS, staggered by device id so
+heartbeats don't all land on the same tick.
+
+Readers must therefore treat a payload's `timestamp` as the time of the
+last change or heartbeat, not of the last tick: no newer write means
+unchanged.
+
+The comparison runs in Redis (`RedisClient.store_changed_devices`), against
+whatever was written last by any worker, so it suppresses as much on a
+Celery pool of many processes as in the single-process daemon. Results
+with a non-finite number, and writes without a tick, are always written.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from apps.simulation.rng import np
+
+_NUMERIC = ('power_w', 'flow_w', 'current_level_wh', 'capacity_wh')
+
+
+def _finite(result) -> bool:
+    # NaN is never within the band; non-finite numbers are stored as null
+    return all(
+        math.isfinite(result.get(field))
+        for field in _NUMERIC if result.get(field) is not None
+    )
+
+
+class DeadBand:
+    """Leaves out device results that repeat what Redis already holds."""
+
+    def __init__(self, epsilon: Optional[float] = None, heartbeat_seconds: Optional[float] = None):
+        self.epsilon = epsilon if epsilon is not None else float(
+            getattr(settings, 'SIMULATION_WRITE_EPSILON', 1.0)
+        )
+        heartbeat_seconds = heartbeat_seconds if heartbeat_seconds is not None else float(
+            getattr(settings, 'SIMULATION_WRITE_HEARTBEAT_SECONDS', 900)
+        )
+        tick_seconds = int(getattr(settings, 'SIMULATION_TICK_SECONDS', 60))
+        # 1 (every tick is a heartbeat) turns suppression off
+        self.heartbeat_ticks = max(1, round(heartbeat_seconds / tick_seconds))
+
+    def split(self, results: Dict[int, Any], tick_id: Optional[int]) -> Tuple[Dict[int, Any], Dict[int, Any]]:
+        """(results to write, results to write only if changed) for one tick's results."""
+        if tick_id is None or self.heartbeat_ticks == 1:
+            return results, {}
+        write, check = {}, {}
+        for device_id, result in results.items():
+            if (tick_id + device_id) % self.heartbeat_ticks == 0 or not _finite(result):
+                write[device_id] = result
+            else:
+                check[device_id] = result
+        return write, check
+
+    def store(self, redis_client, current: Dict[int, Any], storage: Dict[int, Any],
+              tick_id: Optional[int]) -> int:
+        """`RedisClient.store_devices` of the results that changed; returns how many were skipped."""
+        current, check_current = self.split(current, tick_id)
+        storage, check_storage = self.split(storage, tick_id)
+        redis_client.store_devices(current, storage)
+        return redis_client.store_changed_devices(check_current, check_storage, self.epsilon)
+
+    def due(self, device_ids, tick_id: Optional[int]):
+        """Which of `device_ids` (an array) are rewritten on this tick whatever Redis holds."""
+        if tick_id is None or self.heartbeat_ticks == 1:
+            return np.ones(len(device_ids), dtype=bool)
+        return (tick_id + device_ids) % self.heartbeat_ticks == 0
+
+    def store_payloads(self, redis_client, keys: List[str], payloads: List[bytes], write) -> int:
+        """
+        `store` for payloads already encoded, as the daemon builds them from
+        its arrays; `write` marks those written whatever Redis holds.
+        Returns how many were skipped.
+        """
+        write = write.tolist()
+        redis_client.store_payloads(
+            [key for key, forced in zip(keys, write) if forced],
+            [payload for payload, forced in zip(payloads, write) if forced],
+        )
+        return redis_client.store_changed_payloads(
+            [key for key, forced in zip(keys, write) if not forced],
+            [payload for payload, forced in zip(payloads, write) if not forced],
+            self.epsilon,
+        )
+
+
+# Shared by every task a worker process runs
+DEAD_BAND = DeadBand()
@@ -0,0 +1,182 @@
+"""
+Household baseline load profiles.
+
+Lighting, appliances and standby load aren't simulated as devices; each
+user's `Household` follows a normalised 24-hour profile instead, scaled by
+its `baseline_w` (the average load):
+
+    baseline(t) = baseline_w * profile[load_profile, season, day type](local hour)
+
+with linear interpolation between the hourly values, on the household's
+local clock. Every profile has a weekday and a weekend curve for each of
+three seasons (winter: December-February, summer: June-August, and the
+shoulder months), each normalised to a mean of 1.
+
+The library is compiled once per worker process into one float32 table of
+(profiles x seasons x day types x 25 hours) and only read from then on; the
+25th hour repeats midnight so interpolation never wraps. `baseline_loads`
+evaluates every household at once: the local time is worked out once per
+time zone and the table is read with one NumPy gather.
+"""
+
+from array import array
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from apps.devices.models import Household, LoadProfile
+from apps.devices.schedule import DEFAULT_TIMEZONE
+from apps.simulation.rng import np
+
+HOURS = 24
+SEASONS = ('winter', 'shoulder', 'summer')
+DAY_TYPES = ('weekday', 'weekend')
+DEFAULT_PROFILE = LoadProfile.STANDARD
+DEFAULT_BASELINE_W = Household._meta.get_field('baseline_w').default
+
+_WORKDAY_EVENING = (0.55, 0.50, 0.48, 0.47, 0.48, 0.60, 0.95, 1.25, 1.00, 0.70, 0.65, 0.65,
+                    0.70, 0.68, 0.68, 0.75, 0.95, 1.35, 1.70, 1.80, 1.65, 1.40, 1.05, 0.75)
+_DAY_AT_HOME = (0.60, 0.55, 0.50, 0.48, 0.48, 0.50, 0.60, 0.80, 1.10, 1.30, 1.35, 1.30,
+                1.25, 1.15, 1.10, 1.10, 1.20, 1.40, 1.60, 1.65, 1.50, 1.30, 1.00, 0.75)
+
+# Hourly shape of each profile, from midnight, local time
+SHAPES: Dict[str, Dict[str, Tuple[float, ...]]] = {
+    LoadProfile.STANDARD: {'weekday': _WORKDAY_EVENING, 'weekend': _DAY_AT_HOME},
+    LoadProfile.HOME_WORKER: {
+        'weekday': (0.55, 0.50, 0.48, 0.47, 0.48, 0.55, 0.80, 1.05, 1.15, 1.20, 1.20, 1.25,
+                    1.30, 1.20, 1.15, 1.15, 1.20, 1.40, 1.60, 1.65, 1.50, 1.30, 1.00, 0.70),
+        'weekend': _DAY_AT_HOME,
+    },
+    LoadProfile.NIGHT_SHIFT: {
+        'weekday': (1.30, 1.25, 1.20, 1.10, 1.00, 0.90, 1.10, 1.30, 0.90, 0.60, 0.55, 0.55,
+                    0.55, 0.60, 0.70, 0.90, 1.20, 1.40, 1.30, 0.90, 0.70, 0.70, 0.90, 1.20),
+        'weekend': (1.10, 1.00, 0.90, 0.80, 0.70, 0.60, 0.55, 0.55, 0.60, 0.80, 1.00, 1.20,
+                    1.30, 1.30, 1.25, 1.20, 1.30, 1.45, 1.50, 1.45, 1.35, 1.30, 1.25, 1.20),
+    },
+    LoadProfile.RETIRED: {
+        'weekday': (0.60, 0.55, 0.50, 0.50, 0.50, 0.55, 0.75, 1.10, 1.30, 1.30, 1.25, 1.30,
+                    1.35, 1.20, 1.10, 1.10, 1.20, 1.40, 1.50, 1.45, 1.30, 1.10, 0.90, 0.70),
+        'weekend': (0.60, 0.55, 0.50, 0.50, 0.50, 0.55, 0.70, 1.00, 1.25, 1.30, 1.30, 1.30,
+                    1.35, 1.25, 1.15, 1.10, 1.20, 1.40, 1.50, 1.45, 1.30, 1.10, 0.90, 0.70),
+    },
+}
+
+# Seasonal adjustment by hour: lighting in dark winter mornings and evenings,
+# fans and refrigeration on summer afternoons
+SEASONAL: Dict[str, Tuple[float, ...]] = {
+    'winter': tuple(
+        1.15 if 5 <= hour <= 8 else 1.20 if 16 <= hour <= 22 else 1.05 for hour in range(HOURS)
+    ),
+    'shoulder': (1.0,) * HOURS,
+    'summer': tuple(
+        1.10 if 11 <= hour <= 17 else 0.95 if 18 <= hour <= 20 else 1.0 for hour in range(HOURS)
+    ),
+}
+
+PROFILES: Tuple[str, ...] = tuple(SHAPES)
+_PROFILE_INDEX = {name: index for index, name in enumerate(PROFILES)}
+_STRIDE = HOURS + 1
+_LOOKUP_CHUNK = 5000
+
+
+@lru_cache(maxsize=None)
+def profile_table() -> bytes:
+    """The compiled library: float32 curves, `_STRIDE` values each, read-only."""
+    table = array('f')
+    for profile in PROFILES:
+        for season in SEASONS:
+            for day_type in DAY_TYPES:
+                curve = [
+                    value * factor
+                    for value, factor in zip(SHAPES[profile][day_type], SEASONAL[season])
+                ]
+                mean = sum(curve) / HOURS
+                table.extend(value / mean for value in curve)
+                table.append(curve[0] / mean)
+    return table.tobytes()
+
+
+@lru_cache(maxsize=None)
+def _table_array():
+    # A view of the immutable bytes, so it is read-only and never copied
+    return np.frombuffer(profile_table(), dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def _table_values() -> array:
+    table = array('f')
+    table.frombytes(profile_table())
+    return table
+
+
+def _season(month: int) -> int:
+    return 0 if month in (12, 1, 2) else 2 if month in (6, 7, 8) else 1
+
+
+def local_position(timestamp: datetime, tz: str) -> Tuple[int, float]:
+    """(curve offset for season and day type, fractional local hour) at naive UTC `timestamp`."""
+    local = timestamp.replace(tzinfo=dt_timezone.utc).astimezone(ZoneInfo(tz))
+    day_type = 1 if local.weekday() >= 5 else 0
+    hour = local.hour + local.minute / 60 + local.second / 3600
+    return (_season(local.month) * len(DAY_TYPES) + day_type) * _STRIDE, hour
+
+
+def _curve_start(profile: str) -> int:
+    return _PROFILE_INDEX.get(profile, _PROFILE_INDEX[DEFAULT_PROFILE]) * len(SEASONS) * len(DAY_TYPES) * _STRIDE
+
+
+def baseline_load(profile: str, baseline_w: float, tz: str, timestamp: datetime) -> float:
+    """Baseline load in watts of one household."""
+    offset, hour = local_position(timestamp, tz)
+    index = _curve_start(profile) + offset + int(hour)
+    fraction = hour - int(hour)
+    table = _table_values()
+    return baseline_w * (table[index] + (table[index + 1] - table[index]) * fraction)
+
+
+def _households(user_ids: Iterable[int]) -> List[Tuple[int, str, float, str]]:
+    """(user id, profile, baseline W, time zone) per user, with defaults for users without one."""
+    user_ids = list(user_ids)
+    found = {}
+    # In chunks, to stay under the database's limit on query parameters
+    for start in range(0, len(user_ids), _LOOKUP_CHUNK):
+        found.update(
+            (row[0], row) for row in Household.objects.filter(
+                user_id__in=user_ids[start:start + _LOOKUP_CHUNK]
+            ).values_list('user_id', 'load_profile', 'baseline_w', 'timezone')
+        )
+    return [
+        found.get(user_id, (user_id, DEFAULT_PROFILE, DEFAULT_BASELINE_W, DEFAULT_TIMEZONE))
+        for user_id in user_ids
+    ]
+
+
+def household_baseline(user_id: int, timestamp: datetime) -> float:
+    """Baseline load in watts of one user's household."""
+    _, profile, baseline_w, tz = _households([user_id])[0]
+    return baseline_load(profile, baseline_w, tz, timestamp)
+
+
+def baseline_loads(user_ids: Sequence[int], timestamp: datetime) -> Dict[int, float]:
+    """Baseline load in watts of every user's household, in one pass."""
+    households = _households(user_ids)
+    if np is None:
+        return {
+            user_id: baseline_load(profile, baseline_w, tz, timestamp)
+            for user_id, profile, baseline_w, tz in households
+        }
+    if not households:
+        return {}
+
+    positions = {tz: local_position(timestamp, tz) for tz in {row[3] for row in households}}
+    starts = np.array([_curve_start(row[1]) + positions[row[3]][0] for row in households], dtype=np.intp)
+    hours = np.array([positions[row[3]][1] for row in households], dtype=np.float64)
+    scale = np.array([row[2] for row in households], dtype=np.float64)
+
+    whole = hours.astype(np.intp)
+    index = starts + whole
+    table = _table_array()
+    now, later = table[index].astype(np.float64), table[index + 1].astype(np.float64)
+    loads = scale * (now + (later - now) * (hours - whole))
+    return dict(zip((row[0] for row in households), loads.tolist()))
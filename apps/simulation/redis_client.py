@@ -1,9 +1,64 @@
 """Redis client for storing and retrieving simulation data."""
 
-import json
+import asyncio
+import weakref
 import redis
+import redis.asyncio
 from django.conf import settings
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Sequence, Tuple
+from apps.simulation import codec
+from apps.simulation.results import DeviceResult, StorageResult
+
+# Pub/sub channel announcing new entries of the device change feed
+DEVICE_CHANGES_CHANNEL = 'devices:changes'
+
+
+# KEYS = result keys; ARGV = (ttl, epsilon, payload per key). A result is
+# written unless the stored one has the same status and mode and every
+# number within epsilon; returns how many were left as they were.
+_STORE_CHANGED_SCRIPT = """
+local ttl, epsilon = ARGV[1], tonumber(ARGV[2])
+local skipped = 0
+for i, key in ipairs(KEYS) do
+  local payload = ARGV[i + 2]
+  local stored = redis.call('GET', key)
+  local unchanged = false
+  if stored then
+    local new, old = cjson.decode(payload), cjson.decode(stored)
+    unchanged = new.status == old.status and new.mode == old.mode
+    for _, field in ipairs({'power_w', 'flow_w', 'current_level_wh', 'capacity_wh'}) do
+      local value, previous = new[field], old[field]
+      if type(value) ~= type(previous)
+          or (type(value) == 'number' and math.abs(value - previous) > epsilon) then
+        unchanged = false
+      end
+    end
+  end
+  if unchanged then
+    skipped = skipped + 1
+  else
+    redis.call('SET', key, payload, 'EX', ttl)
+  end
+end
+return skipped
+"""
+
+
+def _encode_current(data) -> bytes:
+    return data.to_json() if isinstance(data, DeviceResult) else codec.dumps(data)
+
+
+def _encode_storage(data) -> bytes:
+    return data.storage_json() if isinstance(data, StorageResult) else codec.dumps(data)
+
+
+def _device_payloads(current: Dict[int, Any], storage: Dict[int, Any]) -> Tuple[list, list]:
+    """Keys and encoded payloads of many devices' results."""
+    keys = [f"device:{device_id}:current" for device_id in current]
+    keys += [f"device:{device_id}:storage" for device_id in storage]
+    payloads = [_encode_current(data) for data in current.values()]
+    payloads += [_encode_storage(data) for data in storage.values()]
+    return keys, payloads
 
 
 class RedisClient:
@@ -12,53 +67,103 @@ class RedisClient:
     def __init__(self):
         self.redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
         # TTL = 7 days for demo (no Celery workers on Railway)
-        # With Celery workers: set to 60 seconds
+        # With Celery workers: set to 60 seconds, but never below
+        # SIMULATION_WRITE_HEARTBEAT_SECONDS, as unchanged results are only
+        # rewritten that often
         self.ttl = 604800  # 7 days in seconds
+        self._store_changed = self.redis.register_script(_STORE_CHANGED_SCRIPT)
 
     def store_device_data(self, device_id: int, data: Dict[str, Any]):
-        """Store current device simulation data."""
+        """Store current device simulation data (a dict or a DeviceResult)."""
         key = f"device:{device_id}:current"
-        self.redis.setex(key, self.ttl, json.dumps(data))
+        self.redis.setex(key, self.ttl, _encode_current(data))
 
     def get_device_data(self, device_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve current device simulation data."""
         key = f"device:{device_id}:current"
         data = self.redis.get(key)
-        return json.loads(data) if data else None
+        return codec.loads(data) if data else None
 
     def store_device_storage(self, device_id: int, storage_data: Dict[str, Any]):
-        """Store storage device data (batteries, EVs)."""
+        """Store storage device data (batteries, EVs; a dict or a StorageResult)."""
         key = f"device:{device_id}:storage"
-        self.redis.setex(key, self.ttl, json.dumps(storage_data))
+        self.redis.setex(key, self.ttl, _encode_storage(storage_data))
 
     def get_device_storage(self, device_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve storage device data."""
         key = f"device:{device_id}:storage"
         data = self.redis.get(key)
-        return json.loads(data) if data else None
+        return codec.loads(data) if data else None
+
+    def store_devices(self, current: Dict[int, Dict[str, Any]],
+                      storage: Dict[int, Dict[str, Any]]):
+        """Store many devices' results (dicts or result records) in one round trip."""
+        self.store_payloads(*_device_payloads(current, storage))
+
+    def store_payloads(self, keys: Sequence[str], payloads: Sequence[bytes]):
+        """Store already encoded device payloads under `keys` in one round trip."""
+        if not keys:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for key, payload in zip(keys, payloads):
+            pipe.setex(key, self.ttl, payload)
+        pipe.execute()
+
+    def store_changed_devices(self, current: Dict[int, Dict[str, Any]],
+                              storage: Dict[int, Dict[str, Any]], epsilon: float) -> int:
+        """
+        Store results unless Redis already holds the same reading.
+
+        A result is left out, TTL and all, when the stored payload has the
+        same status and mode and every number within `epsilon`. Compared in
+        one script call against what Redis holds, whichever process wrote it.
+        Returns how many results were left out.
+        """
+        return self.store_changed_payloads(*_device_payloads(current, storage), epsilon)
+
+    def store_changed_payloads(self, keys: Sequence[str], payloads: Sequence[bytes], epsilon: float) -> int:
+        """`store_changed_devices` of already encoded payloads; returns how many were left out."""
+        if not keys:
+            return 0
+        return int(self._store_changed(keys=list(keys), args=[self.ttl, epsilon, *payloads]))
 
     def store_ev_last_seen(self, device_id: int, last_seen_data: Dict[str, Any]):
         """Store EV last seen data for offline tracking."""
         key = f"device:{device_id}:last_seen"
         # Longer TTL for last_seen data (1 day)
-        self.redis.setex(key, 86400, json.dumps(last_seen_data))
+        self.redis.setex(key, 86400, codec.dumps(last_seen_data))
 
     def get_ev_last_seen(self, device_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve EV last seen data."""
         key = f"device:{device_id}:last_seen"
         data = self.redis.get(key)
-        return json.loads(data) if data else None
+        return codec.loads(data) if data else None
 
     def store_user_stats(self, user_id: int, stats: Dict[str, Any]):
         """Store aggregated user energy statistics."""
         key = f"user:{user_id}:energy_stats"
-        self.redis.setex(key, self.ttl, json.dumps(stats))
+        self.redis.setex(key, self.ttl, codec.dumps(stats))
+
+    def store_users_stats(self, stats: Dict[int, Dict[str, Any]]):
+        """Store many users' aggregated statistics in one round trip."""
+        if not stats:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, user_stats in stats.items():
+            pipe.setex(f"user:{user_id}:energy_stats", self.ttl, codec.dumps(user_stats))
+        pipe.execute()
 
     def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve aggregated user energy statistics."""
         key = f"user:{user_id}:energy_stats"
         data = self.redis.get(key)
-        return json.loads(data) if data else None
+        return codec.loads(data) if data else None
+
+    def publish_device_change(self, change_id: int, device_id: int, operation: str):
+        """Announce a committed change feed entry to DEVICE_CHANGES_CHANNEL subscribers."""
+        self.redis.publish(DEVICE_CHANGES_CHANNEL, codec.dumps({
+            'id': change_id, 'device_id': device_id, 'operation': operation,
+        }))
 
     def get_all_device_keys(self, pattern: str = "device:*:current") -> list:
         """Get all device keys matching pattern."""
@@ -67,3 +172,53 @@ class RedisClient:
     def delete_key(self, key: str):
         """Delete a specific key."""
         self.redis.delete(key)
+
+
+class AsyncRedisClient:
+    """
+    asyncio counterpart of RedisClient for async GraphQL resolvers.
+
+    All instances created on the same event loop share one client, and with
+    it one connection pool. asyncio connections can't be reused across loops,
+    so the shared client is keyed by loop. config.asgi serves GraphQL on each
+    worker's one loop, so that is one pool per worker; only under WSGI (as with
+    runserver), where Django gives every async request a loop of its own,
+    does each request open its own.
+    """
+
+    _clients = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = redis.asyncio.from_url(settings.REDIS_URL, decode_responses=True)
+            self._clients[loop] = client
+        self.redis = client
+
+    async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Retrieve aggregated user energy statistics."""
+        data = await self.redis.get(f"user:{user_id}:energy_stats")
+        return codec.loads(data) if data else None
+
+    async def get_devices_live_data(
+        self, devices: Iterable[Tuple[int, bool]]
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Fetch the latest simulation payload for many devices in one MGET.
+
+        `devices` yields `(device_id, is_storage)` pairs; storage devices are
+        read from their `:storage` key, everything else from `:current`.
+        """
+        devices = list(devices)
+        if not devices:
+            return {}
+        keys = [
+            f"device:{device_id}:{'storage' if is_storage else 'current'}"
+            for device_id, is_storage in devices
+        ]
+        values = await self.redis.mget(keys)
+        return {
+            device_id: codec.loads(value) if value else None
+            for (device_id, _), value in zip(devices, values)
+        }
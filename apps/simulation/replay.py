@@ -0,0 +1,520 @@
+"""
+Offline replay of the simulation over a historical time range.
+
+`FleetReplay` loads the fleet once and keeps it in NumPy arrays grouped by
+device type. Each step applies the same models as the per-device
+simulators to every device of a type at once, with the same per-device
+random draws (`apps.simulation.rng`), and integrates battery and EV charge
+in memory. Live state in `DeviceState` and Redis is never touched.
+
+The fleet can be patched in place (`patch`, or `add`, `remove` and
+`update`), so a long-running holder such as the simulation daemon keeps it
+current without reloading it; devices that did not change keep their
+integrated state. Patched groups keep spare rows, so a patch rewrites only
+the rows it touches.
+
+`ReadingWriter` streams the results into `DeviceReading`: binary COPY
+built straight from the result arrays on PostgreSQL with psycopg 3,
+`bulk_create` elsewhere.
+
+A step at time `t` gives the same values the live pipeline would for the
+tick containing `t`, so a backfill can be checked against the scalar
+simulators (see tests/test_simulation/test_replay.py). Floating-point
+results may differ from them in the last bit where NumPy's transcendental
+functions round differently from `math`.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.db import connection, transaction
+
+from apps.devices.models import Device, DeviceReading, EVMode
+from apps.devices.schedule import FleetSchedules, to_epoch
+from apps.simulation import rng
+from apps.simulation.clouds import CloudField
+from apps.simulation.rng import tick_id_for_timestamp, uniform_array
+from apps.simulation.simulators.registry import GROUPS
+from apps.simulation.simulators.solar import cell_size, declination_trig, solar_elevation, trig
+from apps.simulation.thermal import DUTY_JITTER, ThermalFleet, hvac_power
+
+np = rng.np
+
+
+@dataclass
+class Readings:
+    """One step's results for one device type."""
+
+    device_ids: 'np.ndarray'
+    power_w: 'np.ndarray'
+    flow_w: Optional['np.ndarray'] = None
+    level_wh: Optional['np.ndarray'] = None
+    mode: Optional['np.ndarray'] = None
+
+
+# Attribute holding each device group (stepped by `_<name>`), and the device types in it
+_GROUP_OF = {device_type: name for name, types in GROUPS.items() for device_type in types}
+
+
+def spare_capacity(rows: int) -> int:
+    """Rows to allocate for a group of `rows`, leaving room for patches to add devices."""
+    return rows + rows // 4 + 64
+
+
+def _column(devices, attr):
+    return np.array([getattr(device, attr) for device in devices], dtype=np.float64)
+
+
+def _last_seen(rows):
+    """`last_seen_at` as epoch seconds, NaN where unset."""
+    return np.array([
+        to_epoch(row.last_seen_at) if row.last_seen_at else np.nan for row in rows
+    ], dtype=np.float64)
+
+
+class FleetReplay:
+    """Vectorised, in-memory copy of a fleet that can be stepped through time."""
+
+    def __init__(self, devices: Iterable[Device], seed: Optional[int] = None):
+        if np is None:
+            raise ImportError('NumPy is required for simulation replay')
+        self.seed = seed
+
+        groups = {name: [] for name in GROUPS}
+        for device in devices:
+            name = _GROUP_OF.get(device.get_device_type())
+            if name is not None:
+                groups[name].append(device.get_specific_device())
+
+        self.solar = self._load(groups['solar'], (
+            'latitude', 'longitude', 'panel_area_m2', 'efficiency', 'max_capacity_w',
+        ))
+        # Panels see the sun from the centre of their geometry cache cell, as live
+        cell = cell_size()
+        for attr in ('latitude', 'longitude'):
+            self.solar[f'sun_{attr}'] = (
+                np.round(self.solar[attr] / cell) * cell if cell else self.solar[attr]
+            )
+        self.generator = self._load(groups['generator'], ('rated_output_w',))
+        self.consumption = self._load(groups['consumption'], ('min_power_w', 'max_power_w'))
+        self.thermal = ThermalFleet(groups['consumption'])
+        self.battery = self._load(groups['battery'], (
+            'capacity_kwh', 'current_charge_kwh', 'max_charge_rate_kw', 'max_discharge_rate_kw',
+        ))
+        # Carried through unchanged, so the stored state row can be written back whole
+        states = [device.device_state for device in groups['battery']]
+        self.battery['mode'] = np.array([state.mode for state in states], dtype=object)
+        self.battery['last_seen'] = _last_seen(states)
+        self.ev = self._load(groups['ev'], (
+            'capacity_kwh', 'current_charge_kwh', 'max_charge_rate_kw',
+            'driving_efficiency_kwh_per_hour',
+        ))
+        evs = groups['ev']
+        self.ev['mode'] = np.array([device.mode for device in evs], dtype=object)
+        self.ev['last_seen'] = _last_seen(evs)
+        self.ev['was_away'] = np.array([
+            device.mode == EVMode.OFFLINE and device.last_seen_at is not None for device in evs
+        ], dtype=bool)
+        self.ev['away_mark'] = np.array([
+            device.schedule.away_before(device.last_seen_at) if device.last_seen_at else 0.0
+            for device in evs
+        ], dtype=np.float64)
+        self.ev_schedules = FleetSchedules([device.schedule for device in evs])
+        # Row arrays with spare rows after the group's, that patches fill in place
+        self.buffers: Dict[str, Dict[str, 'np.ndarray']] = {name: {} for name in GROUPS}
+        # Rows each patch rewrote, per group, while a holder such as `FleetShards` collects them
+        self.patched: Optional[Dict[str, List]] = None
+
+    @classmethod
+    def from_rows(cls, rows: Dict[str, dict], schedules: List, seed: Optional[int] = None) -> 'FleetReplay':
+        """A fleet made from already loaded `row_arrays` of each group, as a shard worker holds."""
+        fleet = cls.__new__(cls)
+        fleet.seed = seed
+        fleet.buffers = {name: {} for name in GROUPS}
+        fleet.patched = None
+        fleet.ev_schedules = FleetSchedules([])
+        fleet.ev_schedules.unique = schedules
+        for name in GROUPS:
+            fleet._bind(name, rows[name])
+        return fleet
+
+    @staticmethod
+    def _load(devices: List, attrs) -> dict:
+        columns = {attr: _column(devices, attr) for attr in attrs}
+        columns['id'] = np.array([device.id for device in devices], dtype=np.int64)
+        columns['user_id'] = np.array([device.user_id for device in devices], dtype=np.int64)
+        columns['status'] = np.array([device.status for device in devices], dtype=object)
+        columns['online'] = columns['status'] == 'online'
+        return columns
+
+    def __len__(self):
+        return sum(len(getattr(self, name)['id']) for name in GROUPS)
+
+    def device_ids(self):
+        """Ids of every device in the fleet."""
+        return np.concatenate([getattr(self, name)['id'] for name in GROUPS])
+
+    def row_arrays(self, name: str) -> Dict[str, 'np.ndarray']:
+        """Every array with a row per device of group `name`, its thermal model and schedules included."""
+        arrays = dict(getattr(self, name))
+        if name == 'consumption':
+            arrays.update((f'thermal.{column}', getattr(self.thermal, column)) for column in ThermalFleet.COLUMNS)
+        elif name == 'ev':
+            arrays['schedule'] = self.ev_schedules.index
+        return arrays
+
+    def _bind(self, name: str, arrays: Dict[str, 'np.ndarray']):
+        """Make `arrays` (as from `row_arrays`) the rows of group `name`."""
+        arrays = dict(arrays)
+        if name == 'consumption':
+            self.thermal = ThermalFleet.from_columns(
+                arrays.pop(f'thermal.{column}') for column in ThermalFleet.COLUMNS
+            )
+        elif name == 'ev':
+            self.ev_schedules.index = arrays.pop('schedule')
+        setattr(self, name, arrays)
+
+    def reserve(self, name: str, buffers: Optional[Dict[str, 'np.ndarray']] = None):
+        """
+        Move group `name` into `buffers`, or new ones with spare rows.
+
+        Any row array `buffers` lacks gets a new buffer of the same length.
+        """
+        arrays = self.row_arrays(name)
+        length = len(arrays['id'])
+        buffers = dict(buffers or {})
+        capacity = len(next(iter(buffers.values()))) if buffers else spare_capacity(length)
+        for key, column in arrays.items():
+            if key not in buffers:
+                buffers[key] = np.empty(capacity, dtype=column.dtype)
+            buffers[key][:length] = column
+        self.buffers[name] = buffers
+        self._bind(name, {key: buffer[:length] for key, buffer in buffers.items()})
+
+    def patch(self, removed_ids: Iterable[int] = (), devices: Iterable[Device] = ()) -> int:
+        """
+        Drop devices and add or reload others, in place; returns how many rows changed.
+
+        Reloaded devices are rewritten in their own rows and new ones take
+        the rows of removed ones, then the spare rows after the last; rows
+        still free are filled by moving the last rows down. A patch costs
+        the rows it touches, until a group outgrows its buffers and is
+        moved to bigger ones. Devices not given keep their integrated state.
+        """
+        removed_ids = np.fromiter(removed_ids, dtype=np.int64)
+        loaded = FleetReplay(devices, self.seed)
+        return sum(self._patch_group(name, removed_ids, loaded) for name in GROUPS)
+
+    def _patch_group(self, name: str, removed_ids, loaded: 'FleetReplay') -> int:
+        arrays, new = self.row_arrays(name), loaded.row_arrays(name)
+        length = len(arrays['id'])
+        order = np.argsort(arrays['id'], kind='stable')
+        sorted_ids = arrays['id'][order]
+
+        def rows_of(device_ids):
+            at = np.minimum(np.searchsorted(sorted_ids, device_ids), max(length - 1, 0))
+            found = sorted_ids[at] == device_ids if length else np.zeros(len(device_ids), dtype=bool)
+            return order[at[found]], found
+
+        gone, _ = rows_of(removed_ids)
+        reloaded, found = rows_of(new['id'])
+        fresh = np.flatnonzero(~found)
+        if not len(gone) and not len(new['id']):
+            return 0
+        if name == 'ev':
+            new['schedule'] = self._schedule_index(loaded.ev_schedules)
+
+        reused, holes = gone[:len(fresh)], gone[len(fresh):]
+        appended = len(fresh) - len(reused)
+        new_length = length + appended - len(holes)
+        # Rows past the new end that stay are moved into the holes before it
+        filled = np.sort(holes[holes < new_length])
+        moved = np.setdiff1d(np.arange(new_length, length), holes)
+
+        buffers = self.buffers[name]
+        if not buffers or len(buffers['id']) < new_length or any(
+            length and not np.may_share_memory(column, buffers[key]) for key, column in arrays.items()
+        ):
+            capacity = spare_capacity(max(length, new_length))
+            self.reserve(name, {key: np.empty(capacity, dtype=column.dtype) for key, column in arrays.items()})
+            buffers = self.buffers[name]
+        tail = np.arange(length, length + appended)
+        for key, buffer in buffers.items():
+            buffer[reloaded] = new[key][found]
+            buffer[reused] = new[key][fresh[:len(reused)]]
+            buffer[tail] = new[key][fresh[len(reused):]]
+            buffer[filled] = buffer[moved]
+        self._bind(name, {key: buffer[:new_length] for key, buffer in buffers.items()})
+
+        written = np.concatenate([reloaded, reused, tail, filled])
+        if self.patched is not None:
+            self.patched[name].append(written[written < new_length])
+        return len(gone) + len(new['id'])
+
+    def _schedule_index(self, schedules: FleetSchedules):
+        """`schedules.index` as positions in this fleet's list of distinct schedules, extended as needed."""
+        unique = self.ev_schedules.unique
+        positions = {id(schedule): i for i, schedule in enumerate(unique)}
+        remap = []
+        for schedule in schedules.unique:
+            if id(schedule) not in positions:
+                positions[id(schedule)] = len(unique)
+                unique.append(schedule)
+            remap.append(positions[id(schedule)])
+        return np.array(remap, dtype=np.intp)[schedules.index]
+
+    def remove(self, device_ids: Iterable[int]) -> int:
+        """Drop devices from the fleet; returns how many it held."""
+        return self.patch(removed_ids=device_ids)
+
+    def add(self, devices: Iterable[Device]) -> int:
+        """Append devices, loaded with their current stored state; returns how many."""
+        return self.patch(devices=devices)
+
+    def update(self, devices: Iterable[Device]) -> int:
+        """Reload devices whose rows changed, adding any the fleet doesn't hold."""
+        return self.patch(devices=devices)
+
+    def step(self, timestamp: datetime, elapsed_seconds: float,
+             tick_id: Optional[int] = None) -> List[Readings]:
+        """Simulate every device at naive UTC `timestamp` and advance storage state."""
+        return list(self.step_groups(timestamp, elapsed_seconds, tick_id).values())
+
+    def step_groups(self, timestamp: datetime, elapsed_seconds: float,
+                    tick_id: Optional[int] = None) -> Dict[str, Readings]:
+        """`step`, keyed by the name of each non-empty device group."""
+        if tick_id is None:
+            tick_id = tick_id_for_timestamp(timestamp)
+        results = {}
+        for name in GROUPS:
+            group = getattr(self, name)
+            if len(group['id']):
+                results[name] = getattr(self, f'_{name}')(group, timestamp, elapsed_seconds, tick_id)
+        return results
+
+    def _uniform(self, group, tick_id, low, high):
+        return uniform_array(group['id'], tick_id, low, high, seed=self.seed)
+
+    def _solar(self, group, timestamp, elapsed_seconds, tick_id):
+        elevation = solar_elevation(
+            timestamp, trig(group['sun_latitude']), declination_trig(timestamp), group['sun_longitude']
+        )
+
+        day = group['online'] & (elevation > 0)
+        sin_day = np.sin(np.radians(np.where(day, elevation, 90.0)))
+        air_mass = 1 / sin_day
+        atmospheric_factor = np.where(air_mass < 10, 0.7 ** (air_mass - 1), 0.0)
+        power_w = (
+            1000 * sin_day * atmospheric_factor * group['panel_area_m2'] * group['efficiency']
+            * CloudField(timestamp, self.seed).factor_array(group['latitude'], group['longitude'])
+        )
+        power_w = np.where(day, np.minimum(power_w, group['max_capacity_w']), 0.0)
+        return Readings(group['id'], power_w)
+
+    def _generator(self, group, timestamp, elapsed_seconds, tick_id):
+        variation = self._uniform(group, tick_id, -0.05, 0.05)
+        power_w = np.where(group['online'], group['rated_output_w'] * (1 + variation), 0.0)
+        return Readings(group['id'], power_w)
+
+    def _consumption(self, group, timestamp, elapsed_seconds, tick_id):
+        low, high = group['min_power_w'], group['max_power_w']
+        duty = self.thermal.duty_cycle(
+            timestamp, self._uniform(group, tick_id, -DUTY_JITTER, DUTY_JITTER)
+        )
+        return Readings(group['id'], np.where(group['online'], hvac_power(low, high, duty), 0.0))
+
+    def _battery(self, group, timestamp, elapsed_seconds, tick_id):
+        charge, capacity, online = group['current_charge_kwh'], group['capacity_kwh'], group['online']
+        percentage = (charge / capacity) * 100
+        factor = self._uniform(group, tick_id, 0.5, 1.0)
+
+        charging = online & (percentage < 50)
+        discharging = online & (percentage > 70)
+        charge_rate_kw = factor * group['max_charge_rate_kw']
+        discharge_rate_kw = factor * group['max_discharge_rate_kw']
+
+        new_charge = np.where(
+            charging, np.minimum(capacity, charge + charge_rate_kw * elapsed_seconds / 3600),
+            np.where(
+                discharging, np.maximum(0, charge - discharge_rate_kw * elapsed_seconds / 3600),
+                charge
+            )
+        )
+        flow_w = np.where(
+            charging, charge_rate_kw * 1000,
+            np.where(discharging, -discharge_rate_kw * 1000, 0.0)
+        )
+        group['current_charge_kwh'][:] = new_charge
+        return Readings(group['id'], np.zeros(len(new_charge)), flow_w, new_charge * 1000)
+
+    def _ev(self, group, timestamp, elapsed_seconds, tick_id):
+        # Same closed-form settlement as EVSimulator: the stored charge of an
+        # away car is its charge when it left, at cumulative away time
+        # `away_mark`, and driving since then follows from the schedule.
+        charge, capacity, online = group['current_charge_kwh'], group['capacity_kwh'], group['online']
+        was_away = group['was_away']
+        away_now = self.ev_schedules.away_before(timestamp)
+        away_at_start = self.ev_schedules.away_before(timestamp - timedelta(seconds=elapsed_seconds))
+
+        driven_seconds = np.maximum(0.0, np.where(was_away, away_now - group['away_mark'], away_now - away_at_start))
+        driven_kwh = group['driving_efficiency_kwh_per_hour'] * driven_seconds / 3600
+        settled = np.maximum(0, charge - driven_kwh)
+
+        # Vehicles have their own schedules, so leaving and charging are per-vehicle masks
+        away = online & self.ev_schedules.is_away(timestamp)
+        departing = away & ~was_away
+        connected = online & ~away
+
+        connected_seconds = np.maximum(0.0, elapsed_seconds - np.maximum(0.0, away_now - away_at_start))
+        charging = connected & ((settled / capacity) * 100 < 90)
+        charge_rate_kw = self._uniform(group, tick_id, 0.7, 1.0) * group['max_charge_rate_kw']
+        new_charge = np.where(
+            charging, np.minimum(capacity, settled + charge_rate_kw * connected_seconds / 3600),
+            settled
+        )
+
+        level = np.where(away, settled, np.where(connected, new_charge, charge))
+        flow_w = np.where(charging, charge_rate_kw * 1000, 0.0)
+        # In place: the columns may be rows of a shared buffer
+        group['current_charge_kwh'][:] = np.where(
+            departing, settled, np.where(connected, new_charge, charge)
+        )
+        group['away_mark'][:] = np.where(departing, away_now, group['away_mark'])
+        # As EVSimulator: last seen when it leaves, charges or gets back
+        group['last_seen'][:] = np.where(
+            departing | charging | (connected & was_away), to_epoch(timestamp), group['last_seen']
+        )
+        group['was_away'][:] = (was_away | departing) & ~connected
+        group['mode'][:] = np.where(
+            away, EVMode.OFFLINE.value, np.where(connected, EVMode.CHARGING.value, group['mode'])
+        )
+
+        return Readings(group['id'], np.zeros(len(level)), flow_w, level * 1000, group['mode'])
+
+    def run(self, start: datetime, end: datetime, step_seconds: float) -> Iterator:
+        """Yield `(timestamp, readings)` for every step in [start, end)."""
+        step = timedelta(seconds=step_seconds)
+        timestamp = start
+        while timestamp < end:
+            yield timestamp, self.step(timestamp, step_seconds)
+            timestamp += step
+
+
+# PostgreSQL binary COPY framing: signature, flags and header extension, and the trailer
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + bytes(8)
+COPY_TRAILER = b'\xff\xff'
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def copy_rows(device_ids, timestamp: datetime, power_w, flow_w=None, level_wh=None, mode: str = '') -> bytes:
+    """
+    Binary COPY rows of `DeviceReading` for readings sharing a timestamp and mode.
+
+    Every row then has the same layout (field count, then length and value of
+    each column), so the rows are one structured array filled a column at a
+    time and no Python runs per row.
+    """
+    encoded = mode.encode()
+    layout = [('fields', '>i2'), ('id_size', '>i4'), ('id', '>i8'), ('timestamp_size', '>i4'),
+              ('timestamp', '>i8'), ('power_size', '>i4'), ('power', '>f8')]
+    optional = (('flow', flow_w), ('level', level_wh), ('mode', encoded or None))
+    for name, values in optional:
+        layout.append((f'{name}_size', '>i4'))
+        if values is not None:
+            layout.append((name, f'S{len(encoded)}' if name == 'mode' else '>f8'))
+
+    rows = np.empty(len(device_ids), dtype=layout)
+    rows['fields'] = len(ReadingWriter.columns)
+    rows['id_size'], rows['id'] = 8, device_ids
+    rows['timestamp_size'] = 8
+    rows['timestamp'] = (timestamp - _PG_EPOCH) // timedelta(microseconds=1)
+    rows['power_size'], rows['power'] = 8, power_w
+    for name, values in optional:
+        if values is None:
+            # NULL, or the empty mode
+            rows[f'{name}_size'] = 0 if name == 'mode' else -1
+        else:
+            rows[f'{name}_size'] = len(encoded) if name == 'mode' else 8
+            rows[name] = values
+    return rows.tobytes()
+
+
+class ReadingWriter:
+    """Buffers replay results and writes them to `DeviceReading` in bulk."""
+
+    columns = ('device_id', 'timestamp', 'power_w', 'flow_w', 'level_wh', 'mode')
+
+    def __init__(self, batch_size: int = 50000):
+        self.batch_size = batch_size
+        # (timestamp, Readings) per step and device type, written a block at a time
+        self.blocks = []
+        self.pending = 0
+        self.written = 0
+
+    @staticmethod
+    def copy_supported() -> bool:
+        return connection.vendor == 'postgresql' and connection.Database.__name__ == 'psycopg'
+
+    def add(self, timestamp: datetime, readings: List[Readings]):
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+        for group in readings:
+            # Sharded steps return views that the next step overwrites
+            self.blocks.append((timestamp, Readings(*(
+                None if column is None else column.copy()
+                for column in (group.device_ids, group.power_w, group.flow_w, group.level_wh, group.mode)
+            ))))
+            self.pending += len(group.device_ids)
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.blocks:
+            return
+        if self.copy_supported():
+            self._copy()
+        else:
+            DeviceReading.objects.bulk_create(
+                [DeviceReading(**dict(zip(self.columns, row))) for row in self._rows()],
+                batch_size=5000
+            )
+        self.written += self.pending
+        self.blocks, self.pending = [], 0
+
+    def _rows(self):
+        for timestamp, group in self.blocks:
+            count = len(group.device_ids)
+            flow_w = group.flow_w.tolist() if group.flow_w is not None else [None] * count
+            level_wh = group.level_wh.tolist() if group.level_wh is not None else [None] * count
+            mode = group.mode.tolist() if group.mode is not None else [''] * count
+            yield from zip(
+                group.device_ids.tolist(), [timestamp] * count, group.power_w.tolist(),
+                flow_w, level_wh, mode,
+            )
+
+    @staticmethod
+    def _block(timestamp, group) -> bytes:
+        if group.mode is None:
+            return copy_rows(group.device_ids, timestamp, group.power_w, group.flow_w, group.level_wh)
+        # One run of rows per mode, each with a fixed layout
+        parts = []
+        for mode in np.unique(group.mode).tolist():
+            rows = group.mode == mode
+            parts.append(copy_rows(
+                group.device_ids[rows], timestamp, group.power_w[rows],
+                None if group.flow_w is None else group.flow_w[rows],
+                None if group.level_wh is None else group.level_wh[rows], mode,
+            ))
+        return b''.join(parts)
+
+    def _copy(self):
+        qn = connection.ops.quote_name
+        column_list = ', '.join(qn(column) for column in self.columns)
+        with transaction.atomic(), connection.cursor() as cursor:
+            with cursor.cursor.copy(
+                f'COPY {qn(DeviceReading._meta.db_table)} ({column_list}) FROM STDIN (FORMAT BINARY)'
+            ) as copy:
+                copy.write(COPY_HEADER)
+                for timestamp, group in self.blocks:
+                    copy.write(self._block(timestamp, group))
+                copy.write(COPY_TRAILER)
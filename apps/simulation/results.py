@@ -0,0 +1,162 @@
+"""
+Simulation result records.
+
+Simulators return a `DeviceResult` (production and consumption devices) or
+a `StorageResult` (batteries and EVs) rather than a dict. Both are slotted,
+so a result is a handful of pointers with no per-instance dict, and they
+are encoded straight to the JSON stored in Redis without building an
+intermediate dict:
+
+- the tick's timestamp is formatted once and shared by every result of the
+  tick (`format_timestamp`), along with its encoded JSON fragment;
+- `to_json()` writes the `device:{id}:current` payload and
+  `storage_json()` the `device:{id}:storage` payload; both decode to
+  exactly what `codec.dumps` of the equivalent dict would. A caller holding
+  a whole tick's results in arrays (the simulation daemon) encodes the same
+  payloads straight from them with `current_payloads` and
+  `storage_payloads`, without a record per device.
+
+Results still read like the dicts they replace (`result['power_w']`,
+`'mode' in result`, `result.get(...)`, `to_dict()`), so callers and tests
+don't care which they get.
+"""
+
+import math
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from apps.simulation import codec
+
+
+@lru_cache(maxsize=16)
+def format_timestamp(timestamp: datetime) -> str:
+    """ISO timestamp of a tick; formatted once however many devices share it."""
+    return timestamp.isoformat()
+
+
+@lru_cache(maxsize=64)
+def _string(value: str) -> bytes:
+    # Timestamps, statuses and modes: a few distinct values per tick
+    return codec.dumps(value)
+
+
+def _number(value: float) -> bytes:
+    # repr is the shortest round-tripping form, as codec.dumps writes it;
+    # non-finite values become null, as with orjson
+    return repr(float(value)).encode() if math.isfinite(value) else b'null'
+
+
+_CURRENT_JSON = b'{"device_id":%d,"power_w":%b,"timestamp":%b,"status":%b}'
+_STORAGE_JSON = b'{"capacity_wh":%b,"current_level_wh":%b,"flow_w":%b,"timestamp":%b,"status":%b%b}'
+
+
+def _mode(mode: Optional[str]) -> bytes:
+    return b',"mode":%b' % _string(mode) if mode is not None else b''
+
+
+class DeviceResult:
+    """One device's result for one tick."""
+
+    __slots__ = ('device_id', 'power_w', 'timestamp', 'status')
+    fields = __slots__
+
+    def __init__(self, device_id: int, power_w: float, timestamp: str, status: str):
+        self.device_id = device_id
+        self.power_w = power_w
+        self.timestamp = timestamp
+        self.status = status
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.fields and getattr(self, key, None) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in self.fields if field in self)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self else default
+
+    def keys(self):
+        return list(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self}
+
+    def __eq__(self, other):
+        if isinstance(other, DeviceResult):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_json(self) -> bytes:
+        """The `device:{id}:current` payload."""
+        return _CURRENT_JSON % (
+            self.device_id, _number(self.power_w), _string(self.timestamp), _string(self.status),
+        )
+
+
+class StorageResult(DeviceResult):
+    """A battery's or EV's result; `mode` is only set for EVs."""
+
+    __slots__ = ('capacity_wh', 'current_level_wh', 'flow_w', 'mode')
+    fields = DeviceResult.fields + __slots__
+
+    def __init__(self, device_id: int, power_w: float, timestamp: str, status: str,
+                 capacity_wh: float, current_level_wh: float, flow_w: float,
+                 mode: Optional[str] = None):
+        super().__init__(device_id, power_w, timestamp, status)
+        self.capacity_wh = capacity_wh
+        self.current_level_wh = current_level_wh
+        self.flow_w = flow_w
+        self.mode = mode
+
+    def storage_payload(self) -> Dict[str, Any]:
+        payload = {
+            'capacity_wh': self.capacity_wh,
+            'current_level_wh': self.current_level_wh,
+            'flow_w': self.flow_w,
+            'timestamp': self.timestamp,
+            'status': self.status,
+        }
+        if self.mode is not None:
+            payload['mode'] = self.mode
+        return payload
+
+    def storage_json(self) -> bytes:
+        """The `device:{id}:storage` payload."""
+        return _STORAGE_JSON % (
+            _number(self.capacity_wh), _number(self.current_level_wh), _number(self.flow_w),
+            _string(self.timestamp), _string(self.status), _mode(self.mode),
+        )
+
+
+def current_payloads(device_ids: Sequence[int], power_w: Sequence[float], timestamp: str,
+                     statuses: Sequence[str]) -> List[bytes]:
+    """`DeviceResult.to_json` of many devices sharing a tick's `timestamp`."""
+    stamp = _string(timestamp)
+    return [
+        _CURRENT_JSON % (device_id, _number(power), stamp, _string(status))
+        for device_id, power, status in zip(device_ids, power_w, statuses)
+    ]
+
+
+def storage_payloads(capacity_wh: Sequence[float], current_level_wh: Sequence[float],
+                     flow_w: Sequence[float], timestamp: str, statuses: Sequence[str],
+                     modes: Optional[Sequence[Optional[str]]] = None) -> List[bytes]:
+    """`StorageResult.storage_json` of many devices sharing a tick's `timestamp`."""
+    stamp = _string(timestamp)
+    if modes is None:
+        modes = [None] * len(statuses)
+    return [
+        _STORAGE_JSON % (_number(capacity), _number(level), _number(flow), stamp, _string(status), _mode(mode))
+        for capacity, level, flow, status, mode in zip(capacity_wh, current_level_wh, flow_w, statuses, modes)
+    ]
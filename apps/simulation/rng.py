@@ -0,0 +1,131 @@
+"""
+Counter-based random numbers for the simulators.
+
+Each value is a pure function of `(seed, device_id, tick_id, draw)`, hashed
+with the SplitMix64 finaliser. There is no generator state to share, so a
+device's tick produces the same numbers whichever worker or process runs it
+and in whatever order, and a whole batch can be drawn at once as NumPy
+arrays that are bit-identical to the scalar values:
+
+    rng = DeviceRandom(device_id, tick_id)
+    rng.uniform(0.5, 1.0)                               # draw 0
+    rng.uniform(0.5, 1.0)                               # draw 1
+
+    uniform_array(device_ids, tick_id, 0.5, 1.0)        # draw 0 for each device
+
+The seed comes from the SIMULATION_SEED setting unless given explicitly.
+NumPy is optional; only the array functions need it.
+"""
+
+import calendar
+from datetime import datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+from apps.simulation.ticks import tick_id_for
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+# 53 random bits fill a double's mantissa exactly
+_UNIT = 2.0 ** -53
+
+
+def default_seed() -> int:
+    return int(getattr(settings, 'SIMULATION_SEED', 0)) & MASK64
+
+
+def tick_id_for_timestamp(timestamp: datetime, seconds: Optional[int] = None) -> int:
+    """Tick id of a naive UTC timestamp, for callers that don't pass one."""
+    return tick_id_for(calendar.timegm(timestamp.utctimetuple()), seconds)
+
+
+def _mix(z: int) -> int:
+    z = (z + _GOLDEN) & MASK64
+    z = ((z ^ (z >> 30)) * _MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def random_bits(seed: int, device_id: int, tick_id: int, draw: int) -> int:
+    """64 random bits for one `(seed, device_id, tick_id, draw)` key."""
+    z = _mix(seed & MASK64)
+    z = _mix(z ^ (device_id & MASK64))
+    z = _mix(z ^ (tick_id & MASK64))
+    return _mix(z ^ (draw & MASK64))
+
+
+def random_float(seed: int, device_id: int, tick_id: int, draw: int) -> float:
+    """A float in [0, 1) for one key."""
+    return (random_bits(seed, device_id, tick_id, draw) >> 11) * _UNIT
+
+
+class DeviceRandom:
+    """
+    The random stream of one device during one tick.
+
+    Successive calls use successive draw numbers, so a simulator that makes
+    the same calls in the same order always gets the same values.
+    """
+
+    def __init__(self, device_id: int, tick_id: int, seed: Optional[int] = None):
+        self.device_id = device_id
+        self.tick_id = tick_id
+        self.seed = default_seed() if seed is None else seed & MASK64
+        self.draw = 0
+
+    def random(self) -> float:
+        value = random_float(self.seed, self.device_id, self.tick_id, self.draw)
+        self.draw += 1
+        return value
+
+    def uniform(self, low: float, high: float) -> float:
+        return low + (high - low) * self.random()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('NumPy is required for batched random draws')
+
+
+def _mix_array(z):
+    z = z + np.uint64(_GOLDEN)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+def random_bits_array(device_ids: Iterable[int], tick_id: int, draw: int = 0,
+                      seed: Optional[int] = None):
+    """`random_bits` for many devices at once, as a uint64 array."""
+    _require_numpy()
+    seed = default_seed() if seed is None else seed & MASK64
+    if not isinstance(device_ids, np.ndarray):
+        device_ids = list(device_ids)
+    ids = np.asarray(device_ids).astype(np.uint64)
+    # uint64 arithmetic wraps modulo 2**64 exactly like the masked scalar code
+    z = _mix_array(np.full(ids.shape, seed, dtype=np.uint64))
+    z = _mix_array(z ^ ids)
+    z = _mix_array(z ^ np.uint64(tick_id & MASK64))
+    return _mix_array(z ^ np.uint64(draw & MASK64))
+
+
+def random_array(device_ids: Iterable[int], tick_id: int, draw: int = 0,
+                 seed: Optional[int] = None):
+    """Floats in [0, 1), bit-identical to `DeviceRandom` draw `draw`."""
+    bits = random_bits_array(device_ids, tick_id, draw, seed)
+    return (bits >> np.uint64(11)).astype(np.float64) * _UNIT
+
+
+def uniform_array(device_ids: Iterable[int], tick_id: int, low: float, high: float,
+                  draw: int = 0, seed: Optional[int] = None):
+    """`DeviceRandom.uniform` for many devices at once."""
+    return low + (high - low) * random_array(device_ids, tick_id, draw, seed)
@@ -0,0 +1,350 @@
+"""
+Multi-process stepping of a `FleetReplay`.
+
+One process steps the fleet only as fast as NumPy runs on one core.
+`FleetShards` splits it across forked worker processes by a hash of the
+user id, so a household's devices always share a shard:
+
+- every numeric row array (device parameters, the thermal model, schedule
+  positions and storage state) is moved once into a
+  `multiprocessing.shared_memory` block, with spare rows after each group,
+  and the fleet's own arrays become views of it. Workers map the same block
+  and hold the positions of their shard's rows;
+- a tick sends workers only its timestamp. Each steps its rows and writes
+  the state it advanced and its readings back into the block, so the
+  results arrive merged, in fleet order, and are written out once; only EV
+  modes, which are strings and can't live in shared memory, come back;
+- patches (`FleetReplay.patch`) write their rows straight into the block.
+  The next step sends workers just the rows that changed, with their string
+  fields and any new schedules. Only a group outgrowing its spare rows
+  moves the fleet to a new block.
+
+Workers never touch the database or Redis.
+"""
+
+import traceback
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+
+from apps.simulation.replay import GROUPS, FleetReplay, Readings, spare_capacity
+from apps.simulation.rng import np, tick_id_for_timestamp
+
+# Result columns each group's readings fill in
+READING_FIELDS = {
+    'solar': ('power_w',),
+    'generator': ('power_w',),
+    'consumption': ('power_w',),
+    'battery': ('power_w', 'flow_w', 'level_wh'),
+    'ev': ('power_w', 'flow_w', 'level_wh'),
+}
+# Columns a step advances, which workers write back for their rows
+STEP_FIELDS = {
+    'battery': ('current_charge_kwh',),
+    'ev': ('current_charge_kwh', 'away_mark', 'last_seen', 'was_away', 'mode'),
+}
+_ALIGNMENT = 64
+# 2**64 / golden ratio: consecutive user ids land on different shards
+_FIBONACCI = 0x9E3779B97F4A7C15
+
+
+class ShardError(Exception):
+    """A shard worker failed or exited; carries its traceback."""
+
+
+def shard_of(user_ids, shards: int):
+    """The shard of each user id, by Fibonacci hashing."""
+    hashed = (np.asarray(user_ids, dtype=np.int64).astype(np.uint64) * np.uint64(_FIBONACCI)) >> np.uint64(32)
+    return (hashed % np.uint64(shards)).astype(np.intp)
+
+
+def _shard_rows(rows, written, length: int, user_ids, shard: int, shards: int):
+    """A shard's `rows` of a group after a patch rewrote `written` and left it `length` long."""
+    kept = rows[(rows < length) & ~np.isin(rows, written)]
+    return np.union1d(kept, written[shard_of(user_ids[written], shards) == shard])
+
+
+def _views(block: SharedMemory, layout: Dict[tuple, tuple]) -> Dict[tuple, 'np.ndarray']:
+    """Arrays over `block`, every row of each group's capacity."""
+    return {
+        key: np.ndarray(capacity, dtype=dtype, buffer=block.buf, offset=offset)
+        for key, (offset, dtype, capacity) in layout.items()
+    }
+
+
+def _allocate(dtypes: Dict[tuple, str], capacity: Dict[str, int]):
+    """A new shared block with `capacity` rows of each group; returns (block, layout, views)."""
+    layout, size = {}, 0
+    for key, dtype in dtypes.items():
+        layout[key] = (size, dtype, capacity[key[1]])
+        size += -(-capacity[key[1]] * np.dtype(dtype).itemsize // _ALIGNMENT) * _ALIGNMENT
+    block = SharedMemory(create=True, size=max(size, 1))
+    return block, layout, _views(block, layout)
+
+
+# Worker side
+
+class _Shard:
+    """A worker's view of the shared fleet, stepping the rows of one shard."""
+
+    def __init__(self, name, layout, lengths, objects, schedules, seed, shard, shards):
+        self.block = SharedMemory(name=name)
+        self.views = _views(self.block, layout)
+        self.lengths, self.schedules, self.seed = lengths, schedules, seed
+        self.shard, self.shards = shard, shards
+        # String columns of every row, at the block's capacity
+        self.objects = {}
+        for group, columns in objects.items():
+            capacity = len(self.views[('group', group, 'id')])
+            self.objects[group] = {}
+            for key, column in columns.items():
+                self.objects[group][key] = np.empty(capacity, dtype=object)
+                self.objects[group][key][:len(column)] = column
+        self.rows = {
+            group: np.flatnonzero(shard_of(self._column(group, 'user_id'), shards) == shard)
+            for group in GROUPS
+        }
+        self._gather()
+
+    def _column(self, group, key):
+        """Every row of a column of `group`, from the block or the string columns."""
+        columns = self.objects[group]
+        column = columns[key] if key in columns else self.views[('group', group, key)]
+        return column[:self.lengths[group]]
+
+    def _gather(self):
+        """Copy this shard's rows out of the block into the fleet it steps."""
+        rows = {}
+        for group in GROUPS:
+            keys = [key[2] for key in self.views if key[:2] == ('group', group)] + list(self.objects[group])
+            rows[group] = {key: self._column(group, key)[self.rows[group]] for key in keys}
+        self.replay = FleetReplay.from_rows(rows, self.schedules, self.seed)
+
+    def patch(self, changes, schedules):
+        self.schedules.extend(schedules)
+        for group, (length, written, objects) in changes.items():
+            self.lengths[group] = length
+            for key, values in objects.items():
+                self.objects[group][key][written] = values
+            self.rows[group] = _shard_rows(
+                self.rows[group], written, length, self._column(group, 'user_id'), self.shard, self.shards
+            )
+        self._gather()
+
+    def step(self, timestamp, elapsed_seconds, tick_id):
+        readings = self.replay.step_groups(timestamp, elapsed_seconds, tick_id)
+        for group, fields in STEP_FIELDS.items():
+            rows, columns = self.rows[group], getattr(self.replay, group)
+            for field in fields:
+                self._column(group, field)[rows] = columns[field]
+        for group, result in readings.items():
+            for field in READING_FIELDS[group]:
+                self.views[('out', group, field)][self.rows[group]] = getattr(result, field)
+        return self.replay.ev['mode']
+
+    def close(self):
+        self.replay = self.views = None
+        self.block.close()
+
+
+def _serve(connection):
+    """Worker loop: attach to the shared fleet, then step this shard on request."""
+    shard = None
+    while True:
+        message = connection.recv()
+        try:
+            if message[0] == 'attach':
+                if shard is not None:
+                    shard.close()
+                shard = None
+                shard = _Shard(*message[1:])
+                reply = None
+            elif message[0] == 'patch':
+                reply = shard.patch(*message[1:])
+            elif message[0] == 'step':
+                reply = shard.step(*message[1:])
+            else:
+                break
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+        else:
+            connection.send(('ok', reply))
+    if shard is not None:
+        shard.close()
+
+
+# Parent side
+
+class FleetShards:
+    """Steps a `FleetReplay` in `processes` worker processes over shared memory."""
+
+    def __init__(self, processes: int):
+        if np is None:
+            raise ImportError('NumPy is required for sharded simulation')
+        self.processes = processes
+        self._workers: List[tuple] = []
+        self._block: Optional[SharedMemory] = None
+        self._retired: List[SharedMemory] = []
+        self._fleet: Optional[FleetReplay] = None
+        self._schedules: Optional[list] = None
+        self._sent_schedules = 0
+        # Positions of each shard's rows, per group
+        self._rows: Dict[str, List['np.ndarray']] = {}
+        self._views: Dict[tuple, 'np.ndarray'] = {}
+
+    def _stale(self, fleet: FleetReplay) -> bool:
+        """Whether `fleet` isn't the one in the block, or was moved out of it."""
+        return fleet is not self._fleet or fleet.ev_schedules.unique is not self._schedules or any(
+            fleet.buffers[key[1]].get(key[2]) is not view for key, view in self._views.items() if key[0] == 'group'
+        )
+
+    def _share(self, fleet: FleetReplay):
+        """Move the fleet's numeric row arrays into a new block, with spare rows."""
+        dtypes, capacity, objects = {}, {}, {}
+        for name in GROUPS:
+            arrays = fleet.row_arrays(name)
+            capacity[name] = spare_capacity(len(arrays['id']))
+            objects[name] = {}
+            for key, column in arrays.items():
+                if column.dtype.kind == 'O':
+                    objects[name][key] = column
+                else:
+                    dtypes[('group', name, key)] = column.dtype.str
+            for field in READING_FIELDS[name]:
+                dtypes[('out', name, field)] = np.dtype(np.float64).str
+        block, layout, views = _allocate(dtypes, capacity)
+        for name in GROUPS:
+            fleet.reserve(name, {key[2]: view for key, view in views.items() if key[:2] == ('group', name)})
+
+        # Forked after the first block exists, so workers share its resource tracker
+        self._start()
+        lengths = {name: len(getattr(fleet, name)['id']) for name in GROUPS}
+        schedules = list(fleet.ev_schedules.unique)
+        for shard, (_, connection) in enumerate(self._workers):
+            connection.send((
+                'attach', block.name, layout, lengths, objects, schedules, fleet.seed, shard, self.processes,
+            ))
+        self._replies()
+
+        if self._block is not None:
+            self._retire(self._block)
+        self._block, self._views = block, views
+        self._rows = {
+            name: [
+                np.flatnonzero(shard_of(getattr(fleet, name)['user_id'], self.processes) == shard)
+                for shard in range(self.processes)
+            ]
+            for name in GROUPS
+        }
+        self._fleet, self._schedules, self._sent_schedules = fleet, fleet.ev_schedules.unique, len(schedules)
+        fleet.patched = {name: [] for name in GROUPS}
+
+    def _send_patches(self, fleet: FleetReplay):
+        """Send workers the rows patched into the block since the last step."""
+        changes = {}
+        for name in GROUPS:
+            if not fleet.patched[name]:
+                continue
+            group = getattr(fleet, name)
+            length = len(group['id'])
+            written = np.unique(np.concatenate(fleet.patched[name]))
+            written = written[written < length]
+            fleet.patched[name] = []
+            objects = {key: column[written] for key, column in group.items() if column.dtype.kind == 'O'}
+            changes[name] = (length, written, objects)
+            self._rows[name] = [
+                _shard_rows(rows, written, length, group['user_id'], shard, self.processes)
+                for shard, rows in enumerate(self._rows[name])
+            ]
+        schedules = self._schedules[self._sent_schedules:]
+        self._sent_schedules = len(self._schedules)
+        for _, connection in self._workers:
+            connection.send(('patch', changes, schedules))
+        self._replies()
+
+    def _start(self):
+        context = get_context('fork')
+        while len(self._workers) < self.processes:
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._workers.append((process, parent))
+
+    def _replies(self) -> list:
+        replies = []
+        for process, connection in self._workers:
+            try:
+                replies.append(connection.recv())
+            except EOFError:
+                replies.append(('error', f'Shard worker {process.pid} exited ({process.exitcode})'))
+        errors = [value for status, value in replies if status == 'error']
+        if errors:
+            raise ShardError(errors[0])
+        return [value for _, value in replies]
+
+    def _retire(self, block: SharedMemory):
+        block.unlink()
+        self._retired.append(block)
+        self._close_retired()
+
+    def _close_retired(self):
+        # A block can't be unmapped while arrays over it are still alive
+        still_open = []
+        for block in self._retired:
+            try:
+                block.close()
+            except BufferError:
+                still_open.append(block)
+        self._retired = still_open
+
+    def step_groups(self, fleet: FleetReplay, timestamp, elapsed_seconds: float,
+                    tick_id: Optional[int] = None) -> Dict[str, Readings]:
+        """
+        `FleetReplay.step_groups`, run across the shards.
+
+        The readings are views of the shared block, valid until the next step.
+        """
+        if tick_id is None:
+            tick_id = tick_id_for_timestamp(timestamp)
+        if self._stale(fleet):
+            self._share(fleet)
+        elif any(fleet.patched.values()):
+            self._send_patches(fleet)
+        for _, connection in self._workers:
+            connection.send(('step', timestamp, elapsed_seconds, tick_id))
+        ev_modes = fleet.ev['mode']
+        for rows, modes in zip(self._rows['ev'], self._replies()):
+            ev_modes[rows] = modes
+
+        results = {}
+        for name in GROUPS:
+            group = getattr(fleet, name)
+            length = len(group['id'])
+            if length:
+                fields = {field: self._views[('out', name, field)][:length] for field in READING_FIELDS[name]}
+                results[name] = Readings(group['id'], mode=ev_modes if name == 'ev' else None, **fields)
+        return results
+
+    def close(self):
+        """Stop the workers and free the shared block; the fleet keeps private copies."""
+        for _, connection in self._workers:
+            try:
+                connection.send(('stop',))
+            except OSError:
+                pass
+        for process, connection in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self._workers = []
+
+        if self._fleet is not None and not self._stale(self._fleet):
+            for name in GROUPS:
+                self._fleet.reserve(name)
+            self._fleet.patched = None
+        self._views, self._fleet, self._schedules, self._rows = {}, None, None, {}
+        if self._block is not None:
+            self._retire(self._block)
+            self._block = None
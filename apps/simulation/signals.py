@@ -0,0 +1,44 @@
+"""Signal handlers for the simulation app."""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from redis.exceptions import RedisError
+
+from apps.devices.models import DeviceChange, DeviceState
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.state import RedisStateStore, write_behind_enabled
+
+
+@receiver(post_save, sender=DeviceState)
+def write_through_live_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Make edits made through the models (API, admin) win over Redis state.
+
+    Only the saved fields are copied, so the rest of the live state stays
+    as the simulation left it. Simulation writes use bulk queries and never
+    trigger this.
+    """
+    if write_behind_enabled() and not raw:
+        RedisStateStore().write_through(instance, update_fields)
+
+
+@receiver(post_save, sender=DeviceChange)
+def announce_device_change(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Publish change feed entries once committed, if DEVICE_CHANGE_NOTIFY is set.
+
+    Only a hint for consumers to poll the feed sooner: a lost message delays
+    a change by one poll, so Redis errors aren't raised into the commit.
+    """
+    if not created or raw or not getattr(settings, 'DEVICE_CHANGE_NOTIFY', False):
+        return
+
+    def publish():
+        try:
+            RedisClient().publish_device_change(instance.id, instance.device_id, instance.operation)
+        except RedisError:
+            pass
+
+    transaction.on_commit(publish)
@@ -2,21 +2,53 @@
 
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Dict, Any
+from typing import List, Optional
+from apps.simulation.results import DeviceResult, StorageResult, format_timestamp
+from apps.simulation.rng import DeviceRandom, tick_id_for_timestamp
+from apps.simulation.state import ImmediateStateWriter
+from apps.simulation.ticks import tick_watermark
+
+# Simulated time covered by one tick unless the caller says otherwise
+DEFAULT_ELAPSED_SECONDS = 60.0
+
+
+class TickAlreadyApplied(Exception):
+    """Raised when a storage device has already integrated the given tick."""
 
 
 class BaseSimulator(ABC):
     """Base class for all device simulators."""
 
-    def __init__(self, device):
+    def __init__(self, device, state_writer=None):
+        self.bind(device, state_writer)
+        self.prepare()
+
+    def bind(self, device, state_writer=None):
+        """Point a (possibly long-lived) simulator at the latest row of its device."""
         self.device = device
+        # Where storage simulators send their state changes
+        self.state_writer = state_writer or ImmediateStateWriter()
+
+    def prepare(self):
+        """
+        Precompute constants from the device's configuration.
+
+        Runs once per simulator; a pooled simulator keeps them until the
+        device is edited (see `simulators.registry.SimulatorPool`).
+        """
 
     @abstractmethod
-    def simulate(self, timestamp: datetime) -> Dict[str, Any]:
+    def simulate(self, timestamp: datetime,
+                 elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                 tick_id: Optional[int] = None) -> DeviceResult:
         """
         Simulate device behavior at given timestamp.
 
-        Returns a dictionary with simulation results:
+        `elapsed_seconds` is the real time since the previous tick; devices
+        that integrate state (batteries, EVs) advance by that much, at most
+        once per `tick_id`.
+
+        Returns a result record (`apps.simulation.results`), read like a dict:
         {
             'power_w': float,  # Current power (+ for production/consumption, - for discharging)
             'timestamp': str,  # ISO format timestamp
@@ -26,11 +58,38 @@ class BaseSimulator(ABC):
         """
         pass
 
-    def get_base_data(self, timestamp: datetime, power_w: float) -> Dict[str, Any]:
+    @classmethod
+    def simulate_batch(cls, simulators: List['BaseSimulator'], timestamp: datetime,
+                       elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                       tick_id: Optional[int] = None) -> List[DeviceResult]:
+        """Simulate several devices of this type; vectorised where a subclass can."""
+        return [simulator.simulate(timestamp, elapsed_seconds, tick_id) for simulator in simulators]
+
+    def write_state(self, delta_kwh: float, timestamp: datetime, tick_id: Optional[int], **fields):
+        """Record a charge change and state fields, once per tick (unconditionally without one)."""
+        watermark = tick_watermark(timestamp) if tick_id is not None else None
+        if not self.state_writer.apply(self.device, delta_kwh, watermark, **fields):
+            raise TickAlreadyApplied(tick_id)
+
+    def random(self, timestamp: datetime, tick_id: Optional[int]) -> DeviceRandom:
+        """
+        The device's random stream for this tick.
+
+        Keyed by device and tick rather than drawn from a shared generator,
+        so results don't depend on which worker runs the device or when.
+        """
+        if tick_id is None:
+            tick_id = tick_id_for_timestamp(timestamp)
+        return DeviceRandom(self.device.id, tick_id)
+
+    def get_base_data(self, timestamp: datetime, power_w: float) -> DeviceResult:
         """Get base data common to all devices."""
-        return {
-            'device_id': self.device.id,
-            'power_w': power_w,
-            'timestamp': timestamp.isoformat(),
-            'status': self.device.status,
-        }
+        return DeviceResult(self.device.id, power_w, format_timestamp(timestamp), self.device.status)
+
+    def get_storage_data(self, timestamp: datetime, capacity_wh: float, current_level_wh: float,
+                         flow_w: float, mode: Optional[str] = None) -> StorageResult:
+        """Result of a storage device; power_w is not used for storage."""
+        return StorageResult(
+            self.device.id, 0.0, format_timestamp(timestamp), self.device.status,
+            capacity_wh, current_level_wh, flow_w, mode,
+        )
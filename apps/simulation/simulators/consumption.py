@@ -1,24 +1,52 @@
 """Consumption device simulators."""
 
-import random
 from datetime import datetime
-from typing import Dict, Any
-from .base import BaseSimulator
+from typing import List, Optional
+from apps.simulation.results import DeviceResult, format_timestamp
+from apps.simulation.rng import np, tick_id_for_timestamp, uniform_array
+from apps.simulation.thermal import DUTY_JITTER, ThermalFleet, duty_cycle, hvac_power
+from .base import BaseSimulator, DEFAULT_ELAPSED_SECONDS
 
 
 class ConsumptionSimulator(BaseSimulator):
-    """Simulates consumption devices (AC, Heater) with variable power."""
+    """Simulates consumption devices (AC, Heater) driven by the weather."""
 
-    def simulate(self, timestamp: datetime) -> Dict[str, Any]:
-        """Generate variable power consumption within min/max range."""
+    def simulate(self, timestamp: datetime,
+                 elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                 tick_id: Optional[int] = None) -> DeviceResult:
+        """Draw power in the min/max range according to the heating or cooling demand (none without)."""
 
         if self.device.status != 'online':
             return self.get_base_data(timestamp, 0.0)
 
-        # Random power within min and max range
-        power_w = random.uniform(
-            self.device.min_power_w,
-            self.device.max_power_w
-        )
+        jitter = self.random(timestamp, tick_id).uniform(-DUTY_JITTER, DUTY_JITTER)
+        duty = duty_cycle(self.device, timestamp, jitter)
+        power_w = hvac_power(self.device.min_power_w, self.device.max_power_w, duty)
 
         return self.get_base_data(timestamp, power_w)
+
+    @classmethod
+    def simulate_batch(cls, simulators: List['ConsumptionSimulator'], timestamp: datetime,
+                       elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                       tick_id: Optional[int] = None) -> List[DeviceResult]:
+        """`simulate` for many devices in one vectorised pass (one at a time without NumPy)."""
+        if np is None or len(simulators) < 2:
+            return super().simulate_batch(simulators, timestamp, elapsed_seconds, tick_id)
+        if tick_id is None:
+            tick_id = tick_id_for_timestamp(timestamp)
+
+        devices = [simulator.device for simulator in simulators]
+        ids = [device.id for device in devices]
+        low = np.array([device.min_power_w for device in devices], dtype=np.float64)
+        high = np.array([device.max_power_w for device in devices], dtype=np.float64)
+        online = np.array([device.status == 'online' for device in devices], dtype=bool)
+
+        duty = ThermalFleet(devices).duty_cycle(
+            timestamp, uniform_array(ids, tick_id, -DUTY_JITTER, DUTY_JITTER)
+        )
+        power_w = np.where(online, hvac_power(low, high, duty), 0.0)
+        stamp = format_timestamp(timestamp)
+        return [
+            DeviceResult(device.id, power, stamp, device.status)
+            for device, power in zip(devices, power_w.tolist())
+        ]
@@ -1,16 +1,17 @@
 """Electric vehicle simulator with connection schedule."""
 from datetime import datetime, timedelta
-from typing import Dict, Any
-import random
-from django.utils import timezone
-from .base import BaseSimulator
+from typing import Optional
+from apps.simulation.results import StorageResult
+from .base import BaseSimulator, DEFAULT_ELAPSED_SECONDS
 from apps.devices.models import EVMode
 
 
 class EVSimulator(BaseSimulator):
     """
     Simulates EV behavior with connection schedule.
-    Schedule: Away 7 AM - 6 PM on weekdays, connected otherwise
+    Schedule: Away 7 AM - 6 PM EST on weekdays, connected otherwise.
+
+    Away EVs are not written on every tick: see `ElectricVehicle.charge_at`.
     """
 
     def _make_naive(self, dt):
@@ -19,103 +20,97 @@ class EVSimulator(BaseSimulator):
             return dt.replace(tzinfo=None)
         return dt
 
-    def simulate(self, timestamp: datetime) -> Dict[str, Any]:
+    def simulate(self, timestamp: datetime,
+                 elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                 tick_id: Optional[int] = None) -> StorageResult:
         """Simulate EV behavior based on time and connection status."""
         if self.device.status != 'online':
-            return {
-                **self.get_base_data(timestamp, 0.0),
-                'capacity_wh': self.device.capacity_kwh * 1000,
-                'current_level_wh': self.device.current_charge_kwh * 1000,
-                'flow_w': 0.0,
-                'mode': self.device.mode,
-            }
-
-        # Determine if EV should be connected based on schedule
-        # Convert UTC to EST for schedule check (spec defines schedule in EST)
-        from datetime import timedelta
-        # EST is UTC-5 (or UTC-4 during DST, but using UTC-5 for consistency)
-        est_offset = timedelta(hours=-5)
-        timestamp_est = timestamp + est_offset
-        
-        is_weekday = timestamp_est.weekday() < 5  # Monday = 0, Friday = 4
-        hour = timestamp_est.hour
-        should_be_away = is_weekday and 7 <= hour < 18
+            return self.get_storage_data(
+                timestamp,
+                capacity_wh=self.device.capacity_kwh * 1000,
+                current_level_wh=self.device.current_charge_kwh * 1000,
+                flow_w=0.0,
+                mode=self.device.mode,
+            )
 
+        schedule = self.device.schedule
         current_charge_kwh = self.device.current_charge_kwh
         capacity_kwh = self.device.capacity_kwh
+        interval_start = timestamp - timedelta(seconds=elapsed_seconds)
+        was_away = self.device.mode == EVMode.OFFLINE and self.device.last_seen_at is not None
 
-        if should_be_away:
-            # EV is away (driving)
-            if self.device.mode != EVMode.OFFLINE:
-                # Just disconnected, store last seen
-                self.device.mode = EVMode.OFFLINE
-                self.device.last_seen_at = timestamp
-                self.device.save(update_fields=['mode', 'last_seen_at'])
+        # Energy driven since the stored charge was last settled: since the
+        # car left if it is already away, otherwise over this tick's interval
+        driven_since = self.device.last_seen_at if was_away else interval_start
+        driven_kwh = (
+            self.device.driving_efficiency_kwh_per_hour
+            * schedule.away_seconds(driven_since, timestamp) / 3600
+        )
+        settled_charge_kwh = max(0, current_charge_kwh - driven_kwh)
 
-            # Calculate energy consumed while driving
-            if self.device.last_seen_at:
-                # Ensure both timestamps are naive UTC for comparison
-                last_seen = self._make_naive(self.device.last_seen_at)
-                ts = self._make_naive(timestamp)
-                hours_away = (ts - last_seen).total_seconds() / 3600
-                # Update every minute, so small incremental consumption
-                energy_consumed_kwh = (self.device.driving_efficiency_kwh_per_hour / 60)
-                new_charge_kwh = max(0, current_charge_kwh - energy_consumed_kwh)
-                self.device.current_charge_kwh = new_charge_kwh
-                self.device.last_seen_at = timestamp
-                self.device.save(update_fields=['current_charge_kwh', 'last_seen_at'])
-            else:
-                new_charge_kwh = current_charge_kwh
+        if schedule.is_away(timestamp):
+            # EV is away (driving). It is written once, when it leaves; after
+            # that its level follows from last_seen_at in closed form.
+            if not was_away:
+                self.write_state(
+                    settled_charge_kwh - current_charge_kwh, timestamp, tick_id,
+                    mode=EVMode.OFFLINE, last_seen_at=timestamp,
+                )
 
-            return {
-                **self.get_base_data(timestamp, 0.0),
-                'capacity_wh': capacity_kwh * 1000,
-                'current_level_wh': new_charge_kwh * 1000,
-                'flow_w': 0.0,
-                'mode': EVMode.OFFLINE.value,
-            }
+            return self.get_storage_data(
+                timestamp,
+                capacity_wh=capacity_kwh * 1000,
+                current_level_wh=settled_charge_kwh * 1000,
+                flow_w=0.0,
+                mode=EVMode.OFFLINE.value,
+            )
         else:
-            # EV is connected
-            charge_percentage = (current_charge_kwh / capacity_kwh) * 100
+            # EV is connected. A car that just got back has its whole trip
+            # settled in the same write as this tick's charging.
+            connected_seconds = max(
+                0.0, elapsed_seconds - schedule.away_seconds(interval_start, timestamp)
+            )
+            charge_percentage = (settled_charge_kwh / capacity_kwh) * 100
 
             # Charge until 90% capacity
             if charge_percentage < 90:
-                # Charging mode
-                if self.device.mode != EVMode.CHARGING:
-                    self.device.mode = EVMode.CHARGING
-                    self.device.last_seen_at = timestamp
-                    self.device.save(update_fields=['mode', 'last_seen_at'])
-
-                # Charge at random rate up to max
-                charge_rate_kw = random.uniform(0.7, 1.0) * self.device.max_charge_rate_kw
+                # Charging mode: charge at random rate up to max
+                charge_rate_kw = self.random(timestamp, tick_id).uniform(0.7, 1.0) * self.device.max_charge_rate_kw
                 flow_w = charge_rate_kw * 1000
 
-                # Update charge level (60 seconds = 1/60 hour)
+                # Update charge level over the connected time since the last tick
                 new_charge_kwh = min(
                     capacity_kwh,
-                    current_charge_kwh + (charge_rate_kw / 60)
+                    settled_charge_kwh + charge_rate_kw * connected_seconds / 3600
+                )
+                self.write_state(
+                    new_charge_kwh - current_charge_kwh, timestamp, tick_id,
+                    mode=EVMode.CHARGING, last_seen_at=timestamp,
                 )
-                self.device.current_charge_kwh = new_charge_kwh
-                self.device.last_seen_at = timestamp
-                self.device.save(update_fields=['current_charge_kwh', 'last_seen_at'])
 
-                return {
-                    **self.get_base_data(timestamp, 0.0),
-                    'capacity_wh': capacity_kwh * 1000,
-                    'current_level_wh': new_charge_kwh * 1000,
-                    'flow_w': flow_w,
-                    'mode': EVMode.CHARGING.value,
-                }
+                return self.get_storage_data(
+                    timestamp,
+                    capacity_wh=capacity_kwh * 1000,
+                    current_level_wh=new_charge_kwh * 1000,
+                    flow_w=flow_w,
+                    mode=EVMode.CHARGING.value,
+                )
             else:
                 # Idle (fully charged)
-                if self.device.mode != EVMode.CHARGING:
-                    self.device.mode = EVMode.CHARGING
-                    self.device.save(update_fields=['mode'])
+                if was_away:
+                    self.write_state(
+                        settled_charge_kwh - current_charge_kwh, timestamp, tick_id,
+                        mode=EVMode.CHARGING, last_seen_at=timestamp,
+                    )
+                elif driven_kwh or self.device.mode != EVMode.CHARGING:
+                    self.write_state(
+                        settled_charge_kwh - current_charge_kwh, timestamp, tick_id, mode=EVMode.CHARGING
+                    )
 
-                return {
-                    **self.get_base_data(timestamp, 0.0),
-                    'capacity_wh': capacity_kwh * 1000,
-                    'current_level_wh': current_charge_kwh * 1000,
-                    'flow_w': 0.0,
-                    'mode': EVMode.CHARGING.value,
-                }
+                return self.get_storage_data(
+                    timestamp,
+                    capacity_wh=capacity_kwh * 1000,
+                    current_level_wh=settled_charge_kwh * 1000,
+                    flow_w=0.0,
+                    mode=EVMode.CHARGING.value,
+                )
@@ -1,15 +1,17 @@
 """Generator simulator."""
 
-import random
 from datetime import datetime
-from typing import Dict, Any
-from .base import BaseSimulator
+from typing import Optional
+from apps.simulation.results import DeviceResult
+from .base import BaseSimulator, DEFAULT_ELAPSED_SECONDS
 
 
 class GeneratorSimulator(BaseSimulator):
     """Simulates generator with steady output and slight variation."""
 
-    def simulate(self, timestamp: datetime) -> Dict[str, Any]:
+    def simulate(self, timestamp: datetime,
+                 elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                 tick_id: Optional[int] = None) -> DeviceResult:
         """Generate steady output with ±5% random variation."""
 
         if self.device.status != 'online':
@@ -19,7 +21,7 @@ class GeneratorSimulator(BaseSimulator):
         base_output = self.device.rated_output_w
 
         # Add ±5% variation
-        variation = random.uniform(-0.05, 0.05)
+        variation = self.random(timestamp, tick_id).uniform(-0.05, 0.05)
         power_w = base_output * (1 + variation)
 
         return self.get_base_data(timestamp, power_w)
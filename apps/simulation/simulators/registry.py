@@ -0,0 +1,152 @@
+"""
+Which simulator runs which device type.
+
+Every device type the simulation supports is registered here once, with what
+the pipeline needs to load, run and total it:
+
+- `relation`: the `select_related` path from `Device` to the type's row
+  (and its state), so a batch is loaded in one query;
+- `role`: whether the device produces, consumes or stores energy, which
+  decides how it is stored in Redis (storage keys for batteries and EVs)
+  and where it counts in a household's totals;
+- `group`: the group of the vectorised engine (`apps.simulation.replay`)
+  that simulates it;
+- `batch`: the simulator class implements `simulate_batch`, so a task's
+  devices of this type are simulated in one vectorised pass.
+
+Every list of device types and relations elsewhere (the tasks, the daemon,
+the replay engine and the management commands) is derived from here.
+Adding a device type to the simulation means a simulator and one `register`
+call here, plus the replay group's step if it joins a new one. The model
+(with its `get_device_type` name) and its GraphQL type (`build_device_type`)
+are added in their own apps as before.
+
+`SimulatorPool` keeps simulator instances alive across ticks in a worker
+process. A cached simulator is reused, re-bound to the freshly loaded device
+row (which carries its current storage state), for as long as the device's
+configuration is unchanged; it is rebuilt when `Device.updated_at` moves.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Type
+
+from django.conf import settings
+
+from .base import BaseSimulator
+from .battery import BatterySimulator
+from .consumption import ConsumptionSimulator
+from .ev import EVSimulator
+from .generator import GeneratorSimulator
+from .solar import SolarPanelSimulator
+
+PRODUCTION = 'production'
+CONSUMPTION = 'consumption'
+STORAGE = 'storage'
+
+
+@dataclass(frozen=True)
+class SimulatorSpec:
+    """How a device type is simulated."""
+
+    device_type: str
+    simulator_class: Type[BaseSimulator]
+    relation: str
+    role: str
+    group: str
+    batch: bool = False
+
+    @property
+    def storage(self) -> bool:
+        return self.role == STORAGE
+
+
+REGISTRY: Dict[str, SimulatorSpec] = {}
+
+
+def register(device_type: str, simulator_class: Type[BaseSimulator], relation: str,
+             role: str, group: str, batch: bool = False):
+    REGISTRY[device_type] = SimulatorSpec(device_type, simulator_class, relation, role, group, batch)
+
+
+register('solar_panel', SolarPanelSimulator, 'solarpanel', PRODUCTION, 'solar')
+register('generator', GeneratorSimulator, 'generator', PRODUCTION, 'generator')
+register('air_conditioner', ConsumptionSimulator, 'airconditioner', CONSUMPTION, 'consumption', batch=True)
+register('heater', ConsumptionSimulator, 'heater', CONSUMPTION, 'consumption', batch=True)
+register('battery', BatterySimulator, 'battery__state', STORAGE, 'battery')
+register('electric_vehicle', EVSimulator, 'electricvehicle__state', STORAGE, 'ev')
+
+
+def device_types(role: str) -> Tuple[str, ...]:
+    """The registered device types with `role`."""
+    return tuple(spec.device_type for spec in REGISTRY.values() if spec.role == role)
+
+
+PRODUCTION_DEVICE_TYPES = device_types(PRODUCTION)
+CONSUMPTION_DEVICE_TYPES = device_types(CONSUMPTION)
+STORAGE_DEVICE_TYPES = device_types(STORAGE)
+
+# Everything a simulator may read, fetched in the same query as the device
+SIMULATION_RELATIONS = tuple(spec.relation for spec in REGISTRY.values())
+
+# The replay engine's groups, in registration order, with their device types and role
+GROUPS: Dict[str, Tuple[str, ...]] = {}
+GROUP_ROLES: Dict[str, str] = {}
+for _spec in REGISTRY.values():
+    GROUPS[_spec.group] = GROUPS.get(_spec.group, ()) + (_spec.device_type,)
+    GROUP_ROLES[_spec.group] = _spec.role
+
+
+def groups(role: str) -> Tuple[str, ...]:
+    """The replay engine's groups with `role`."""
+    return tuple(name for name, group_role in GROUP_ROLES.items() if group_role == role)
+
+
+def spec_for(device_type: str) -> Optional[SimulatorSpec]:
+    return REGISTRY.get(device_type)
+
+
+def create_simulator(device, state_writer=None) -> Tuple[str, Optional[BaseSimulator]]:
+    """The device type and a new simulator for a device (None if unsupported)."""
+    device_type = device.get_device_type()
+    spec = REGISTRY.get(device_type)
+    if spec is None:
+        return device_type, None
+    return device_type, spec.simulator_class(device.get_specific_device(), state_writer)
+
+
+class SimulatorPool:
+    """Simulator instances kept across ticks, keyed by device id."""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size if max_size is not None else int(
+            getattr(settings, 'SIMULATOR_POOL_SIZE', 100_000)
+        )
+        # device id -> (configuration version, device type, simulator)
+        self.simulators: Dict[int, Tuple[object, str, BaseSimulator]] = {}
+
+    def get(self, device, state_writer=None) -> Tuple[str, Optional[BaseSimulator]]:
+        """The device type and a simulator bound to this row of the device."""
+        cached = self.simulators.get(device.id)
+        if cached is not None and cached[0] == device.updated_at:
+            _, device_type, simulator = cached
+            simulator.bind(device.get_specific_device(), state_writer)
+            return device_type, simulator
+
+        device_type, simulator = create_simulator(device, state_writer)
+        if simulator is not None:
+            self.simulators.pop(device.id, None)
+            while self.simulators and len(self.simulators) >= self.max_size:
+                # Oldest first out
+                del self.simulators[next(iter(self.simulators))]
+            self.simulators[device.id] = (device.updated_at, device_type, simulator)
+        return device_type, simulator
+
+    def forget(self, device_id: int):
+        self.simulators.pop(device_id, None)
+
+    def clear(self):
+        self.simulators.clear()
+
+
+# Shared by every task a worker process runs
+SIMULATOR_POOL = SimulatorPool()
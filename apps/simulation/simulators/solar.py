@@ -1,23 +1,158 @@
 """Solar panel simulator with solar elevation model."""
 
 import math
-import random
-from datetime import datetime
-from typing import Dict, Any
-from .base import BaseSimulator
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from apps.simulation.clouds import cloud_field
+from apps.simulation.results import DeviceResult
+from apps.simulation.rng import np
+from .base import BaseSimulator, DEFAULT_ELAPSED_SECONDS
+
+
+def cell_size() -> float:
+    return float(getattr(settings, 'SOLAR_CACHE_CELL_DEGREES', 0.01))
+
+
+def snap_to_cell(degrees: float, cell: Optional[float] = None) -> float:
+    """Centre of the cache cell that contains `degrees`."""
+    cell = cell_size() if cell is None else cell
+    return round(degrees / cell) * cell if cell else degrees
+
+
+class SolarGeometryCache:
+    """
+    Solar elevation per location cell and minute of day, for one day at a time.
+
+    Panels are located on a grid of SOLAR_CACHE_CELL_DEGREES (0.01° is about
+    1 km) and the elevation model only depends on the hour and minute, so
+    every panel in a cell shares one value per minute. Declination trig is
+    computed once per day and latitude trig once per cell; the whole cache is
+    dropped when the (UTC) day rolls over and never holds more than
+    SOLAR_CACHE_MAX_ENTRIES elevations (oldest first out).
+    """
+
+    def __init__(self, cell: Optional[float] = None, max_entries: Optional[int] = None):
+        self.cell = cell_size() if cell is None else cell
+        self.max_entries = max_entries if max_entries is not None else int(
+            getattr(settings, 'SOLAR_CACHE_MAX_ENTRIES', 100_000)
+        )
+        self.day: Optional[date] = None
+        self.declination_trig: Tuple[float, float] = (0.0, 1.0)
+        self.elevations: Dict[Tuple[int, int, int], float] = {}
+        self.latitude_trig: Dict[int, Tuple[float, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _cell(self, degrees: float) -> int:
+        return round(degrees / self.cell) if self.cell else degrees
+
+    def _roll_over(self, timestamp: datetime):
+        self.day = timestamp.date()
+        self.elevations.clear()
+        self.declination_trig = declination_trig(timestamp)
+
+    def elevation(self, timestamp: datetime, latitude: float, longitude: float) -> float:
+        """Solar elevation in degrees at the centre of the panel's cell."""
+        if timestamp.date() != self.day:
+            self._roll_over(timestamp)
+
+        lat_cell, lon_cell = self._cell(latitude), self._cell(longitude)
+        key = (lat_cell, lon_cell, timestamp.hour * 60 + timestamp.minute)
+        elevation = self.elevations.get(key)
+        if elevation is not None:
+            self.hits += 1
+            return elevation
+        self.misses += 1
+
+        latitude_trig = self.latitude_trig.get(lat_cell)
+        if latitude_trig is None:
+            if len(self.latitude_trig) >= self.max_entries:
+                self.latitude_trig.clear()
+            latitude_trig = self.latitude_trig[lat_cell] = trig(snap_to_cell(latitude, self.cell))
+
+        elevation = solar_elevation(
+            timestamp, latitude_trig, self.declination_trig, snap_to_cell(longitude, self.cell)
+        )
+        if len(self.elevations) >= self.max_entries:
+            del self.elevations[next(iter(self.elevations))]
+        self.elevations[key] = elevation
+        return elevation
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.elevations),
+        }
+
+
+def trig(degrees: float) -> Tuple[float, float]:
+    """Sine and cosine of an angle (or array of angles) in degrees."""
+    if isinstance(degrees, (int, float)):
+        radians = math.radians(degrees)
+        return math.sin(radians), math.cos(radians)
+    radians = np.radians(degrees)
+    return np.sin(radians), np.cos(radians)
+
+
+def declination_trig(timestamp: datetime) -> Tuple[float, float]:
+    """Sine and cosine of the solar declination on the timestamp's day."""
+    # Solar declination angle (simplified)
+    # Varies from -23.45° to +23.45° over the year
+    day_of_year = timestamp.timetuple().tm_yday
+    return trig(23.45 * math.sin(math.radians((360 / 365) * (day_of_year - 81))))
+
+
+def solar_elevation(timestamp: datetime, latitude_trig: Tuple[float, float],
+                    declination_trig: Tuple[float, float], longitude: float) -> float:
+    """
+    Solar elevation in degrees.
+
+    `latitude_trig` (from `trig`) and `longitude` may be NumPy arrays, one
+    entry per panel, for the batch engine; the result is then an array too.
+    """
+    # Hour angle (0° at solar noon, -15°/hour in morning, +15°/hour in afternoon)
+    # Convert UTC to local solar time using longitude
+    # For west longitudes (negative), subtract hours; for east (positive), add hours
+    solar_hour_offset = longitude / 15.0  # Convert longitude to hours
+    local_solar_time = timestamp.hour + timestamp.minute / 60.0 + solar_hour_offset
+    # Normalize to 0-24 hour range
+    local_solar_time = local_solar_time % 24
+    hour_angle = 15.0 * (local_solar_time - 12.0)
+
+    sin_lat, cos_lat = latitude_trig
+    sin_dec, cos_dec = declination_trig
+    sin_elevation = sin_lat * sin_dec + cos_lat * cos_dec * trig(hour_angle)[1]
+
+    if isinstance(sin_elevation, float):
+        return math.degrees(math.asin(max(-1, min(1, sin_elevation))))
+    return np.degrees(np.arcsin(np.clip(sin_elevation, -1, 1)))
+
+
+# One cache per worker process, shared by all panels it simulates
+SOLAR_GEOMETRY = SolarGeometryCache()
 
 
 class SolarPanelSimulator(BaseSimulator):
     """Simulates solar panel output based on sun position."""
 
-    def simulate(self, timestamp: datetime) -> Dict[str, Any]:
+    def prepare(self):
+        # Effective collecting area in m²
+        self.area_efficiency = self.device.panel_area_m2 * self.device.efficiency
+
+    def simulate(self, timestamp: datetime,
+                 elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                 tick_id: Optional[int] = None) -> DeviceResult:
         """Calculate solar panel output based on time and location."""
 
         if self.device.status != 'online':
             return self.get_base_data(timestamp, 0.0)
 
-        # Calculate solar elevation angle
-        elevation = self._calculate_solar_elevation(
+        # Calculate solar elevation angle (shared by nearby panels)
+        elevation = SOLAR_GEOMETRY.elevation(
             timestamp,
             self.device.latitude,
             self.device.longitude
@@ -38,52 +173,13 @@ class SolarPanelSimulator(BaseSimulator):
             irradiance = base_irradiance * atmospheric_factor
 
             # Calculate power: irradiance * area * efficiency
-            power_w = irradiance * self.device.panel_area_m2 * self.device.efficiency
+            power_w = irradiance * self.area_efficiency
 
-            # Add random variation (0.85-1.0) to simulate cloud cover
-            cloud_factor = random.uniform(0.85, 1.0)
+            # Cloud cover (0.85-1.0) from the regional field shared by nearby panels
+            cloud_factor = cloud_field(timestamp).factor(self.device.latitude, self.device.longitude)
             power_w *= cloud_factor
 
             # Cap at max capacity
             power_w = min(power_w, self.device.max_capacity_w)
 
         return self.get_base_data(timestamp, power_w)
-
-    def _calculate_solar_elevation(self, timestamp: datetime, latitude: float, longitude: float) -> float:
-        """
-        Calculate solar elevation angle in degrees.
-
-        Uses simplified formula based on:
-        - Day of year
-        - Hour of day
-        - Latitude
-        """
-        # Day of year (1-365)
-        day_of_year = timestamp.timetuple().tm_yday
-
-        # Solar declination angle (simplified)
-        # Varies from -23.45° to +23.45° over the year
-        declination = 23.45 * math.sin(math.radians((360 / 365) * (day_of_year - 81)))
-
-        # Hour angle (0° at solar noon, -15°/hour in morning, +15°/hour in afternoon)
-        # Convert UTC to local solar time using longitude
-        # For west longitudes (negative), subtract hours; for east (positive), add hours
-        solar_hour_offset = longitude / 15.0  # Convert longitude to hours
-        local_solar_time = timestamp.hour + timestamp.minute / 60.0 + solar_hour_offset
-        # Normalize to 0-24 hour range
-        local_solar_time = local_solar_time % 24
-        hour_angle = 15.0 * (local_solar_time - 12.0)
-
-        # Calculate elevation angle
-        lat_rad = math.radians(latitude)
-        dec_rad = math.radians(declination)
-        hour_rad = math.radians(hour_angle)
-
-        sin_elevation = (
-            math.sin(lat_rad) * math.sin(dec_rad) +
-            math.cos(lat_rad) * math.cos(dec_rad) * math.cos(hour_rad)
-        )
-
-        elevation = math.degrees(math.asin(max(-1, min(1, sin_elevation))))
-
-        return elevation
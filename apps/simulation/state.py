@@ -0,0 +1,390 @@
+"""
+Writers for storage device state produced by the simulators.
+
+Battery and EV simulators hand their per-tick changes to a state writer
+instead of saving the device themselves:
+
+- `ImmediateStateWriter` applies each change right away with one conditional
+  UPDATE (used when simulating a single device).
+- `BatchStateWriter` collects a batch of devices' changes and writes them to
+  `DeviceState` in one bulk statement when flushed; `CopyStateWriter` does
+  the same for large batches on PostgreSQL via COPY and `UPDATE ... FROM`.
+- `RedisStateWriter` is the write-behind variant: Redis holds the live state
+  and `RedisStateStore.checkpoint()` periodically copies changed devices to
+  `DeviceState` with one bulk UPDATE per chunk.
+
+All of them honour the per-device `last_tick_start` watermark (the simulated
+start of the last tick applied, see `apps.simulation.ticks.tick_watermark`),
+so a tick is applied to a device at most once.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from redis.exceptions import WatchError
+
+from apps.devices.models import DeviceState
+from apps.simulation import codec
+from apps.simulation.redis_client import RedisClient
+
+
+def write_behind_enabled() -> bool:
+    """Whether Redis is the authoritative store for live storage state."""
+    return getattr(settings, 'SIMULATION_STATE_BACKEND', 'database') == 'redis'
+
+
+class ImmediateStateWriter:
+    """Writes each state change to the database as it is applied."""
+
+    def apply(self, device, delta_kwh: float = 0.0, watermark: Optional[int] = None, **fields) -> bool:
+        """Apply a charge delta and state fields; False if the tick already ran."""
+        return device.apply_charge_delta(delta_kwh, watermark, **fields)
+
+
+class BatchStateWriter:
+    """Buffers state changes and writes them with a single bulk UPDATE."""
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+        self.pending: Dict[int, Tuple[object, Optional[int]]] = {}
+
+    def apply(self, device, delta_kwh: float = 0.0, watermark: Optional[int] = None, **fields) -> bool:
+        """Apply the change to the in-memory device; it is written on `flush()`."""
+        device.current_charge_kwh = max(
+            0.0, min(device.capacity_kwh, device.current_charge_kwh + delta_kwh)
+        )
+        for name, value in fields.items():
+            setattr(device, name, value)
+        self.pending[device.pk] = (device, watermark)
+        return True
+
+    def flush(self) -> Set[int]:
+        """Write all buffered changes and return the ids of the devices written."""
+        if not self.pending:
+            return set()
+        written = self.write_states(
+            [(device.device_state, watermark) for device, watermark in self.pending.values()]
+        )
+        self.pending.clear()
+        return written
+
+    def write_states(self, changes: List[Tuple[DeviceState, Optional[int]]]) -> Set[int]:
+        """
+        Write `(state, watermark)` pairs with `bulk_update`.
+
+        The state rows are locked and their watermarks re-checked first, so
+        a device whose tick was applied concurrently (a duplicate task) is
+        left alone and omitted from the result. A pair without a watermark
+        is written unconditionally and keeps the row's.
+        """
+        with transaction.atomic():
+            watermarks = dict(
+                DeviceState.objects.select_for_update()
+                .filter(pk__in=[state.pk for state, _ in changes])
+                .values_list('pk', 'last_tick_start')
+            )
+            states = []
+            for state, watermark in changes:
+                if state.pk not in watermarks:
+                    continue
+                last_tick_start = watermarks[state.pk]
+                if watermark is None:
+                    state.last_tick_start = last_tick_start
+                elif last_tick_start is not None and last_tick_start >= watermark:
+                    continue
+                else:
+                    state.last_tick_start = watermark
+                states.append(state)
+
+            DeviceState.objects.bulk_update(
+                states,
+                list(DeviceState.STATE_FIELDS),
+                batch_size=self.batch_size,
+            )
+        return {state.pk for state in states}
+
+
+class CopyStateWriter(BatchStateWriter):
+    """
+    Streams a batch's state through COPY and merges it in one UPDATE ... FROM.
+
+    `bulk_update` turns a large batch into one CASE expression per column;
+    here the rows go over the wire in COPY format into a session-local
+    staging table and a single join updates `DeviceState`, with the tick
+    watermark checked in the same statement. Needs PostgreSQL with psycopg 3;
+    other databases and small batches use `bulk_update`.
+    """
+
+    staging_table = 'devicestate_staging'
+
+    def __init__(self, batch_size: int = 1000, copy_threshold: Optional[int] = None):
+        super().__init__(batch_size)
+        if copy_threshold is None:
+            copy_threshold = getattr(settings, 'SIMULATION_COPY_THRESHOLD', 200)
+        self.copy_threshold = copy_threshold
+
+    @staticmethod
+    def copy_supported() -> bool:
+        return connection.vendor == 'postgresql' and connection.Database.__name__ == 'psycopg'
+
+    def write_states(self, changes: List[Tuple[DeviceState, Optional[int]]]) -> Set[int]:
+        if len(changes) < self.copy_threshold or not self.copy_supported():
+            return super().write_states(changes)
+
+        qn = connection.ops.quote_name
+        staging = qn(self.staging_table)
+        target = qn(DeviceState._meta.db_table)
+        columns = ('device_id',) + DeviceState.STATE_FIELDS
+        column_list = ', '.join(qn(column) for column in columns)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Temporary tables are never WAL-logged and are private to this
+            # session, so concurrent workers can't see each other's rows.
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ('
+                f'device_id bigint NOT NULL, current_charge_kwh double precision NOT NULL, '
+                f'mode varchar(20) NOT NULL, last_seen_at timestamp with time zone, '
+                f'last_tick_start bigint'
+                f') ON COMMIT DELETE ROWS'
+            )
+            with cursor.cursor.copy(f'COPY {staging} ({column_list}) FROM STDIN') as copy:
+                for state, watermark in changes:
+                    copy.write_row((
+                        state.pk,
+                        state.current_charge_kwh,
+                        state.mode,
+                        state.last_seen_at,
+                        watermark,
+                    ))
+            # A row without a watermark is written unconditionally and keeps
+            # the row's watermark, as in `BatchStateWriter`
+            cursor.execute(
+                f'UPDATE {target} AS s SET '
+                f'current_charge_kwh = t.current_charge_kwh, mode = t.mode, '
+                f'last_seen_at = t.last_seen_at, last_tick_start = COALESCE(t.last_tick_start, s.last_tick_start) '
+                f'FROM {staging} AS t '
+                f'WHERE s.device_id = t.device_id AND ('
+                f't.last_tick_start IS NULL OR s.last_tick_start IS NULL OR s.last_tick_start < t.last_tick_start'
+                f') RETURNING s.device_id, s.last_tick_start'
+            )
+            watermarks = dict(cursor.fetchall())
+            # ON COMMIT only fires at the outermost commit; clear the rows
+            # now in case we're nested in a caller's transaction.
+            cursor.execute(f'DELETE FROM {staging}')
+
+        for state, _ in changes:
+            if state.pk in watermarks:
+                state.last_tick_start = watermarks[state.pk]
+        return set(watermarks)
+
+
+STATE_KEY = 'device:{}:state'
+DIRTY_KEY = 'simulation:state:dirty'
+CHECKPOINT_KEY = 'simulation:state:checkpointing'
+
+# KEYS = [dirty set, state key per device]; ARGV = (device id, watermark, payload) per device.
+# A device's state is replaced only if its stored watermark is older than the new one.
+_WRITE_SCRIPT = """
+local written = {}
+for i = 1, #KEYS - 1 do
+  local key = KEYS[i + 1]
+  local device_id, tick, payload = ARGV[3 * i - 2], ARGV[3 * i - 1], ARGV[3 * i]
+  local last = redis.call('HGET', key, 't')
+  if tick == '' or not last or last == '' or tonumber(last) < tonumber(tick) then
+    if tick == '' then
+      tick = last or ''
+    end
+    redis.call('HSET', key, 't', tick, 'v', payload)
+    redis.call('SADD', KEYS[1], device_id)
+    written[#written + 1] = device_id
+  end
+end
+return written
+"""
+
+
+def _encode_state(state: DeviceState) -> str:
+    last_seen_at = state.last_seen_at
+    if last_seen_at is not None and last_seen_at.tzinfo is None:
+        last_seen_at = last_seen_at.replace(tzinfo=timezone.utc)
+    return codec.dumps_str({
+        'c': state.current_charge_kwh,
+        'm': state.mode,
+        's': last_seen_at.isoformat() if last_seen_at is not None else None,
+    })
+
+
+# Payload keys of the state fields
+_PAYLOAD_KEYS = {'current_charge_kwh': 'c', 'mode': 'm', 'last_seen_at': 's'}
+
+
+def _decode_state(state: DeviceState, tick: Optional[str], payload: str):
+    data = codec.loads(payload)
+    state.current_charge_kwh = data['c']
+    state.mode = data['m']
+    state.last_seen_at = datetime.fromisoformat(data['s']) if data['s'] else None
+    state.last_tick_start = int(tick) if tick else None
+
+
+class RedisStateStore:
+    """
+    Live storage state kept in Redis, checkpointed to `DeviceState`.
+
+    Each device's state is a hash at `device:{id}:state` holding the
+    watermark of the last applied tick (`t`) and the encoded state (`v`). Every write adds the
+    device to a dirty set, which `checkpoint()` drains into the database.
+    Devices with no Redis state fall back to their last checkpoint.
+    """
+
+    def __init__(self, redis_client: Optional[RedisClient] = None):
+        self.redis = (redis_client or RedisClient()).redis
+        self._write = self.redis.register_script(_WRITE_SCRIPT)
+
+    def load(self, devices: Iterable) -> None:
+        """Overlay live Redis state onto `devices` (storage devices only)."""
+        devices = list(devices)
+        if not devices:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for device in devices:
+            pipe.hmget(STATE_KEY.format(device.pk), 't', 'v')
+        for device, (tick, payload) in zip(devices, pipe.execute()):
+            if payload is not None:
+                _decode_state(device.device_state, tick, payload)
+
+    def write(self, changes: Iterable[Tuple[DeviceState, Optional[int]]]) -> Set[int]:
+        """Store `(state, watermark)` pairs; return the ids actually written."""
+        keys, args = [DIRTY_KEY], []
+        for state, watermark in changes:
+            keys.append(STATE_KEY.format(state.pk))
+            args.extend([state.pk, '' if watermark is None else watermark, _encode_state(state)])
+        if len(keys) == 1:
+            return set()
+        return {int(device_id) for device_id in self._write(keys=keys, args=args)}
+
+    def write_through(self, state: DeviceState, fields: Optional[Iterable[str]] = None) -> None:
+        """
+        Copy a state edit made through the models into the live state.
+
+        Only `fields` (all state fields if None) are replaced, so an edit to
+        the mode doesn't roll the live charge back to the last checkpoint.
+        Called while the edit's transaction still holds the row lock, which
+        `checkpoint()` waits on before it reads Redis.
+        """
+        fields = set(DeviceState.STATE_FIELDS if fields is None else fields)
+        key = STATE_KEY.format(state.pk)
+        update = codec.loads(_encode_state(state))
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    tick, payload = pipe.hmget(key, 't', 'v')
+                    if payload is not None:
+                        merged = codec.loads(payload)
+                        for name in fields & set(_PAYLOAD_KEYS):
+                            merged[_PAYLOAD_KEYS[name]] = update[_PAYLOAD_KEYS[name]]
+                    else:
+                        merged = update
+                    if payload is None or 'last_tick_start' in fields:
+                        tick = '' if state.last_tick_start is None else state.last_tick_start
+                    pipe.multi()
+                    pipe.hset(key, mapping={'t': tick, 'v': codec.dumps_str(merged)})
+                    pipe.sadd(DIRTY_KEY, state.pk)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def checkpoint(self, batch_size: int = 1000) -> int:
+        """
+        Copy every device changed since the last checkpoint to `DeviceState`.
+
+        The dirty set is swapped out first, so devices written while the
+        checkpoint runs are picked up by the next one. A failed checkpoint
+        leaves its devices queued for the next attempt. Returns the number
+        of rows written.
+
+        Each chunk's rows are locked before their live state is read, so a
+        model edit (which writes through to Redis under the same lock) is
+        either read here or made after this write, never overwritten by an
+        older read. Rows whose database watermark is newer than the live
+        state's are left alone.
+        """
+        pipe = self.redis.pipeline()
+        pipe.sunionstore(CHECKPOINT_KEY, [CHECKPOINT_KEY, DIRTY_KEY])
+        pipe.delete(DIRTY_KEY)
+        pipe.execute()
+
+        device_ids = sorted(int(device_id) for device_id in self.redis.smembers(CHECKPOINT_KEY))
+        written = 0
+        for start in range(0, len(device_ids), batch_size):
+            chunk = device_ids[start:start + batch_size]
+            with transaction.atomic():
+                # Devices deleted since their last tick have nothing to checkpoint
+                watermarks = dict(
+                    DeviceState.objects.select_for_update().filter(pk__in=chunk)
+                    .order_by('pk').values_list('pk', 'last_tick_start')
+                )
+                pipe = self.redis.pipeline(transaction=False)
+                for device_id in chunk:
+                    pipe.hmget(STATE_KEY.format(device_id), 't', 'v')
+                values = pipe.execute()
+
+                states = []
+                for device_id, (tick, payload) in zip(chunk, values):
+                    if payload is None or device_id not in watermarks:
+                        continue
+                    state = DeviceState(device_id=device_id)
+                    _decode_state(state, tick, payload)
+                    last_tick_start = watermarks[device_id]
+                    if last_tick_start is not None and state.last_tick_start is not None \
+                            and state.last_tick_start < last_tick_start:
+                        continue
+                    states.append(state)
+
+                DeviceState.objects.bulk_update(states, list(DeviceState.STATE_FIELDS), batch_size=batch_size)
+            written += len(states)
+
+        self.redis.delete(CHECKPOINT_KEY)
+        return written
+
+    def restore(self, batch_size: int = 1000) -> int:
+        """
+        Rebuild Redis state from the last checkpoint after Redis lost it.
+
+        Only devices without live state are seeded; newer state already in
+        Redis is left alone. Returns the number of devices examined.
+        """
+        count = 0
+        pipe = self.redis.pipeline(transaction=False)
+        for state in DeviceState.objects.order_by('pk').iterator(chunk_size=batch_size):
+            key = STATE_KEY.format(state.pk)
+            pipe.hsetnx(key, 'v', _encode_state(state))
+            pipe.hsetnx(key, 't', '' if state.last_tick_start is None else state.last_tick_start)
+            count += 1
+            if count % batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def clear_watermarks(self, batch_size: int = 1000) -> None:
+        """Forget every device's live watermark, so the next tick applies whatever its start."""
+        pipe = self.redis.pipeline(transaction=False)
+        for count, key in enumerate(self.redis.scan_iter(STATE_KEY.format('*'), count=batch_size), 1):
+            pipe.hset(key, 't', '')
+            if count % batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+
+
+class RedisStateWriter(BatchStateWriter):
+    """Buffers state changes and writes them to Redis instead of the database."""
+
+    def __init__(self, store: RedisStateStore):
+        super().__init__()
+        self.store = store
+
+    def write_states(self, changes: List[Tuple[DeviceState, Optional[int]]]) -> Set[int]:
+        return self.store.write(changes)
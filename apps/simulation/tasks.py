@@ -2,116 +2,266 @@
 
 from celery import shared_task
 from datetime import datetime
+from itertools import chain
+from typing import List, Optional, Tuple
+from django.conf import settings
 from django.contrib.auth.models import User
-from apps.devices.models import Device
+from django.db import DatabaseError
+from redis.exceptions import RedisError
+from apps.devices.changes import ChangeFeed, ChangeFeedExpired, prune_changes
+from apps.devices.models import Device, DeviceStatus
+from apps.simulation.deadband import DEAD_BAND
+from apps.simulation.profiles import baseline_loads, household_baseline
 from apps.simulation.redis_client import RedisClient
-from apps.simulation.simulators.solar import SolarPanelSimulator
-from apps.simulation.simulators.generator import GeneratorSimulator
-from apps.simulation.simulators.battery import BatterySimulator
-from apps.simulation.simulators.ev import EVSimulator
-from apps.simulation.simulators.consumption import ConsumptionSimulator
+from apps.simulation.state import (
+    CopyStateWriter, RedisStateStore, RedisStateWriter, write_behind_enabled
+)
+from apps.simulation.ticks import TickCoordinator, tick_start, tick_watermark
+from apps.simulation.simulators.base import DEFAULT_ELAPSED_SECONDS
+from apps.simulation.simulators.registry import (
+    CONSUMPTION, PRODUCTION, SIMULATION_RELATIONS, SIMULATOR_POOL, STORAGE, STORAGE_DEVICE_TYPES,
+    spec_for,
+)
+from apps.simulation.simulators.solar import SOLAR_GEOMETRY
+
+
+# Change feed position (`ChangeFeed.position`) of the orchestrator's offline transitions
+OFFLINE_WATERMARK_KEY = 'simulation:offline_watermark'
+
+
+def _tick_already_applied(specific_device, watermark: Optional[int]) -> bool:
+    """Whether a storage device has already integrated the tick with `watermark`."""
+    last_tick_start = getattr(specific_device, 'last_tick_start', None)
+    return watermark is not None and last_tick_start is not None and last_tick_start >= watermark
+
+
+def _offline_transitions(redis_client: RedisClient) -> Tuple[List[int], str]:
+    """
+    Devices that aren't online and were created or edited since the last
+    tick, from the change feed, and the feed position to continue from.
+
+    The feed position is kept in Redis; without one, or if it fell out of
+    the feed's retention, every one of them is returned once. The caller
+    stores the new position once the devices are enqueued.
+    """
+    position = redis_client.redis.get(OFFLINE_WATERMARK_KEY)
+    offline = Device.objects.exclude(status=DeviceStatus.ONLINE)
+    try:
+        if position is None:
+            raise ChangeFeedExpired(position)
+        feed = ChangeFeed.resume(position)
+        changed = sorted(feed.poll().upserted)
+        device_ids = [
+            device_id
+            for start in range(0, len(changed), 10000)
+            for device_id in offline.filter(id__in=changed[start:start + 10000]).values_list('id', flat=True)
+        ]
+    except ChangeFeedExpired:
+        # Position taken first: edits made during the scan are seen next tick
+        feed = ChangeFeed()
+        device_ids = list(offline.values_list('id', flat=True))
+    return sorted(device_ids), feed.position
 
 
 @shared_task
 def run_energy_simulation():
     """
-    Main orchestrator task that runs every 60 seconds.
+    Main orchestrator task that runs once per tick.
+
+    Claims the current tick from the TickCoordinator and spawns simulation
+    tasks for the online devices in batches of SIMULATION_BATCH_SIZE.
+    Overlapping or repeated runs are skipped; the next tick that runs
+    catches up on the elapsed time.
+
+    Devices that aren't online produce nothing and change no state, so they
+    are only simulated in the tick after they are created or edited while
+    offline, which publishes their offline result once.
+    """
+    redis_client = RedisClient()
+    coordinator = TickCoordinator(redis_client)
+    with coordinator.begin() as tick:
+        if tick is None:
+            return
+
+        batch_size = settings.SIMULATION_BATCH_SIZE
+        tick_seconds = coordinator.tick_seconds
+        device_ids = Device.objects.filter(status=DeviceStatus.ONLINE).order_by('id').values_list('id', flat=True)
+
+        # Spawn a simulation task per batch of devices
+        offline_ids, offline_position = _offline_transitions(redis_client)
+        batch = []
+        for device_id in chain(device_ids.iterator(), offline_ids):
+            batch.append(device_id)
+            if len(batch) == batch_size:
+                simulate_devices.delay(batch, tick.tick_id, tick.elapsed_seconds, tick_seconds)
+                batch = []
+        if batch:
+            simulate_devices.delay(batch, tick.tick_id, tick.elapsed_seconds, tick_seconds)
+
+        # Get unique user IDs
+        user_ids = list(Device.objects.values_list('user_id', flat=True).distinct())
+
+        # Baseline household load for every user in one lookup
+        baselines = baseline_loads(user_ids, tick.timestamp)
+
+        # Compute stats for each user
+        for user_id in user_ids:
+            compute_user_energy_stats.delay(user_id, tick.tick_id, baselines[user_id])
+
+        # In write-behind mode, persist live storage state every N ticks
+        if write_behind_enabled() and tick.tick_id % settings.SIMULATION_CHECKPOINT_TICKS == 0:
+            checkpoint_device_state.delay()
+
+        # Only now is every offline transition enqueued; if the tick fails
+        # before here, the next one picks them up again
+        redis_client.redis.set(OFFLINE_WATERMARK_KEY, offline_position)
+
+
+@shared_task(
+    acks_late=True,
+    autoretry_for=(DatabaseError, RedisError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def simulate_devices(device_ids: List[int], tick_id: Optional[int] = None,
+                     elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS,
+                     tick_seconds: Optional[int] = None):
+    """
+    Simulate a batch of devices and store results in Redis.
+
+    Storage state for the whole batch is written to DeviceState in one bulk
+    UPDATE (or, in write-behind mode, to Redis in one script call), and the
+    Redis results in one pipeline and one script call, leaving out results
+    that Redis already holds (`DEAD_BAND`). Safe to retry or run
+    twice: devices that already applied the tick are skipped.
 
-    Spawns individual device simulation tasks for all devices.
+    Args:
+        device_ids: The IDs of the devices to simulate
+        tick_id: The tick being simulated; defaults to "now"
+        elapsed_seconds: Simulated time since the previous tick
+        tick_seconds: The tick length `tick_id` was claimed with; defaults
+            to the current SIMULATION_TICK_SECONDS
     """
-    devices = Device.objects.select_related(
-        'solarpanel', 'generator', 'battery', 'electricvehicle',
-        'airconditioner', 'heater', 'user'
-    ).all()
+    timestamp = tick_start(tick_id, tick_seconds) if tick_id is not None else datetime.utcnow()
+    watermark = tick_watermark(timestamp) if tick_id is not None else None
+    redis_client = RedisClient()
 
-    # Spawn simulation task for each device
+    simulators = []
+    devices = Device.objects.select_related(*SIMULATION_RELATIONS).filter(id__in=device_ids)
+    if write_behind_enabled():
+        store = RedisStateStore(redis_client)
+        state_writer = RedisStateWriter(store)
+    else:
+        store, state_writer = None, CopyStateWriter()
     for device in devices:
-        simulate_device.delay(device.id)
+        device_type, simulator = SIMULATOR_POOL.get(device, state_writer)
+        if simulator is not None:
+            simulators.append((device.id, device_type, simulator))
 
-    # Get unique user IDs
-    user_ids = devices.values_list('user_id', flat=True).distinct()
+    if store is not None:
+        # Redis holds the live charge and mode; the database row may be
+        # up to SIMULATION_CHECKPOINT_TICKS behind
+        store.load(
+            simulator.device for _, device_type, simulator in simulators
+            if device_type in STORAGE_DEVICE_TYPES
+        )
 
-    # Compute stats for each user
-    for user_id in user_ids:
-        compute_user_energy_stats.delay(user_id)
+    hits, misses = SOLAR_GEOMETRY.hits, SOLAR_GEOMETRY.misses
+    results, batches = [], {}
+    for device_id, device_type, simulator in simulators:
+        if _tick_already_applied(simulator.device, watermark):
+            continue
+        spec = spec_for(device_type)
+        if spec.batch:
+            # Simulated together, one vectorised pass per simulator class, below
+            batches.setdefault(spec.simulator_class, []).append((device_id, device_type, simulator))
+        else:
+            results.append((device_id, device_type, simulator.simulate(timestamp, elapsed_seconds, tick_id)))
+    for simulator_class, members in batches.items():
+        batch_results = simulator_class.simulate_batch(
+            [simulator for _, _, simulator in members], timestamp, elapsed_seconds, tick_id
+        )
+        results.extend(
+            (device_id, device_type, result)
+            for (device_id, device_type, _), result in zip(members, batch_results)
+        )
 
+    current, storage = {}, {}
+    for device_id, device_type, result in results:
+        # Storage results are encoded to the storage payload by the Redis client
+        if device_type in STORAGE_DEVICE_TYPES:
+            storage[device_id] = result
+        else:
+            current[device_id] = result
 
-@shared_task
-def simulate_device(device_id: int):
+    # Devices a concurrent duplicate of this batch got to first keep its results
+    pending = set(state_writer.pending)
+    lost = pending - state_writer.flush()
+    storage = {device_id: data for device_id, data in storage.items() if device_id not in lost}
+
+    skipped = DEAD_BAND.store(redis_client, current, storage, tick_id)
+    TickCoordinator(redis_client).record_counters(
+        solar_cache_hits=SOLAR_GEOMETRY.hits - hits,
+        solar_cache_misses=SOLAR_GEOMETRY.misses - misses,
+        redis_writes_skipped=skipped,
+    )
+
+
+@shared_task(
+    acks_late=True,
+    autoretry_for=(DatabaseError, RedisError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def simulate_device(device_id: int, tick_id: Optional[int] = None,
+                    elapsed_seconds: float = DEFAULT_ELAPSED_SECONDS):
     """
     Simulate a single device and store results in Redis.
 
+    A batch of one; see `simulate_devices`.
+
     Args:
         device_id: The ID of the device to simulate
+        tick_id: The tick being simulated; defaults to "now"
+        elapsed_seconds: Simulated time since the previous tick
     """
-    try:
-        device = Device.objects.select_related(
-            'solarpanel', 'generator', 'battery', 'electricvehicle',
-            'airconditioner', 'heater'
-        ).get(id=device_id)
-    except Device.DoesNotExist:
-        return
+    simulate_devices([device_id], tick_id, elapsed_seconds)
 
-    timestamp = datetime.utcnow()
-    redis_client = RedisClient()
 
-    # Get specific device and appropriate simulator
-    specific_device = device.get_specific_device()
-    device_type = device.get_device_type()
-
-    # Instantiate appropriate simulator
-    if device_type == 'solar_panel':
-        simulator = SolarPanelSimulator(specific_device)
-    elif device_type == 'generator':
-        simulator = GeneratorSimulator(specific_device)
-    elif device_type == 'battery':
-        simulator = BatterySimulator(specific_device)
-    elif device_type == 'electric_vehicle':
-        simulator = EVSimulator(specific_device)
-    elif device_type in ['air_conditioner', 'heater']:
-        simulator = ConsumptionSimulator(specific_device)
-    else:
-        return
+@shared_task(
+    autoretry_for=(DatabaseError, RedisError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def checkpoint_device_state():
+    """Flush storage state changed in Redis to DeviceState (write-behind mode)."""
+    if write_behind_enabled():
+        RedisStateStore().checkpoint()
 
-    # Run simulation
-    result = simulator.simulate(timestamp)
-
-    # Store result in Redis
-    if device_type in ['battery', 'electric_vehicle']:
-        # Storage devices have different data structure
-        storage_data = {
-            'capacity_wh': result['capacity_wh'],
-            'current_level_wh': result['current_level_wh'],
-            'flow_w': result['flow_w'],
-            'timestamp': result['timestamp'],
-            'status': result['status'],
-        }
-        # Include mode for EVs
-        if device_type == 'electric_vehicle' and 'mode' in result:
-            storage_data['mode'] = result['mode']
-        redis_client.store_device_storage(device_id, storage_data)
-    else:
-        # Production and consumption devices
-        redis_client.store_device_data(device_id, result)
+
+@shared_task(autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=3)
+def prune_device_changes():
+    """Drop change feed entries older than DEVICE_CHANGE_RETENTION_HOURS."""
+    return prune_changes()
 
 
 @shared_task
-def compute_user_energy_stats(user_id: int):
+def compute_user_energy_stats(user_id: int, tick_id: Optional[int] = None,
+                              baseline_w: Optional[float] = None):
     """
     Compute aggregated energy statistics for a user.
 
     Args:
         user_id: The ID of the user
+        tick_id: The tick whose device results are being aggregated
+        baseline_w: The household's baseline load; looked up if not given
     """
     try:
         user = User.objects.get(id=user_id)
     except User.DoesNotExist:
         return
 
-    devices = Device.objects.filter(user=user).select_related(
-        'solarpanel', 'generator', 'battery', 'electricvehicle',
-        'airconditioner', 'heater'
-    )
+    devices = Device.objects.filter(user=user).select_related(*SIMULATION_RELATIONS)
 
     redis_client = RedisClient()
 
@@ -123,28 +273,45 @@ def compute_user_energy_stats(user_id: int):
     total_storage_flow = 0.0  # Watts (+ charging, - discharging)
 
     for device in devices:
-        device_type = device.get_device_type()
+        spec = spec_for(device.get_device_type())
+        role = spec.role if spec is not None else None
 
-        if device_type in ['solar_panel', 'generator']:
+        if role == PRODUCTION:
             # Production devices
             data = redis_client.get_device_data(device.id)
             if data and data.get('status') == 'online':
                 total_production += data.get('power_w', 0.0)
 
-        elif device_type in ['battery', 'electric_vehicle']:
+        elif role == STORAGE:
             # Storage devices
             data = redis_client.get_device_storage(device.id)
             if data and data.get('status') == 'online':
                 total_storage_capacity += data.get('capacity_wh', 0.0)
                 total_storage_level += data.get('current_level_wh', 0.0)
                 total_storage_flow += data.get('flow_w', 0.0)
+            elif device.status != DeviceStatus.ONLINE:
+                # Offline storage still counts at its last known level. It
+                # isn't simulated again, so its result may have expired
+                if data:
+                    total_storage_capacity += data.get('capacity_wh', 0.0)
+                    total_storage_level += data.get('current_level_wh', 0.0)
+                else:
+                    specific_device = device.get_specific_device()
+                    total_storage_capacity += specific_device.capacity_kwh * 1000
+                    total_storage_level += specific_device.current_charge_kwh * 1000
 
-        elif device_type in ['air_conditioner', 'heater']:
+        elif role == CONSUMPTION:
             # Consumption devices
             data = redis_client.get_device_data(device.id)
             if data and data.get('status') == 'online':
                 total_consumption += data.get('power_w', 0.0)
 
+    # Lighting, appliances and standby load from the household's profile
+    if baseline_w is None:
+        timestamp = tick_start(tick_id) if tick_id is not None else datetime.utcnow()
+        baseline_w = household_baseline(user_id, timestamp)
+    total_consumption += baseline_w
+
     # Calculate storage percentage
     storage_percentage = 0.0
     if total_storage_capacity > 0:
@@ -158,6 +325,7 @@ def compute_user_energy_stats(user_id: int):
     stats = {
         'current_production': total_production,
         'current_consumption': total_consumption,
+        'baseline_consumption': baseline_w,
         'storage': {
             'total_capacity_wh': total_storage_capacity,
             'current_level_wh': total_storage_level,
@@ -169,3 +337,8 @@ def compute_user_energy_stats(user_id: int):
     }
 
     redis_client.store_user_stats(user_id, stats)
+
+    # Stats tasks are queued behind the tick's device tasks, so their lag
+    # tells us how long the tick took to drain.
+    if tick_id is not None:
+        TickCoordinator(redis_client).record_drain(tick_id)
@@ -0,0 +1,179 @@
+"""
+Outdoor temperature and HVAC load.
+
+Each air conditioner or heater is in a climate region with seasonal and
+diurnal temperature curves:
+
+    outdoor(t) = mean + seasonal * cos(2π (day - warmest_day) / 365.2425)
+                      + diurnal * cos(2π (local_hour - 15) / 24)
+
+A house does not follow the outdoor temperature instantly. It is modelled
+as a first-order thermal mass with time constant τ (the device's
+`thermal_time_constant_hours`), so the temperature its HVAC works against
+is the outdoor curve passed through a low-pass filter. The curves are
+sinusoids, so the filtered temperature has a closed form: each component is
+damped by 1 / sqrt(1 + (ωτ)²) and delayed by atan(ωτ). A device's thermal
+state is therefore known at any moment without storing or integrating
+anything per tick, in the same way as a parked EV's charge.
+
+Load follows the gap between that temperature and the setpoint:
+
+    duty = clip((indoor - setpoint) / DEMAND_SPAN_C, 0, 1)     # cooling
+    duty = clip((setpoint - indoor) / DEMAND_SPAN_C, 0, 1)     # heating
+    power = min_power_w + (max_power_w - min_power_w) * duty   # 0 when duty is 0
+
+`ThermalFleet` evaluates a whole batch with NumPy: per-device constants are
+folded in once, and a tick costs two cosines per device.
+"""
+
+import calendar
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Sequence
+
+from apps.devices.models import ClimateRegion
+from apps.simulation.rng import np
+
+DAY = 86400
+YEAR_DAYS = 365.2425
+# Hour of the daily maximum, local time
+PEAK_HOUR = 15
+# Temperature gap, in °C, at which a unit runs flat out
+DEMAND_SPAN_C = 8.0
+# Per-tick variation in duty (doors opening, occupancy, cycling)
+DUTY_JITTER = 0.05
+
+
+@dataclass(frozen=True)
+class Climate:
+    """Temperature curves of one region, in °C."""
+
+    mean_c: float
+    seasonal_c: float
+    diurnal_c: float
+    warmest_day: float
+    utc_offset_hours: float
+
+
+CLIMATES: Dict[str, Climate] = {
+    ClimateRegion.HOT_HUMID: Climate(21.0, 8.5, 5.0, 200, -6),
+    ClimateRegion.HOT_DRY: Climate(24.0, 10.5, 7.5, 200, -7),
+    ClimateRegion.MIXED: Climate(13.0, 11.5, 4.5, 200, -5),
+    ClimateRegion.MARINE: Climate(14.5, 3.0, 4.0, 260, -8),
+    ClimateRegion.COLD: Climate(7.5, 15.5, 5.0, 200, -6),
+}
+
+
+def _days(timestamp: datetime) -> float:
+    """Days since the Unix epoch of a naive UTC timestamp."""
+    return (calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6) / DAY
+
+
+def _response(period_days: float, time_constant_hours: float):
+    """Damping and phase lag of a first-order lag on a sinusoid."""
+    omega_tau = 2 * math.pi * time_constant_hours / (period_days * 24)
+    return 1 / math.sqrt(1 + omega_tau ** 2), math.atan(omega_tau)
+
+
+def outdoor_temperature(climate: Climate, timestamp: datetime) -> float:
+    """Outdoor temperature in °C."""
+    return indoor_temperature(climate, timestamp, 0.0)
+
+
+def indoor_temperature(climate: Climate, timestamp: datetime, time_constant_hours: float) -> float:
+    """Temperature a house with time constant τ hours works against, in °C."""
+    days = _days(timestamp)
+    seasonal_gain, seasonal_lag = _response(YEAR_DAYS, time_constant_hours)
+    diurnal_gain, diurnal_lag = _response(1.0, time_constant_hours)
+    # Reduce the day count first so the phases stay precise
+    seasonal = 2 * math.pi * (days % YEAR_DAYS - climate.warmest_day) / YEAR_DAYS
+    diurnal = 2 * math.pi * (days % 1.0 + (climate.utc_offset_hours - PEAK_HOUR) / 24)
+    return (
+        climate.mean_c
+        + climate.seasonal_c * seasonal_gain * math.cos(seasonal - seasonal_lag)
+        + climate.diurnal_c * diurnal_gain * math.cos(diurnal - diurnal_lag)
+    )
+
+
+def duty_cycle(device, timestamp: datetime, jitter: float = 0.0) -> float:
+    """Fraction of its power range an AC or heater draws at `timestamp`."""
+    indoor = indoor_temperature(
+        CLIMATES[device.climate_region], timestamp, device.thermal_time_constant_hours
+    )
+    gap = indoor - device.setpoint_c if device.cooling else device.setpoint_c - indoor
+    return min(1.0, max(0.0, gap / DEMAND_SPAN_C + jitter))
+
+
+def hvac_power(min_power_w, max_power_w, duty):
+    """
+    Power drawn at a duty cycle: nothing while idle, in the min/max range while running.
+
+    Takes floats or NumPy arrays, so the scalar and batched paths share it.
+    """
+    return (duty > 0) * (min_power_w + (max_power_w - min_power_w) * duty)
+
+
+class ThermalFleet:
+    """Vectorised HVAC load for many devices."""
+
+    COLUMNS = (
+        'mean', 'seasonal_amplitude', 'diurnal_amplitude',
+        'seasonal_phase', 'diurnal_phase', 'setpoint', 'sign',
+    )
+
+    def __init__(self, devices: Sequence):
+        if np is None:
+            raise ImportError('NumPy is required for batched HVAC load')
+        climates = [CLIMATES[device.climate_region] for device in devices]
+        seasonal = [_response(YEAR_DAYS, device.thermal_time_constant_hours) for device in devices]
+        diurnal = [_response(1.0, device.thermal_time_constant_hours) for device in devices]
+
+        def column(values):
+            return np.array(values, dtype=np.float64)
+
+        self.mean = column([climate.mean_c for climate in climates])
+        self.seasonal_amplitude = column([c.seasonal_c * gain for c, (gain, _) in zip(climates, seasonal)])
+        self.diurnal_amplitude = column([c.diurnal_c * gain for c, (gain, _) in zip(climates, diurnal)])
+        # Phases at the epoch, lags included, so a tick only adds the time
+        self.seasonal_phase = column([
+            -2 * math.pi * c.warmest_day / YEAR_DAYS - lag for c, (_, lag) in zip(climates, seasonal)
+        ])
+        self.diurnal_phase = column([
+            2 * math.pi * (c.utc_offset_hours - PEAK_HOUR) / 24 - lag for c, (_, lag) in zip(climates, diurnal)
+        ])
+        self.setpoint = column([device.setpoint_c for device in devices])
+        # +1 where cooling raises load with temperature, -1 where heating does
+        self.sign = column([1.0 if device.cooling else -1.0 for device in devices])
+
+    @classmethod
+    def from_columns(cls, columns) -> 'ThermalFleet':
+        """A fleet from arrays given in `COLUMNS` order."""
+        fleet = cls.__new__(cls)
+        for name, values in zip(cls.COLUMNS, columns):
+            setattr(fleet, name, values)
+        return fleet
+
+    def select(self, rows) -> 'ThermalFleet':
+        """The devices at `rows` (an index array or boolean mask)."""
+        return self.from_columns(getattr(self, name)[rows] for name in self.COLUMNS)
+
+    def concatenate(self, other: 'ThermalFleet') -> 'ThermalFleet':
+        """The devices of this fleet followed by those of `other`."""
+        return self.from_columns(
+            np.concatenate([getattr(self, name), getattr(other, name)]) for name in self.COLUMNS
+        )
+
+    def indoor_temperature(self, timestamp: datetime):
+        days = _days(timestamp)
+        seasonal = 2 * math.pi * (days % YEAR_DAYS) / YEAR_DAYS
+        diurnal = 2 * math.pi * (days % 1.0)
+        return (
+            self.mean
+            + self.seasonal_amplitude * np.cos(seasonal + self.seasonal_phase)
+            + self.diurnal_amplitude * np.cos(diurnal + self.diurnal_phase)
+        )
+
+    def duty_cycle(self, timestamp: datetime, jitter=0.0):
+        gap = self.sign * (self.indoor_temperature(timestamp) - self.setpoint)
+        return np.clip(gap / DEMAND_SPAN_C + jitter, 0.0, 1.0)
@@ -0,0 +1,231 @@
+"""
+Tick coordination for the simulation loop.
+
+Every simulation run is a *tick* identified by the interval of simulated
+time it belongs to: `tick_id = floor(epoch_seconds / SIMULATION_TICK_SECONDS)`,
+where the epoch comes from the `SimulationClock` (the wall clock unless the
+simulation is accelerated). The
+coordinator guarantees that at most one orchestrator runs at a time (a Redis
+lock shared by all workers) and that each tick id is run at most once.
+
+A beat that fires while the previous tick still holds the lock is skipped,
+and a tick id that already ran is ignored. Neither loses simulated time: the
+next tick that does run integrates over everything since the start of the
+last completed tick, so battery and EV charge track elapsed time however
+late or irregular the workers are, and even if the tick length changes.
+For the same reason storage devices are marked with the simulated start of
+the last tick they applied (`tick_watermark`), not its id.
+
+Tick health is written to Redis so a lagging fleet is visible:
+
+    simulation:ticks        hash of the latest tick (id, lag, elapsed, ...)
+    simulation:ticks:lag    most recent per-tick lag samples, newest first
+"""
+
+import calendar
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+from django.conf import settings
+from redis.exceptions import LockError
+
+from apps.devices.models import DeviceState
+from apps.simulation.clock import SimulationClock
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.state import RedisStateStore
+
+
+LOCK_KEY = 'simulation:tick:lock'
+LAST_TICK_KEY = 'simulation:tick:last'
+LAST_TICK_START_KEY = 'simulation:tick:last_start'
+STATS_KEY = 'simulation:ticks'
+LAG_HISTORY_KEY = 'simulation:ticks:lag'
+
+# One day of lag samples at the default 60 second tick
+LAG_HISTORY_LENGTH = 1440
+
+
+def tick_seconds() -> int:
+    return int(getattr(settings, 'SIMULATION_TICK_SECONDS', 60))
+
+
+def tick_id_for(epoch_seconds: float, seconds: Optional[int] = None) -> int:
+    """Return the id of the tick that contains `epoch_seconds`."""
+    return int(epoch_seconds // (seconds or tick_seconds()))
+
+
+def tick_start(tick_id: int, seconds: Optional[int] = None) -> datetime:
+    """Return the naive UTC simulated time at which `tick_id` starts."""
+    epoch = tick_id * (seconds or tick_seconds())
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def tick_watermark(timestamp: datetime) -> int:
+    """
+    The storage watermark of the tick starting at `timestamp` (naive UTC).
+
+    This is the tick's simulated start in epoch seconds rather than its id,
+    so it keeps increasing when SIMULATION_TICK_SECONDS changes.
+    """
+    return calendar.timegm(timestamp.utctimetuple())
+
+
+@dataclass(frozen=True)
+class Tick:
+    """A tick the caller holds the lock for and is expected to run."""
+
+    tick_id: int
+    timestamp: datetime     # naive UTC start of the tick interval
+    elapsed_seconds: float  # simulated time to integrate over
+    missed_ticks: int       # ticks since the last completed one that never ran
+    lag_seconds: float      # how late this tick started, in simulated seconds
+
+
+class TickCoordinator:
+    """Serialises simulation ticks across workers through Redis."""
+
+    def __init__(self, redis_client: Optional[RedisClient] = None,
+                 clock: Optional[SimulationClock] = None):
+        redis_client = redis_client or RedisClient()
+        self._redis_client = redis_client
+        self.redis = redis_client.redis
+        self.clock = clock or SimulationClock(redis_client)
+        self.tick_seconds = tick_seconds()
+        self.max_catch_up_seconds = float(
+            getattr(settings, 'SIMULATION_MAX_CATCH_UP_SECONDS', 86400)
+        )
+        # Outlive a crashed orchestrator for a few ticks, then let others in
+        self.lock_timeout = max(1, math.ceil(self.clock.real_duration(self.tick_seconds) * 5))
+
+    def reset(self):
+        """
+        Restart simulated time from SIMULATION_CLOCK_START.
+
+        Forgets the clock anchor and the completed ticks, and clears every
+        storage device's watermark, which would otherwise be ahead of the
+        restarted clock and make devices skip every tick as already applied.
+        """
+        self.clock.reset()
+        self.redis.delete(LAST_TICK_KEY, LAST_TICK_START_KEY)
+        DeviceState.objects.update(last_tick_start=None)
+        RedisStateStore(self._redis_client).clear_watermarks()
+
+    def last_completed_tick(self) -> Optional[int]:
+        value = self.redis.get(LAST_TICK_KEY)
+        return int(value) if value is not None else None
+
+    def _last_completed_start(self) -> Optional[float]:
+        """Simulated epoch at which the last completed tick started."""
+        start, tick_id = self.redis.mget(LAST_TICK_START_KEY, LAST_TICK_KEY)
+        if start is not None:
+            return float(start)
+        return int(tick_id) * self.tick_seconds if tick_id is not None else None
+
+    @contextmanager
+    def begin(self, now: Optional[float] = None) -> Iterator[Optional[Tick]]:
+        """
+        Claim the current tick.
+
+        Yields a `Tick` when the caller should run it, or None when another
+        orchestrator holds the lock or this tick has already run. The tick
+        is marked completed only if the block exits without raising. `now`
+        is simulated epoch seconds and defaults to the clock's time.
+        """
+        started = time.time()
+        now = self.clock.now(started) if now is None else now
+        lock = self.redis.lock(LOCK_KEY, timeout=self.lock_timeout, blocking=False)
+        if not lock.acquire(blocking=False):
+            self.redis.hincrby(STATS_KEY, 'skipped_overlaps', 1)
+            yield None
+            return
+
+        try:
+            tick_id = tick_id_for(now, self.tick_seconds)
+            start = float(tick_id * self.tick_seconds)
+            last_start = self._last_completed_start()
+            if last_start is not None and start <= last_start:
+                self.redis.hincrby(STATS_KEY, 'skipped_duplicates', 1)
+                yield None
+                return
+
+            if last_start is None:
+                elapsed, missed = float(self.tick_seconds), 0
+            else:
+                elapsed = start - last_start
+                missed = max(0, math.ceil(elapsed / self.tick_seconds) - 1)
+            tick = Tick(
+                tick_id=tick_id,
+                timestamp=tick_start(tick_id, self.tick_seconds),
+                elapsed_seconds=min(elapsed, self.max_catch_up_seconds),
+                missed_ticks=missed,
+                lag_seconds=now - start,
+            )
+
+            yield tick
+
+            self._complete(tick, duration=time.time() - started)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Lock expired while we ran; someone else may own it now.
+                pass
+
+    def _complete(self, tick: Tick, duration: float):
+        pipe = self.redis.pipeline()
+        pipe.set(LAST_TICK_KEY, tick.tick_id)
+        pipe.set(LAST_TICK_START_KEY, tick.tick_id * self.tick_seconds)
+        pipe.hset(STATS_KEY, mapping={
+            'last_tick_id': tick.tick_id,
+            'lag_seconds': round(tick.lag_seconds, 3),
+            'elapsed_seconds': tick.elapsed_seconds,
+            'tick_seconds': self.tick_seconds,
+            'time_scale': self.clock.scale,
+            'missed_ticks': tick.missed_ticks,
+            'duration_seconds': round(duration, 3),
+        })
+        if tick.missed_ticks:
+            pipe.hincrby(STATS_KEY, 'missed_ticks_total', tick.missed_ticks)
+        pipe.lpush(LAG_HISTORY_KEY, round(tick.lag_seconds, 3))
+        pipe.ltrim(LAG_HISTORY_KEY, 0, LAG_HISTORY_LENGTH - 1)
+        pipe.execute()
+
+    def record_drain(self, tick_id: int, now: Optional[float] = None):
+        """
+        Record how long after its start a tick's queued work drained.
+
+        Called by the last tasks a tick enqueues; when this approaches the
+        tick length, the workers can no longer keep up with the fleet.
+        """
+        now = self.clock.now() if now is None else now
+        self.redis.hset(STATS_KEY, mapping={
+            'drained_tick_id': tick_id,
+            'drain_lag_seconds': round(now - tick_id * self.tick_seconds, 3),
+        })
+
+    def record_counters(self, **counts: int):
+        """Add to running totals in the tick stats (e.g. cache hits from a batch)."""
+        counts = {key: value for key, value in counts.items() if value}
+        if not counts:
+            return
+        pipe = self.redis.pipeline()
+        for key, value in counts.items():
+            pipe.hincrby(STATS_KEY, key, value)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the latest tick stats with numeric values decoded."""
+        stats = {}
+        for key, value in self.redis.hgetall(STATS_KEY).items():
+            try:
+                stats[key] = int(value)
+            except ValueError:
+                stats[key] = float(value)
+        lookups = stats.get('solar_cache_hits', 0) + stats.get('solar_cache_misses', 0)
+        if lookups:
+            stats['solar_cache_hit_rate'] = round(stats.get('solar_cache_hits', 0) / lookups, 4)
+        return stats
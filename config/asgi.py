@@ -0,0 +1,30 @@
+"""
+ASGI config for smart_home_energy project.
+
+Only `/graphql/` is served as ASGI, on the worker's event loop, so its async
+resolvers share one Redis pool per worker and don't hold a thread while they
+wait. Everything else (the REST API, admin, dashboard pages) is sync Django
+and runs as WSGI on a pool of WEB_THREADS threads per worker, handling that
+many requests at once as `gunicorn --threads` did.
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
+
+ASYNC_PATH_PREFIXES = ('/graphql/',)
+
+django_asgi = get_asgi_application()
+django_wsgi = WSGIMiddleware(get_wsgi_application(), workers=int(os.getenv('WEB_THREADS', '2')))
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(ASYNC_PATH_PREFIXES):
+        await django_asgi(scope, receive, send)
+    else:
+        # Includes lifespan, which the WSGI adapter acknowledges
+        await django_wsgi(scope, receive, send)
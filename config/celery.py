@@ -15,11 +15,26 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 # Configure Celery Beat schedule
-app.conf.beat_schedule = {
-    'run-energy-simulation-every-60-seconds': {
-        'task': 'apps.simulation.tasks.run_energy_simulation',
-        'schedule': 60.0,  # Run every 60 seconds
-    },
-}
+# At the default one tick per real minute, fire on minute boundaries so each
+# run lands at the start of its tick. Sub-minute or accelerated ticks use a
+# plain interval; the tick coordinator aligns them to the simulation clock.
+# A run that sits in the queue past its tick is dropped; the next one catches up.
+# Built once the app is configured, when Django settings are loaded.
+@app.on_after_configure.connect
+def setup_beat_schedule(sender, **kwargs):
+    from apps.simulation.clock import beat_interval_seconds
+
+    interval = beat_interval_seconds()
+    sender.conf.beat_schedule = {
+        'run-energy-simulation-every-tick': {
+            'task': 'apps.simulation.tasks.run_energy_simulation',
+            'schedule': crontab() if interval == 60 else interval,
+            'options': {'expires': interval},
+        },
+        'prune-device-changes-hourly': {
+            'task': 'apps.simulation.tasks.prune_device_changes',
+            'schedule': crontab(minute=0),
+        },
+    }
 
 app.conf.timezone = 'UTC'
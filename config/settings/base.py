@@ -75,6 +75,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 DATABASES = {
@@ -123,6 +124,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redis configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
+# JSON codec for Redis payloads and API responses: 'auto' (orjson if installed), 'orjson' or 'json'
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -141,6 +145,49 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Simulation ticks: length of one tick, and the most simulated time a single
+# tick will integrate when catching up after missed runs
+SIMULATION_TICK_SECONDS = int(os.getenv('SIMULATION_TICK_SECONDS', '60'))
+SIMULATION_MAX_CATCH_UP_SECONDS = int(os.getenv('SIMULATION_MAX_CATCH_UP_SECONDS', '86400'))
+# Simulated seconds per real second (e.g. 60 runs an hour a minute), and an
+# optional ISO UTC datetime where an accelerated clock starts
+SIMULATION_TIME_SCALE = float(os.getenv('SIMULATION_TIME_SCALE', '1'))
+SIMULATION_CLOCK_START = os.getenv('SIMULATION_CLOCK_START', '')
+# Devices simulated per task; their storage state is written in one statement
+SIMULATION_BATCH_SIZE = int(os.getenv('SIMULATION_BATCH_SIZE', '500'))
+# Batches at least this large are written via COPY + UPDATE ... FROM on PostgreSQL
+SIMULATION_COPY_THRESHOLD = int(os.getenv('SIMULATION_COPY_THRESHOLD', '200'))
+# Where live battery/EV state is kept: 'database', or 'redis' for write-behind
+# with a DeviceState checkpoint every SIMULATION_CHECKPOINT_TICKS ticks
+SIMULATION_STATE_BACKEND = os.getenv('SIMULATION_STATE_BACKEND', 'database')
+SIMULATION_CHECKPOINT_TICKS = int(os.getenv('SIMULATION_CHECKPOINT_TICKS', '10'))
+# Results, state rows and user stats the simulation daemon writes per bulk call
+SIMULATION_DAEMON_WRITE_SIZE = int(os.getenv('SIMULATION_DAEMON_WRITE_SIZE', '10000'))
+# Worker processes the simulation daemon shards the fleet across (1: step in-process)
+SIMULATION_DAEMON_PROCESSES = int(os.getenv('SIMULATION_DAEMON_PROCESSES', '1'))
+# Device change feed: entries, and gaps in its ids still looked up in case
+# an open transaction fills them, are kept for DEVICE_CHANGE_RETENTION_HOURS,
+# and each commit is announced on the 'devices:changes' Redis channel when
+# DEVICE_CHANGE_NOTIFY is set
+DEVICE_CHANGE_RETENTION_HOURS = float(os.getenv('DEVICE_CHANGE_RETENTION_HOURS', '24'))
+DEVICE_CHANGE_NOTIFY = os.getenv('DEVICE_CHANGE_NOTIFY', 'False') == 'True'
+# Device results within SIMULATION_WRITE_EPSILON (W, Wh) of the last written
+# one, with the same status and mode, aren't rewritten to Redis; each is still
+# refreshed every SIMULATION_WRITE_HEARTBEAT_SECONDS (one tick or less: always write)
+SIMULATION_WRITE_EPSILON = float(os.getenv('SIMULATION_WRITE_EPSILON', '1.0'))
+SIMULATION_WRITE_HEARTBEAT_SECONDS = float(os.getenv('SIMULATION_WRITE_HEARTBEAT_SECONDS', '900'))
+# Simulators a worker process keeps alive between ticks
+SIMULATOR_POOL_SIZE = int(os.getenv('SIMULATOR_POOL_SIZE', '100000'))
+# Seed of the per-device random streams; same seed, same simulated fleet
+SIMULATION_SEED = int(os.getenv('SIMULATION_SEED', '0'))
+# Panels share solar geometry within cells of this many degrees (0.01° ≈ 1 km);
+# the per-process cache holds at most SOLAR_CACHE_MAX_ENTRIES elevations
+SOLAR_CACHE_CELL_DEGREES = float(os.getenv('SOLAR_CACHE_CELL_DEGREES', '0.01'))
+SOLAR_CACHE_MAX_ENTRIES = int(os.getenv('SOLAR_CACHE_MAX_ENTRIES', '100000'))
+# Cloud cover field: grid spacing in degrees, and seconds between weather frames
+CLOUD_GRID_DEGREES = float(os.getenv('CLOUD_GRID_DEGREES', '0.5'))
+CLOUD_PERSISTENCE_SECONDS = int(os.getenv('CLOUD_PERSISTENCE_SECONDS', '1800'))
+
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
@@ -157,7 +204,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'apps.api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'apps.api.pagination.KeysetPagination',
     'PAGE_SIZE': 100,
 }
 
@@ -39,12 +39,13 @@ END
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Start Gunicorn
-echo "Starting Gunicorn..."
-exec gunicorn config.wsgi:application \
+# Start Gunicorn with Uvicorn workers. config.asgi serves /graphql/ on the
+# event loop and everything else as WSGI on WEB_THREADS threads per worker
+echo "Starting Gunicorn (ASGI)..."
+exec gunicorn config.asgi:application \
+    --worker-class uvicorn.workers.UvicornWorker \
     --bind 0.0.0.0:${PORT:-8000} \
     --workers 4 \
-    --threads 2 \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
@@ -15,5 +15,8 @@ until python -c "import psycopg; psycopg.connect('$DATABASE_URL')" 2>/dev/null;
   sleep 1
 done
 
+# In write-behind mode, rebuild any live storage state Redis lost from the last checkpoint
+python manage.py restore_device_state
+
 echo "Redis and Database are ready - starting Celery beat scheduler"
 celery -A config beat --loglevel=info
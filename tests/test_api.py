@@ -3,12 +3,17 @@
 import pytest
 import json
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.devices.models import (
     Device, Battery, ElectricVehicle, SolarPanel,
     Generator, AirConditioner, Heater, DeviceStatus, EVMode
 )
+from apps.api.serializers import (
+    BatterySerializer, ElectricVehicleSerializer, SolarPanelSerializer, FastReadSerializer
+)
 
 
 @pytest.fixture
@@ -505,3 +510,137 @@ class TestValidation:
             format='json'
         )
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    """Test cursor pagination on list endpoints."""
+
+    @pytest.fixture
+    def many_generators(self, user):
+        return [
+            Generator.objects.create(user=user, name=f'Generator {i}', rated_output_w=1000.0)
+            for i in range(5)
+        ]
+
+    def test_list_has_no_count(self, authenticated_client, many_generators):
+        """Test list responses use the cursor envelope without COUNT(*)."""
+        response = authenticated_client.get('/api/generators/')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert response.data['next'] is None
+        assert response.data['previous'] is None
+        assert len(response.data['results']) == 5
+
+    def test_walk_pages_forward_and_back(self, authenticated_client, many_generators):
+        """Test following next/previous links visits every row exactly once."""
+        response = authenticated_client.get('/api/devices/?page_size=2')
+        seen = [row['id'] for row in response.data['results']]
+        pages = [seen[:]]
+        while response.data['next']:
+            response = authenticated_client.get(response.data['next'])
+            ids = [row['id'] for row in response.data['results']]
+            pages.append(ids)
+            seen.extend(ids)
+
+        expected = [d.id for d in sorted(many_generators, key=lambda d: (d.created_at, d.id), reverse=True)]
+        assert seen == expected
+        assert len(pages) == 3
+
+        previous = authenticated_client.get(response.data['previous'])
+        assert [row['id'] for row in previous.data['results']] == pages[1]
+
+    def test_ties_on_created_at_are_broken_by_id(self, authenticated_client, many_generators):
+        """Test rows sharing a created_at timestamp are neither skipped nor repeated."""
+        Device.objects.filter(id__in=[d.id for d in many_generators]).update(
+            created_at=many_generators[0].created_at
+        )
+        response = authenticated_client.get('/api/generators/?page_size=2')
+        seen = [row['id'] for row in response.data['results']]
+        while response.data['next']:
+            response = authenticated_client.get(response.data['next'])
+            seen.extend(row['id'] for row in response.data['results'])
+
+        assert seen == sorted((d.id for d in many_generators), reverse=True)
+
+    def test_invalid_cursor(self, authenticated_client, many_generators):
+        """Test a tampered cursor is rejected."""
+        response = authenticated_client.get('/api/devices/?cursor=not-a-cursor')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    """Test ?fields= support and the fast list serializer."""
+
+    def test_fields_limits_response(self, authenticated_client, battery):
+        """Test only the requested fields are returned."""
+        response = authenticated_client.get('/api/batteries/?fields=id,name,charge_percentage')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == [
+            {'id': battery.id, 'name': battery.name, 'charge_percentage': 50.0}
+        ]
+
+    def test_fields_on_retrieve(self, authenticated_client, electric_vehicle):
+        """Test sparse fieldsets also apply to detail reads."""
+        response = authenticated_client.get(
+            f'/api/electric-vehicles/{electric_vehicle.id}/?fields=mode,current_charge_kwh'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'mode': 'charging', 'current_charge_kwh': 37.5}
+
+    def test_unknown_field_rejected(self, authenticated_client, battery):
+        """Test asking for a field that doesn't exist is a 400."""
+        response = authenticated_client.get('/api/batteries/?fields=id,password')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_user_join_skipped(self, authenticated_client, battery):
+        """Test the user table isn't joined unless user_username is requested."""
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_client.get('/api/batteries/?fields=id,name')
+        assert not any('auth_user' in q['sql'] and 'devices_battery' in q['sql'] for q in queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get('/api/batteries/?fields=id,user_username')
+        assert response.data['results'][0]['user_username'] == battery.user.username
+        assert any('auth_user' in q['sql'] and 'devices_battery' in q['sql'] for q in queries)
+
+    def test_device_list_query_count(
+        self, authenticated_client, battery, electric_vehicle, solar_panel, django_assert_max_num_queries
+    ):
+        """Test device_type on the base device list doesn't cost a query per row."""
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.get('/api/devices/')
+        assert {row['device_type'] for row in response.data['results']} == {
+            'battery', 'electric_vehicle', 'solar_panel'
+        }
+
+    def test_field_order_shares_a_cache_entry(self, authenticated_client, battery):
+        """Test reorderings of the same fieldset don't each grow the caches."""
+        authenticated_client.get('/api/batteries/?fields=id,name')
+        before = FastReadSerializer.for_serializer.cache_info().currsize
+        response = authenticated_client.get('/api/batteries/?fields=name,id,name')
+
+        assert response.data['results'] == [{'id': battery.id, 'name': battery.name}]
+        assert FastReadSerializer.for_serializer.cache_info().currsize == before
+
+    def test_user_device_count_annotated(
+        self, admin_client, user, another_user, battery, electric_vehicle, django_assert_max_num_queries
+    ):
+        """Test device_count doesn't cost a query per user."""
+        with django_assert_max_num_queries(1):
+            response = admin_client.get('/api/users/')
+        counts = {row['username']: row['device_count'] for row in response.data['results']}
+        assert counts[user.username] == 2
+        assert counts[another_user.username] == 0
+
+    def test_fast_serializer_matches_drf(self, battery, electric_vehicle, solar_panel):
+        """Test the fast read path renders exactly what the DRF serializer does."""
+        electric_vehicle.last_seen_at = electric_vehicle.created_at
+        for serializer_class, instance in [
+            (BatterySerializer, battery),
+            (ElectricVehicleSerializer, electric_vehicle),
+            (SolarPanelSerializer, solar_panel),
+        ]:
+            fast = FastReadSerializer.for_serializer(serializer_class)
+            assert fast.serialize_many([instance]) == serializer_class([instance], many=True).data
@@ -0,0 +1,179 @@
+"""Tests for the device change feed."""
+
+import time
+import pytest
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from apps.devices.changes import (
+    ChangeFeed, ChangeFeedExpired, current_watermark, prune_changes, read_changes,
+)
+from apps.devices.models import ChangeOperation, DeviceChange, EVMode, Generator
+from apps.simulation.redis_client import RedisClient
+
+pytestmark = pytest.mark.django_db
+
+
+def _entries(since=0):
+    return list(
+        DeviceChange.objects.filter(id__gt=since).order_by('id').values_list('device_id', 'operation')
+    )
+
+
+def _change(device_id, age_seconds=0, operation=ChangeOperation.UPSERT, **kwargs):
+    change = DeviceChange.objects.create(device_id=device_id, user_id=1, operation=operation, **kwargs)
+    if age_seconds:
+        DeviceChange.objects.filter(pk=change.pk).update(
+            created_at=timezone.now() - timedelta(seconds=age_seconds)
+        )
+    return change
+
+
+class TestRecording:
+    """Test that mutations add entries in their own transaction."""
+
+    def test_create_update_and_delete(self, user):
+        generator = Generator.objects.create(user=user, name='Generator', rated_output_w=3000.0)
+        generator.rated_output_w = 4000.0
+        generator.save()
+        device_id = generator.pk
+        generator.delete()
+
+        assert _entries() == [
+            (device_id, ChangeOperation.UPSERT),
+            (device_id, ChangeOperation.UPSERT),
+            (device_id, ChangeOperation.DELETE),
+        ]
+
+    def test_state_only_save(self, electric_vehicle):
+        since = current_watermark()
+        electric_vehicle.mode = EVMode.OFFLINE
+        electric_vehicle.save(update_fields=['mode'])
+
+        assert _entries(since) == [(electric_vehicle.pk, ChangeOperation.UPSERT)]
+
+    def test_deleting_a_user_records_each_device(self, user, battery, generator):
+        since = current_watermark()
+        user.delete()
+
+        assert sorted(_entries(since)) == sorted([
+            (battery.pk, ChangeOperation.DELETE), (generator.pk, ChangeOperation.DELETE),
+        ])
+
+    def test_rolled_back_change_is_not_recorded(self, user):
+        since = current_watermark()
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                Generator.objects.create(user=user, name='Generator', rated_output_w=3000.0)
+                raise RuntimeError
+
+        assert _entries(since) == []
+
+
+class TestReading:
+    """Test reading changes after a watermark."""
+
+    def test_last_operation_per_device_wins(self, user):
+        since = current_watermark()
+        kept = Generator.objects.create(user=user, name='Kept', rated_output_w=1000.0)
+        dropped = Generator.objects.create(user=user, name='Dropped', rated_output_w=1000.0)
+        kept.save()
+        dropped_id = dropped.pk
+        dropped.delete()
+
+        batch = read_changes(since)
+
+        assert batch.upserted == {kept.pk}
+        assert batch.deleted == {dropped_id}
+        assert batch.user_ids == {user.pk}
+        assert batch.count == 4
+        assert batch.watermark == current_watermark()
+
+    def test_gap_is_read_once_filled(self):
+        first = _change(1)
+        last = _change(2, id=first.id + 2)
+
+        batch = read_changes(first.id - 1)
+        assert (batch.watermark, batch.upserted) == (last.id, {1, 2})
+        assert [gap[:2] for gap in batch.gaps] == [(first.id + 1, first.id + 1)]
+
+        # A transaction open for longer than any settle time commits into it
+        _change(3, age_seconds=600, id=first.id + 1)
+        batch = read_changes(batch.watermark, gaps=batch.gaps)
+
+        assert (batch.watermark, batch.upserted, batch.gaps) == (last.id, {3}, [])
+
+    def test_gap_is_forgotten_after_retention(self, settings):
+        settings.DEVICE_CHANGE_RETENTION_HOURS = 1
+        first = _change(1)
+        gaps = [(first.id + 1, first.id + 1, time.time() - 7200)]
+        _change(2, id=first.id + 1)
+
+        batch = read_changes(first.id + 1, gaps=gaps)
+
+        assert (batch.count, batch.gaps) == (0, [])
+
+    def test_feed_position_keeps_gaps(self):
+        first = _change(1)
+        _change(2, id=first.id + 2)
+        feed = ChangeFeed(first.id - 1)
+        feed.poll()
+
+        _change(3, id=first.id + 1)
+        resumed = ChangeFeed.resume(feed.position)
+
+        assert resumed.poll().upserted == {3}
+        assert resumed.gaps == []
+        # A bare watermark, as stored before gaps were kept
+        assert ChangeFeed.resume(str(first.id)).poll().upserted == {2, 3}
+
+    def test_pruned_changes_expire_the_watermark(self):
+        first = _change(1, age_seconds=7200)
+        _change(2, age_seconds=7200)
+        last = _change(3, age_seconds=60)
+
+        assert prune_changes(timezone.now() - timedelta(hours=1)) == 2
+        with pytest.raises(ChangeFeedExpired):
+            read_changes(first.id - 1)
+        assert read_changes(last.id - 1).upserted == {3}
+
+    def test_prune_keeps_the_newest_entry(self):
+        last = _change(1, age_seconds=7200)
+
+        assert prune_changes(timezone.now()) == 0
+        assert current_watermark() == last.id
+
+    def test_feed_pages_through_changes(self):
+        feed = ChangeFeed(page_size=2)
+        for device_id in range(5):
+            _change(device_id)
+
+        assert feed.poll().upserted == set(range(5))
+        assert feed.watermark == current_watermark()
+        assert not feed.poll()
+
+
+class TestNotification:
+    """Test the optional Redis announcement."""
+
+    def test_published_on_commit(self, user, settings, monkeypatch, django_capture_on_commit_callbacks):
+        settings.DEVICE_CHANGE_NOTIFY = True
+        published = []
+        monkeypatch.setattr(
+            RedisClient, 'publish_device_change',
+            lambda self, change_id, device_id, operation: published.append((device_id, operation))
+        )
+
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            generator = Generator.objects.create(user=user, name='Generator', rated_output_w=3000.0)
+        assert published == []
+        for callback in callbacks:
+            callback()
+
+        assert published == [(generator.pk, ChangeOperation.UPSERT)]
+
+    def test_off_by_default(self, user, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            Generator.objects.create(user=user, name='Generator', rated_output_w=3000.0)
+
+        assert callbacks == []
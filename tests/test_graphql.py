@@ -1,11 +1,15 @@
 """Comprehensive tests for GraphQL API."""
 
+import asyncio
 import pytest
 import json
-from django.contrib.auth.models import User
-from django.test import Client
+from types import SimpleNamespace
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import Client, RequestFactory
 from apps.api.mutations.auth import generate_jwt_token
-from apps.devices.models import Battery, ElectricVehicle, SolarPanel
+from apps.api.permissions import AsyncIsAuthenticated, IsAuthenticated
+from apps.devices.models import Battery, Device, ElectricVehicle, SolarPanel
+from apps.simulation.redis_client import RedisClient
 
 
 @pytest.fixture
@@ -230,6 +234,105 @@ class TestDeviceQueries:
         assert devices[0]['deviceType'] == 'solar_panel'
 
 
+    def test_devices_connection_pages(
+        self, graphql_client, auth_headers, user, battery, electric_vehicle, solar_panel
+    ):
+        """Test the devices connection walks pages with endCursor."""
+        query = """
+            query Devices($after: String) {
+                devices(first: 2, after: $after) {
+                    edges {
+                        cursor
+                        node {
+                            ... on BatteryType { id }
+                            ... on ElectricVehicleType { id }
+                            ... on SolarPanelType { id }
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+        """
+
+        response = execute_graphql(graphql_client, query, headers=auth_headers)
+        first_page = response.json()['data']['devices']
+        assert len(first_page['edges']) == 2
+        assert first_page['pageInfo']['hasNextPage'] is True
+
+        response = execute_graphql(
+            graphql_client, query,
+            variables={'after': first_page['pageInfo']['endCursor']},
+            headers=auth_headers
+        )
+        second_page = response.json()['data']['devices']
+        assert len(second_page['edges']) == 1
+        assert second_page['pageInfo']['hasNextPage'] is False
+
+        ids = [edge['node']['id'] for edge in first_page['edges'] + second_page['edges']]
+        assert sorted(ids) == sorted([battery.id, electric_vehicle.id, solar_panel.id])
+
+    def test_all_devices_is_limited(
+        self, graphql_client, auth_headers, user, battery, electric_vehicle, solar_panel
+    ):
+        """Test allDevices returns the newest `first` devices."""
+        query = """
+            query {
+                allDevices(first: 2) {
+                    ... on BatteryType { id }
+                    ... on ElectricVehicleType { id }
+                    ... on SolarPanelType { id }
+                }
+            }
+        """
+
+        response = execute_graphql(graphql_client, query, headers=auth_headers)
+        ids = [device['id'] for device in response.json()['data']['allDevices']]
+
+        newest = Device.objects.filter(user=user).order_by('-created_at', '-id').values_list('id', flat=True)[:2]
+        assert ids == list(newest)
+
+
+    def test_all_devices_reads_live_state_from_redis(
+        self, graphql_client, auth_headers, user, battery, generator
+    ):
+        """Test allDevices and energyStats resolve together from Redis data."""
+        redis_client = RedisClient()
+        redis_client.store_device_storage(battery.id, {
+            'capacity_wh': 10000.0, 'current_level_wh': 5000.0, 'flow_w': 0.0,
+            'timestamp': '2024-06-21T20:00:00', 'status': 'offline',
+        })
+        redis_client.store_user_stats(user.id, {
+            'current_production': 1500.0,
+            'current_consumption': 500.0,
+            'storage': {'total_capacity_wh': 10000.0, 'current_level_wh': 5000.0, 'percentage': 50.0},
+            'current_storage_flow': 0.0,
+            'net_grid_flow': -1000.0,
+            'timestamp': '2024-06-21T20:00:00',
+        })
+
+        query = """
+            query Dashboard {
+                energyStats { currentProduction netGridFlow }
+                allDevices {
+                    ... on BatteryType { id status }
+                    ... on GeneratorType { id status }
+                }
+            }
+        """
+        response = execute_graphql(graphql_client, query, headers=auth_headers)
+        data = response.json()['data']
+
+        statuses = {device['id']: device['status'] for device in data['allDevices']}
+        assert statuses == {battery.id: 'OFFLINE', generator.id: 'ONLINE'}
+        assert data['energyStats'] == {'currentProduction': 1500.0, 'netGridFlow': -1000.0}
+
+        redis_client.delete_key(f"device:{battery.id}:storage")
+        redis_client.delete_key(f"user:{user.id}:energy_stats")
+
+
 @pytest.mark.django_db
 class TestEnergyStatsQuery:
     """Test GraphQL energy statistics query."""
@@ -524,3 +627,43 @@ class TestGraphQLAuthentication:
         response = execute_graphql(graphql_client, query, headers=headers)
         data = response.json()
         assert 'errors' in data
+
+    def test_permission_check_is_synchronous(self, user):
+        """Test IsAuthenticated answers with a bool even while an event loop runs."""
+        request = RequestFactory().get('/graphql/', HTTP_AUTHORIZATION='Bearer invalid')
+        request.user = AnonymousUser()
+        info = SimpleNamespace(context=SimpleNamespace(request=request))
+
+        async def check():
+            return IsAuthenticated().has_permission(None, info)
+
+        assert asyncio.run(check()) is False
+        request.user = user
+        assert asyncio.run(check()) is True
+        assert asyncio.run(AsyncIsAuthenticated().has_permission(None, info)) is True
+
+
+class TestAsgiRouting:
+    """Test only GraphQL is served on the event loop."""
+
+    @pytest.mark.parametrize('scope, served_by', [
+        ({'type': 'http', 'path': '/graphql/'}, 'asgi'),
+        ({'type': 'http', 'path': '/api/devices/'}, 'wsgi'),
+        ({'type': 'http', 'path': '/admin/'}, 'wsgi'),
+        ({'type': 'lifespan'}, 'wsgi'),
+    ])
+    def test_routes(self, monkeypatch, scope, served_by):
+        from config import asgi
+
+        served = []
+
+        def app(name):
+            async def serve(scope, receive, send):
+                served.append(name)
+            return serve
+
+        monkeypatch.setattr(asgi, 'django_asgi', app('asgi'))
+        monkeypatch.setattr(asgi, 'django_wsgi', app('wsgi'))
+        asyncio.run(asgi.application(scope, None, None))
+
+        assert served == [served_by]
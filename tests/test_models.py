@@ -5,7 +5,7 @@ from decimal import Decimal
 from django.core.exceptions import ValidationError
 from apps.devices.models import (
     Device, DeviceStatus, SolarPanel, Battery, ElectricVehicle,
-    Generator, AirConditioner, Heater, EVMode
+    Generator, AirConditioner, Heater, EVMode, DeviceState
 )
 
 
@@ -212,6 +212,56 @@ class TestElectricVehicleModel:
         assert electric_vehicle.driving_efficiency_kwh_per_hour == 2.5
 
 
+@pytest.mark.django_db
+class TestDeviceStateModel:
+    """Test hot storage state lives on DeviceState."""
+
+    def test_state_created_with_device(self, battery, electric_vehicle):
+        """Test storage devices get a state row on creation."""
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 5.0
+        ev_state = DeviceState.objects.get(pk=electric_vehicle.pk)
+        assert ev_state.current_charge_kwh == 37.5
+        assert ev_state.mode == EVMode.CHARGING
+
+    def test_state_fields_round_trip(self, electric_vehicle):
+        """Test state attributes read back through the device."""
+        electric_vehicle.mode = EVMode.OFFLINE
+        electric_vehicle.current_charge_kwh = 20.0
+        electric_vehicle.save()
+
+        ev = ElectricVehicle.objects.get(pk=electric_vehicle.pk)
+        assert ev.mode == EVMode.OFFLINE
+        assert ev.current_charge_kwh == 20.0
+
+    def test_state_update_fields_skip_device_table(self, electric_vehicle, django_assert_num_queries):
+        """Test saving only state fields writes only the state row (and its change feed entry)."""
+        electric_vehicle.mode = EVMode.OFFLINE
+        with django_assert_num_queries(2):
+            electric_vehicle.save(update_fields=['mode'])
+
+        assert DeviceState.objects.get(pk=electric_vehicle.pk).mode == EVMode.OFFLINE
+
+    def test_device_save_writes_only_changed_state(self, battery):
+        """Test a device edit doesn't write back state it didn't change."""
+        loaded = Battery.objects.select_related('state').get(pk=battery.pk)
+        DeviceState.objects.filter(pk=battery.pk).update(current_charge_kwh=7.0, last_tick_start=3)
+
+        loaded.name = 'Renamed'
+        loaded.save()
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 7.0
+        loaded.current_charge_kwh = 8.0
+        loaded.save()
+
+        state = DeviceState.objects.get(pk=battery.pk)
+        assert (state.current_charge_kwh, state.last_tick_start) == (8.0, 3)
+
+    def test_state_deleted_with_device(self, battery):
+        """Test state rows cascade with their device."""
+        pk = battery.pk
+        battery.delete()
+        assert not DeviceState.objects.filter(pk=pk).exists()
+
+
 @pytest.mark.django_db
 class TestSolarPanelModel:
     """Test Solar Panel model functionality."""
@@ -0,0 +1,34 @@
+"""Fixtures shared by the simulation tests."""
+
+import pytest
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.state import CHECKPOINT_KEY, DIRTY_KEY, STATE_KEY, RedisStateStore
+
+
+@pytest.fixture(autouse=True)
+def forget_written_results():
+    """Device ids are reused across tests; an earlier test's result would hold back a write."""
+    redis = RedisClient().redis
+    keys = [*redis.scan_iter('device:*:current'), *redis.scan_iter('device:*:storage')]
+    if keys:
+        redis.delete(*keys)
+
+
+@pytest.fixture
+def fleet(solar_panel, generator, air_conditioner, battery, electric_vehicle):
+    """One household with a device of each simulated group, its battery part charged."""
+    battery.current_charge_kwh = 2.0
+    battery.save()
+    return [solar_panel, generator, air_conditioner, battery, electric_vehicle]
+
+
+@pytest.fixture
+def write_behind(settings):
+    """Keep live storage state in Redis, starting from an empty store."""
+    settings.SIMULATION_STATE_BACKEND = 'redis'
+    store = RedisStateStore()
+    keys = [DIRTY_KEY, CHECKPOINT_KEY, *store.redis.scan_iter(STATE_KEY.format('*'))]
+    store.redis.delete(*keys)
+    yield store
+    keys = [DIRTY_KEY, CHECKPOINT_KEY, *store.redis.scan_iter(STATE_KEY.format('*'))]
+    store.redis.delete(*keys)
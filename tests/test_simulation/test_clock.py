@@ -0,0 +1,66 @@
+"""Tests for the simulation clock."""
+
+import pytest
+from apps.simulation.clock import CLOCK_KEY, SimulationClock, beat_interval_seconds
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.ticks import LAST_TICK_KEY, LAST_TICK_START_KEY, LOCK_KEY, TickCoordinator, tick_id_for
+
+# 2024-01-15 12:00:00 UTC
+EPOCH = 1705320000.0
+
+
+@pytest.fixture
+def redis_client():
+    client = RedisClient()
+    client.redis.delete(CLOCK_KEY)
+    yield client
+    client.redis.delete(CLOCK_KEY)
+
+
+class TestSimulationClock:
+    """Test mapping wall-clock time to simulated time."""
+
+    def test_realtime_by_default(self, redis_client):
+        assert SimulationClock(redis_client).now(real=EPOCH) == EPOCH
+        assert not redis_client.redis.exists(CLOCK_KEY)
+
+    def test_accelerated_clock(self, redis_client):
+        clock = SimulationClock(redis_client, scale=60)
+        assert clock.now(real=EPOCH) == EPOCH
+        assert clock.now(real=EPOCH + 10) == EPOCH + 600
+        assert clock.real_duration(600) == 10
+
+    def test_workers_share_the_anchor(self, redis_client):
+        SimulationClock(redis_client, scale=60).now(real=EPOCH)
+        assert SimulationClock(RedisClient(), scale=60).now(real=EPOCH + 1) == EPOCH + 60
+
+    def test_configured_start(self, redis_client, settings):
+        settings.SIMULATION_CLOCK_START = '2024-06-01T00:00:00'
+        clock = SimulationClock(redis_client, scale=2)
+        clock.now(real=EPOCH)
+        assert clock.now(real=EPOCH + 30) == 1717200000.0 + 60
+
+    def test_scale_change_does_not_jump(self, redis_client):
+        SimulationClock(redis_client, scale=60).now(real=EPOCH)
+        slower = SimulationClock(redis_client, scale=10)
+        assert slower.now(real=EPOCH + 10) == EPOCH + 600
+        assert slower.now(real=EPOCH + 20) == EPOCH + 700
+
+    def test_beat_interval(self, settings):
+        settings.SIMULATION_TICK_SECONDS = 60
+        settings.SIMULATION_TIME_SCALE = 30
+        assert beat_interval_seconds() == 2
+
+
+class TestAcceleratedTicks:
+    """Test the coordinator runs on simulated time."""
+
+    def test_ticks_follow_the_clock(self, redis_client, settings):
+        coordinator = TickCoordinator(redis_client, clock=SimulationClock(redis_client, scale=60))
+        redis_client.redis.delete(LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY)
+        coordinator.clock.now(real=EPOCH)
+
+        # One real second later, a simulated minute has passed
+        with coordinator.begin(now=coordinator.clock.now(real=EPOCH + 1)) as tick:
+            assert tick.tick_id == tick_id_for(EPOCH + 60, 60)
+        assert coordinator.lock_timeout == 5
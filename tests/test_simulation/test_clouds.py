@@ -0,0 +1,73 @@
+"""Tests for the cloud cover field."""
+
+import pytest
+from datetime import datetime, timedelta
+from apps.simulation import rng
+from apps.simulation.clouds import CloudField, cloud_field
+
+
+NOON = datetime(2024, 6, 21, 20, 0)
+
+
+class TestCloudField:
+    """Test the spatial and temporal structure of cloud cover."""
+
+    def test_factor_range(self):
+        field = CloudField(NOON, seed=1)
+        factors = [field.factor(30 + i * 0.37, -120 + i * 0.53) for i in range(200)]
+
+        assert all(0.85 <= factor <= 1.0 for factor in factors)
+        assert max(factors) - min(factors) > 0.05
+
+    def test_neighbours_see_the_same_clouds(self):
+        field = CloudField(NOON, seed=1)
+        here = field.factor(37.77, -122.42)
+
+        assert field.factor(37.771, -122.419) == pytest.approx(here, abs=1e-3)
+
+    def test_continuous_across_grid_lines(self):
+        field = CloudField(NOON, seed=1, grid=0.5)
+
+        assert field.factor(37.5 - 1e-9, -122.42) == pytest.approx(field.factor(37.5, -122.42), abs=1e-6)
+        assert field.factor(37.77, -122.5 - 1e-9) == pytest.approx(field.factor(37.77, -122.5), abs=1e-6)
+
+    def test_persists_between_ticks(self):
+        factors = [
+            CloudField(NOON + timedelta(minutes=minute), seed=1).factor(37.77, -122.42)
+            for minute in range(120)
+        ]
+
+        # A frame is 30 minutes; one tick never moves cover more than a few percent of its range
+        assert max(abs(b - a) for a, b in zip(factors, factors[1:])) < 0.15 * 0.1
+        assert max(factors) - min(factors) > 0
+
+    def test_deterministic_and_seeded(self):
+        assert CloudField(NOON, seed=1).factor(37.77, -122.42) == CloudField(NOON, seed=1).factor(37.77, -122.42)
+        assert CloudField(NOON, seed=1).factor(37.77, -122.42) != CloudField(NOON, seed=2).factor(37.77, -122.42)
+
+    def test_field_is_reused_within_a_tick(self):
+        field = cloud_field(NOON, seed=3)
+
+        assert cloud_field(NOON, seed=3) is field
+        assert cloud_field(NOON + timedelta(minutes=1), seed=3) is not field
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_array_matches_scalar(self):
+        latitudes = [37.77, -33.87, 51.5, 0.0, 37.771]
+        longitudes = [-122.42, 151.21, -0.12, 0.0, -122.419]
+        field = CloudField(NOON, seed=5)
+
+        batch = field.factor_array(latitudes, longitudes).tolist()
+        assert batch == [field.factor(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_array_matches_scalar_everywhere(self):
+        # Both hemispheres, points on grid lines, and moments across a frame boundary
+        latitudes = [-89.9, -45.25, -0.5, 0.0, 0.25, 12.5, 37.77, 60.001]
+        longitudes = [-179.9, -122.5, -0.0001, 0.0, 0.5, 33.3, 151.21, 179.99]
+        for minute in (0, 7, 29, 30, 59):
+            for grid in (0.25, 0.5, 3.0):
+                field = CloudField(NOON + timedelta(minutes=minute, seconds=13), seed=9, grid=grid)
+
+                batch = field.factor_array(latitudes, longitudes).tolist()
+                assert batch == [field.factor(lat, lon) for lat, lon in zip(latitudes, longitudes)]
@@ -0,0 +1,70 @@
+"""Tests for the shared JSON codec and the fast DRF renderer."""
+
+import json
+from datetime import datetime, timezone
+from rest_framework.renderers import JSONRenderer
+from apps.simulation import codec
+from apps.api.renderers import FastJSONRenderer, FastJSONParser
+from io import BytesIO
+
+
+SAMPLE = {
+    'device_id': 42,
+    'power_w': 1234.5678901234,
+    'flow_w': -0.1,
+    'capacity_wh': 13500.0,
+    'tiny': 1e-05,
+    'status': 'online',
+    'name': 'Garage \u2028 heater \u2713',
+    'nested': {'values': [0.0, 1.5, 2.25]},
+}
+
+
+class TestCodec:
+    """Test the codec behaves like the stdlib encoder it replaces."""
+
+    def test_roundtrip_matches_stdlib(self):
+        assert codec.loads(codec.dumps(SAMPLE)) == json.loads(json.dumps(SAMPLE))
+
+    def test_floats_round_trip_exactly(self):
+        values = [0.1, 1 / 3, 2.5e-7, 123456789.123456, -0.0, 1e16]
+        assert codec.loads(codec.dumps(values)) == values
+
+    def test_large_and_small_floats_decode_like_stdlib(self):
+        values = [1e16, 1e22, 1.2345678901234568e17, 1.5e300, 1.7976931348623157e308,
+                  1e-5, 1e-7, 2.5e-10, 5e-324, 2.2250738585072014e-308, -3.0e-42]
+        encoded = codec.dumps(values)
+
+        # Exponents may be spelled differently, but never the values
+        assert [value.hex() for value in codec.loads(encoded)] == [value.hex() for value in values]
+        assert json.loads(encoded) == json.loads(json.dumps(values))
+
+    def test_bytes_match_stdlib_without_exponents(self):
+        data = {**SAMPLE, 'tiny': 0.001, 'big': 123456789012.5, 'count': 2 ** 62}
+        assert codec.dumps(data) == json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+    def test_datetime_uses_default_hook(self):
+        stamp = datetime(2024, 6, 21, 20, 0, 0, 123456, tzinfo=timezone.utc)
+        encoded = codec.dumps({'at': stamp}, default=lambda obj: obj.isoformat())
+        assert codec.loads(encoded) == {'at': stamp.isoformat()}
+
+    def test_loads_accepts_str_and_bytes(self):
+        assert codec.loads('{"a": 1}') == codec.loads(b'{"a": 1}') == {'a': 1}
+
+
+class TestFastJSONRenderer:
+    """Test the DRF renderer and parser stay compatible with DRF's own."""
+
+    def test_render_matches_drf(self):
+        stamp = datetime(2024, 6, 21, 20, 0, 0, tzinfo=timezone.utc)
+        data = {**SAMPLE, 'created_at': stamp}
+        fast = FastJSONRenderer().render(data, 'application/json')
+        assert json.loads(fast) == json.loads(JSONRenderer().render(data, 'application/json'))
+        assert b'\\u2028' in fast
+
+    def test_render_none(self):
+        assert FastJSONRenderer().render(None) == b''
+
+    def test_parser(self):
+        body = json.dumps(SAMPLE).encode('utf-8')
+        assert FastJSONParser().parse(BytesIO(body)) == SAMPLE
@@ -0,0 +1,279 @@
+"""Tests for the in-memory simulation daemon."""
+
+import calendar
+import pytest
+from datetime import datetime
+from apps.devices.models import (
+    Battery, Device, DeviceState, DeviceStatus, ElectricVehicle, EVMode, Generator,
+)
+from apps.simulation import rng
+from apps.simulation.daemon import SimulationDaemon
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.tasks import compute_user_energy_stats, simulate_devices
+from apps.simulation.ticks import (
+    LAST_TICK_KEY, LAST_TICK_START_KEY, LOCK_KEY, Tick, TickCoordinator, tick_start,
+)
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(rng.np is None, reason='NumPy is not installed'),
+]
+
+# Monday 2024-06-17 20:00 UTC: sun up, EV leaving for the afternoon
+TICK_ID = calendar.timegm(datetime(2024, 6, 17, 20, 0).timetuple()) // 60
+
+
+def _tick(tick_id=TICK_ID):
+    return Tick(tick_id, tick_start(tick_id, 60), 60.0, 0, 0.0)
+
+
+@pytest.fixture(autouse=True)
+def clean_ticks():
+    redis = RedisClient().redis
+    redis.delete(LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY)
+    yield
+    redis.delete(LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY)
+
+
+def _outputs(devices, user):
+    redis_client = RedisClient()
+    outputs = {}
+    for device in devices:
+        if device.get_device_type() in ('battery', 'electric_vehicle'):
+            outputs[device.id] = redis_client.get_device_storage(device.id)
+        else:
+            outputs[device.id] = redis_client.get_device_data(device.id)
+    stats = redis_client.get_user_stats(user.id)
+    stats.pop('timestamp')
+    return outputs, stats
+
+
+def _states(devices):
+    return {
+        state.pk: (state.current_charge_kwh, state.mode, state.last_seen_at, state.last_tick_start)
+        for state in DeviceState.objects.filter(pk__in=[device.pk for device in devices])
+    }
+
+
+def _assert_close(got, expected):
+    assert got.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            _assert_close(got[key], value)
+        elif isinstance(value, float):
+            assert got[key] == pytest.approx(value, rel=1e-9)
+        else:
+            assert got[key] == value
+
+
+class TestSimulationDaemon:
+    """Test one daemon tick against the Celery path."""
+
+    def test_tick_matches_celery_path(self, fleet, user):
+        initial = {state.pk: state for state in DeviceState.objects.all()}
+        simulate_devices([device.id for device in fleet], TICK_ID, 60.0)
+        compute_user_energy_stats(user.id, TICK_ID)
+        celery_outputs, celery_stats = _outputs(fleet, user)
+        celery_states = _states(fleet)
+
+        # Back to the state before the tick, then run it in the daemon
+        DeviceState.objects.bulk_update(initial.values(), list(DeviceState.STATE_FIELDS))
+        RedisClient().redis.delete(
+            f'user:{user.id}:energy_stats',
+            *(f'device:{device.id}:{key}' for device in fleet for key in ('current', 'storage')),
+        )
+        daemon = SimulationDaemon()
+        daemon.load()
+        counts = daemon.run_tick(_tick())
+        outputs, stats = _outputs(fleet, user)
+
+        assert counts['devices'] == len(fleet)
+        assert counts['users'] == 1
+        for device in fleet:
+            _assert_close(outputs[device.id], celery_outputs[device.id])
+        _assert_close(stats, celery_stats)
+        states = _states(fleet)
+        for pk, (charge, mode, last_seen_at, last_tick_start) in celery_states.items():
+            assert states[pk][0] == pytest.approx(charge, rel=1e-12)
+            assert states[pk][1:] == (mode, last_seen_at, last_tick_start)
+
+    def test_offline_storage_stats_match_celery_path(self, fleet, user, battery):
+        battery.status = DeviceStatus.OFFLINE
+        battery.save()
+        simulate_devices([device.id for device in fleet], TICK_ID, 60.0)
+        compute_user_energy_stats(user.id, TICK_ID)
+        _, celery_stats = _outputs(fleet, user)
+
+        RedisClient().redis.delete(f'user:{user.id}:energy_stats')
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+        _, stats = _outputs(fleet, user)
+
+        assert stats['storage']['total_capacity_wh'] == (10.0 + 75.0) * 1000
+        _assert_close(stats, celery_stats)
+
+    def test_sharded_tick_matches_one_process(self, fleet, user):
+        initial = {state.pk: state for state in DeviceState.objects.all()}
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+        expected_outputs, expected_stats = _outputs(fleet, user)
+        expected_states = _states(fleet)
+
+        DeviceState.objects.bulk_update(initial.values(), list(DeviceState.STATE_FIELDS))
+        sharded = SimulationDaemon(processes=2)
+        try:
+            sharded.load()
+            sharded.run_tick(_tick())
+        finally:
+            sharded.close()
+        outputs, stats = _outputs(fleet, user)
+
+        for device in fleet:
+            _assert_close(outputs[device.id], expected_outputs[device.id])
+        _assert_close(stats, expected_stats)
+        assert _states(fleet) == expected_states
+
+    def test_unchanged_state_is_not_written(self, fleet, electric_vehicle):
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+        # Still away a minute later: nothing to write for the EV
+        daemon.run_tick(_tick(TICK_ID + 1))
+
+        assert ElectricVehicle.objects.get(pk=electric_vehicle.pk).last_tick_start == TICK_ID * 60
+        assert Battery.objects.get(pk=fleet[3].pk).last_tick_start == (TICK_ID + 1) * 60
+
+    def test_state_applied_elsewhere_is_reloaded(self, fleet, battery):
+        DeviceState.objects.filter(pk=battery.pk).update(current_charge_kwh=3.0, last_tick_start=TICK_ID * 60)
+        daemon = SimulationDaemon()
+        daemon.load()
+        DeviceState.objects.filter(pk=battery.pk).update(current_charge_kwh=4.0)
+        RedisClient().redis.delete(f'device:{battery.id}:storage')
+
+        counts = daemon.run_tick(_tick())
+
+        assert counts['lost'] == 1
+        assert RedisClient().get_device_storage(battery.id) is None
+        assert Battery.objects.get(pk=battery.pk).current_charge_kwh == 4.0
+        assert daemon.fleet.battery['current_charge_kwh'].tolist() == [4.0]
+
+
+class TestIncrementalSync:
+    """Test that device changes reach the arrays without a reload."""
+
+    def test_edits_additions_and_deletions(self, fleet, user, generator, battery):
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+        charge = daemon.fleet.battery['current_charge_kwh'].tolist()
+
+        generator.rated_output_w = 5000.0
+        generator.save()
+        added = Generator.objects.create(user=user, name='Second Generator', rated_output_w=1000.0)
+        fleet[2].delete()
+
+        assert daemon.sync() == 3
+        assert sorted(daemon.fleet.generator['rated_output_w'].tolist()) == [1000.0, 5000.0]
+        assert added.id in daemon.fleet.device_ids().tolist()
+        assert len(daemon.fleet.consumption['id']) == 0
+        assert len(daemon.fleet.thermal.setpoint) == 0
+        # Untouched devices keep their integrated state
+        assert daemon.fleet.battery['current_charge_kwh'].tolist() == charge
+        assert sorted(daemon.fleet.device_ids().tolist()) == sorted(Device.objects.values_list('id', flat=True))
+        assert not daemon.sync()
+
+    def test_edited_ev_keeps_its_trip(self, fleet, electric_vehicle):
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+
+        electric_vehicle = ElectricVehicle.objects.get(pk=electric_vehicle.pk)
+        electric_vehicle.name = 'Renamed EV'
+        electric_vehicle.save()
+        daemon.sync()
+
+        ev = daemon.fleet.ev
+        assert ev['mode'].tolist() == [EVMode.OFFLINE]
+        assert ev['was_away'].tolist() == [True]
+        assert len(daemon.fleet.ev_schedules.index) == 1
+
+
+class TestWriteBehind:
+    """Test the daemon with live storage state kept in Redis."""
+
+    def _live(self, store, battery):
+        live = Battery.objects.get(pk=battery.pk)
+        store.load([live])
+        return live
+
+    def test_tick_writes_redis_not_database(self, fleet, battery, write_behind, settings):
+        # No checkpoint on this tick
+        settings.SIMULATION_CHECKPOINT_TICKS = TICK_ID + 1
+        daemon = SimulationDaemon()
+        daemon.load()
+        counts = daemon.run_tick(_tick())
+
+        # The battery charges and the EV leaves
+        assert counts['states'] == 2
+        state = DeviceState.objects.get(pk=battery.pk)
+        assert (state.current_charge_kwh, state.last_tick_start) == (2.0, None)
+        live = self._live(write_behind, battery)
+        assert live.current_charge_kwh == daemon.fleet.battery['current_charge_kwh'][0] > 2.0
+        assert live.last_tick_start == TICK_ID * 60
+
+    def test_load_starts_from_live_state(self, fleet, battery, write_behind):
+        simulate_devices([battery.id], TICK_ID, 60.0)
+        daemon = SimulationDaemon()
+        daemon.load()
+
+        live = self._live(write_behind, battery)
+        assert live.current_charge_kwh > 2.0
+        assert daemon.fleet.battery['current_charge_kwh'].tolist() == [live.current_charge_kwh]
+
+    def test_checkpoints_every_n_ticks(self, fleet, battery, write_behind, settings):
+        settings.SIMULATION_CHECKPOINT_TICKS = 1
+        daemon = SimulationDaemon()
+        daemon.load()
+        daemon.run_tick(_tick())
+
+        state = DeviceState.objects.get(pk=battery.pk)
+        assert state.current_charge_kwh == self._live(write_behind, battery).current_charge_kwh
+        assert state.last_tick_start == TICK_ID * 60
+
+    def test_state_applied_elsewhere_is_reloaded(self, fleet, battery, write_behind):
+        daemon = SimulationDaemon()
+        daemon.load()
+        # A Celery worker runs the same tick first
+        simulate_devices([battery.id], TICK_ID, 60.0)
+        level = RedisClient().get_device_storage(battery.id)['current_level_wh']
+
+        counts = daemon.run_tick(_tick())
+
+        assert counts['lost'] == 1
+        assert RedisClient().get_device_storage(battery.id)['current_level_wh'] == level
+        live = self._live(write_behind, battery)
+        assert daemon.fleet.battery['current_charge_kwh'].tolist() == [live.current_charge_kwh]
+
+
+class TestDaemonLoop:
+    """Test tick claiming."""
+
+    def test_runs_claimed_tick(self, fleet):
+        daemon = SimulationDaemon()
+        ticks = []
+        daemon.run(ticks=1, on_tick=lambda tick, counts, seconds: ticks.append(tick.tick_id))
+
+        assert daemon.coordinator.last_completed_tick() == ticks[0]
+        assert daemon.last_tick_id == ticks[0]
+
+    def test_reloads_after_a_tick_run_elsewhere(self, fleet):
+        daemon = SimulationDaemon()
+        daemon.load()
+        fleet_before = daemon.fleet
+        TickCoordinator().redis.set(LAST_TICK_KEY, TICK_ID)
+
+        daemon.run(ticks=1)
+
+        assert daemon.fleet is not fleet_before
@@ -0,0 +1,147 @@
+"""Tests for dead-band suppression of unchanged Redis writes."""
+
+import pytest
+from apps.devices.models import DeviceStatus
+from apps.simulation import rng
+from apps.simulation.daemon import SimulationDaemon
+from apps.simulation.deadband import DeadBand
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.results import DeviceResult, StorageResult
+from apps.simulation.tasks import simulate_devices
+from apps.simulation.ticks import Tick, tick_start
+
+
+def _result(power_w=0.0, status='online', tick_id=None):
+    return DeviceResult(7, power_w, _stamp(tick_id), status)
+
+
+def _storage(level_wh=5000.0, mode='charging', tick_id=None):
+    return StorageResult(8, 0.0, _stamp(tick_id), 'online', 75000.0, level_wh, 0.0, mode)
+
+
+def _stamp(tick_id):
+    return tick_start(tick_id or TICK, 60).isoformat()
+
+
+# Heartbeats fall where (tick + device id) % 4 == 0: for device 7 at TICK + 3,
+# for device 8 at TICK + 2
+TICK = 1002
+
+
+@pytest.fixture
+def redis_client():
+    client = RedisClient()
+    client.redis.delete('device:7:current', 'device:8:storage')
+    yield client
+    client.redis.delete('device:7:current', 'device:8:storage')
+
+
+def _written_at(redis_client):
+    """The tick timestamps of the stored results of devices 7 and 8."""
+    return (
+        (redis_client.get_device_data(7) or {}).get('timestamp'),
+        (redis_client.get_device_storage(8) or {}).get('timestamp'),
+    )
+
+
+@pytest.fixture
+def dead_band():
+    return DeadBand(epsilon=1.0, heartbeat_seconds=240)
+
+
+class TestDeadBand:
+    """Test which results are written."""
+
+    def test_unchanged_result_is_skipped(self, dead_band, redis_client):
+        dead_band.store(redis_client, {7: _result()}, {8: _storage()}, TICK)
+        skipped = dead_band.store(
+            redis_client, {7: _result(0.5, tick_id=TICK + 1)}, {8: _storage(5000.9, tick_id=TICK + 1)}, TICK + 1
+        )
+
+        assert skipped == 2
+        assert _written_at(redis_client) == (_stamp(TICK), _stamp(TICK))
+
+    def test_drift_is_measured_from_the_last_write(self, dead_band, redis_client):
+        dead_band.store(redis_client, {7: _result(0.0)}, {}, TICK)
+        dead_band.store(redis_client, {7: _result(0.6, tick_id=TICK + 1)}, {}, TICK + 1)
+        dead_band.store(redis_client, {7: _result(1.2, tick_id=TICK + 2)}, {}, TICK + 2)
+
+        assert redis_client.get_device_data(7)['power_w'] == 1.2
+
+    @pytest.mark.parametrize('changed', [
+        {'current': {7: _result(status='offline')}},
+        {'storage': {8: _storage(mode='offline')}},
+        {'storage': {8: _storage(mode=None)}},
+        {'storage': {8: _storage(level_wh=float('nan'))}},
+    ])
+    def test_status_and_mode_changes_are_written(self, dead_band, redis_client, changed):
+        dead_band.store(redis_client, {7: _result()}, {8: _storage()}, TICK)
+
+        assert dead_band.store(
+            redis_client, changed.get('current', {}), changed.get('storage', {}), TICK + 1
+        ) == 0
+
+    def test_heartbeat_rewrites_unchanged_results(self, dead_band, redis_client):
+        written = []
+        for tick_id in range(TICK, TICK + 8):
+            if not dead_band.store(redis_client, {7: _result(tick_id=tick_id)}, {}, tick_id):
+                written.append(tick_id)
+
+        # Written first, then on the device's heartbeat ticks
+        assert written == [TICK, TICK + 3, TICK + 7]
+        assert _written_at(redis_client)[0] == _stamp(TICK + 7)
+
+    def test_another_process_write_is_compared(self, redis_client):
+        # Two worker processes, each with its own DeadBand, taking turns
+        first, second = DeadBand(epsilon=1.0, heartbeat_seconds=240), DeadBand(epsilon=1.0, heartbeat_seconds=240)
+        first.store(redis_client, {7: _result(0.0)}, {}, TICK)
+
+        assert second.store(redis_client, {7: _result(0.5, tick_id=TICK + 1)}, {}, TICK + 1) == 1
+        assert first.store(redis_client, {7: _result(5.0, tick_id=TICK + 2)}, {}, TICK + 2) == 0
+        assert second.store(redis_client, {7: _result(5.5, tick_id=TICK + 4)}, {}, TICK + 4) == 1
+        assert redis_client.get_device_data(7)['power_w'] == 5.0
+
+    def test_expired_result_is_written(self, dead_band, redis_client):
+        dead_band.store(redis_client, {7: _result()}, {}, TICK)
+        redis_client.redis.delete('device:7:current')
+
+        assert dead_band.store(redis_client, {7: _result(tick_id=TICK + 1)}, {}, TICK + 1) == 0
+        assert _written_at(redis_client)[0] == _stamp(TICK + 1)
+
+    def test_writes_without_a_tick_are_not_suppressed(self, dead_band, redis_client):
+        dead_band.store(redis_client, {7: _result()}, {}, TICK)
+
+        assert dead_band.store(redis_client, {7: _result()}, {}, None) == 0
+        assert dead_band.store(redis_client, {7: _result()}, {}, TICK + 1) == 1
+
+
+@pytest.mark.django_db
+class TestSuppressedWrites:
+    """Test the simulation paths skip unchanged results."""
+
+    @staticmethod
+    def _ticks(device_id):
+        # Two ticks, neither a heartbeat for the device (every 15 ticks by default)
+        first = 28_000_000 - (28_000_000 + device_id) % 15 + 1
+        return first, first + 1
+
+    def test_offline_device_written_once(self, generator):
+        generator.status = DeviceStatus.OFFLINE
+        generator.save()
+        first, second = self._ticks(generator.id)
+
+        simulate_devices([generator.id], first)
+        simulate_devices([generator.id], second)
+
+        assert RedisClient().get_device_data(generator.id)['timestamp'] == tick_start(first).isoformat()
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_daemon_counts_skipped_results(self, generator):
+        generator.status = DeviceStatus.OFFLINE
+        generator.save()
+        first, second = self._ticks(generator.id)
+        daemon = SimulationDaemon()
+        daemon.load()
+
+        assert daemon.run_tick(Tick(first, tick_start(first, 60), 60.0, 0, 0.0))['skipped'] == 0
+        assert daemon.run_tick(Tick(second, tick_start(second, 60), 60.0, 0, 0.0))['skipped'] == 1
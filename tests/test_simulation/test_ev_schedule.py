@@ -0,0 +1,171 @@
+"""Tests for EV schedules and closed-form settlement of away EVs."""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from freezegun import freeze_time
+from django.core.exceptions import ValidationError
+from apps.api.serializers import ElectricVehicleSerializer
+from apps.devices.models import ElectricVehicle, EVMode
+from apps.devices.schedule import (
+    DEFAULT_SCHEDULE, FleetSchedules, WeeklySchedule, default_away_windows,
+    validate_away_windows, validate_timezone,
+)
+from apps.simulation import rng
+from apps.simulation.clock import CLOCK_KEY
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.simulators.ev import EVSimulator
+
+# Monday 2024-01-15, in UTC; in January the default schedule is away 12:00-23:00 UTC
+MONDAY = datetime(2024, 1, 15)
+
+
+class TestWeeklySchedule:
+    """Test away windows and closed-form away time."""
+
+    def test_is_away(self):
+        assert not DEFAULT_SCHEDULE.is_away(MONDAY.replace(hour=11, minute=59))
+        assert DEFAULT_SCHEDULE.is_away(MONDAY.replace(hour=12))
+        assert not DEFAULT_SCHEDULE.is_away(MONDAY.replace(hour=23))
+        assert not DEFAULT_SCHEDULE.is_away(MONDAY.replace(hour=15) + timedelta(days=5))
+
+    def test_away_seconds(self):
+        assert DEFAULT_SCHEDULE.away_seconds(MONDAY, MONDAY + timedelta(days=1)) == 11 * 3600
+        assert DEFAULT_SCHEDULE.away_seconds(MONDAY, MONDAY + timedelta(weeks=3)) == 3 * 55 * 3600
+        assert DEFAULT_SCHEDULE.away_seconds(
+            MONDAY.replace(hour=22, minute=30), MONDAY.replace(hour=23, minute=30)
+        ) == 1800
+        assert DEFAULT_SCHEDULE.away_seconds(MONDAY + timedelta(days=1), MONDAY) == 0
+
+    def test_aware_and_naive_agree(self):
+        aware = MONDAY.replace(hour=15, tzinfo=timezone.utc)
+        assert DEFAULT_SCHEDULE.away_before(aware) == DEFAULT_SCHEDULE.away_before(aware.replace(tzinfo=None))
+
+    def test_custom_windows(self):
+        weekend = WeeklySchedule([{'days': [5, 6], 'start': '09:00', 'end': '17:00'}], 'UTC')
+        assert weekend.away_seconds(MONDAY, MONDAY + timedelta(weeks=1)) == 16 * 3600
+        assert weekend.is_away(MONDAY.replace(hour=9) + timedelta(days=5))
+
+    def test_overnight_window_wraps_the_week(self):
+        night = WeeklySchedule([{'days': [6], 'start': '22:00', 'end': '06:00'}], 'UTC')
+        assert night.is_away(MONDAY.replace(hour=5))
+        assert night.is_away(MONDAY - timedelta(hours=1))
+        assert night.away_seconds(MONDAY, MONDAY + timedelta(weeks=1)) == 8 * 3600
+
+    def test_follows_daylight_saving(self):
+        # New York is UTC-4 in July, so the car leaves at 11:00 UTC
+        july = datetime(2024, 7, 15)
+        assert DEFAULT_SCHEDULE.is_away(july.replace(hour=11))
+        assert not DEFAULT_SCHEDULE.is_away(july.replace(hour=22))
+        assert DEFAULT_SCHEDULE.away_seconds(july, july + timedelta(days=1)) == 11 * 3600
+
+    def test_validation(self):
+        validate_away_windows(default_away_windows())
+        for windows in ({}, [{'days': [7], 'start': '07:00', 'end': '08:00'}],
+                        [{'days': [1], 'start': '7am', 'end': '08:00'}],
+                        [{'days': [1], 'start': '08:00', 'end': '08:00'}]):
+            with pytest.raises(ValidationError):
+                validate_away_windows(windows)
+        with pytest.raises(ValidationError):
+            validate_timezone('Mars/Olympus_Mons')
+
+
+@pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+class TestFleetSchedules:
+    """Test evaluating many schedules at once."""
+
+    def test_matches_each_vehicle(self):
+        nights = WeeklySchedule([{'days': [0], 'start': '20:00', 'end': '23:00'}], 'UTC')
+        schedules = [DEFAULT_SCHEDULE, nights, DEFAULT_SCHEDULE]
+        fleet = FleetSchedules(schedules)
+        moment = MONDAY.replace(hour=21)
+
+        assert len(fleet.unique) == 2
+        assert fleet.is_away(moment).tolist() == [s.is_away(moment) for s in schedules]
+        assert fleet.away_before(moment).tolist() == [s.away_before(moment) for s in schedules]
+
+
+@pytest.mark.django_db
+class TestVehicleSchedules:
+    """Test per-vehicle compiled schedules."""
+
+    def test_identical_schedules_are_shared(self, electric_vehicle):
+        assert electric_vehicle.schedule is DEFAULT_SCHEDULE
+
+    def test_edit_recompiles(self, electric_vehicle):
+        before = electric_vehicle.schedule
+        electric_vehicle.away_windows = [{'days': [5], 'start': '10:00', 'end': '12:00'}]
+        electric_vehicle.schedule_timezone = 'Europe/London'
+        electric_vehicle.save()
+
+        # Another process's stale instance also sees the new schedule
+        reloaded = ElectricVehicle.objects.get(pk=electric_vehicle.pk)
+        assert reloaded.schedule is not before
+        assert reloaded.schedule.is_away(datetime(2024, 1, 20, 11))
+
+    def test_simulator_uses_vehicle_schedule(self, electric_vehicle):
+        electric_vehicle.away_windows = []
+        electric_vehicle.save()
+
+        result = EVSimulator(electric_vehicle).simulate(MONDAY.replace(hour=15), tick_id=1)
+        assert result['mode'] == EVMode.CHARGING
+
+
+@pytest.mark.django_db
+class TestAwayEV:
+    """Test away EVs are written once and settled in closed form."""
+
+    def _depart(self, electric_vehicle):
+        departure = MONDAY.replace(hour=12)
+        EVSimulator(electric_vehicle).simulate(departure, tick_id=1)
+        return ElectricVehicle.objects.select_related('state').get(pk=electric_vehicle.pk)
+
+    def test_away_ticks_do_not_write(self, electric_vehicle, django_assert_num_queries):
+        ev = self._depart(electric_vehicle)
+        assert ev.mode == EVMode.OFFLINE
+
+        with django_assert_num_queries(0):
+            result = EVSimulator(ev).simulate(MONDAY.replace(hour=14), tick_id=2)
+
+        assert result['current_level_wh'] == pytest.approx((37.5 - 2 * 3.0) * 1000)
+
+    def test_reconnect_settles_in_one_write(self, electric_vehicle, django_assert_max_num_queries):
+        ev = self._depart(electric_vehicle)
+
+        # Back at 18:00 EST after 11 hours away; all of the last minute was away
+        with django_assert_max_num_queries(1):
+            result = EVSimulator(ev).simulate(MONDAY.replace(hour=23), tick_id=3)
+
+        ev.refresh_from_db()
+        assert ev.mode == EVMode.CHARGING
+        assert ev.current_charge_kwh == pytest.approx(37.5 - 11 * 3.0)
+        assert result['current_level_wh'] == pytest.approx(ev.current_charge_kwh * 1000)
+
+    def test_charge_can_not_go_negative(self, electric_vehicle):
+        electric_vehicle.current_charge_kwh = 1.0
+        electric_vehicle.save()
+        ev = self._depart(electric_vehicle)
+
+        assert ev.charge_at(MONDAY.replace(hour=22)) == 0.0
+
+    @freeze_time("2024-01-15 16:00:00")
+    def test_api_reads_settled_charge(self, electric_vehicle):
+        ev = self._depart(electric_vehicle)
+
+        data = ElectricVehicleSerializer(ev).data
+        assert data['current_charge_kwh'] == pytest.approx(37.5 - 4 * 3.0)
+        assert data['charge_percentage'] == pytest.approx((37.5 - 4 * 3.0) / 75 * 100)
+
+    def test_settled_charge_follows_the_simulation_clock(self, electric_vehicle, settings):
+        redis = RedisClient().redis
+        redis.delete(CLOCK_KEY)
+        # An accelerated clock started at 16:00, well before the real time
+        settings.SIMULATION_TIME_SCALE = 60
+        settings.SIMULATION_CLOCK_START = '2024-01-15T16:00:00'
+        try:
+            ev = self._depart(electric_vehicle)
+
+            assert ev.settled_charge_kwh == pytest.approx(37.5 - 4 * 3.0, abs=0.01)
+            ev.settled_charge_kwh = 20.0
+            assert abs(ev.last_seen_at - MONDAY.replace(hour=16, tzinfo=timezone.utc)) < timedelta(minutes=1)
+        finally:
+            redis.delete(CLOCK_KEY)
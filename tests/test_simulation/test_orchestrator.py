@@ -0,0 +1,109 @@
+"""Tests for the tick orchestrator and offline devices."""
+
+import pytest
+from datetime import datetime, timezone
+from freezegun import freeze_time
+from apps.devices.models import DeviceStatus
+from apps.simulation import tasks
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.tasks import (
+    OFFLINE_WATERMARK_KEY, compute_user_energy_stats, run_energy_simulation, simulate_devices,
+)
+from apps.simulation.ticks import LAST_TICK_KEY, LAST_TICK_START_KEY, LOCK_KEY, STATS_KEY
+
+pytestmark = pytest.mark.django_db
+
+# 2024-01-15 12:00:00 UTC, on a minute boundary
+EPOCH = 1705320000.0
+KEYS = (LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY, STATS_KEY, OFFLINE_WATERMARK_KEY)
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Device ids the orchestrator enqueues, per run."""
+    redis = RedisClient().redis
+    redis.delete(*KEYS)
+    runs = []
+    monkeypatch.setattr(tasks.simulate_devices, 'delay', lambda ids, *args: runs[-1].extend(ids))
+    monkeypatch.setattr(tasks.compute_user_energy_stats, 'delay', lambda *args: None)
+    monkeypatch.setattr(tasks.checkpoint_device_state, 'delay', lambda *args: None)
+
+    def run(minute):
+        runs.append([])
+        with freeze_time(datetime.fromtimestamp(EPOCH + minute * 60, tz=timezone.utc)):
+            run_energy_simulation()
+        return sorted(runs[-1])
+
+    yield run
+    redis.delete(*KEYS)
+
+
+def _offline(device):
+    device.status = DeviceStatus.OFFLINE
+    device.save()
+    return device
+
+
+class TestOrchestrator:
+    """Test which devices a tick simulates."""
+
+    def test_offline_devices_simulated_once(self, enqueued, generator, battery):
+        _offline(battery)
+
+        # Without a feed position, every offline device once
+        assert enqueued(0) == sorted([generator.id, battery.id])
+        assert enqueued(1) == [generator.id]
+
+    def test_edited_offline_device_simulated_once(self, enqueued, generator, solar_panel):
+        enqueued(0)
+        _offline(solar_panel)
+
+        assert enqueued(1) == sorted([generator.id, solar_panel.id])
+        assert enqueued(2) == [generator.id]
+
+    def test_failed_enqueue_keeps_feed_position(self, enqueued, monkeypatch, generator, solar_panel):
+        enqueued(0)
+        _offline(solar_panel)
+
+        def fail(*args):
+            raise ConnectionError
+        with monkeypatch.context() as patch:
+            patch.setattr(tasks.compute_user_energy_stats, 'delay', fail)
+            with pytest.raises(ConnectionError):
+                enqueued(1)
+
+        assert enqueued(2) == sorted([generator.id, solar_panel.id])
+
+    def test_device_back_online_is_simulated(self, enqueued, generator):
+        _offline(generator)
+        enqueued(0)
+        generator.status = DeviceStatus.ONLINE
+        generator.save()
+
+        assert enqueued(1) == [generator.id]
+        assert enqueued(2) == [generator.id]
+
+
+class TestOfflineStorageStats:
+    """Test offline batteries and EVs count at their last known level."""
+
+    def test_counted_from_last_result(self, user, battery, electric_vehicle):
+        _offline(electric_vehicle)
+        simulate_devices([battery.id, electric_vehicle.id])
+        compute_user_energy_stats(user.id, baseline_w=0.0)
+
+        storage = RedisClient().get_user_stats(user.id)['storage']
+        assert storage['total_capacity_wh'] == (10.0 + 75.0) * 1000
+        assert storage['current_level_wh'] == pytest.approx(
+            RedisClient().get_device_storage(battery.id)['current_level_wh'] + 37.5 * 1000
+        )
+
+    def test_counted_from_state_once_result_expired(self, user, battery):
+        _offline(battery)
+        RedisClient().redis.delete(f'device:{battery.id}:storage')
+        compute_user_energy_stats(user.id, baseline_w=0.0)
+
+        stats = RedisClient().get_user_stats(user.id)
+        assert stats['storage']['total_capacity_wh'] == 10.0 * 1000
+        assert stats['storage']['current_level_wh'] == 5.0 * 1000
+        assert stats['current_storage_flow'] == 0.0
@@ -0,0 +1,77 @@
+"""Tests for household baseline load profiles."""
+
+import pytest
+from array import array
+from datetime import datetime
+from apps.devices.models import Household, LoadProfile
+from apps.simulation import rng
+from apps.simulation.profiles import (
+    DAY_TYPES, HOURS, PROFILES, SEASONS, baseline_load, baseline_loads, profile_table,
+)
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.tasks import compute_user_energy_stats
+
+NY = 'America/New_York'
+# Tuesday 2024-01-16, 7 PM and 3 AM in New York (UTC timestamps)
+WINTER_EVENING = datetime(2024, 1, 17, 0, 0)
+WINTER_NIGHT = datetime(2024, 1, 16, 8, 0)
+
+
+class TestProfileLibrary:
+    """Test the compiled profile table and interpolation."""
+
+    def test_curves_are_normalised(self):
+        table = array('f')
+        table.frombytes(profile_table())
+        stride = HOURS + 1
+
+        assert len(table) == len(PROFILES) * len(SEASONS) * len(DAY_TYPES) * stride
+        for start in range(0, len(table), stride):
+            curve = table[start:start + HOURS]
+            assert sum(curve) / HOURS == pytest.approx(1.0, rel=1e-6)
+            assert table[start + HOURS] == curve[0]
+
+    def test_evening_peak_and_night_trough(self):
+        assert baseline_load(LoadProfile.STANDARD, 600, NY, WINTER_EVENING) > 900
+        assert baseline_load(LoadProfile.STANDARD, 600, NY, WINTER_NIGHT) < 400
+        assert baseline_load(LoadProfile.NIGHT_SHIFT, 600, NY, WINTER_NIGHT) > 600
+
+    def test_interpolates_between_hours(self):
+        at_seven = baseline_load(LoadProfile.STANDARD, 600, NY, datetime(2024, 1, 16, 12, 0))
+        at_eight = baseline_load(LoadProfile.STANDARD, 600, NY, datetime(2024, 1, 16, 13, 0))
+        half_past = baseline_load(LoadProfile.STANDARD, 600, NY, datetime(2024, 1, 16, 12, 30))
+
+        assert half_past == pytest.approx((at_seven + at_eight) / 2)
+
+    def test_follows_local_time(self):
+        assert baseline_load(LoadProfile.STANDARD, 600, 'America/Los_Angeles', WINTER_EVENING) == pytest.approx(
+            baseline_load(LoadProfile.STANDARD, 600, NY, datetime(2024, 1, 16, 21, 0))
+        )
+
+
+@pytest.mark.django_db
+class TestHouseholdBaselines:
+    """Test per-user assignment and the batched lookup."""
+
+    def test_defaults_without_household(self, user):
+        assert baseline_loads([user.id], WINTER_EVENING) == {
+            user.id: pytest.approx(baseline_load(LoadProfile.STANDARD, 600, NY, WINTER_EVENING))
+        }
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_batch_matches_scalar(self, user, django_user_model):
+        Household.objects.create(user=user, load_profile=LoadProfile.RETIRED, baseline_w=450, timezone='Europe/London')
+        other = django_user_model.objects.create_user(username='other', password='x')
+        Household.objects.create(user=other, load_profile=LoadProfile.HOME_WORKER, baseline_w=800, timezone=NY)
+
+        loads = baseline_loads([user.id, other.id], WINTER_EVENING)
+        assert loads[user.id] == baseline_load(LoadProfile.RETIRED, 450, 'Europe/London', WINTER_EVENING)
+        assert loads[other.id] == baseline_load(LoadProfile.HOME_WORKER, 800, NY, WINTER_EVENING)
+
+    def test_included_in_user_stats(self, user):
+        compute_user_energy_stats(user.id, baseline_w=750.0)
+
+        stats = RedisClient().get_user_stats(user.id)
+        assert stats['baseline_consumption'] == 750.0
+        assert stats['current_consumption'] == 750.0
+        assert stats['net_grid_flow'] == 750.0
@@ -0,0 +1,77 @@
+"""Tests for the simulator registry and pool."""
+
+import pytest
+from apps.devices.models import Device
+from apps.simulation.simulators.consumption import ConsumptionSimulator
+from apps.simulation.replay import FleetReplay
+from apps.simulation.simulators.registry import (
+    GROUPS, PRODUCTION, REGISTRY, SIMULATION_RELATIONS, STORAGE, STORAGE_DEVICE_TYPES, SimulatorPool,
+    create_simulator, groups,
+)
+
+
+def _row(device):
+    """The device as a task loads it."""
+    return Device.objects.select_related(*SIMULATION_RELATIONS).get(pk=device.pk)
+
+
+@pytest.mark.django_db
+class TestRegistry:
+    """Test device type lookup."""
+
+    def test_every_device_type_is_registered(self, solar_panel, generator, battery,
+                                             electric_vehicle, air_conditioner, heater,
+                                             django_assert_num_queries):
+        for device in (solar_panel, generator, battery, electric_vehicle, air_conditioner, heater):
+            row = _row(device)
+            # The registered relations load everything the simulator reads
+            with django_assert_num_queries(0):
+                device_type, simulator = create_simulator(row)
+                if device_type in STORAGE_DEVICE_TYPES:
+                    assert simulator.device.current_charge_kwh >= 0
+            assert isinstance(simulator, REGISTRY[device_type].simulator_class)
+
+        assert set(STORAGE_DEVICE_TYPES) == {'battery', 'electric_vehicle'}
+        assert REGISTRY['heater'].batch and REGISTRY['heater'].simulator_class is ConsumptionSimulator
+
+    def test_groups_follow_the_registry(self):
+        assert GROUPS['consumption'] == ('air_conditioner', 'heater')
+        assert groups(STORAGE) == ('battery', 'ev')
+        assert groups(PRODUCTION) == ('solar', 'generator')
+        # The replay engine steps every registered group
+        assert all(callable(getattr(FleetReplay, f'_{name}', None)) for name in GROUPS)
+
+
+@pytest.mark.django_db
+class TestSimulatorPool:
+    """Test simulators kept across ticks."""
+
+    def test_reused_and_rebound_to_fresh_row(self, battery):
+        pool = SimulatorPool()
+        _, first = pool.get(_row(battery))
+
+        battery.current_charge_kwh = 7.5
+        battery.state.save()
+        _, second = pool.get(_row(battery))
+
+        assert second is first
+        assert second.device.current_charge_kwh == 7.5
+
+    def test_rebuilt_when_device_is_edited(self, solar_panel):
+        pool = SimulatorPool()
+        _, first = pool.get(_row(solar_panel))
+
+        solar_panel.panel_area_m2 = 30.0
+        solar_panel.save()
+        _, second = pool.get(_row(solar_panel))
+
+        assert second is not first
+        assert second.area_efficiency == pytest.approx(30.0 * solar_panel.efficiency)
+
+    def test_bounded_oldest_first(self, solar_panel, generator, heater):
+        pool = SimulatorPool(max_size=2)
+        pool.get(_row(solar_panel))
+        pool.get(_row(generator))
+        pool.get(_row(heater))
+
+        assert list(pool.simulators) == [generator.id, heater.id]
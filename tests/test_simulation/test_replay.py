@@ -0,0 +1,155 @@
+"""Tests for the offline replay engine and simulate_range."""
+
+import pytest
+import struct
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from django.core.management import call_command
+from apps.devices.models import Device, DeviceReading, Generator
+from apps.simulation import rng
+from apps.simulation.replay import COPY_HEADER, COPY_TRAILER, FleetReplay, ReadingWriter
+from apps.simulation.simulators.battery import BatterySimulator
+from apps.simulation.simulators.consumption import ConsumptionSimulator
+from apps.simulation.simulators.ev import EVSimulator
+from apps.simulation.simulators.generator import GeneratorSimulator
+from apps.simulation.simulators.solar import SolarPanelSimulator
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(rng.np is None, reason='NumPy is not installed'),
+]
+
+SIMULATORS = {
+    'solar_panel': SolarPanelSimulator,
+    'generator': GeneratorSimulator,
+    'battery': BatterySimulator,
+    'electric_vehicle': EVSimulator,
+    'air_conditioner': ConsumptionSimulator,
+}
+
+
+def _flatten(readings):
+    results = {}
+    for group in readings:
+        for i, device_id in enumerate(group.device_ids.tolist()):
+            results[device_id] = {
+                'power_w': group.power_w[i],
+                'flow_w': group.flow_w[i] if group.flow_w is not None else None,
+                'level_wh': group.level_wh[i] if group.level_wh is not None else None,
+                'mode': group.mode[i] if group.mode is not None else None,
+            }
+    return results
+
+
+class TestFleetReplay:
+    """Test the vectorised engine against the per-device simulators."""
+
+    @pytest.mark.parametrize('start', [
+        datetime(2024, 6, 17, 20, 0),   # Monday afternoon: sun up, EV away
+        datetime(2024, 6, 18, 2, 0),    # Monday evening EST: EV charging
+    ])
+    def test_matches_scalar_simulators(self, fleet, start):
+        replay = FleetReplay(Device.objects.filter(pk__in=[d.pk for d in fleet]).order_by('id'))
+        simulators = [SIMULATORS[device.get_device_type()](device) for device in fleet]
+
+        for minute in range(5):
+            timestamp = start + timedelta(minutes=minute)
+            batch = _flatten(replay.step(timestamp, 60))
+            for device, simulator in zip(fleet, simulators):
+                expected = simulator.simulate(timestamp, elapsed_seconds=60)
+                got = batch[device.id]
+                assert got['power_w'] == pytest.approx(expected['power_w'], rel=1e-12)
+                if 'flow_w' in expected:
+                    assert got['flow_w'] == pytest.approx(expected['flow_w'], rel=1e-12)
+                    assert got['level_wh'] == pytest.approx(expected['current_level_wh'], rel=1e-12)
+                if 'mode' in expected:
+                    assert got['mode'] == expected['mode']
+
+    def test_patched_fleet_matches_fresh_load(self, fleet, user):
+        start = datetime(2024, 6, 17, 20, 0)
+        replay = FleetReplay(Device.objects.filter(pk__in=[d.pk for d in fleet[:3]]))
+        replay.add(Device.objects.filter(pk__in=[d.pk for d in fleet[3:]]))
+        replay.remove([fleet[0].pk])
+        fresh = FleetReplay(Device.objects.filter(pk__in=[d.pk for d in fleet[1:]]))
+
+        assert len(replay) == len(fresh) == 4
+        assert _flatten(replay.step(start, 60)) == _flatten(fresh.step(start, 60))
+
+    def test_patch_rewrites_rows_in_place(self, fleet, user):
+        replay = FleetReplay(Device.objects.filter(pk__in=[d.pk for d in fleet]))
+        second = Generator.objects.create(user=user, name='Second Generator', rated_output_w=1000.0)
+        replay.add(Device.objects.filter(pk=second.pk))
+        buffer = replay.buffers['generator']['id']
+
+        third = Generator.objects.create(user=user, name='Third Generator', rated_output_w=500.0)
+        assert replay.patch([fleet[1].pk], Device.objects.filter(pk=third.pk)) == 2
+
+        # The new generator takes the removed one's row, in the same buffer
+        assert replay.buffers['generator']['id'] is buffer
+        assert replay.generator['id'].tolist() == [third.pk, second.pk]
+        assert replay.generator['rated_output_w'].tolist() == [500.0, 1000.0]
+
+    def test_live_state_untouched(self, fleet):
+        replay = FleetReplay(Device.objects.filter(pk__in=[d.pk for d in fleet]))
+        for _ in replay.run(datetime(2024, 1, 1), datetime(2024, 1, 1, 1), 60):
+            pass
+
+        assert fleet[3].__class__.objects.get(pk=fleet[3].pk).current_charge_kwh == 2.0
+
+
+class TestSimulateRange:
+    """Test the backfill command."""
+
+    def test_writes_one_reading_per_device_per_step(self, fleet):
+        out = StringIO()
+        call_command('simulate_range', start='2024-01-01', end='2024-01-01T01:00:00', stdout=out)
+
+        assert DeviceReading.objects.count() == 60 * len(fleet)
+        assert DeviceReading.objects.filter(device=fleet[3], level_wh__isnull=False).count() == 60
+
+        # Re-running the range replaces it rather than duplicating it
+        call_command('simulate_range', start='2024-01-01', end='2024-01-01T01:00:00', stdout=out)
+        assert DeviceReading.objects.count() == 60 * len(fleet)
+
+
+def _decode_copy(data):
+    """Rows of a binary COPY stream, decoded as PostgreSQL would."""
+    assert data.startswith(COPY_HEADER) and data.endswith(COPY_TRAILER)
+    data, offset, rows = data[len(COPY_HEADER):-len(COPY_TRAILER)], 0, []
+    decoders = [
+        lambda raw: struct.unpack('>q', raw)[0],
+        lambda raw: datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=struct.unpack('>q', raw)[0]),
+        lambda raw: struct.unpack('>d', raw)[0],
+        lambda raw: struct.unpack('>d', raw)[0],
+        lambda raw: struct.unpack('>d', raw)[0],
+        bytes.decode,
+    ]
+    while offset < len(data):
+        (count,) = struct.unpack_from('>h', data, offset)
+        offset += 2
+        row = []
+        for decode in decoders[:count]:
+            (size,) = struct.unpack_from('>i', data, offset)
+            offset += 4
+            row.append(None if size < 0 else decode(data[offset:offset + size]))
+            offset += max(size, 0)
+        rows.append(tuple(row))
+    return rows
+
+
+class TestReadingWriter:
+    """Test the binary COPY rows built from result arrays."""
+
+    def test_copy_rows_match_bulk_rows(self, fleet):
+        writer = ReadingWriter()
+        replay = FleetReplay(Device.objects.order_by('id'))
+        for minute in range(3):
+            timestamp = datetime(2024, 6, 17, 20, minute)
+            writer.add(timestamp, replay.step(timestamp, 60))
+
+        data = COPY_HEADER + b''.join(
+            writer._block(timestamp, group) for timestamp, group in writer.blocks
+        ) + COPY_TRAILER
+
+        assert sorted(_decode_copy(data)) == sorted(writer._rows())
+        assert writer.pending == 3 * len(fleet)
@@ -0,0 +1,82 @@
+"""Tests for simulation result records."""
+
+import math
+import pytest
+from datetime import datetime
+from apps.simulation import codec
+from apps.simulation.results import (
+    DeviceResult, StorageResult, current_payloads, format_timestamp, storage_payloads,
+)
+from apps.simulation.simulators.battery import BatterySimulator
+from apps.simulation.simulators.solar import SolarPanelSimulator
+
+TICK = datetime(2024, 6, 21, 20, 0)
+
+
+class TestResultRecords:
+    """Test the records read and encode like the dicts they replace."""
+
+    def test_reads_like_a_dict(self):
+        result = StorageResult(7, 0.0, format_timestamp(TICK), 'online', 13500.0, 6750.5, -1200.25)
+
+        assert result['current_level_wh'] == 6750.5
+        assert 'flow_w' in result and 'mode' not in result
+        assert result.get('mode', 'n/a') == 'n/a'
+        with pytest.raises(KeyError):
+            result['mode']
+        assert result == {
+            'device_id': 7, 'power_w': 0.0, 'timestamp': '2024-06-21T20:00:00', 'status': 'online',
+            'capacity_wh': 13500.0, 'current_level_wh': 6750.5, 'flow_w': -1200.25,
+        }
+
+    def test_slotted(self):
+        assert not hasattr(DeviceResult(1, 1.0, 'now', 'online'), '__dict__')
+
+    def test_timestamp_formatted_once_per_tick(self):
+        assert format_timestamp(TICK) is format_timestamp(datetime(2024, 6, 21, 20, 0))
+
+    @pytest.mark.parametrize('power_w', [0.0, 1234.5678901234, 1e-07, 3.0e16, -42.0])
+    def test_json_matches_codec(self, power_w):
+        result = DeviceResult(3, power_w, format_timestamp(TICK), 'online')
+
+        assert codec.loads(result.to_json()) == codec.loads(codec.dumps(result.to_dict()))
+
+    def test_storage_json_matches_payload(self):
+        battery = StorageResult(4, 0.0, format_timestamp(TICK), 'online', 13500.0, 1.0 / 3, 5000.0)
+        ev = StorageResult(5, 0.0, format_timestamp(TICK), 'online', 75000.0, 60000.0, 0.0, 'offline')
+
+        for result in (battery, ev):
+            assert codec.loads(result.storage_json()) == result.storage_payload()
+        assert 'mode' not in codec.loads(battery.storage_json())
+
+    def test_payloads_from_columns_match_records(self):
+        stamp = format_timestamp(TICK)
+        current = [DeviceResult(3, 1.5, stamp, 'online'), DeviceResult(4, math.nan, stamp, 'offline')]
+        storage = [
+            StorageResult(5, 0.0, stamp, 'online', 13500.0, 1.0 / 3, 5000.0),
+            StorageResult(6, 0.0, stamp, 'online', 75000.0, 60000.0, 0.0, 'offline'),
+        ]
+
+        assert current_payloads([3, 4], [1.5, math.nan], stamp, ['online', 'offline']) == [
+            result.to_json() for result in current
+        ]
+        assert storage_payloads(
+            [13500.0, 75000.0], [1.0 / 3, 60000.0], [5000.0, 0.0], stamp, ['online', 'online'], [None, 'offline'],
+        ) == [result.storage_json() for result in storage]
+
+    def test_non_finite_is_null(self):
+        result = DeviceResult(3, math.inf, format_timestamp(TICK), 'online')
+
+        assert codec.loads(result.to_json())['power_w'] is None
+
+
+@pytest.mark.django_db
+class TestSimulatorResults:
+    """Test simulators return records sharing the tick timestamp."""
+
+    def test_results_share_timestamp(self, solar_panel, battery):
+        solar = SolarPanelSimulator(solar_panel).simulate(TICK, tick_id=1)
+        storage = BatterySimulator(battery).simulate(TICK, tick_id=1)
+
+        assert isinstance(storage, StorageResult)
+        assert solar.timestamp is storage.timestamp
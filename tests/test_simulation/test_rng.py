@@ -0,0 +1,82 @@
+"""Tests for counter-based per-device random streams."""
+
+import pytest
+from datetime import datetime
+from apps.simulation import rng
+from apps.simulation.rng import DeviceRandom, random_float, uniform_array
+from apps.simulation.simulators.generator import GeneratorSimulator
+
+
+class TestDeviceRandom:
+    """Test scalar draws are a pure function of their key."""
+
+    def test_same_key_same_value(self):
+        assert DeviceRandom(7, 100, seed=1).random() == DeviceRandom(7, 100, seed=1).random()
+
+    def test_keys_give_independent_values(self):
+        values = {
+            DeviceRandom(7, 100, seed=1).random(),
+            DeviceRandom(8, 100, seed=1).random(),
+            DeviceRandom(7, 101, seed=1).random(),
+            DeviceRandom(7, 100, seed=2).random(),
+        }
+        assert len(values) == 4
+
+    def test_successive_draws(self):
+        stream = DeviceRandom(7, 100, seed=1)
+        first, second = stream.random(), stream.random()
+        assert (first, second) == (random_float(1, 7, 100, 0), random_float(1, 7, 100, 1))
+
+    def test_uniform_range_and_mean(self):
+        values = [DeviceRandom(device_id, 5, seed=3).uniform(0.5, 1.0) for device_id in range(5000)]
+        assert all(0.5 <= value < 1.0 for value in values)
+        assert sum(values) / len(values) == pytest.approx(0.75, abs=0.01)
+
+    def test_seed_setting(self, settings):
+        settings.SIMULATION_SEED = 42
+        assert DeviceRandom(7, 100).random() == DeviceRandom(7, 100, seed=42).random()
+
+
+@pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+class TestArrays:
+    """Test batched draws match the scalar reference bit for bit."""
+
+    def test_array_matches_scalar(self):
+        device_ids = list(range(1, 2001))
+        batch = uniform_array(device_ids, 28_000_000, 0.85, 1.0, draw=1, seed=9)
+
+        scalar = []
+        for device_id in device_ids:
+            stream = DeviceRandom(device_id, 28_000_000, seed=9)
+            stream.random()
+            scalar.append(stream.uniform(0.85, 1.0))
+        assert batch.tolist() == scalar
+
+    def test_sharding_does_not_change_values(self):
+        device_ids = list(range(1, 1001))
+        whole = uniform_array(device_ids, 12, 0.0, 1.0, seed=4).tolist()
+        shards = [uniform_array(device_ids[i::3], 12, 0.0, 1.0, seed=4).tolist() for i in range(3)]
+
+        assert sorted(value for shard in shards for value in shard) == sorted(whole)
+        assert shards[1] == whole[1::3]
+
+
+@pytest.mark.django_db
+class TestSimulatorReproducibility:
+    """Test simulators draw from their device's stream."""
+
+    def test_same_tick_same_output(self, generator):
+        timestamp = datetime(2024, 1, 15, 12, 0)
+        first = GeneratorSimulator(generator).simulate(timestamp, tick_id=10)
+        again = GeneratorSimulator(generator).simulate(timestamp, tick_id=10)
+        other = GeneratorSimulator(generator).simulate(timestamp, tick_id=11)
+
+        assert first['power_w'] == again['power_w']
+        assert first['power_w'] != other['power_w']
+
+    def test_tick_defaults_to_timestamp(self, generator):
+        timestamp = datetime(2024, 1, 15, 12, 0, 30)
+        implicit = GeneratorSimulator(generator).simulate(timestamp)
+        explicit = GeneratorSimulator(generator).simulate(timestamp, tick_id=1705320000 // 60)
+
+        assert implicit['power_w'] == explicit['power_w']
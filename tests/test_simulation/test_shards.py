@@ -0,0 +1,132 @@
+"""Tests for multi-process sharded stepping."""
+
+import pytest
+from datetime import datetime, timedelta
+from apps.devices.models import Device, Generator
+from apps.simulation import rng
+from apps.simulation.replay import FleetReplay
+from apps.simulation.shards import FleetShards, shard_of
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(rng.np is None, reason='NumPy is not installed'),
+]
+
+START = datetime(2024, 6, 17, 20, 0)
+
+
+@pytest.fixture
+def households(fleet, heater, another_user):
+    # A second household, so both shards have devices
+    Generator.objects.create(user=another_user, name='Neighbour Generator', rated_output_w=2000.0)
+    return Device.objects.order_by('id')
+
+
+@pytest.fixture
+def shards():
+    shards = FleetShards(processes=2)
+    yield shards
+    shards.close()
+
+
+def _by_device(groups):
+    results = {}
+    for readings in groups.values():
+        for i, device_id in enumerate(readings.device_ids.tolist()):
+            results[device_id] = tuple(
+                None if values is None else values[i]
+                for values in (readings.power_w, readings.flow_w, readings.level_wh, readings.mode)
+            )
+    return results
+
+
+def _assert_same(got, expected):
+    assert got.keys() == expected.keys()
+    for device_id, values in expected.items():
+        for value, other in zip(got[device_id], values):
+            assert value == (pytest.approx(other, rel=1e-12, nan_ok=True) if isinstance(other, float) else other)
+
+
+def _state(replay):
+    return {
+        device_id: (charge, mode, last_seen)
+        for name in ('battery', 'ev')
+        for device_id, charge, mode, last_seen in zip(
+            getattr(replay, name)['id'].tolist(), getattr(replay, name)['current_charge_kwh'].tolist(),
+            getattr(replay, name)['mode'].tolist(), getattr(replay, name)['last_seen'].tolist(),
+        )
+    }
+
+
+class TestShardOf:
+    """Test the assignment of households to shards."""
+
+    def test_keeps_users_together(self):
+        user_ids = rng.np.array([1, 2, 3, 2, 1, 1000])
+        shards = shard_of(user_ids, 4)
+
+        assert shards.tolist() == shard_of(user_ids, 4).tolist()
+        assert shards[0] == shards[4] and shards[1] == shards[3]
+        assert all(0 <= shard < 4 for shard in shards.tolist())
+        assert len(set(shard_of(rng.np.arange(1000), 4).tolist())) == 4
+
+
+class TestFleetShards:
+    """Test sharded steps against stepping in one process."""
+
+    def test_steps_match_one_process(self, households, shards):
+        single = FleetReplay(households)
+        sharded = FleetReplay(households)
+
+        for minute in range(0, 600, 60):
+            timestamp = START + timedelta(minutes=minute)
+            expected = _by_device(single.step_groups(timestamp, 3600, minute))
+            got = _by_device(shards.step_groups(sharded, timestamp, 3600, minute))
+            _assert_same(got, expected)
+        _assert_same(_state(sharded), _state(single))
+
+    def test_patches_are_made_in_the_block(self, households, shards, generator, electric_vehicle, user, another_user):
+        single = FleetReplay(households)
+        sharded = FleetReplay(households)
+        shards.step_groups(sharded, START, 60, 1)
+        single.step_groups(START, 60, 1)
+        block = shards._block
+
+        added = Device.objects.filter(pk__in=[
+            Generator.objects.create(user=user, name='Added Generator', rated_output_w=1000.0).pk,
+            Generator.objects.create(user=another_user, name='Added Neighbour', rated_output_w=500.0).pk,
+        ])
+        electric_vehicle.name = 'Renamed EV'
+        electric_vehicle.save()
+        for replay in (single, sharded):
+            replay.patch([generator.pk], list(added) + [Device.objects.get(pk=electric_vehicle.pk)])
+
+        for minute in range(1, 4):
+            timestamp = START + timedelta(minutes=minute)
+            _assert_same(
+                _by_device(shards.step_groups(sharded, timestamp, 60, minute + 1)),
+                _by_device(single.step_groups(timestamp, 60, minute + 1)),
+            )
+        assert shards._block is block
+        _assert_same(_state(sharded), _state(single))
+
+    def test_outgrown_block_is_replaced(self, households, shards, user):
+        sharded = FleetReplay(households)
+        shards.step_groups(sharded, START, 60, 1)
+        block = shards._block
+
+        sharded.add(Device.objects.filter(pk__in=[
+            Generator.objects.create(user=user, name=f'Generator {i}', rated_output_w=1000.0).pk
+            for i in range(100)
+        ]))
+        results = _by_device(shards.step_groups(sharded, START + timedelta(minutes=1), 60, 2))
+
+        assert shards._block is not block
+        assert results.keys() == set(sharded.device_ids().tolist())
+
+    def test_close_leaves_a_usable_fleet(self, households, shards):
+        sharded = FleetReplay(households)
+        shards.step_groups(sharded, START, 60, 1)
+        shards.close()
+
+        sharded.step_groups(START + timedelta(minutes=1), 60, 2)
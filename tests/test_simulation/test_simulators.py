@@ -3,7 +3,9 @@
 import pytest
 from datetime import datetime
 from freezegun import freeze_time
-from apps.simulation.simulators.solar import SolarPanelSimulator
+from apps.simulation.simulators.solar import (
+    SolarGeometryCache, SolarPanelSimulator, declination_trig, solar_elevation, trig,
+)
 from apps.simulation.simulators.generator import GeneratorSimulator
 from apps.simulation.simulators.battery import BatterySimulator
 from apps.simulation.simulators.ev import EVSimulator
@@ -54,6 +56,67 @@ class TestSolarPanelSimulator:
         assert result['power_w'] == 0
 
 
+def _elevation(timestamp, latitude, longitude):
+    return solar_elevation(timestamp, trig(latitude), declination_trig(timestamp), longitude)
+
+
+class TestSolarElevation:
+    """Test the solar elevation model."""
+
+    def test_noon_and_midnight(self):
+        # Solar noon in San Francisco on the summer solstice
+        assert _elevation(datetime(2024, 6, 21, 20, 10), 37.77, -122.42) == pytest.approx(75.7, abs=0.5)
+        assert _elevation(datetime(2024, 6, 21, 8, 10), 37.77, -122.42) < -20
+
+    def test_arrays_match_scalars(self):
+        np = pytest.importorskip('numpy')
+        latitudes = np.array([37.77, -33.87, 51.5, 0.0])
+        longitudes = np.array([-122.42, 151.21, -0.13, 0.0])
+        timestamp = datetime(2024, 3, 20, 14, 45)
+
+        elevations = solar_elevation(timestamp, trig(latitudes), declination_trig(timestamp), longitudes)
+
+        expected = [_elevation(timestamp, lat, lon) for lat, lon in zip(latitudes.tolist(), longitudes.tolist())]
+        assert elevations.tolist() == pytest.approx(expected, abs=1e-9)
+
+
+class TestSolarGeometryCache:
+    """Test the shared solar elevation cache."""
+
+    def test_matches_direct_calculation(self):
+        cache = SolarGeometryCache(cell=0.01)
+        for hour in range(24):
+            timestamp = datetime(2024, 6, 21, hour, 17, 42)
+            expected = _elevation(timestamp, 37.77, -122.42)
+            assert cache.elevation(timestamp, 37.77, -122.42) == pytest.approx(expected, abs=1e-9)
+
+    def test_nearby_panels_share_entries(self):
+        cache = SolarGeometryCache(cell=0.01)
+        timestamp = datetime(2024, 6, 21, 20, 0)
+        first = cache.elevation(timestamp, 37.7701, -122.4199)
+        # Same cell, later in the same minute
+        assert cache.elevation(timestamp.replace(second=30), 37.7699, -122.4202) == first
+        cache.elevation(timestamp, 40.0, -74.0)
+
+        assert cache.stats() == {'hits': 1, 'misses': 2, 'hit_rate': pytest.approx(1 / 3), 'entries': 2}
+
+    def test_day_rollover_invalidates(self):
+        cache = SolarGeometryCache(cell=0.01)
+        cache.elevation(datetime(2024, 6, 21, 20, 0), 37.77, -122.42)
+        winter = cache.elevation(datetime(2024, 12, 21, 20, 0), 37.77, -122.42)
+
+        assert cache.misses == 2
+        assert cache.stats()['entries'] == 1
+        assert winter == pytest.approx(_elevation(datetime(2024, 12, 21, 20, 0), 37.77, -122.42), abs=1e-9)
+
+    def test_bounded(self):
+        cache = SolarGeometryCache(cell=0.01, max_entries=10)
+        for minute in range(60):
+            cache.elevation(datetime(2024, 6, 21, 20, minute), 37.77, -122.42)
+
+        assert len(cache.elevations) == 10
+
+
 @pytest.mark.django_db
 class TestGeneratorSimulator:
     """Test generator simulator."""
@@ -62,10 +125,10 @@ class TestGeneratorSimulator:
         """Test generator produces output with variation."""
         simulator = GeneratorSimulator(generator)
 
-        # Run multiple simulations to check variation
+        # Run multiple ticks to check variation
         outputs = []
-        for _ in range(10):
-            result = simulator.simulate(datetime.utcnow())
+        for tick_id in range(10):
+            result = simulator.simulate(datetime.utcnow(), tick_id=tick_id)
             outputs.append(result['power_w'])
 
         # Should be around rated output (±5%)
@@ -166,13 +229,16 @@ class TestConsumptionSimulator:
     """Test consumption device simulator."""
 
     def test_consumption_within_range(self, air_conditioner):
-        """Test consumption stays within min/max range."""
+        """Test consumption stays within min/max range while running (and is 0 when idle)."""
         simulator = ConsumptionSimulator(air_conditioner)
 
         # Run multiple times to check variation
         for _ in range(10):
             result = simulator.simulate(datetime.utcnow())
-            assert air_conditioner.min_power_w <= result['power_w'] <= air_conditioner.max_power_w
+            assert (
+                result['power_w'] == 0.0
+                or air_conditioner.min_power_w <= result['power_w'] <= air_conditioner.max_power_w
+            )
 
     def test_consumption_offline(self, air_conditioner):
         """Test consumption device when offline."""
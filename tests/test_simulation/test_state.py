@@ -0,0 +1,214 @@
+"""Tests for batched and write-behind storage state writes."""
+
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from apps.devices.models import Battery, DeviceState, ElectricVehicle, EVMode
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.state import STATE_KEY, BatchStateWriter, CopyStateWriter
+from apps.simulation.tasks import simulate_devices
+
+
+@pytest.mark.django_db
+class TestBatchStateWriter:
+    """Test buffered DeviceState writes."""
+
+    def test_flush_writes_in_one_update(self, battery, electric_vehicle, django_assert_max_num_queries):
+        writer = BatchStateWriter()
+        writer.apply(battery, 1.0, watermark=10)
+        writer.apply(electric_vehicle, -2.5, watermark=10, mode='offline')
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 5.0
+
+        # SELECT ... FOR UPDATE and a single bulk UPDATE (plus savepoint handling)
+        with django_assert_max_num_queries(4):
+            written = writer.flush()
+
+        assert written == {battery.pk, electric_vehicle.pk}
+        battery_state = DeviceState.objects.get(pk=battery.pk)
+        ev_state = DeviceState.objects.get(pk=electric_vehicle.pk)
+        assert (battery_state.current_charge_kwh, battery_state.last_tick_start) == (6.0, 10)
+        assert (ev_state.current_charge_kwh, ev_state.mode) == (35.0, 'offline')
+
+    def test_flush_skips_ticks_already_applied(self, battery):
+        battery.apply_charge_delta(1.0, watermark=10)
+        stale = Battery.objects.select_related('state').get(pk=battery.pk)
+
+        writer = BatchStateWriter()
+        writer.apply(stale, 1.0, watermark=10)
+        assert writer.flush() == set()
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 6.0
+
+
+@pytest.mark.django_db
+class TestCopyStateWriter:
+    """Test the COPY + UPDATE ... FROM state write path."""
+
+    def _write_twice(self, writer, battery, electric_vehicle):
+        writer.apply(battery, 1.0, watermark=10)
+        writer.apply(electric_vehicle, -2.5, watermark=10, mode='offline')
+        written = writer.flush()
+
+        stale = Battery.objects.select_related('state').get(pk=battery.pk)
+        stale.current_charge_kwh = 0.0
+        assert writer.write_states([(stale.device_state, 10)]) == set()
+        return written
+
+    def test_matches_bulk_update(self, battery, electric_vehicle):
+        # Falls back to bulk_update off PostgreSQL, so this runs everywhere
+        written = self._write_twice(CopyStateWriter(copy_threshold=0), battery, electric_vehicle)
+
+        assert written == {battery.pk, electric_vehicle.pk}
+        battery_state = DeviceState.objects.get(pk=battery.pk)
+        ev_state = DeviceState.objects.get(pk=electric_vehicle.pk)
+        assert (battery_state.current_charge_kwh, battery_state.last_tick_start) == (6.0, 10)
+        assert (ev_state.current_charge_kwh, ev_state.mode, ev_state.last_tick_start) == (35.0, 'offline', 10)
+
+    @pytest.mark.parametrize('writer', [BatchStateWriter(), CopyStateWriter(copy_threshold=0)])
+    def test_write_without_tick_keeps_watermark(self, writer, battery, electric_vehicle):
+        DeviceState.objects.filter(pk__in=[battery.pk, electric_vehicle.pk]).update(last_tick_start=7)
+        # One copy without a watermark, one with the row's own
+        stale = Battery.objects.select_related('state').get(pk=battery.pk)
+        stale.device_state.last_tick_start = None
+        ev = ElectricVehicle.objects.select_related('state').get(pk=electric_vehicle.pk)
+        stale.current_charge_kwh, ev.current_charge_kwh = 1.0, 2.0
+
+        written = writer.write_states([(stale.device_state, None), (ev.device_state, None)])
+
+        assert written == {battery.pk, electric_vehicle.pk}
+        assert sorted(DeviceState.objects.values_list('current_charge_kwh', 'last_tick_start')) == [(1.0, 7), (2.0, 7)]
+        assert stale.last_tick_start == ev.last_tick_start == 7
+
+    @pytest.mark.skipif(not CopyStateWriter.copy_supported(), reason='COPY needs PostgreSQL with psycopg 3')
+    def test_copy_uses_single_merge(self, battery, electric_vehicle, django_assert_max_num_queries):
+        writer = CopyStateWriter(copy_threshold=0)
+        writer.apply(battery, 1.0, watermark=10)
+        writer.apply(electric_vehicle, -2.5, watermark=10, mode='offline')
+
+        # CREATE TEMPORARY TABLE, UPDATE ... FROM, DELETE (COPY isn't logged)
+        with django_assert_max_num_queries(5):
+            assert writer.flush() == {battery.pk, electric_vehicle.pk}
+
+    def test_benchmark_command(self, db):
+        out = StringIO()
+        call_command('benchmark_state_writes', sizes='20', stdout=out)
+
+        assert '20' in out.getvalue()
+        assert not DeviceState.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSimulateDevices:
+    """Test the batched simulation task."""
+
+    def test_batch_simulates_every_device_once(self, battery, solar_panel, air_conditioner):
+        device_ids = [battery.id, solar_panel.id, air_conditioner.id]
+        simulate_devices(device_ids, tick_id=1000, elapsed_seconds=60)
+        charge = DeviceState.objects.get(pk=battery.pk).current_charge_kwh
+
+        # A duplicate delivery of the same batch changes nothing
+        simulate_devices(device_ids, tick_id=1000, elapsed_seconds=60)
+
+        state = DeviceState.objects.get(pk=battery.pk)
+        assert state.current_charge_kwh == charge
+        assert state.last_tick_start == 1000 * 60
+
+        redis_client = RedisClient()
+        assert redis_client.get_device_storage(battery.id)['current_level_wh'] == pytest.approx(charge * 1000)
+        assert redis_client.get_device_data(solar_panel.id) is not None
+        assert redis_client.get_device_data(air_conditioner.id) is not None
+
+
+@pytest.mark.django_db
+class TestWriteBehind:
+    """Test Redis-authoritative storage state with database checkpoints."""
+
+    def test_ticks_write_redis_not_database(self, battery, write_behind, django_assert_max_num_queries):
+        battery.current_charge_kwh = 2.0
+        battery.save()
+
+        # Only the device SELECT; no state writes
+        with django_assert_max_num_queries(1):
+            simulate_devices([battery.id], tick_id=1, elapsed_seconds=60)
+        simulate_devices([battery.id], tick_id=2, elapsed_seconds=60)
+
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 2.0
+        live = Battery.objects.select_related('state').get(pk=battery.pk)
+        write_behind.load([live])
+        assert live.current_charge_kwh > 2.0
+        assert live.last_tick_start == 2 * 60
+
+    def test_duplicate_tick_is_a_no_op(self, battery, write_behind):
+        battery.current_charge_kwh = 2.0
+        battery.save()
+
+        simulate_devices([battery.id], tick_id=1, elapsed_seconds=60)
+        level = RedisClient().get_device_storage(battery.id)['current_level_wh']
+        simulate_devices([battery.id], tick_id=1, elapsed_seconds=60)
+
+        live = Battery.objects.select_related('state').get(pk=battery.pk)
+        write_behind.load([live])
+        assert live.current_charge_kwh * 1000 == pytest.approx(level)
+        assert RedisClient().get_device_storage(battery.id)['current_level_wh'] == level
+
+    def test_checkpoint_upserts_changed_devices(self, battery, electric_vehicle, write_behind):
+        simulate_devices([battery.id, electric_vehicle.id], tick_id=5, elapsed_seconds=60)
+        devices = [Battery.objects.get(pk=battery.pk), ElectricVehicle.objects.get(pk=electric_vehicle.pk)]
+        write_behind.load(devices)
+        live = {device.pk: device.current_charge_kwh for device in devices}
+
+        assert write_behind.checkpoint() == 2
+        assert write_behind.checkpoint() == 0
+        for pk, charge in live.items():
+            state = DeviceState.objects.get(pk=pk)
+            assert state.current_charge_kwh == pytest.approx(charge)
+            assert state.last_tick_start == 5 * 60
+
+    def test_restore_rebuilds_lost_state(self, battery, write_behind):
+        simulate_devices([battery.id], tick_id=5, elapsed_seconds=60)
+        write_behind.checkpoint()
+        write_behind.redis.delete(STATE_KEY.format(battery.pk))
+
+        write_behind.restore()
+
+        live = Battery.objects.get(pk=battery.pk)
+        live.current_charge_kwh = -1.0
+        write_behind.load([live])
+        assert live.current_charge_kwh == DeviceState.objects.get(pk=battery.pk).current_charge_kwh
+        assert live.last_tick_start == 5 * 60
+
+    def test_model_save_overrides_live_state(self, battery, write_behind):
+        simulate_devices([battery.id], tick_id=5, elapsed_seconds=60)
+
+        battery.current_charge_kwh = 9.0
+        battery.save()
+
+        live = Battery.objects.get(pk=battery.pk)
+        write_behind.load([live])
+        assert live.current_charge_kwh == 9.0
+        # The watermark stays with the live state
+        assert live.last_tick_start == 5 * 60
+        assert write_behind.checkpoint() == 1
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 9.0
+
+    def test_device_edit_keeps_live_state(self, electric_vehicle, write_behind):
+        stale = ElectricVehicle.objects.select_related('state').get(pk=electric_vehicle.pk)
+        simulate_devices([electric_vehicle.id], tick_id=5, elapsed_seconds=60)
+        live = ElectricVehicle.objects.get(pk=electric_vehicle.pk)
+        write_behind.load([live])
+
+        stale.name = 'Renamed'
+        stale.save()
+        stale.mode = EVMode.DISCHARGING
+        stale.save()
+
+        edited = ElectricVehicle.objects.get(pk=electric_vehicle.pk)
+        write_behind.load([edited])
+        assert edited.current_charge_kwh == live.current_charge_kwh
+        assert edited.mode == EVMode.DISCHARGING
+
+    def test_checkpoint_keeps_newer_database_state(self, battery, write_behind):
+        simulate_devices([battery.id], tick_id=5, elapsed_seconds=60)
+        DeviceState.objects.filter(pk=battery.pk).update(current_charge_kwh=1.0, last_tick_start=6 * 60)
+
+        assert write_behind.checkpoint() == 0
+        assert DeviceState.objects.get(pk=battery.pk).current_charge_kwh == 1.0
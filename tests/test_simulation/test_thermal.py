@@ -0,0 +1,101 @@
+"""Tests for the weather-driven HVAC load model."""
+
+import pytest
+from datetime import datetime, timedelta
+from apps.devices.models import ClimateRegion, Device
+from apps.simulation import rng
+from apps.simulation.replay import FleetReplay
+from apps.simulation.simulators.consumption import ConsumptionSimulator
+from apps.simulation.thermal import CLIMATES, ThermalFleet, indoor_temperature, outdoor_temperature
+
+
+MIXED = CLIMATES[ClimateRegion.MIXED]
+# 2024-07-18 3 PM and 2024-01-15 5 AM in New York (UTC timestamps)
+SUMMER_AFTERNOON = datetime(2024, 7, 18, 19, 0)
+WINTER_NIGHT = datetime(2024, 1, 15, 10, 0)
+
+
+class TestTemperature:
+    """Test the climate curves and thermal lag."""
+
+    def test_seasonal_and_diurnal_curves(self):
+        assert outdoor_temperature(MIXED, SUMMER_AFTERNOON) == pytest.approx(13.0 + 11.5 + 4.5, abs=0.5)
+        assert outdoor_temperature(MIXED, WINTER_NIGHT) < 3.0
+        assert outdoor_temperature(MIXED, SUMMER_AFTERNOON) > outdoor_temperature(
+            MIXED, SUMMER_AFTERNOON - timedelta(hours=12)
+        )
+
+    def test_thermal_mass_damps_and_delays(self):
+        day = [SUMMER_AFTERNOON + timedelta(minutes=10 * step) for step in range(-72, 72)]
+        outdoor = [outdoor_temperature(MIXED, t) for t in day]
+        indoor = [indoor_temperature(MIXED, t, 4.0) for t in day]
+
+        assert max(indoor) - min(indoor) < max(outdoor) - min(outdoor)
+        assert day[indoor.index(max(indoor))] > day[outdoor.index(max(outdoor))]
+
+    def test_no_mass_follows_outdoor(self):
+        assert indoor_temperature(MIXED, SUMMER_AFTERNOON, 0.0) == outdoor_temperature(MIXED, SUMMER_AFTERNOON)
+
+
+@pytest.mark.django_db
+class TestHVACLoad:
+    """Test load against temperature and the batched evaluation."""
+
+    def test_ac_follows_heat(self, air_conditioner):
+        simulator = ConsumptionSimulator(air_conditioner)
+
+        assert simulator.simulate(SUMMER_AFTERNOON)['power_w'] > 1.3 * air_conditioner.min_power_w
+        assert simulator.simulate(WINTER_NIGHT)['power_w'] < 1.1 * air_conditioner.min_power_w
+
+        air_conditioner.climate_region = ClimateRegion.HOT_DRY
+        assert simulator.simulate(SUMMER_AFTERNOON)['power_w'] > 0.8 * air_conditioner.max_power_w
+
+    def test_heater_follows_cold(self, heater):
+        simulator = ConsumptionSimulator(heater)
+
+        assert simulator.simulate(WINTER_NIGHT)['power_w'] == heater.max_power_w
+        assert simulator.simulate(SUMMER_AFTERNOON)['power_w'] < 1.1 * heater.min_power_w
+
+    def test_region_matters(self, air_conditioner):
+        may_afternoon = datetime(2024, 5, 15, 22, 0)
+        marine = ConsumptionSimulator(air_conditioner).simulate(may_afternoon)['power_w']
+        air_conditioner.climate_region = ClimateRegion.HOT_DRY
+
+        assert ConsumptionSimulator(air_conditioner).simulate(may_afternoon)['power_w'] > marine
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_no_demand_draws_nothing(self, air_conditioner, heater):
+        # A cold winter night for the AC and a hot afternoon for the heater
+        simulators = [ConsumptionSimulator(air_conditioner), ConsumptionSimulator(heater)]
+        batch = ConsumptionSimulator.simulate_batch(simulators, WINTER_NIGHT, tick_id=42)
+        replay = FleetReplay(Device.objects.filter(pk__in=[air_conditioner.pk, heater.pk]))
+        replayed = {
+            device_id: power
+            for readings in replay.step(WINTER_NIGHT, 60)
+            for device_id, power in zip(readings.device_ids.tolist(), readings.power_w.tolist())
+        }
+
+        assert simulators[0].simulate(WINTER_NIGHT, tick_id=42)['power_w'] == 0.0
+        assert batch[0]['power_w'] == replayed[air_conditioner.pk] == 0.0
+        assert simulators[1].simulate(SUMMER_AFTERNOON)['power_w'] == 0.0
+        assert batch[1]['power_w'] > heater.min_power_w
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_batch_matches_scalar(self, air_conditioner, heater):
+        air_conditioner.climate_region = ClimateRegion.HOT_HUMID
+        heater.thermal_time_constant_hours = 12.0
+        simulators = [ConsumptionSimulator(air_conditioner), ConsumptionSimulator(heater)]
+
+        for timestamp in (SUMMER_AFTERNOON, WINTER_NIGHT, datetime(2024, 4, 1, 3, 17)):
+            batch = ConsumptionSimulator.simulate_batch(simulators, timestamp, tick_id=42)
+            for simulator, result in zip(simulators, batch):
+                expected = simulator.simulate(timestamp, tick_id=42)
+                assert result['power_w'] == pytest.approx(expected['power_w'], rel=1e-12)
+
+    @pytest.mark.skipif(rng.np is None, reason='NumPy is not installed')
+    def test_fleet_temperatures(self, air_conditioner, heater):
+        fleet = ThermalFleet([air_conditioner, heater])
+
+        assert fleet.indoor_temperature(SUMMER_AFTERNOON).tolist() == pytest.approx([
+            indoor_temperature(MIXED, SUMMER_AFTERNOON, 4.0)
+        ] * 2, rel=1e-12)
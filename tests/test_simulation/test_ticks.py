@@ -0,0 +1,228 @@
+"""Tests for tick coordination and catch-up integration."""
+
+import pytest
+from datetime import datetime
+from freezegun import freeze_time
+from apps.devices.models import EVMode
+from apps.simulation.redis_client import RedisClient
+from apps.simulation.rng import DeviceRandom
+from apps.simulation.simulators.base import TickAlreadyApplied
+from apps.simulation.simulators.battery import BatterySimulator
+from apps.simulation.simulators.ev import EVSimulator
+from apps.simulation.tasks import simulate_device
+from apps.simulation.ticks import (
+    LAG_HISTORY_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY, LOCK_KEY, STATS_KEY,
+    TickCoordinator, tick_id_for, tick_start,
+)
+
+
+# 2024-01-15 12:00:00 UTC, on a minute boundary
+EPOCH = 1705320000.0
+
+
+@pytest.fixture
+def coordinator():
+    redis_client = RedisClient()
+    redis_client.redis.delete(LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY, STATS_KEY, LAG_HISTORY_KEY)
+    yield TickCoordinator(redis_client)
+    redis_client.redis.delete(LOCK_KEY, LAST_TICK_KEY, LAST_TICK_START_KEY, STATS_KEY, LAG_HISTORY_KEY)
+
+
+class TestTickIds:
+    """Test wall-clock alignment of tick ids."""
+
+    def test_tick_ids_align_to_wall_clock(self):
+        assert tick_id_for(EPOCH, 60) == tick_id_for(EPOCH + 59.9, 60)
+        assert tick_id_for(EPOCH + 60, 60) == tick_id_for(EPOCH, 60) + 1
+
+    def test_tick_start(self):
+        assert tick_start(tick_id_for(EPOCH + 42, 60), 60) == datetime(2024, 1, 15, 12, 0, 0)
+
+
+class TestTickCoordinator:
+    """Test locking, deduplication and catch-up."""
+
+    def test_first_tick_covers_one_interval(self, coordinator):
+        with coordinator.begin(now=EPOCH + 3) as tick:
+            assert tick.tick_id == tick_id_for(EPOCH, 60)
+            assert tick.elapsed_seconds == 60
+            assert tick.missed_ticks == 0
+            assert tick.lag_seconds == pytest.approx(3)
+
+        assert coordinator.last_completed_tick() == tick.tick_id
+
+    def test_same_tick_runs_once(self, coordinator):
+        with coordinator.begin(now=EPOCH) as tick:
+            assert tick is not None
+        with coordinator.begin(now=EPOCH + 30) as tick:
+            assert tick is None
+
+        assert coordinator.stats()['skipped_duplicates'] == 1
+
+    def test_overlapping_tick_is_skipped(self, coordinator):
+        with coordinator.begin(now=EPOCH) as first:
+            with coordinator.begin(now=EPOCH + 60) as second:
+                assert second is None
+            assert first is not None
+
+        assert coordinator.stats()['skipped_overlaps'] == 1
+
+    def test_catch_up_after_missed_ticks(self, coordinator):
+        with coordinator.begin(now=EPOCH):
+            pass
+        with coordinator.begin(now=EPOCH + 4 * 60 + 5) as tick:
+            assert tick.elapsed_seconds == 240
+            assert tick.missed_ticks == 3
+
+        stats = coordinator.stats()
+        assert stats['missed_ticks_total'] == 3
+        assert stats['lag_seconds'] == pytest.approx(5)
+        assert coordinator.redis.llen(LAG_HISTORY_KEY) == 2
+
+    def test_counters_accumulate(self, coordinator):
+        coordinator.record_counters(solar_cache_hits=3, solar_cache_misses=1)
+        coordinator.record_counters(solar_cache_hits=4, solar_cache_misses=0)
+
+        stats = coordinator.stats()
+        assert stats['solar_cache_hits'] == 7
+        assert stats['solar_cache_hit_rate'] == pytest.approx(7 / 8)
+
+    def test_catch_up_is_capped(self, coordinator, settings):
+        settings.SIMULATION_MAX_CATCH_UP_SECONDS = 600
+        capped = TickCoordinator(RedisClient())
+        with capped.begin(now=EPOCH):
+            pass
+        with capped.begin(now=EPOCH + 86400) as tick:
+            assert tick.elapsed_seconds == 600
+
+    def test_sub_minute_ticks(self, coordinator, settings):
+        settings.SIMULATION_TICK_SECONDS = 10
+        fast = TickCoordinator(RedisClient())
+        with fast.begin(now=EPOCH):
+            pass
+        with fast.begin(now=EPOCH + 10) as tick:
+            assert tick.elapsed_seconds == 10
+            assert tick.missed_ticks == 0
+
+    def test_tick_length_change_keeps_elapsed_exact(self, coordinator, settings):
+        with coordinator.begin(now=EPOCH):
+            pass
+
+        # Shorter ticks mean larger tick ids; elapsed is still measured in seconds
+        settings.SIMULATION_TICK_SECONDS = 15
+        with TickCoordinator(RedisClient()).begin(now=EPOCH + 90) as tick:
+            assert tick.elapsed_seconds == 90
+
+        # Longer ticks mean smaller ids, which must not look like duplicates
+        settings.SIMULATION_TICK_SECONDS = 60
+        with TickCoordinator(RedisClient()).begin(now=EPOCH + 180) as tick:
+            assert tick.elapsed_seconds == 90
+
+    def test_failed_tick_is_not_completed(self, coordinator):
+        with pytest.raises(RuntimeError):
+            with coordinator.begin(now=EPOCH):
+                raise RuntimeError('boom')
+
+        assert coordinator.last_completed_tick() is None
+        with coordinator.begin(now=EPOCH + 1) as tick:
+            assert tick is not None
+
+
+@pytest.mark.django_db
+class TestElapsedIntegration:
+    """Test storage simulators integrate over the elapsed time."""
+
+    def test_battery_charges_for_elapsed_time(self, battery, monkeypatch):
+        monkeypatch.setattr(DeviceRandom, 'uniform', lambda self, low, high: 1.0)
+        battery.current_charge_kwh = 1.0
+        battery.save()
+
+        result = BatterySimulator(battery).simulate(datetime.utcnow(), elapsed_seconds=600)
+
+        # 5 kW for 10 minutes
+        assert result['current_level_wh'] == pytest.approx(1000 + 5000 / 6)
+
+
+@pytest.mark.django_db
+class TestIdempotentIntegration:
+    """Test storage charge is integrated exactly once per tick."""
+
+    def test_duplicate_tick_is_a_no_op(self, battery):
+        assert battery.apply_charge_delta(1.0, watermark=100)
+        assert not battery.apply_charge_delta(1.0, watermark=100)
+        assert not battery.apply_charge_delta(1.0, watermark=99)
+
+        battery.refresh_from_db()
+        assert battery.current_charge_kwh == 6.0
+        assert battery.last_tick_start == 100
+
+    def test_update_is_clamped_in_the_database(self, battery):
+        battery.apply_charge_delta(50.0, watermark=1)
+        battery.refresh_from_db()
+        assert battery.current_charge_kwh == battery.capacity_kwh
+
+        battery.apply_charge_delta(-50.0, watermark=2)
+        battery.refresh_from_db()
+        assert battery.current_charge_kwh == 0.0
+
+    def test_stale_instance_cannot_apply_twice(self, battery):
+        stale = type(battery).objects.select_related('state').get(pk=battery.pk)
+        battery.current_charge_kwh = 2.0
+        battery.save()
+
+        assert BatterySimulator(battery).simulate(tick_start(7), tick_id=7)
+        with pytest.raises(TickAlreadyApplied):
+            BatterySimulator(stale).simulate(tick_start(7), tick_id=7)
+
+    def test_simulate_device_twice_charges_once(self, battery, monkeypatch):
+        monkeypatch.setattr(DeviceRandom, 'uniform', lambda self, low, high: 1.0)
+        battery.current_charge_kwh = 1.0
+        battery.save()
+
+        simulate_device(battery.id, tick_id=tick_id_for(EPOCH, 60), elapsed_seconds=60)
+        simulate_device(battery.id, tick_id=tick_id_for(EPOCH, 60), elapsed_seconds=60)
+
+        battery.refresh_from_db()
+        assert battery.current_charge_kwh == pytest.approx(1.0 + 5.0 / 60)
+        level = RedisClient().get_device_storage(battery.id)['current_level_wh']
+        assert level == pytest.approx(battery.current_charge_kwh * 1000)
+
+    def test_tick_length_change_keeps_charging(self, battery, settings, monkeypatch):
+        monkeypatch.setattr(DeviceRandom, 'uniform', lambda self, low, high: 1.0)
+        battery.current_charge_kwh = 1.0
+        battery.save()
+
+        settings.SIMULATION_TICK_SECONDS = 10
+        simulate_device(battery.id, tick_id=tick_id_for(EPOCH + 50, 10), elapsed_seconds=10)
+        # Longer ticks have smaller ids than the ones already applied
+        settings.SIMULATION_TICK_SECONDS = 60
+        simulate_device(battery.id, tick_id=tick_id_for(EPOCH + 60, 60), elapsed_seconds=60)
+        simulate_device(battery.id, tick_id=tick_id_for(EPOCH + 120, 60), elapsed_seconds=60)
+
+        battery.refresh_from_db()
+        assert battery.current_charge_kwh == pytest.approx(1.0 + 5.0 * 130 / 3600)
+        assert battery.last_tick_start == EPOCH + 120
+
+    def test_reset_clears_watermarks(self, coordinator, battery):
+        with coordinator.begin(now=EPOCH) as tick:
+            simulate_device(battery.id, tick_id=tick.tick_id, elapsed_seconds=60)
+
+        coordinator.reset()
+
+        battery.refresh_from_db()
+        assert battery.last_tick_start is None
+        assert coordinator.last_completed_tick() is None
+        # The restarted clock may be behind the old ticks; they apply again
+        assert battery.apply_charge_delta(1.0, watermark=EPOCH - 3600)
+
+    @freeze_time("2024-01-15 20:00:00")  # Monday 3 PM EST - away
+    def test_ev_departure_is_applied_once(self, electric_vehicle):
+        stale = type(electric_vehicle).objects.select_related('state').get(pk=electric_vehicle.pk)
+
+        EVSimulator(electric_vehicle).simulate(datetime.utcnow(), tick_id=5)
+        with pytest.raises(TickAlreadyApplied):
+            EVSimulator(stale).simulate(datetime.utcnow(), tick_id=5)
+
+        electric_vehicle.refresh_from_db()
+        assert electric_vehicle.mode == EVMode.OFFLINE
+        assert electric_vehicle.current_charge_kwh == pytest.approx(stale.current_charge_kwh - 3.0 / 60)